@@ -0,0 +1,41 @@
+<?php
+/**
+ * The order and lanes to run a cross-organism fan-out in -- warm organisms first, cold
+ * ones largest first -- from the page cache's residency (lib/fanout_schedule.php).
+ *
+ * The browser asks this once before fanning out (js/modules/fanout-scheduler.js, used by
+ * the annotation search and the MOOPmart preview). Only ever an optimisation: an error, or
+ * an organism missing from the answer, means "cold, in the order I have it".
+ *
+ * Access: organisms the caller may not search are left out, like api/search_skip.php --
+ * residency says which organisms someone has been reading.
+ *
+ * GET parameters:
+ *   organisms - comma-separated organism directory names (required)
+ *   kind      - 'search' (default) or 'file' (MOOPmart: reads across the whole database)
+ *
+ * Returns JSON: { schedule: [{organism, resident, bytes, warm}] }
+ */
+
+include_once __DIR__ . '/../tools/tool_init.php';
+require_once __DIR__ . '/../lib/fanout_schedule.php';
+
+header('Content-Type: application/json');
+
+$kind      = ($_GET['kind'] ?? '') === 'file' ? 'file' : 'search';
+$organisms = array_values(array_unique(array_filter(array_map('trim', explode(',', $_GET['organisms'] ?? '')))));
+
+$organism_data = rtrim($config->getPath('organism_data'), '/');
+$is_admin = moop_session_is_admin();
+$dbs = [];
+foreach ($organisms as $organism) {
+    if (!preg_match('/^[A-Za-z0-9_.-]+$/', $organism)) continue;
+    if (!$is_admin && !is_public_organism($organism) && !has_access('COLLABORATOR', $organism)) continue;
+    $path = "$organism_data/$organism/organism.sqlite";
+    if (is_file($path)) $dbs[$organism] = $path;
+}
+
+// Nothing here writes to the session; do not hold its lock while the probe runs.
+if (session_status() === PHP_SESSION_ACTIVE) session_write_close();
+
+echo json_encode(['schedule' => $dbs ? moop_fanout_plan($dbs, $kind, moop_fanout_residency($dbs)) : []]);
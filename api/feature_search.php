@@ -22,6 +22,8 @@ include_once __DIR__ . '/../lib/extract_search_helpers.php';
 // MOOP_HIERARCHY_MAX_DEPTH and the walker), so this one line brings in both. Same reasoning
 // as lib/moopmart_functions.php:20.
 require_once __DIR__ . '/../lib/database_queries.php';
+require_once __DIR__ . '/../lib/search_result_cache.php';
+require_once __DIR__ . '/../lib/search_capture.php';
 
 header('Content-Type: application/json');
 
@@ -31,6 +33,8 @@ if ($q === '') {
     exit;
 }
 
+moop_search_capture('feature_id', $_GET, []);
+
 $config        = ConfigManager::getInstance();
 $site          = $config->getString('site', 'moop');
 $organism_data = $config->getPath('organism_data');
@@ -77,7 +81,7 @@ $feature_types = ['gene', 'mRNA', 'protein', 'polypeptide'];
  * UNION ALLs across EVERY accessible database: a seek stays a seek 85 times over, a scan
  * becomes 85 full index scans. Do not "simplify" this to LIKE.
  */
-function moop_feature_id_lookup(array $batches, string $needle, string $mode, array $feature_types, string $site): array {
+function moop_feature_id_lookup(array $batches, string $needle, string $mode, array $feature_types, string $site, bool &$failed = false): array {
     $results = [];
 
     foreach ($batches as $batch) {
@@ -143,54 +147,75 @@ function moop_feature_id_lookup(array $batches, string $needle, string $mode, ar
 
         } catch (Exception $e) {
             error_log('feature_search batch error: ' . $e->getMessage());
+            $failed = true;
         }
     }
 
     return $results;
 }
 
-// Version-tolerant ladder. Each rung runs ONLY if the one above found nothing, so the
-// common case — a user pasting the exact ID that MOOP itself displayed — is still a single
-// index seek per database and costs exactly what it did before.
-//
-// The rungs exist because MOOP shows versioned accessions (NV2t021704001.1) while users
-// paste IDs from papers, spreadsheets and older releases, where the version is routinely
-// absent or stale. Before this, "NV2t021704001" returned NOTHING from the index search box
-// even though the feature is right there — an exact-match endpoint reporting a real gene as
-// missing, which reads as "the site does not have my gene".
-//
-// Order matters: exact-as-typed always wins, so an ID that genuinely exists unversioned is
-// never shadowed by a versioned near-match.
-$results = moop_feature_id_lookup($batches, $q, 'exact', $feature_types, $site);
-
-if (empty($results)) {
-    // Typed unversioned, stored versioned: NV2t021704001 -> NV2t021704001.1
-    $results = moop_feature_id_lookup($batches, $q, 'version', $feature_types, $site);
+// Served from the shared result cache when it can be (lib/search_result_cache.php). The key
+// carries the accessible gene sets, not the user: two users who can see the same gene sets
+// get the same answer, and a user who can see more never shares an entry with one who sees
+// less. A batch that failed is not cached -- its organisms would be missing from the answer.
+$cache_dbs   = [];
+$cache_scope = [];
+foreach ($db_entries as $entry) {
+    $cache_dbs[$entry['organism']] = $entry['path'];
+    $ids = array_values(array_unique($entry['gene_set_ids']));
+    sort($ids);
+    $cache_scope[$entry['organism']] = $ids;
 }
-
-if (empty($results) && preg_match('/^(.+)\.\d+$/', $q, $m)) {
-    // Typed versioned, stored unversioned or stored at a DIFFERENT version:
-    // NV2t021704001.1 -> NV2t021704001, then -> NV2t021704001.<any>
-    $base    = $m[1];
-    $results = moop_feature_id_lookup($batches, $base, 'exact', $feature_types, $site);
+ksort($cache_scope);
+$cache_key = moop_search_cache_key('feature_search', ['q' => $q, 'scope' => $cache_scope]);
+
+$compute = function () use ($batches, $q, $feature_types, $site, $db_map) {
+    // Version-tolerant ladder. Each rung runs ONLY if the one above found nothing, so the
+    // common case — a user pasting the exact ID that MOOP itself displayed — is still a single
+    // index seek per database and costs exactly what it did before.
+    //
+    // The rungs exist because MOOP shows versioned accessions (NV2t021704001.1) while users
+    // paste IDs from papers, spreadsheets and older releases, where the version is routinely
+    // absent or stale. Before this, "NV2t021704001" returned NOTHING from the index search box
+    // even though the feature is right there — an exact-match endpoint reporting a real gene as
+    // missing, which reads as "the site does not have my gene".
+    //
+    // Order matters: exact-as-typed always wins, so an ID that genuinely exists unversioned is
+    // never shadowed by a versioned near-match.
+    $failed  = false;
+    $results = moop_feature_id_lookup($batches, $q, 'exact', $feature_types, $site, $failed);
 
     if (empty($results)) {
-        $results = moop_feature_id_lookup($batches, $base, 'version', $feature_types, $site);
+        // Typed unversioned, stored versioned: NV2t021704001 -> NV2t021704001.1
+        $results = moop_feature_id_lookup($batches, $q, 'version', $feature_types, $site, $failed);
+    }
+
+    if (empty($results) && preg_match('/^(.+)\.\d+$/', $q, $m)) {
+        // Typed versioned, stored unversioned or stored at a DIFFERENT version:
+        // NV2t021704001.1 -> NV2t021704001, then -> NV2t021704001.<any>
+        $base    = $m[1];
+        $results = moop_feature_id_lookup($batches, $base, 'exact', $feature_types, $site, $failed);
+
+        if (empty($results)) {
+            $results = moop_feature_id_lookup($batches, $base, 'version', $feature_types, $site, $failed);
+        }
     }
-}
 
-// Collapse to one row per gene, exactly as the search page does — same shared walker, same
-// per-database level derivation, so the index box and the search page cannot disagree about
-// how many rows one gene is.
-//
-// The batched UNION above cannot do this itself: it runs against many ATTACHed databases at
-// once, while the walk is per-database (parent_feature_id is only meaningful inside one).
-// So the walk runs AFTER, once per organism that actually returned hits — which for an ID
-// lookup is normally one. That is why "cross-organism with ATTACH" does not block reuse: it
-// only decides WHERE the helper is called, not whether it can be.
-$results = moop_resolve_feature_search_hits($results, $db_map, $site);
-
-echo json_encode(['results' => $results]);
+    // Collapse to one row per gene, exactly as the search page does — same shared walker, same
+    // per-database level derivation, so the index box and the search page cannot disagree about
+    // how many rows one gene is.
+    //
+    // The batched UNION above cannot do this itself: it runs against many ATTACHed databases at
+    // once, while the walk is per-database (parent_feature_id is only meaningful inside one).
+    // So the walk runs AFTER, once per organism that actually returned hits — which for an ID
+    // lookup is normally one. That is why "cross-organism with ATTACH" does not block reuse: it
+    // only decides WHERE the helper is called, not whether it can be.
+    $results = moop_resolve_feature_search_hits($results, $db_map, $site);
+
+    return [['results' => $results], !$failed];
+};
+
+echo moop_search_cache_serve($cache_key, $cache_dbs, $compute);
 
 /**
  * Lift ID-search hits to one row per gene, per organism.
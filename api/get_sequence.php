@@ -24,6 +24,7 @@
 include_once __DIR__ . '/../tools/tool_init.php';
 include_once __DIR__ . '/../lib/moop_functions.php';
 include_once __DIR__ . '/../lib/blast_functions.php';
+require_once __DIR__ . '/../lib/search_telemetry.php';
 
 header('Content-Type: application/json');
 
@@ -102,7 +103,15 @@ if (!$fasta) {
 }
 
 // --- Extract sequence ---
+$t0 = moop_telemetry_start();
 $sequence = extractFastaRegion($fasta, $fai, $seqname, $start, $end);
+moop_telemetry_record('sequence', $t0, [
+    'organism' => $organism_name,
+    'file'     => basename($fasta),
+    'ids'      => 1,
+    'results'  => $sequence === null ? 0 : 1,
+    'bases'    => $sequence === null ? 0 : strlen($sequence),
+]);
 
 if ($sequence === null) {
     http_response_code(404);
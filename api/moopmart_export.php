@@ -21,6 +21,7 @@ include_once __DIR__ . '/../lib/extract_search_helpers.php';
 include_once __DIR__ . '/../lib/blast_functions.php';
 include_once __DIR__ . '/../lib/moopmart_functions.php';
 require_once __DIR__ . '/../lib/download_filename.php';
+require_once __DIR__ . '/../lib/search_telemetry.php';
 
 csrf_protect();
 
@@ -258,6 +259,8 @@ if ($output_format === 'tsv') {
     // chunk's annotations, write, free. Flush per chunk so the browser receives data
     // incrementally instead of waiting on the whole export.
     foreach ($by_organism as $org => $org_data) {
+        $t0 = moop_telemetry_start();
+        $org_genes = $org_rows = 0;
         foreach ($organismChunks($org, $org_data) as $db_path => $chunk) {
             if ($out === null) $beginOutput();
 
@@ -269,6 +272,7 @@ if ($output_format === 'tsv') {
             foreach ($expanded as $f) {
                 $base     = array_map(fn($k) => ($feat_col_map[$k][1])($f), $active_feat);
                 $fid_anns = $chunk_anns[$f['feature_id']] ?? []; // feature_id is still the gene's
+                $org_rows++;
 
                 if ($ann_format === 'long') {
                     $emitted = false;
@@ -296,9 +300,16 @@ if ($output_format === 'tsv') {
                     fputcsv($out, $row, "\t");
                 }
             }
+            $org_genes += count($chunk);
             unset($expanded, $chunk_anns);
             flush();
         }
+        moop_telemetry_record('moopmart', $t0, [
+            'organism'   => $org,
+            'mode'       => 'tsv',
+            'gene_count' => $org_genes,
+            'row_count'  => $org_rows,
+        ]);
     }
 
     if ($out === null) {
@@ -330,6 +341,7 @@ if ($output_format === 'tsv') {
 
     foreach ($by_organism as $org_name => $org_data) {
         if ($reached_limit) break;
+        $t0 = moop_telemetry_start();
 
         // Group this organism's genes by gene set: the exon writer makes a single GFF pass over
         // a whole gene set, so it needs one intact. Keep only the fields the FASTA writers read
@@ -351,6 +363,7 @@ if ($output_format === 'tsv') {
         }
         if (empty($by_gs)) continue;
         if ($out === null) $beginOutput();
+        $org_genes = array_sum(array_map('count', $by_gs));
 
         foreach ($by_gs as $gs_key => $gs_features) {
             $src = $sources_by_gs_id[$gs_key] ?? null;
@@ -401,6 +414,12 @@ if ($output_format === 'tsv') {
             }
         }
         unset($by_gs);
+        moop_telemetry_record('moopmart', $t0, [
+            'organism'   => $org_name,
+            'mode'       => 'fasta',
+            'fasta_mode' => $fasta_mode,
+            'gene_count' => $org_genes,
+        ]);
     }
 
     if ($out === null) {
@@ -22,6 +22,7 @@ include_once __DIR__ . '/../lib/functions_database.php';
 include_once __DIR__ . '/../lib/extract_search_helpers.php';
 include_once __DIR__ . '/../lib/blast_functions.php';
 include_once __DIR__ . '/../lib/moopmart_functions.php';
+require_once __DIR__ . '/../lib/search_telemetry.php';
 
 header('Content-Type: application/json');
 csrf_protect();
@@ -55,10 +56,17 @@ $req = moopmartParsePreviewRequest($_POST);
 
 $organism_data = $config->getPath('organism_data');
 
+$t0  = moop_telemetry_start();
 $res = moopmartCollectOrganismRows(
     $organism, $org_sources, $req['filters'], $req['coord_filter'],
     $req['raw_input_ids'], $req['global_filter_reason'], $organism_data, MOOPMART_PREVIEW_ROW_CAP
 );
+moop_telemetry_record('moopmart', $t0, [
+    'organism'   => $organism,
+    'mode'       => 'preview',
+    'gene_count' => $res['gene_count'],
+    'row_count'  => $res['row_count'],
+]);
 
 $built = moopmartBuildPreviewRows($res['rows'], $req['annotation_columns'], $req['ann_incl_id'], $req['ann_incl_desc']);
 
@@ -0,0 +1,58 @@
+<?php
+/**
+ * Which organisms of a cross-organism search certainly have no result -- answered from the
+ * skip index (lib/organism_skip_index.php), without opening any organism database.
+ *
+ * The browser asks this once before fanning out (js/modules/annotation-search.js) and does
+ * not send the per-organism requests for the ones listed. Only ever an optimisation: an
+ * empty list, or an error, means "search them all", which is what happened before it.
+ *
+ * Access: organisms the caller may not search are never reported, skippable or not -- the
+ * per-organism request refuses them as it always has, and this endpoint must not become a
+ * way to learn which terms occur in them.
+ *
+ * GET parameters:
+ *   search_keywords - the query (required)
+ *   organisms       - comma-separated organism directory names (required)
+ *   quoted          - '1' for an exact phrase
+ *
+ * Returns JSON: { skip: [{organism, genus, species}] }
+ */
+
+include_once __DIR__ . '/../tools/tool_init.php';
+require_once __DIR__ . '/../lib/organism_skip_index.php';
+
+header('Content-Type: application/json');
+
+$search_keywords = $_GET['search_keywords'] ?? '';
+$quoted_search   = isset($_GET['quoted']) && $_GET['quoted'] === '1';
+$organisms       = array_values(array_filter(array_map('trim', explode(',', $_GET['organisms'] ?? ''))));
+
+$search_input = sanitize_search_input($search_keywords, $quoted_search);
+if ($search_input === '' || empty($organisms)
+    || !moop_search_input_is_usable($search_input, $quoted_search)) {
+    echo json_encode(['skip' => []]);
+    exit;
+}
+
+$organism_data = rtrim($config->getPath('organism_data'), '/');
+$is_admin = moop_session_is_admin();
+$dbs = [];
+foreach ($organisms as $organism) {
+    // Same shape of name the per-organism endpoint accepts; anything else is just not skipped.
+    if (!preg_match('/^[A-Za-z0-9_.-]+$/', $organism)) continue;
+    if (!$is_admin && !is_public_organism($organism) && !has_access('COLLABORATOR', $organism)) continue;
+    $dbs[$organism] = "$organism_data/$organism/organism.sqlite";
+}
+
+$skip = [];
+foreach (moop_skip_index_skippable($search_input, $quoted_search, $dbs) as $organism) {
+    $info = loadOrganismInfo($organism, $organism_data) ?: [];
+    $skip[] = [
+        'organism' => $organism,
+        'genus'    => $info['genus'] ?? '',
+        'species'  => $info['species'] ?? '',
+    ];
+}
+
+echo json_encode(['skip' => $skip]);
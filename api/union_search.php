@@ -0,0 +1,106 @@
+<?php
+/**
+ * Cross-organism annotation search through the union index.
+ *
+ * One request for many organisms: ranks once in union.sqlite, then fetches the survivors
+ * from each organism database (lib/union_index.php). Organisms the union index cannot
+ * serve -- not indexed yet, or reloaded since it was built -- come back in "stale", and the
+ * caller searches those one at a time through tools/annotation_search_ajax.php exactly as
+ * before. A response may therefore be all "stale" (no union.sqlite at all); that is the
+ * fallback working, not an error.
+ *
+ * The search page does not call this: tools/annotation_search_stream.php takes the same
+ * union pools (moop_union_pools()) inside its own fan-out, with the per-organism fallback
+ * built in. This is the same search as one JSON document, for scripts and replay.
+ *
+ * Annotation text only. A query that is a feature ID belongs to api/feature_search.php,
+ * and gene-only or source-filtered searches go through the per-organism endpoint, whose
+ * filters narrow BEFORE ranking -- a filter applied after a global pool could come back
+ * near-empty.
+ *
+ * GET parameters:
+ *   search_keywords - the query (required)
+ *   organisms       - comma-separated organism directory names (required)
+ *   quoted          - '1' for an exact phrase
+ *
+ * Returns JSON: { results: {organism: {results, count, capped, warning}}, stale: [organism],
+ *                 results_limit }
+ *           or: { error: "message" }
+ */
+
+include_once __DIR__ . '/../tools/tool_init.php';
+include_once __DIR__ . '/../lib/extract_search_helpers.php';   // flattenSourcesList()
+require_once __DIR__ . '/../lib/union_index.php';
+require_once __DIR__ . '/../lib/search_capture.php';
+
+header('Content-Type: application/json');
+
+$search_keywords = $_GET['search_keywords'] ?? '';
+$quoted_search   = isset($_GET['quoted']) && $_GET['quoted'] === '1';
+$organisms       = array_values(array_filter(array_map('trim', explode(',', $_GET['organisms'] ?? ''))));
+
+if ($search_keywords === '' || empty($organisms)) {
+    echo json_encode(['error' => 'Missing required parameters']);
+    exit;
+}
+
+moop_search_capture('union', $_GET, $organisms);
+
+$search_input = sanitize_search_input($search_keywords, $quoted_search);
+
+// Same gate, same message, as the per-organism endpoint -- a hand-made request skips the
+// browser's check, and here one unselective term would be ranked across the whole site.
+if (!moop_search_input_is_usable($search_input, $quoted_search)) {
+    echo json_encode([
+        'error'   => 'Enter at least 2 characters in one word. Single letters match too '
+                   . 'much to be useful; short words are fine alongside longer ones, '
+                   . 'e.g. "histone deacetylase 1".',
+        'results' => [],
+    ]);
+    exit;
+}
+
+$found = moop_union_search($search_input, $quoted_search, $organisms);
+
+// Same row shape as tools/annotation_search_ajax.php, so the results table renders either
+// response without knowing which one it got.
+$out = [];
+foreach ($found['results'] as $organism => $res) {
+    $rows = [];
+    foreach ($res['results'] as $row) {
+        $species = $row['species'];
+        if (!empty($row['subtype']) && $row['subtype'] != 'NULL') {
+            $species .= ' ' . $row['subtype'];
+        }
+        $rows[] = [
+            'organism'               => $organism,
+            'genus'                  => $row['genus'],
+            'species'                => $species,
+            'common_name'            => $row['common_name'],
+            'feature_type'           => $row['feature_type'],
+            'feature_uniquename'     => $row['feature_uniquename'],
+            'feature_name'           => $row['feature_name'] ?? '',
+            'feature_description'    => htmlspecialchars(decodeAnnotationText($row['feature_description'] ?? ''), ENT_QUOTES, 'UTF-8'),
+            'score'                  => $row['score'] ?? '',
+            'annotation_source_name' => $row['annotation_source_name'] ?? '',
+            'annotation_accession'   => $row['annotation_accession'] ?? '',
+            'annotation_description' => htmlspecialchars(decodeAnnotationText($row['annotation_description'] ?? ''), ENT_QUOTES, 'UTF-8'),
+            'genome_accession'       => $row['genome_accession'] ?? '',
+            'genome_name'            => $row['genome_name'] ?? '',
+            'gene_set'               => $row['gene_set_name'] ?? '',
+            'uniquename_search'      => false,
+        ];
+    }
+    $out[$organism] = [
+        'results' => $rows,
+        'count'   => count($rows),
+        'capped'  => $res['capped'],
+        'warning' => $res['warning'],
+    ];
+}
+
+echo json_encode([
+    'results'       => (object)$out,
+    'stale'         => $found['stale'],
+    'results_limit' => moop_search_results_limit(),
+]);
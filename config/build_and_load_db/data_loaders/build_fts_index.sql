@@ -34,10 +34,13 @@
 -- lib/database_queries.php). bm25() ranking still works: it reads the index and
 -- _docsize, not _content. There is no snippet()/highlight() call anywhere.
 --
--- Constraint to respect: a contentless FTS5 table supports INSERT only -- no
--- UPDATE or DELETE (contentless_delete arrived in SQLite 3.43; this host is on
--- 3.34.1). That is exactly the drop-and-rebuild pattern below, so it costs
--- nothing. If you ever need incremental FTS updates, this must be revisited.
+-- Constraint to respect: a contentless FTS5 table has no UPDATE or DELETE by rowid
+-- (contentless_delete arrived in SQLite 3.43; this host is on 3.34.1). What it does
+-- have is the 'delete' COMMAND, which removes a row given its rowid AND the exact
+-- values it was indexed with. fts_gene_set_remove.sql / fts_gene_set_add.sql use it
+-- to maintain ONE gene set's rows without this rebuild -- see scripts/fts_gene_set.sh.
+-- Their expressions MUST mirror the two INSERTs below, and fts_source_type (below)
+-- records the one input those expressions take from a table a load can change.
 --
 -- RECLAIMING SPACE ON EXISTING DATABASES: re-running this script drops the old
 -- FTS tables and rebuilds them contentless, but SQLite keeps the freed pages in
@@ -52,6 +55,7 @@ BEGIN IMMEDIATE;
 
 DROP TABLE IF EXISTS feature_annotation_search;
 DROP TABLE IF EXISTS feature_search;
+DROP TABLE IF EXISTS fts_source_type;
 
 -- 1) Annotation search: one FTS row per (feature, annotation) pair.
 --    rowid = feature_annotation.feature_annotation_id, so MOOP joins straight back
@@ -66,29 +70,65 @@ DROP TABLE IF EXISTS feature_search;
 --    RBBH = exactly that), silently filling the Homologs quota with RBBH rows.
 --    Stripping the separators instead yields one token per type with no shared stem.
 --    lib/database_queries.php::moop_fts_type_code() MUST mirror this expression.
+--
+--    search_prior is a QUERY-INDEPENDENT rank for the row, fixed at build time, so the
+--    pool can take the most useful rows of each type first without bm25(). Same trick
+--    as the type code: one token per value ('aprior0z'..'aprior5z'), so "prior 0 rows
+--    of this type that match" is an AND inside the index -- a doclist read, never the
+--    scattered per-document _docsize read that made bm25 60% of cold search I/O.
+--        0-2  the feature has a name     (the has-a-name tie-break in the ORDER BY)
+--        3-5  it does not
+--        +0   annotation description 8-120 characters
+--        +1   longer than 120            (long, but it says something)
+--        +2   shorter than 8, or empty   ("-", a bare accession: nothing to read)
+--    Curated TYPE rank is deliberately not stored here: it is applied at query time
+--    from annotation_config.json (the quota pool's type order), so re-curating never
+--    needs a rebuild. lib/database_queries.php::moop_fts_prior_code() mirrors the token.
 CREATE VIRTUAL TABLE feature_annotation_search USING fts5(
     feature_name,
     feature_description,
     annotation_description,
     annotation_accession,
     annotation_type_code,
+    search_prior,
     content = '',
     tokenize = 'porter unicode61'
 );
 INSERT INTO feature_annotation_search(
     rowid, feature_name, feature_description, annotation_description, annotation_accession,
-    annotation_type_code)
+    annotation_type_code, search_prior)
 SELECT fa.feature_annotation_id,
        f.feature_name,
        f.feature_description,
        a.annotation_description,
        a.annotation_accession,
-       'atype' || lower(replace(replace(replace(ans.annotation_type, ' ', ''), '-', ''), '_', '')) || 'z'
+       'atype' || lower(replace(replace(replace(ans.annotation_type, ' ', ''), '-', ''), '_', '')) || 'z',
+       'aprior'
+         || ((CASE WHEN COALESCE(f.feature_name, '') <> '' THEN 0 ELSE 3 END)
+           + (CASE WHEN length(COALESCE(a.annotation_description, '')) < 8   THEN 2
+                   WHEN length(a.annotation_description)               > 120 THEN 1
+                   ELSE 0 END))
+         || 'z'
 FROM feature_annotation fa
 JOIN feature           f   ON f.feature_id            = fa.feature_id
 JOIN annotation        a   ON a.annotation_id         = fa.annotation_id
 JOIN annotation_source ans ON ans.annotation_source_id = a.annotation_source_id;
 
+-- The type code each annotation source was indexed under. annotation_source is shared
+-- by every gene set, and load_annotations_sqlite.pl UPDATEs its annotation_type when a
+-- file's header says something new -- after which every indexed row of that source,
+-- in every gene set, carries a code the table no longer produces. A 'delete' needs the
+-- indexed value, so fts_gene_set_remove.sql reads it from here; scripts/fts_gene_set.sh
+-- treats any source whose current code differs as "index stale, rebuild in full".
+CREATE TABLE fts_source_type (
+    annotation_source_id INTEGER PRIMARY KEY,
+    annotation_type_code TEXT NOT NULL
+);
+INSERT INTO fts_source_type(annotation_source_id, annotation_type_code)
+SELECT annotation_source_id,
+       'atype' || lower(replace(replace(replace(annotation_type, ' ', ''), '-', ''), '_', '')) || 'z'
+FROM annotation_source;
+
 -- 2) Gene-only search: one FTS row per feature (rowid = feature.feature_id).
 --    Every feature is indexed, INCLUDING features with no annotations (which #1 cannot cover).
 CREATE VIRTUAL TABLE feature_search USING fts5(
@@ -0,0 +1,78 @@
+-- ============================================================================
+-- MOOP cross-organism union index  (SQLite FTS5)  -- SCHEMA
+-- ============================================================================
+-- One FTS5 index over the DISTINCT annotation text of every organism, so a
+-- cross-organism search ranks once instead of once per organism.
+--
+-- Why: each organism.sqlite runs its own bm25() pass over its own _docsize table,
+-- and bm25 is where a cold search's I/O goes (notes/SEARCH_COST_MODEL_2026-07-31.md,
+-- section 1). A 49-organism "helicase" read 2,517 MB in 156.9 s. The text itself is
+-- overwhelmingly shared -- measured over 79 organisms:
+--
+--     total annotation rows across sample     25,699,753
+--     sum of per-database distinct            24,805,355
+--     ACTUAL distinct across all of them       1,388,837   -> 17.86x
+--
+-- so the entire annotation vocabulary of the site fits in ~139 MB, small enough to
+-- live on the fast volume and stay resident.
+--
+-- Do not run this directly; scripts/build_union_index.php applies it, then runs
+-- refresh_union_organism.sql once per organism. Idempotent (IF NOT EXISTS), so the
+-- builder applies it on every run.
+--
+-- THE TABLES
+--
+--   union_doc       one row per distinct (accession, description, type code). The
+--                   description is stored '' rather than NULL: UNIQUE treats NULLs as
+--                   distinct, so a NULL description would never deduplicate.
+--   union_search    FTS5 over union_doc. EXTERNAL content, not contentless like the
+--                   per-organism index: the refresh has to delete documents an
+--                   organism no longer references, and contentless tables cannot
+--                   delete on this host's SQLite (3.34.1; contentless_delete is 3.43).
+--                   The text is kept once, in union_doc, so nothing is duplicated.
+--   union_posting   (doc, organism, feature_annotation_id): the way back into each
+--                   organism.sqlite. feature_annotation_id is the same rowid the
+--                   per-organism feature_annotation_search uses, so the survivors join
+--                   exactly as the per-organism pool does. WITHOUT ROWID with doc_id
+--                   leading: the query walks it BY DOCUMENT, one seek per ranked doc.
+--                   Deliberately no (org_id) index -- the refresh deletes by organism
+--                   with one sequential pass, which is cheaper than carrying a second
+--                   copy of the largest table for an operation that runs per reload.
+--   union_organism  which organisms are in the index, and the fingerprint of the
+--                   organism.sqlite each was built from. An organism whose database has
+--                   changed since is STALE: search skips its postings and falls back to
+--                   the per-organism path for it (lib/union_index.php).
+--
+-- annotation_type_code mirrors build_fts_index.sql and moop_fts_type_code() exactly.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS union_organism (
+    org_id       INTEGER PRIMARY KEY,
+    organism     TEXT NOT NULL UNIQUE,
+    fingerprint  TEXT NOT NULL,
+    refreshed_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS union_doc (
+    doc_id                 INTEGER PRIMARY KEY,
+    annotation_description TEXT NOT NULL,
+    annotation_accession   TEXT NOT NULL,
+    annotation_type_code   TEXT NOT NULL,
+    UNIQUE (annotation_accession, annotation_description, annotation_type_code)
+);
+
+CREATE TABLE IF NOT EXISTS union_posting (
+    doc_id                INTEGER NOT NULL,
+    org_id                INTEGER NOT NULL,
+    feature_annotation_id INTEGER NOT NULL,
+    PRIMARY KEY (doc_id, org_id, feature_annotation_id)
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS union_search USING fts5(
+    annotation_description,
+    annotation_accession,
+    annotation_type_code,
+    content = 'union_doc',
+    content_rowid = 'doc_id',
+    tokenize = 'porter unicode61'
+);
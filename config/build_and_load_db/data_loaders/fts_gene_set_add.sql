@@ -0,0 +1,56 @@
+-- ============================================================================
+-- MOOP FTS index -- add ONE gene set's rows
+-- ============================================================================
+-- The incremental counterpart of the INSERTs in build_fts_index.sql. Run by
+-- scripts/fts_gene_set.sh, inside ITS transaction, with:
+--
+--     temp.fts_target(gene_set_id)    the gene set(s) whose rows are added
+--
+-- AFTER both loaders have finished with the gene set, whose rows must not be in the
+-- index at that point -- fts_gene_set_remove.sql took them out before the load, or the
+-- gene set is new. The driver checks that; inserting a rowid the index already holds
+-- would count its tokens twice.
+--
+-- Every expression MUST mirror build_fts_index.sql. scripts/fts_gene_set.sh verify
+-- holds the result against a full rebuild, which is what catches a drift between them.
+-- ============================================================================
+
+INSERT INTO feature_annotation_search(
+    rowid, feature_name, feature_description, annotation_description, annotation_accession,
+    annotation_type_code, search_prior)
+SELECT fa.feature_annotation_id,
+       f.feature_name,
+       f.feature_description,
+       a.annotation_description,
+       a.annotation_accession,
+       'atype' || lower(replace(replace(replace(ans.annotation_type, ' ', ''), '-', ''), '_', '')) || 'z',
+       'aprior'
+         || ((CASE WHEN COALESCE(f.feature_name, '') <> '' THEN 0 ELSE 3 END)
+           + (CASE WHEN length(COALESCE(a.annotation_description, '')) < 8   THEN 2
+                   WHEN length(a.annotation_description)               > 120 THEN 1
+                   ELSE 0 END))
+         || 'z'
+FROM feature            f
+JOIN feature_annotation fa  ON fa.feature_id            = f.feature_id
+JOIN annotation         a   ON a.annotation_id          = fa.annotation_id
+JOIN annotation_source  ans ON ans.annotation_source_id = a.annotation_source_id
+WHERE f.gene_set_id IN (SELECT gene_set_id FROM temp.fts_target);
+
+INSERT INTO feature_search(rowid, feature_name, feature_description)
+SELECT f.feature_id,
+       f.feature_name,
+       f.feature_description
+FROM feature f
+WHERE f.gene_set_id IN (SELECT gene_set_id FROM temp.fts_target);
+
+-- Sources the load created. OR IGNORE, never REPLACE: a source that already has a row
+-- keeps the code its OTHER gene sets' rows were indexed under, so a type the load
+-- changed shows up as a mismatch and the driver rebuilds rather than trusting it.
+-- Rows for sources that no longer exist go first (delete_gene_set.sh drops them with
+-- the source; this catches a database that was edited by hand).
+DELETE FROM fts_source_type
+WHERE annotation_source_id NOT IN (SELECT annotation_source_id FROM annotation_source);
+INSERT OR IGNORE INTO fts_source_type(annotation_source_id, annotation_type_code)
+SELECT annotation_source_id,
+       'atype' || lower(replace(replace(replace(annotation_type, ' ', ''), '-', ''), '_', '')) || 'z'
+FROM annotation_source;
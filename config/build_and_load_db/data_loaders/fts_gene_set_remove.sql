@@ -0,0 +1,52 @@
+-- ============================================================================
+-- MOOP FTS index -- remove ONE gene set's rows
+-- ============================================================================
+-- The incremental counterpart of the DROP in build_fts_index.sql. Run by
+-- scripts/fts_gene_set.sh, inside ITS transaction, with:
+--
+--     temp.fts_target(gene_set_id)    the gene set(s) whose rows are removed
+--
+-- BEFORE the base rows change: before load_genes_sqlite.pl upserts the gene set, and
+-- before delete_gene_set.sh deletes it. Both tables are contentless, so FTS5 cannot
+-- find a row's tokens from its rowid -- the 'delete' command is handed the values the
+-- row was indexed with and subtracts exactly those. Hence "before": once a loader has
+-- updated a feature_name, the value that was indexed is gone from the database.
+--
+-- Values that do not match what was indexed do not fail. They corrupt the index
+-- silently, which is why the driver only runs this on an index it has checked is in
+-- step with the tables (same row counts, no source type changed since the build).
+--
+-- Every expression MUST mirror build_fts_index.sql, with one deliberate exception:
+-- the type code is read from fts_source_type -- the code the row WAS indexed under --
+-- not recomputed from annotation_source, which a load may have changed since.
+-- ============================================================================
+
+INSERT INTO feature_annotation_search(
+    feature_annotation_search, rowid, feature_name, feature_description,
+    annotation_description, annotation_accession, annotation_type_code, search_prior)
+SELECT 'delete',
+       fa.feature_annotation_id,
+       f.feature_name,
+       f.feature_description,
+       a.annotation_description,
+       a.annotation_accession,
+       t.annotation_type_code,
+       'aprior'
+         || ((CASE WHEN COALESCE(f.feature_name, '') <> '' THEN 0 ELSE 3 END)
+           + (CASE WHEN length(COALESCE(a.annotation_description, '')) < 8   THEN 2
+                   WHEN length(a.annotation_description)               > 120 THEN 1
+                   ELSE 0 END))
+         || 'z'
+FROM feature            f
+JOIN feature_annotation fa ON fa.feature_id           = f.feature_id
+JOIN annotation         a  ON a.annotation_id         = fa.annotation_id
+JOIN fts_source_type    t  ON t.annotation_source_id  = a.annotation_source_id
+WHERE f.gene_set_id IN (SELECT gene_set_id FROM temp.fts_target);
+
+INSERT INTO feature_search(feature_search, rowid, feature_name, feature_description)
+SELECT 'delete',
+       f.feature_id,
+       f.feature_name,
+       f.feature_description
+FROM feature f
+WHERE f.gene_set_id IN (SELECT gene_set_id FROM temp.fts_target);
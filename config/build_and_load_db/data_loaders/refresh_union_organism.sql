@@ -0,0 +1,97 @@
+-- ============================================================================
+-- MOOP union index -- (re)load ONE organism
+-- ============================================================================
+-- Replaces one organism's contribution to union.sqlite. Run by
+-- scripts/build_union_index.php with:
+--
+--     main          = union.sqlite (schema from build_union_index.sql)
+--     org           = that organism's organism.sqlite, ATTACHed read-only
+--     temp.union_target(organism, fingerprint)   one row, set by the builder
+--
+-- The cost is proportional to THIS organism, not the whole index: only the
+-- documents it used to reference are checked for orphaning, and only documents
+-- nobody else holds are inserted. Reloading one organism after a gene-set reload
+-- leaves the other 84 untouched.
+--
+-- ATOMIC: one transaction. A killed refresh rolls back to the previous postings,
+-- which still carry the previous fingerprint, so search keeps treating that
+-- organism as stale (per-organism fallback) rather than serving a half-load.
+-- ============================================================================
+
+BEGIN IMMEDIATE;
+
+INSERT INTO union_organism(organism, fingerprint, refreshed_at)
+SELECT organism, fingerprint, datetime('now') FROM temp.union_target WHERE true
+ON CONFLICT(organism) DO UPDATE SET fingerprint  = excluded.fingerprint,
+                                    refreshed_at = excluded.refreshed_at;
+
+DROP TABLE IF EXISTS temp.union_cur;
+CREATE TEMP TABLE union_cur AS
+SELECT org_id FROM union_organism
+WHERE organism = (SELECT organism FROM temp.union_target);
+
+-- Documents this organism referenced before the reload: the only ones that can become
+-- orphans below.
+DROP TABLE IF EXISTS temp.union_old_docs;
+CREATE TEMP TABLE union_old_docs AS
+SELECT DISTINCT doc_id FROM union_posting
+WHERE org_id = (SELECT org_id FROM temp.union_cur);
+
+DELETE FROM union_posting WHERE org_id = (SELECT org_id FROM temp.union_cur);
+
+-- The organism's annotation rows, in the shape union_doc stores them. Type code MUST
+-- mirror build_fts_index.sql and moop_fts_type_code().
+DROP TABLE IF EXISTS temp.union_src;
+CREATE TEMP TABLE union_src AS
+SELECT fa.feature_annotation_id,
+       COALESCE(a.annotation_description, '') AS annotation_description,
+       a.annotation_accession,
+       'atype' || lower(replace(replace(replace(ans.annotation_type, ' ', ''), '-', ''), '_', '')) || 'z'
+           AS annotation_type_code
+FROM org.feature_annotation fa
+JOIN org.annotation         a   ON a.annotation_id          = fa.annotation_id
+JOIN org.annotation_source  ans ON ans.annotation_source_id = a.annotation_source_id;
+
+-- New documents. doc_id is INTEGER PRIMARY KEY, so every row inserted here gets an id
+-- above the current maximum -- which is how the FTS insert below finds exactly them.
+DROP TABLE IF EXISTS temp.union_high_water;
+CREATE TEMP TABLE union_high_water AS SELECT COALESCE(MAX(doc_id), 0) AS m FROM union_doc;
+
+INSERT OR IGNORE INTO union_doc(annotation_description, annotation_accession, annotation_type_code)
+SELECT DISTINCT annotation_description, annotation_accession, annotation_type_code
+FROM temp.union_src;
+
+INSERT INTO union_search(rowid, annotation_description, annotation_accession, annotation_type_code)
+SELECT doc_id, annotation_description, annotation_accession, annotation_type_code
+FROM union_doc
+WHERE doc_id > (SELECT m FROM temp.union_high_water);
+
+INSERT INTO union_posting(doc_id, org_id, feature_annotation_id)
+SELECT d.doc_id, (SELECT org_id FROM temp.union_cur), s.feature_annotation_id
+FROM temp.union_src s
+JOIN union_doc d ON d.annotation_accession   = s.annotation_accession
+                AND d.annotation_description = s.annotation_description
+                AND d.annotation_type_code   = s.annotation_type_code;
+
+-- Orphans: documents this organism used to hold and no organism holds now. External
+-- content FTS needs the ORIGINAL values to delete, so they are removed from the index
+-- before their union_doc row goes.
+DROP TABLE IF EXISTS temp.union_orphans;
+CREATE TEMP TABLE union_orphans AS
+SELECT o.doc_id FROM temp.union_old_docs o
+WHERE NOT EXISTS (SELECT 1 FROM union_posting p WHERE p.doc_id = o.doc_id);
+
+INSERT INTO union_search(union_search, rowid, annotation_description, annotation_accession, annotation_type_code)
+SELECT 'delete', d.doc_id, d.annotation_description, d.annotation_accession, d.annotation_type_code
+FROM union_doc d
+JOIN temp.union_orphans o ON o.doc_id = d.doc_id;
+
+DELETE FROM union_doc WHERE doc_id IN (SELECT doc_id FROM temp.union_orphans);
+
+COMMIT;
+
+DROP TABLE IF EXISTS temp.union_src;
+DROP TABLE IF EXISTS temp.union_old_docs;
+DROP TABLE IF EXISTS temp.union_orphans;
+DROP TABLE IF EXISTS temp.union_high_water;
+DROP TABLE IF EXISTS temp.union_cur;
@@ -27,6 +27,13 @@
 # annotation_source are NOT owned by a gene set -- they are shared -- so deleting
 # features leaves annotation rows that nothing points at. That is precisely the
 # ORPHAN_ANNOT condition check_status.sh reports.
+#
+# The gene set's FTS rows go FIRST, through fts_gene_set.sh remove. The index is
+# contentless: a row can only be taken out with the values it was indexed with, and
+# after the DELETE below those values no longer exist anywhere. Done here, the
+# whole-database step needs no full rebuild for a gene set that was only removed.
+# It is its own transaction; if the delete then fails, the index no longer matches the
+# tables, fts_gene_set.sh check says so, and the sbatch rebuilds in full.
 
 set -uo pipefail
 
@@ -49,6 +56,18 @@ fi
 
 before=$(sqlite3 "$DB" "SELECT COUNT(*) FROM feature;" 2>/dev/null)
 
+# Declines (and says why) on an index it cannot maintain; the full rebuild covers that.
+bash "$(dirname "${BASH_SOURCE[0]}")/fts_gene_set.sh" remove "$DB" "$GENE_SET" || exit 1
+
+# fts_source_type (build_fts_index.sql) follows annotation_source through the sweep.
+fts_sweep=""
+has_fts_types=$(sqlite3 "$DB" \
+  "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'fts_source_type';" 2>/dev/null)
+if [ "${has_fts_types:-0}" -eq 1 ]; then
+  fts_sweep="DELETE FROM fts_source_type
+ WHERE annotation_source_id NOT IN (SELECT annotation_source_id FROM annotation_source);"
+fi
+
 sqlite3 "$DB" <<SQL || { echo "ERROR: failed to delete gene set '$GENE_SET' from $DB" >&2; exit 1; }
 PRAGMA foreign_keys = ON;
 BEGIN;
@@ -68,6 +87,7 @@ DELETE FROM annotation
  WHERE annotation_id NOT IN (SELECT annotation_id FROM feature_annotation);
 DELETE FROM annotation_source
  WHERE annotation_source_id NOT IN (SELECT annotation_source_id FROM annotation);
+$fts_sweep
 
 COMMIT;
 SQL
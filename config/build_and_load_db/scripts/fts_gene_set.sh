@@ -0,0 +1,237 @@
+#!/usr/bin/bash
+# fts_gene_set.sh — maintain ONE gene set's rows in an organism's FTS index, instead of
+# rebuilding the whole index with build_fts_index.sql.
+#
+# Usage: fts_gene_set.sh remove <organism.sqlite> <gene_set_name>
+#        fts_gene_set.sh add    <organism.sqlite> <gene_set_name>
+#        fts_gene_set.sh check  <organism.sqlite>
+#        fts_gene_set.sh verify <organism.sqlite>
+#
+#   remove   take the gene set's rows out of both FTS tables. BEFORE its base rows
+#            change: setup_new_moopdb_and_load_data.sh runs it ahead of the loaders,
+#            delete_gene_set.sh ahead of the delete.
+#   add      put them back from the tables as they now are. AFTER both loaders.
+#   check    exit 0 if the index is in step with the tables, i.e. the whole-database
+#            step of moop_process_genome_data_v2.sbatch may skip the full rebuild;
+#            otherwise print why and exit 1.
+#   verify   rebuild a COPY in full and compare the two indexes term by term
+#            (fts5vocab: documents and occurrences per term and column) and document by
+#            document (_docsize). Exit 0 only if they are identical. Needs free space
+#            for one copy of the database in $SQLITE_TMPDIR (default: beside it).
+#
+# Why: build_fts_index.sql drops and re-inserts every row of the organism. A narrowed
+# reload of one gene set -- or delete_gene_set.sh -- therefore re-indexed all of them,
+# holding the write lock for the whole rebuild, and the VACUUM after it rewrote every
+# page, so nothing the site had cached for that database survived. Here the write lock
+# covers only the gene set's rows and no other page of the file moves.
+#
+# The tables are contentless, so a row comes out only by the 'delete' command given
+# the values it was INDEXED with (see fts_gene_set_remove.sql). Wrong values do not
+# fail; they quietly corrupt the token counts. So remove and add act only on an index
+# shown to be in step with the tables:
+#
+#   * both FTS tables and fts_source_type exist -- a database built before
+#     fts_source_type existed has no record of the indexed type codes
+#   * one _docsize row per feature_annotation and per feature, and the gene set's own
+#     rows all present (remove) or all absent (add)
+#   * no annotation source's type code differs from the one it was indexed under
+#
+# Anything else -- a load that died between remove and add, a source whose type a load
+# changed, an index from an older build -- is not an error. remove and add print why
+# and do nothing, check fails, and the sbatch falls back to the full rebuild, which
+# puts everything right. MOOP_FTS_REBUILD=1 forces that rebuild regardless (needed
+# when build_fts_index.sql itself changes, which no count can see).
+
+set -uo pipefail
+
+HERE=$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)
+SQL_DIR=""
+for candidate in "$HERE/../data_loaders" "$HERE/data_loaders" "$HERE"; do
+  if [ -f "$candidate/fts_gene_set_remove.sql" ]; then
+    SQL_DIR=$(cd "$candidate" && pwd)
+    break
+  fi
+done
+if [ -z "$SQL_DIR" ]; then
+  echo "ERROR: cannot find fts_gene_set_remove.sql near $HERE" >&2
+  exit 1
+fi
+
+usage() {
+  echo "Usage: $0 remove|add <organism.sqlite> <gene_set_name>" >&2
+  echo "       $0 check|verify <organism.sqlite>" >&2
+  exit 1
+}
+
+ACTION=${1:-}
+DB=${2:-}
+GENE_SET=${3:-}
+[ -n "$ACTION" ] && [ -n "$DB" ] || usage
+case "$ACTION" in
+  remove|add) [ -n "$GENE_SET" ] || usage ;;
+  check|verify) ;;
+  *) usage ;;
+esac
+GS_SQL=${GENE_SET//\'/\'\'}
+
+# Type code of an annotation_source row. MUST mirror build_fts_index.sql.
+TYPE_CODE="'atype' || lower(replace(replace(replace(ans.annotation_type, ' ', ''), '-', ''), '_', '')) || 'z'"
+
+## fts_state MODE -- sets REASON to "ok" or to why the index cannot be maintained here.
+##   MODE indexed: the gene set's rows must all be in the index (remove, check)
+##   MODE absent : they must all be out of it, and nothing else (add)
+## Also sets GS_FA / GS_F, the gene set's row counts, for the messages.
+fts_state() {
+  local mode=$1 n
+  GS_FA=0; GS_F=0
+  n=$(sqlite3 -readonly "$DB" \
+        "SELECT count(*) FROM sqlite_master WHERE type = 'table'
+            AND name IN ('feature_annotation_search', 'feature_search');" 2>/dev/null) \
+    || { REASON="cannot read $DB"; return; }
+  [ "$n" = "2" ] || { REASON="no FTS index yet"; return; }
+  n=$(sqlite3 -readonly "$DB" \
+        "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'fts_source_type';")
+  [ "$n" = "1" ] || { REASON="index predates incremental maintenance (no fts_source_type)"; return; }
+
+  local fa fa_idx gs_fa_idx f f_idx gs_f_idx drift
+  read -r fa fa_idx GS_FA gs_fa_idx f f_idx GS_F gs_f_idx drift < <(
+    sqlite3 -readonly -separator ' ' "$DB" <<SQL
+WITH target AS (SELECT gene_set_id FROM gene_set WHERE gene_set_name = '$GS_SQL'),
+     gs_fa  AS (SELECT fa.feature_annotation_id AS id
+                FROM feature_annotation fa JOIN feature f ON f.feature_id = fa.feature_id
+                WHERE f.gene_set_id IN target),
+     gs_f   AS (SELECT feature_id AS id FROM feature WHERE gene_set_id IN target)
+SELECT (SELECT count(*) FROM feature_annotation),
+       (SELECT count(*) FROM feature_annotation_search_docsize),
+       (SELECT count(*) FROM gs_fa),
+       (SELECT count(*) FROM feature_annotation_search_docsize WHERE id IN gs_fa),
+       (SELECT count(*) FROM feature),
+       (SELECT count(*) FROM feature_search_docsize),
+       (SELECT count(*) FROM gs_f),
+       (SELECT count(*) FROM feature_search_docsize WHERE id IN gs_f),
+       (SELECT count(*) FROM annotation_source ans
+          LEFT JOIN fts_source_type t ON t.annotation_source_id = ans.annotation_source_id
+         WHERE t.annotation_type_code IS NOT $TYPE_CODE
+           AND ('$mode' = 'indexed' OR t.annotation_source_id IS NOT NULL));
+SQL
+  )
+  [ -n "${drift:-}" ] || { REASON="cannot read $DB"; return; }
+
+  if [ "$drift" -ne 0 ]; then
+    REASON="$drift annotation source(s) changed type since the index was built"
+  elif [ "$mode" = "indexed" ] && { [ "$fa_idx" -ne "$fa" ] || [ "$f_idx" -ne "$f" ] ||
+       [ "$gs_fa_idx" -ne "$GS_FA" ] || [ "$gs_f_idx" -ne "$GS_F" ]; }; then
+    REASON="index out of step: $fa_idx of $fa annotation rows, $f_idx of $f features indexed"
+  elif [ "$mode" = "absent" ] && { [ "$fa_idx" -ne $((fa - GS_FA)) ] || [ "$f_idx" -ne $((f - GS_F)) ] ||
+       [ "$gs_fa_idx" -ne 0 ] || [ "$gs_f_idx" -ne 0 ]; }; then
+    REASON="index out of step: $fa_idx of $((fa - GS_FA)) annotation rows, $f_idx of $((f - GS_F)) features indexed outside '$GENE_SET'"
+  else
+    REASON=ok
+  fi
+}
+
+## Run one of the gene-set SQL files in a single short transaction.
+run_gene_set_sql() {
+  sqlite3 -bail "$DB" <<SQL
+BEGIN IMMEDIATE;
+CREATE TEMP TABLE fts_target AS
+  SELECT gene_set_id FROM gene_set WHERE gene_set_name = '$GS_SQL';
+.read '$SQL_DIR/$1'
+COMMIT;
+SQL
+}
+
+if [ ! -s "$DB" ]; then
+  [ "$ACTION" = "check" ] && { echo "  FTS: $DB does not exist"; exit 1; }
+  [ "$ACTION" = "verify" ] && { echo "ERROR: $DB does not exist" >&2; exit 1; }
+  exit 0      # remove/add before the database exists: the full build will index it
+fi
+
+case "$ACTION" in
+  check)
+    fts_state indexed
+    if [ "$REASON" = "ok" ]; then
+      echo "  FTS: index is in step with the tables"
+      exit 0
+    fi
+    echo "  FTS: $REASON"
+    exit 1
+    ;;
+
+  remove|add)
+    if [ "$ACTION" = "remove" ]; then fts_state indexed; else fts_state absent; fi
+    if [ "$REASON" != "ok" ]; then
+      echo "  FTS: not maintaining '$GENE_SET' incrementally -- $REASON."
+      echo "       The whole-database step will rebuild the index in full."
+      exit 0
+    fi
+    if [ $((GS_FA + GS_F)) -eq 0 ]; then
+      echo "  FTS: '$GENE_SET' has no rows to $ACTION"
+      exit 0
+    fi
+    start=$SECONDS
+    run_gene_set_sql "fts_gene_set_$ACTION.sql" \
+      || { echo "ERROR: FTS $ACTION failed for gene set '$GENE_SET' in $DB" >&2; exit 1; }
+    [ "$ACTION" = "remove" ] && verb=removed || verb=added
+    echo "  FTS: $verb '$GENE_SET': $GS_FA annotation rows, $GS_F features ($((SECONDS - start)) s)"
+    # The database changed, so everything search derived from it is now stale: the docsize
+    # and term-stats sidecars and the skip index (build_search_sidecars.php), the search
+    # tier, and the organism's union.sqlite entry. Search stays correct without them, on
+    # its slow paths, until they are rewritten -- as after rebuild_fts.py.
+    ORG=$(basename "$(dirname "$DB")")
+    echo "  now: php scripts/build_search_sidecars.php --organism=$ORG"
+    echo "       php scripts/build_search_tier.php       (if search_tier_path is set)"
+    echo "       php scripts/build_union_index.php --organism=$ORG"
+    ;;
+
+  verify)
+    fts_state indexed
+    [ "$REASON" = "ok" ] || echo "  FTS: note -- $REASON"
+    tmpdir=${SQLITE_TMPDIR:-$(dirname "$DB")}
+    fresh=$(mktemp -p "$tmpdir" .fts_verify.XXXXXX) || exit 1
+    trap 'rm -f "$fresh" "$fresh-journal"' EXIT
+    sqlite3 -readonly "$DB" ".backup '$fresh'" \
+      || { echo "ERROR: cannot copy $DB to $fresh" >&2; exit 1; }
+    SQLITE_TMPDIR=$tmpdir sqlite3 -bail "$fresh" < "$SQL_DIR/build_fts_index.sql" \
+      || { echo "ERROR: full rebuild of the copy failed" >&2; exit 1; }
+
+    # fts5vocab 'col' is one row per (term, column) with the number of documents and
+    # of occurrences -- the whole inverted index, reduced to counts. _docsize is every
+    # document's token count per column, which catches a row indexed under the wrong id.
+    diffs=$(sqlite3 -readonly -bail -separator ' ' "$DB" <<SQL
+ATTACH '$fresh' AS fresh;
+CREATE VIRTUAL TABLE temp.inc_fa USING fts5vocab(main,  feature_annotation_search, col);
+CREATE VIRTUAL TABLE temp.new_fa USING fts5vocab(fresh, feature_annotation_search, col);
+CREATE VIRTUAL TABLE temp.inc_f  USING fts5vocab(main,  feature_search, col);
+CREATE VIRTUAL TABLE temp.new_f  USING fts5vocab(fresh, feature_search, col);
+SELECT 'feature_annotation_search',
+       (SELECT count(*) FROM temp.new_fa),
+       (SELECT count(*) FROM (SELECT * FROM temp.inc_fa EXCEPT SELECT * FROM temp.new_fa))
+     + (SELECT count(*) FROM (SELECT * FROM temp.new_fa EXCEPT SELECT * FROM temp.inc_fa)),
+       (SELECT count(*) FROM (SELECT id, sz FROM main.feature_annotation_search_docsize
+                              EXCEPT SELECT id, sz FROM fresh.feature_annotation_search_docsize))
+     + (SELECT count(*) FROM (SELECT id, sz FROM fresh.feature_annotation_search_docsize
+                              EXCEPT SELECT id, sz FROM main.feature_annotation_search_docsize));
+SELECT 'feature_search',
+       (SELECT count(*) FROM temp.new_f),
+       (SELECT count(*) FROM (SELECT * FROM temp.inc_f EXCEPT SELECT * FROM temp.new_f))
+     + (SELECT count(*) FROM (SELECT * FROM temp.new_f EXCEPT SELECT * FROM temp.inc_f)),
+       (SELECT count(*) FROM (SELECT id, sz FROM main.feature_search_docsize
+                              EXCEPT SELECT id, sz FROM fresh.feature_search_docsize))
+     + (SELECT count(*) FROM (SELECT id, sz FROM fresh.feature_search_docsize
+                              EXCEPT SELECT id, sz FROM main.feature_search_docsize));
+SQL
+    ) || { echo "ERROR: cannot compare $DB with its rebuilt copy" >&2; exit 1; }
+
+    bad=0
+    while read -r table terms vocab docs; do
+      if [ "$vocab" -eq 0 ] && [ "$docs" -eq 0 ]; then
+        echo "  FTS verify: $table identical to a full rebuild ($terms term/column counts)"
+      else
+        echo "  FTS verify: $table DIFFERS from a full rebuild: $vocab term/column counts, $docs document sizes"
+        bad=1
+      fi
+    done <<< "$diffs"
+    exit $bad
+    ;;
+esac
@@ -92,6 +92,17 @@ if [ ! -e "$DB" ]; then
   sqlite3 "$DB" < "$SCRIPT_DIR/create_schema_sqlite.sql"
 fi
 
+## Keep the FTS index current for THIS gene set instead of rebuilding all of it.
+##
+## Both loaders upsert, so once they have run, the values this gene set's rows were
+## indexed with are gone -- and a contentless index can only drop a row given exactly
+## those. So the rows come out here, before the first loader, and go back in after the
+## last one (end of this script). fts_gene_set.sh does nothing on a database without an
+## index yet, and declines, saying why, on one it cannot trust; either way the
+## whole-database step in moop_process_genome_data_v2.sbatch then rebuilds in full.
+FTS_GENE_SET="$HERE/fts_gene_set.sh"
+bash "$FTS_GENE_SET" remove "$DB" "$GENE_SET_NAME"
+
 echo "Loading gene set '$GENE_SET_NAME' for: $ORG"
 perl "$SCRIPT_DIR/load_genes_sqlite.pl" "$DB" "$FEATURES" "$GENE_SET_NAME"
 
@@ -158,8 +169,12 @@ load_files "protnlm.moop.tsv" "Protnlm"
 load_files "EggNOG2GO.eggnog.reduced.moop.tsv" "Eggnog2GO"
 load_files "*OMA2GO.moop.tsv" "OMA2GO"
 
-## The whole-database steps -- annotation_sources_cache.json, the FTS index rebuild
-## and VACUUM -- deliberately do NOT run here.
+## The gene set's rows back into the FTS index, from the tables as loaded.
+bash "$FTS_GENE_SET" add "$DB" "$GENE_SET_NAME"
+
+## The whole-database steps -- annotation_sources_cache.json, a full FTS index rebuild
+## when the index could not be kept current above, and VACUUM -- deliberately do NOT
+## run here.
 ##
 ## They rewrite the entire organism database, which every gene set of an organism
 ## shares, so running them per gene set did the same work N times over an ever-growing
@@ -234,6 +234,57 @@ return [
     // quoting a number the search no longer uses.
     'search_results_limit' => 2500,
 
+    // Cross-organism union search index (scripts/build_union_index.php). One FTS index
+    // over the distinct annotation text of every organism, so a multi-organism search
+    // ranks once instead of once per organism. Put it on the FAST volume -- that is the
+    // whole point. Leave as '' for union.sqlite under the cache directory above.
+    // Missing or stale entries fall back to per-organism search automatically.
+    'union_index_path' => '',
+
+    // Shared search-result cache (lib/search_result_cache.php). Finished search responses,
+    // reused until the organism database behind them changes. Like the union index it
+    // belongs on the FAST volume; '' puts search_cache.sqlite under the cache directory.
+    // search_cache_max_mb caps the stored bodies (least recently used go first; 0 turns
+    // the cache off). search_cache_ttl is how long an entry counts as fresh even when no
+    // database changed -- after that it is still served once more while it is refreshed.
+    'search_cache_path'   => '',
+    'search_cache_max_mb' => 256,
+    'search_cache_ttl'    => 86400,
+
+    // Page-cache prewarm (housekeeping task prewarm_search_pages). Most MB re-read per
+    // housekeeping run to keep the most-searched organisms' search pages in the page cache;
+    // pages still cached are skipped and cost nothing. 0 turns the prewarm off.
+    'prewarm_budget_mb'   => 2048,
+
+    // Page-cache snapshot and restore (housekeeping task page_cache_snapshot,
+    // scripts/page_cache_snapshot.py). Every page_cache_snapshot_hours the task records which
+    // database pages are cached; when most of them are gone -- a reboot, a benchmark, a
+    // drop_caches -- it reads them back in file order at most page_cache_restore_mb_s, so
+    // the cache recovers in minutes rather than hours of refaults. 0 turns it off.
+    'page_cache_restore_mb_s'   => 40,
+    'page_cache_snapshot_hours' => 6,
+
+    // Search tier (lib/search_tier.php, scripts/build_search_tier.php). A directory on the
+    // FAST volume that holds a copy of each chosen organism's FTS index, ATTACHed at query
+    // time while organism.sqlite stays put. '' turns tiering off. search_tier_max_gb caps
+    // what the planner puts there -- most searched organisms per GB first.
+    'search_tier_path'   => '',
+    'search_tier_max_gb' => 100,
+
+    // Per-query telemetry (lib/search_telemetry.php). One NDJSON line per search, sequence
+    // fetch and MOOPmart organism pass: wall time and bytes read from storage. Roll it up
+    // with scripts/analyze_telemetry.py. Rotated to .1 past search_telemetry_max_mb, so at
+    // most twice that on disk; 0 turns it off.
+    'search_telemetry_file'   => "$site_path/logs/search_telemetry.ndjson",
+    'search_telemetry_max_mb' => 64,
+
+    // Workload capture (lib/search_capture.php). One NDJSON line per search request --
+    // term, organisms, parameters, an anonymous daily visitor token -- for
+    // `python3 -m moopbench replay` (notes/bench) to re-issue. Stores what users typed, so
+    // it is OFF (0) unless turned on for a capture window; rotated to .1 past the cap.
+    'search_capture_file'   => "$site_path/logs/search_capture.ndjson",
+    'search_capture_max_mb' => 0,
+
     // ======== GENE MODELS GFF FILENAME ========
     // Filename of the gene-models GFF inside each gene_set directory:
     //   organisms/{organism}/{assembly}/{gene_set}/{this}
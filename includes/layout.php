@@ -234,6 +234,8 @@ function render_display_page($content_file, $data = [], $title = '', $options =
         <script src="<?= moop_asset_url('js/modules/shared-results-table.js') ?>"></script>
         <script src="<?= moop_asset_url('js/modules/glossary.js') ?>"></script>
         <script src="<?= moop_asset_url('js/modules/field-help.js') ?>"></script>
+        <!-- Before annotation-search.js and moopmart.js: both fan out through it. -->
+        <script src="<?= moop_asset_url('js/modules/fanout-scheduler.js') ?>"></script>
         <script src="<?= moop_asset_url('js/modules/annotation-search.js') ?>"></script>
         <script src="<?= moop_asset_url('js/modules/advanced-search-filter.js') ?>"></script>
         <script src="<?= moop_asset_url('js/modules/scope-filter.js') ?>"></script>
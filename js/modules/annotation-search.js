@@ -44,6 +44,7 @@ class AnnotationSearch {
         this.zeroResultOrganisms = [];
         this.currentKeywords = '';
         this.cappedOrganisms = [];
+        this.matchEstimates = {};
         // null = no filter; [] = gene-only mode; [...] = specific sources
         this.selectedSources = null;
         // selectedScope: {org: {accession: {gene_set: bool}}} or null (= all included)
@@ -434,6 +435,9 @@ class AnnotationSearch {
         this.zeroResultOrganisms = [];
         this.warnings = [];
         this.cappedOrganisms = [];
+        this.matchEstimates = {};
+        // A search still streaming from before would keep adding its organisms to this one.
+        if (this.streamAbort) this.streamAbort.abort();
         this.cancelled = false;
         $('#searchResults').show();
         $('#resultsContainer').html('');
@@ -469,7 +473,8 @@ class AnnotationSearch {
     }
 
     /**
-     * Search all organisms in parallel with a concurrency limit of 5.
+     * Search all organisms: one streamed request where the browser can read one
+     * (tools/annotation_search_stream.php), else the per-organism fan-out.
      */
     searchAllOrganisms(keywords, quotedSearch) {
         // Organisms the scope filter leaves something to search. Everything the user is
@@ -478,33 +483,171 @@ class AnnotationSearch {
         // announce "48 organisms" and count 48 steps of progress, 47 of which completed
         // instantly, because the counts read config.totalVar and ignored the scope filter.
         const organisms = this.organismsInScope();
+
+        // The stream answers every organism from one request, the instant ones (skip index,
+        // result cache) first, and sends each as soon as it is done. One organism gains
+        // nothing from it.
+        if (organisms.length >= 2 && window.fetch && window.ReadableStream && window.TextDecoder
+            && window.AbortController) {
+            this.streamSearch(organisms, keywords, quotedSearch);
+            return;
+        }
+        this.skipThenFanOut(organisms, keywords, quotedSearch);
+    }
+
+    skipThenFanOut(organisms, keywords, quotedSearch) {
+        if (this.cancelled) return;
+        // Ask the skip index first which organisms cannot match (api/search_skip.php): no
+        // request goes out for those, so a rare term no longer opens every cold database
+        // just to hear "nothing". One organism is not worth the round trip -- the search
+        // endpoint applies the same index itself. Any failure or a slow answer means
+        // "skip nothing": it is an optimisation, and the fan-out must not wait long on it.
+        // The fan-out schedule (which organisms are warm) is asked for at the same time,
+        // on the same terms.
+        if (organisms.length < 2) {
+            this.fanOut(organisms, [], keywords, quotedSearch);
+            return;
+        }
+        const skip = new Promise(resolve => $.ajax({
+            url: this.config.sitePath + '/api/search_skip.php',
+            method: 'GET',
+            data: { search_keywords: keywords, quoted: quotedSearch ? '1' : '0', organisms: organisms.join(',') },
+            dataType: 'json',
+            timeout: 3000,
+            success: (data) => resolve((data && data.skip) || []),
+            error: () => resolve([])
+        }));
+        Promise.all([skip, moopFetchFanoutSchedule(this.config.sitePath, organisms, 'search')])
+            .then(([skipped, schedule]) => this.fanOut(organisms, skipped, keywords, quotedSearch, 0, schedule));
+    }
+
+    /**
+     * Request parameters shared by the per-organism and the streaming endpoint: the query,
+     * the page's extra params and the source filter. Scope is per organism; callers add it.
+     */
+    searchParams(keywords, quotedSearch) {
+        const params = {
+            search_keywords: keywords,
+            quoted: quotedSearch ? '1' : '0',
+            ...this.config.extraAjaxParams
+        };
+        if (this.selectedSources !== null) {
+            if (this.selectedSources.length === 0) {
+                // Explicit "no annotation sources" — search gene fields only
+                params.no_annotations = '1';
+            } else {
+                params.source_names = this.selectedSources.join(',');
+            }
+        }
+        return params;
+    }
+
+    /**
+     * All organisms in one request, read as it arrives (NDJSON, one line per organism).
+     *
+     * If the stream fails before any organism arrived, the search starts over as the
+     * fan-out; if it fails part way, the fan-out picks up only the organisms not yet
+     * answered. Either way the user gets the same results, just by the older route.
+     */
+    streamSearch(organisms, keywords, quotedSearch) {
+        const params = this.searchParams(keywords, quotedSearch);
+        params.organisms = organisms.join(',');
+        const scopes = {};
+        organisms.forEach(org => {
+            const pairs = this.getScopePairsForOrganism(org);
+            if (pairs !== null) scopes[org] = pairs;
+        });
+        if (Object.keys(scopes).length > 0) params.scopes = JSON.stringify(scopes);
+
         const total = organisms.length;
-        let nextIndex = 0;
-        let completed = 0;
+        const reported = new Set();
+        let finished = false;
+        const abort = this.streamAbort = new AbortController();
+
+        const handleLine = (line) => {
+            if (line.trim() === '') return;
+            const msg = JSON.parse(line);
+            if (msg.type === 'organism') {
+                if (reported.has(msg.organism)) return;
+                reported.add(msg.organism);
+                this.recordOrganismResult(msg.organism, msg.data || {});
+                this.updateProgress(reported.size, total);
+            } else if (msg.type === 'top') {
+                this.displayTopMatches(msg.results || []);
+            } else if (msg.type === 'done') {
+                finished = true;
+            }
+        };
+
+        // Aborted = cancelled, or replaced by a newer search: nothing to fall back to.
+        const fallBack = () => {
+            if (this.cancelled || abort.signal.aborted) return;
+            const remaining = organisms.filter(o => !reported.has(o));
+            if (reported.size === 0) {
+                this.skipThenFanOut(organisms, keywords, quotedSearch);
+            } else if (remaining.length > 0) {
+                moopFetchFanoutSchedule(this.config.sitePath, remaining, 'search')
+                    .then(schedule => this.fanOut(remaining, [], keywords, quotedSearch, reported.size, schedule));
+            } else {
+                this.finishSearch();
+            }
+        };
+
+        fetch(this.config.sitePath + '/tools/annotation_search_stream.php?' + $.param(params), {
+            credentials: 'same-origin',
+            signal: abort.signal
+        }).then(response => {
+            if (!response.ok || !response.body) throw new Error('HTTP ' + response.status);
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            const pump = () => reader.read().then(({ done, value }) => {
+                if (this.cancelled || abort.signal.aborted) return;
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.forEach(handleLine);
+                if (!done) return pump();
+                handleLine(buffer);
+                if (finished && reported.size >= total) {
+                    this.finishSearch();
+                } else {
+                    fallBack();
+                }
+            });
+            return pump();
+        }).catch(() => fallBack());
+    }
 
-        const launchNext = () => {
-            if (this.cancelled || nextIndex >= total) return;
-            const index = nextIndex++;
-            const organism = organisms[index];
+    /**
+     * The per-organism requests, run by FanoutScheduler (js/modules/fanout-scheduler.js):
+     * warm organisms and cold ones in their own lanes, each paced by its latency. Skipped
+     * organisms count as complete, zero-result searches from the start; so do `alreadyDone`
+     * organisms answered before (a stream that broke off part way).
+     */
+    fanOut(organisms, skipped, keywords, quotedSearch, alreadyDone = 0, schedule = []) {
+        if (this.cancelled) return;
+        const skip = new Set(skipped.map(s => s.organism));
+        skipped.forEach(s => this.zeroResultOrganisms.push({
+            organism: s.organism,
+            genus: s.genus || '',
+            species: s.species || ''
+        }));
+        const queue = organisms.filter(o => !skip.has(o));
+        const total = organisms.length + alreadyDone;
+        let completed = total - queue.length;
+        if (queue.length === 0) {
+            this.finishSearch();
+            return;
+        }
 
+        const runOne = (organism, done) => {
             // Non-null with entries, or null for "no filter" — organisms scoped out
             // entirely are already gone, filtered by organismsInScope() above.
             const scopePairs = this.getScopePairsForOrganism(organism);
 
-            const ajaxData = {
-                search_keywords: keywords,
-                organism: organism,
-                quoted: quotedSearch ? '1' : '0',
-                ...this.config.extraAjaxParams
-            };
-            if (this.selectedSources !== null) {
-                if (this.selectedSources.length === 0) {
-                    // Explicit "no annotation sources" — search gene fields only
-                    ajaxData.no_annotations = '1';
-                } else {
-                    ajaxData.source_names = this.selectedSources.join(',');
-                }
-            }
+            const ajaxData = this.searchParams(keywords, quotedSearch);
+            ajaxData.organism = organism;
             if (scopePairs !== null) {
                 ajaxData.scope = JSON.stringify(scopePairs);
             }
@@ -516,30 +659,11 @@ class AnnotationSearch {
                 dataType: 'json',
                 success: (data) => {
                     if (this.cancelled) return;
-                    if (data.results && data.results.length > 0) {
-                        this.allResults = this.allResults.concat(data.results);
-                        this.displayOrganismResults(data);
-                    } else {
-                        this.zeroResultOrganisms.push({
-                            organism: organism,
-                            genus: data.genus || '',
-                            species: data.species || ''
-                        });
-                    }
-                    if (data.warning) {
-                        this.warnings.push({ organism: data.organism, warning: data.warning });
-                    }
-                    if (data.capped) {
-                        this.cappedOrganisms.push(data.organism);
-                    }
+                    this.recordOrganismResult(organism, data);
                     completed++;
-                    const progress = Math.round((completed / total) * 100);
-                    $('#progressFill').css('width', progress + '%').text(progress + '%');
-                    $('#progressText').html(`Searching... (${completed}/${total} complete)`);
+                    this.updateProgress(completed, total);
                     if (completed >= total) {
                         this.finishSearch();
-                    } else {
-                        launchNext();
                     }
                 },
                 error: () => {
@@ -549,17 +673,75 @@ class AnnotationSearch {
                     $('#progressFill').css('width', progress + '%').text(progress + '%');
                     if (completed >= total) {
                         this.finishSearch();
-                    } else {
-                        launchNext();
                     }
-                }
+                },
+                complete: done
             });
         };
 
-        const concurrency = Math.min(5, total);
-        for (let i = 0; i < concurrency; i++) {
-            launchNext();
+        new FanoutScheduler(queue, schedule, runOne, { shouldStop: () => this.cancelled }).start();
+    }
+
+    /**
+     * One organism's response, from either endpoint: its table, or its place in the
+     * zero-result list, plus any warning and cap.
+     */
+    recordOrganismResult(organism, data) {
+        if (data.results && data.results.length > 0) {
+            this.allResults = this.allResults.concat(data.results);
+            this.displayOrganismResults(data);
+        } else {
+            this.zeroResultOrganisms.push({
+                organism: organism,
+                genus: data.genus || '',
+                species: data.species || ''
+            });
+        }
+        if (data.warning) {
+            this.warnings.push({ organism: data.organism, warning: data.warning });
+        }
+        if (data.capped) {
+            this.cappedOrganisms.push(data.organism);
+            if (data.estimated_matches) {
+                this.matchEstimates[data.organism] = data.estimated_matches;
+            }
+        }
+    }
+
+    updateProgress(completed, total) {
+        const progress = Math.round((completed / total) * 100);
+        $('#progressFill').css('width', progress + '%').text(progress + '%');
+        $('#progressText').html(`Searching... (${completed}/${total} complete)`);
+    }
+
+    /**
+     * The stream's running cross-organism top matches, above the per-organism tables.
+     * Replaced each time the server sends a new list; the rows are the per-organism rows,
+     * so descriptions arrive HTML-escaped and only names need escaping here.
+     */
+    displayTopMatches(rows) {
+        let panel = $('#searchTopMatches');
+        if (panel.length === 0) {
+            panel = $('<div id="searchTopMatches" class="card mb-3"></div>');
+            $('#resultsContainer').prepend(panel);
+        }
+        if (rows.length === 0) {
+            panel.remove();
+            return;
         }
+        const items = rows.map(r => {
+            const href = `${this.config.sitePath}/tools/parent.php?organism=${encodeURIComponent(r.organism)}`
+                       + `&uniquename=${encodeURIComponent(r.feature_uniquename)}`;
+            const name = escapeHtml(r.feature_name || r.feature_uniquename || '');
+            const desc = r.feature_description || r.annotation_description || '';
+            return `<li><a href="${href}" target="_blank">${name}</a>
+                <em class="text-muted">${escapeHtml((r.genus || '') + ' ' + (r.species || ''))}</em>
+                ${desc ? '— <small>' + desc + '</small>' : ''}</li>`;
+        }).join('');
+        panel.html(`<div class="card-body py-2">
+            <strong>Best matches across organisms</strong>
+            <ol class="mb-0 small">${items}</ol>
+        </div>`);
     }
 
     displayOrganismResults(data) {
@@ -585,6 +767,7 @@ class AnnotationSearch {
 
     cancel() {
         this.cancelled = true;
+        if (this.streamAbort) this.streamAbort.abort();
         $('#search-cancel-btn').hide();
         $('#searchBtn').prop('disabled', false).removeClass('btn-searching').html('<i class="fa fa-search"></i>');
         $('#progressText').html('<span class="text-warning"><i class="fa fa-ban me-1"></i>Search cancelled.</span>');
@@ -596,7 +779,14 @@ class AnnotationSearch {
 
         let capMessageHtml = '';
         if (this.cappedOrganisms.length > 0) {
-            const cappedList = this.cappedOrganisms.join(', ');
+            // "up to N matches" where the server had a term-stats sidecar to say so: the
+            // estimate is an upper bound, read without searching, and shows how much a cap
+            // actually left out -- 2,500 of 3,000 and 2,500 of 300,000 call for different
+            // next steps.
+            const cappedList = this.cappedOrganisms.map(org => {
+                const est = this.matchEstimates[org];
+                return est ? `${org} (up to ${est.toLocaleString()} matches)` : org;
+            }).join(', ');
             // The limit is configurable (search_results_limit), so read it rather than
             // hardcoding -- a message that names the wrong number is worse than none.
             const lim = (window.MOOP_SEARCH_RESULTS_LIMIT || 2500).toLocaleString();
@@ -0,0 +1,134 @@
+/**
+ * Disk-aware fan-out scheduler — runs one request per organism, warm organisms and cold
+ * ones in separate lanes.
+ *
+ * Used by the cross-organism annotation search (annotation-search.js) and the MOOPmart
+ * preview (moopmart.js), which both used to send their per-organism requests five at a
+ * time in the order the organisms were listed. A warm organism answers in milliseconds; a
+ * cold one spends seconds seeking on a disk that is already saturated (15 in flight
+ * instead of 5 was only 1.12x faster), so a fixed pool both starves the warm requests
+ * behind cold ones and queues more cold requests on the disk than it can serve.
+ *
+ * api/fanout_schedule.php says which organisms the page cache holds (mincore), and orders
+ * the cold ones largest first (lib/fanout_schedule.php). Here:
+ *
+ *   warm lane  the resident organisms, several at a time: they are CPU, not disk
+ *   cold lane  the rest, largest first, starting at the same moment -- the longest jobs
+ *              overlap the warm work instead of trailing after it
+ *
+ * Each lane sizes its own in-flight limit from the latencies it sees (FanoutLimit): while
+ * requests come back as fast as the best seen, the limit creeps up; when they slow down
+ * because the disk is queueing, it backs off. The cold lane settles where the disk stops
+ * giving more, without anyone having to know that number.
+ *
+ * With no schedule (the endpoint failed or was slow) every organism goes to the cold lane
+ * in the caller's order: the same requests as before, only paced by latency.
+ */
+
+/**
+ * Ask api/fanout_schedule.php for the plan. Always resolves: to its schedule list, or to []
+ * on any error or after timeoutMs -- the fan-out must not wait long on an optimisation.
+ */
+function moopFetchFanoutSchedule(sitePath, organisms, kind = 'search', timeoutMs = 3000) {
+    if (organisms.length < 2 || !window.fetch) return Promise.resolve([]);
+    const abort = window.AbortController ? new AbortController() : null;
+    const timer = abort ? setTimeout(() => abort.abort(), timeoutMs) : null;
+    const url = `${sitePath}/api/fanout_schedule.php?kind=${encodeURIComponent(kind)}`
+              + `&organisms=${encodeURIComponent(organisms.join(','))}`;
+    return fetch(url, { credentials: 'same-origin', signal: abort ? abort.signal : undefined })
+        .then(r => (r.ok ? r.json() : { schedule: [] }))
+        .then(data => (data && Array.isArray(data.schedule) ? data.schedule : []))
+        .catch(() => [])
+        .finally(() => { if (timer) clearTimeout(timer); });
+}
+
+/**
+ * An in-flight limit that follows observed latency (a gradient limiter).
+ *
+ * Each completed request gives a cost: its latency, per MB the lane expects it to read
+ * when the lane is disk-bound. The best cost seen is the no-contention baseline. A request
+ * within TOLERANCE of it says the lane is not queueing, so the limit moves towards one
+ * more; a slower one pulls it down in proportion, at most halving. Smoothed, so one slow
+ * organism does not collapse the lane.
+ */
+class FanoutLimit {
+    constructor(initial, min, max, perByte) {
+        this.limit = initial;
+        this.min = min;
+        this.max = max;
+        this.perByte = perByte;
+        this.best = Infinity;
+    }
+
+    observe(ms, bytes) {
+        const TOLERANCE = 1.5;
+        const cost = this.perByte ? ms / (1 + (bytes || 0) / 1048576) : ms;
+        if (!(cost > 0)) return;
+        this.best = Math.min(this.best, cost);
+        const gradient = Math.max(0.5, Math.min(1, (this.best * TOLERANCE) / cost));
+        const target = this.limit * gradient + 1;
+        this.limit = Math.max(this.min, Math.min(this.max, 0.8 * this.limit + 0.2 * target));
+    }
+
+    get slots() {
+        return Math.floor(this.limit);
+    }
+}
+
+class FanoutScheduler {
+    /**
+     * @param {string[]} organisms  what to run, in the caller's order
+     * @param {Array}    schedule   moopFetchFanoutSchedule()'s list; may be empty or partial
+     * @param {Function} runOne     (organism, done) => void; starts one request and calls
+     *                              done() when it has finished, however it finished
+     * @param {Object}   [options]  shouldStop: () => bool, checked before each launch
+     */
+    constructor(organisms, schedule, runOne, options = {}) {
+        this.runOne = runOne;
+        this.shouldStop = options.shouldStop || (() => false);
+
+        const wanted = new Set(organisms);
+        const planned = new Set();
+        this.bytes = {};
+        const warm = [], cold = [];
+        (schedule || []).forEach(s => {
+            if (!wanted.has(s.organism) || planned.has(s.organism)) return;
+            planned.add(s.organism);
+            this.bytes[s.organism] = s.bytes || 0;
+            (s.warm ? warm : cold).push(s.organism);
+        });
+        organisms.forEach(o => { if (!planned.has(o)) cold.push(o); });
+
+        this.lanes = [
+            { queue: warm, inFlight: 0, limit: new FanoutLimit(4, 2, 8, false) },
+            // Starts at 2 and may reach the old fixed pool's 5: past that the disk only queues.
+            { queue: cold, inFlight: 0, limit: new FanoutLimit(2, 1, 5, true) },
+        ];
+    }
+
+    start() {
+        this.pump();
+    }
+
+    pump() {
+        if (this.shouldStop()) return;
+        this.lanes.forEach(lane => {
+            while (lane.queue.length > 0 && lane.inFlight < lane.limit.slots) {
+                this.launch(lane, lane.queue.shift());
+            }
+        });
+    }
+
+    launch(lane, organism) {
+        const started = performance.now();
+        let finished = false;
+        lane.inFlight++;
+        this.runOne(organism, () => {
+            if (finished) return;
+            finished = true;
+            lane.inFlight--;
+            lane.limit.observe(performance.now() - started, this.bytes[organism]);
+            this.pump();
+        });
+    }
+}
@@ -740,10 +740,11 @@
         }
     }
 
-    // Progressive TSV preview: fan out one request per selected organism (concurrency
-    // 5, mirroring the AnnotationSearch pattern) so the count and table fill in as each
-    // organism reports, instead of blocking on one all-organisms request. The running
-    // total stays exact; the table shows the first PREVIEW_ROW_CAP rows.
+    // Progressive TSV preview: fan out one request per selected organism (through
+    // FanoutScheduler, like AnnotationSearch: warm organisms first, cold ones largest first,
+    // each lane paced by its latency) so the count and table fill in as each organism
+    // reports, instead of blocking on one all-organisms request. The running total stays
+    // exact; the table shows the first PREVIEW_ROW_CAP rows.
     function runTsvPreviewFanout(csrf, btn, spinner, result) {
         const organisms = getSelectedOrganisms();
         const total = organisms.length;
@@ -811,10 +812,7 @@
             else               updateResultsTable(accRows, totalRows, accRows.length !== before);
         };
 
-        let nextIndex = 0;
-        const launchNext = () => {
-            if (nextIndex >= total) return;
-            const organism = organisms[nextIndex++];
+        const runOne = (organism, next) => {
             fetch(PREVIEW_ORG_URL, {
                 method: 'POST',
                 headers: { 'X-CSRF-Token': csrf },
@@ -840,15 +838,15 @@
                     if (done) {
                         spinner?.classList.add('d-none');
                         if (btn) btn.disabled = false;
-                    } else {
-                        launchNext();
                     }
+                    next();
                 });
         };
 
         showStatus(false);
-        const concurrency = Math.min(5, total);
-        for (let i = 0; i < concurrency; i++) launchNext();
+        // The preview reads all over each database, not just its search index: 'file'.
+        moopFetchFanoutSchedule(moopSite, organisms, 'file')
+            .then(schedule => new FanoutScheduler(organisms, schedule, runOne).start());
     }
 
     function renderFastaPreview(text) {
@@ -0,0 +1,362 @@
+<?php
+/**
+ * One organism's annotation search, as a JSON response body -- shared by the per-organism
+ * endpoint (tools/annotation_search_ajax.php) and the streaming one
+ * (tools/annotation_search_stream.php), which runs it for many organisms in one request.
+ *
+ * Everything an answer depends on is checked here, per organism, in the same order as
+ * before it moved: access, a usable query, the database, the skip index, then the shared
+ * result cache around the search itself. A caller only parses the request.
+ *
+ * Expects tool_init.php to have run (session, access control, config).
+ */
+
+require_once __DIR__ . '/search_result_cache.php';
+require_once __DIR__ . '/organism_skip_index.php';
+
+/**
+ * The search parameters of a request, normalised.
+ *
+ * @param array $in $_GET, or anything shaped like it
+ * @return array keywords, input (sanitised), quoted, group, assembly, gene_set, sources,
+ *               gene_only, scope (list of {assembly, gene_set})
+ */
+function moop_annotation_search_params(array $in): array
+{
+    $keywords = (string)($in['search_keywords'] ?? '');
+    $quoted   = isset($in['quoted']) && $in['quoted'] === '1';
+
+    $gene_only = !empty($in['no_annotations']);   // user explicitly deselected all sources
+    $sources   = (!$gene_only && !empty($in['source_names']))
+        ? array_map('trim', explode(',', (string)$in['source_names']))
+        : [];
+
+    return [
+        'keywords'  => $keywords,
+        'input'     => sanitize_search_input($keywords, $quoted),
+        'quoted'    => $quoted,
+        'group'     => (string)($in['group'] ?? ''),
+        'assembly'  => (string)($in['assembly'] ?? ''),
+        'gene_set'  => (string)($in['gene_set'] ?? ''),
+        'sources'   => $sources,
+        'gene_only' => $gene_only,
+        'scope'     => moop_annotation_search_scope($in['scope'] ?? ''),
+    ];
+}
+
+/**
+ * scope: JSON array of {assembly, gene_set} pairs, which overrides the individual
+ * assembly/gene_set params. Pairs missing either key are dropped.
+ */
+function moop_annotation_search_scope($scope_json): array
+{
+    $pairs = [];
+    $decoded = is_array($scope_json) ? $scope_json : json_decode((string)$scope_json, true);
+    if (!is_array($decoded)) return $pairs;
+    foreach ($decoded as $pair) {
+        if (isset($pair['assembly'], $pair['gene_set'])) {
+            $pairs[] = [
+                'assembly' => (string)$pair['assembly'],
+                'gene_set' => (string)$pair['gene_set'],
+            ];
+        }
+    }
+    return $pairs;
+}
+
+/**
+ * The result-cache key for one organism's answer. Keyed on the FTS expression rather than
+ * the raw input, so spacing differences share an entry; scope lists are sorted because
+ * their order does not change the answer. An answer fetched through a union pool is its
+ * own entry, keyed on the gene sets it was restricted to and on the pool itself. The
+ * pool is this organism's share of ONE ranking across every organism served with it, so
+ * the same organism gets a different pool with 3 organisms selected than with 40, or for
+ * a user who can see others -- and the cache fingerprints only this organism's database,
+ * so nothing else would tell those answers apart.
+ */
+function moop_annotation_search_cache_key(array $p, string $organism): string
+{
+    $cache_scope = array_map(function ($pair) { return $pair['assembly'] . "\t" . $pair['gene_set']; }, $p['scope']);
+    sort($cache_scope);
+    $cache_sources = $p['sources'];
+    sort($cache_sources);
+    return moop_search_cache_key('annotation_search', [
+        'organism'  => $organism,
+        'match'     => buildFtsMatchExpr($p['input'], $p['quoted']),
+        'quoted'    => $p['quoted'],
+        'gene_only' => $p['gene_only'],
+        'sources'   => $cache_sources,
+        'assembly'  => $p['assembly'],
+        'gene_set'  => $p['gene_set'],
+        'scope'     => $cache_scope,
+        'union'     => isset($p['union_pool'])
+            ? [$p['union_pool']['gene_set_ids'], sha1(implode(',', $p['union_pool']['rowids']))]
+            : null,
+    ]);
+}
+
+/**
+ * Search one organism. Returns the JSON body the per-organism endpoint has always sent,
+ * errors included ({error, results: []}).
+ *
+ * $p may carry 'union_pool' (lib/union_index.php, moop_union_pools()): the organism's
+ * share of a ranking already done once across the site, fetched instead of ranking here.
+ */
+function moop_annotation_search_organism(array $p, string $organism): string
+{
+    $config               = ConfigManager::getInstance();
+    $organism_data        = $config->getPath('organism_data');
+    $images_path          = $config->getString('images_path');
+    $absolute_images_path = $config->getPath('absolute_images_path');
+
+    if ($p['keywords'] === '' || $organism === '') {
+        return json_encode(['error' => 'Missing required parameters']);
+    }
+
+    // Check access: Admin has access to everything.
+    // Read the role through moop_session_is_admin() rather than $_SESSION['role'] directly, so
+    // an admin using "View as PUBLIC" gets a visitor's search results here too. A raw read would
+    // have quietly kept full search access during the preview — the worst possible outcome, since
+    // the preview would then report that public users can find data they actually cannot.
+    $is_admin = moop_session_is_admin();
+    $user_has_group_access = has_access('COLLABORATOR', $p['group']);
+    $organism_is_public = is_public_organism($organism);
+    $user_has_organism_access = has_access('COLLABORATOR', $organism);
+
+    if (!$is_admin && !$user_has_group_access && !$organism_is_public && !$user_has_organism_access) {
+        return json_encode(['error' => 'Access denied', 'results' => [], 'debug' => [
+            'session_role' => moop_session_role() ?? 'not set',
+            'is_admin' => $is_admin
+        ]]);
+    }
+
+    // Refuse a query with nothing selective in it, BEFORE opening any database. The browser
+    // checks this too (js/modules/search-terms.js) for a faster message, but that is a
+    // courtesy: a hand-made request skips it, and a lone "1" is a 1.86M-row scan per organism.
+    // Checked here rather than after the access checks above so an unauthorised caller still
+    // gets "Access denied" and learns nothing about the data.
+    if (!moop_search_input_is_usable($p['input'], $p['quoted'])) {
+        return json_encode([
+            'error'   => 'Enter at least 2 characters in one word. Single letters match too '
+                       . 'much to be useful; short words are fine alongside longer ones, '
+                       . 'e.g. "histone deacetylase 1".',
+            'results' => [],
+        ]);
+    }
+
+    // Build database path
+    $db = "$organism_data/$organism/organism.sqlite";
+    if (!file_exists($db)) {
+        include_once __DIR__ . '/moop_functions.php';
+        logError('Database not found for organism', $organism, [
+            'search_term' => $p['keywords'],
+            'searched_path' => $db
+        ]);
+        return json_encode(['error' => 'Database not found for organism', 'results' => []]);
+    }
+
+    // An organism the skip index rules out answers empty without its database being opened
+    // (lib/organism_skip_index.php). The browser normally asks api/search_skip.php first and
+    // never sends this request; this covers older pages and hand-made requests. Same shape as
+    // an empty search below, so nothing downstream can tell the difference.
+    if (in_array($organism, moop_skip_index_skippable($p['input'], $p['quoted'], [$organism => $db]), true)) {
+        $organism_data_result = loadOrganismAndGetImagePath($organism, $images_path, $absolute_images_path);
+        if (!headers_sent()) header('X-MOOP-Search-Cache: skip');
+        return json_encode([
+            'organism' => $organism,
+            'genus' => $organism_data_result['organism_info']['genus'] ?? '',
+            'species' => $organism_data_result['organism_info']['species'] ?? '',
+            'organism_image_path' => $organism_data_result['image_path'],
+            'results' => [],
+            'count' => 0,
+            'search_type' => $p['quoted'] ? 'Quoted' : 'Keyword',
+            'warning' => null,
+            'capped' => false,
+            'results_limit' => moop_search_results_limit(),
+            'estimated_matches' => 0
+        ]);
+    }
+
+    // Validate database is readable and accessible
+    $db_validation = validateDatabaseFile($db);
+    if (!$db_validation['valid']) {
+        logError('Database file not accessible', $organism, [
+            'search_term' => $p['keywords'],
+            'database_path' => $db,
+            'validation_error' => $db_validation['error']
+        ]);
+        return json_encode(['error' => 'Database file not accessible: ' . $db_validation['error'], 'results' => []]);
+    }
+
+    // Everything below depends only on the request and the organism database, so it is served
+    // from the shared result cache when it can be (lib/search_result_cache.php).
+    $compute = function () use ($p, $organism, $db, $images_path, $absolute_images_path) {
+        return moop_annotation_search_compute($p, $organism, $db, $images_path, $absolute_images_path);
+    };
+    return moop_search_cache_serve(moop_annotation_search_cache_key($p, $organism), [$organism => $db], $compute);
+}
+
+/**
+ * The uncached search behind moop_annotation_search_organism().
+ *
+ * @return array [payload, cacheable] as moop_search_cache_serve() expects
+ */
+function moop_annotation_search_compute(array $p, string $organism, string $db, $images_path, $absolute_images_path): array
+{
+    $search_input  = $p['input'];
+    $quoted_search = $p['quoted'];
+
+    // Load organism info and get image path
+    $organism_data_result = loadOrganismAndGetImagePath($organism, $images_path, $absolute_images_path);
+    $organism_image_path = $organism_data_result['image_path'];
+
+    // Check if searching by feature uniquename first
+    $results = searchFeaturesByUniquenameForSearch($search_input, $db, '', $p['assembly'], $p['gene_set'], $p['scope']);
+    $uniquename_search = !empty($results);
+    $warning_message = null;
+    $estimated_matches = null;
+    $cacheable = true;
+
+    // If no results by uniquename, search by annotation or gene fields depending on source selection
+    if (!$uniquename_search) {
+        if ($p['gene_only']) {
+            $search_result = searchFeaturesByNameDescription($search_input, $quoted_search, $db, $p['assembly'], $p['gene_set'], $p['scope'], $organism);
+        } else {
+            $search_result = searchFeaturesAndAnnotations($search_input, $quoted_search, $db, $p['sources'], $p['assembly'], $p['gene_set'], $p['scope'], $p['union_pool'] ?? null);
+        }
+        $results = $search_result['results'];
+        $warning_message = $search_result['warning'];
+        $estimated_matches = $search_result['estimated_matches'] ?? null;
+        // A failed search comes back as no rows plus a warning. Remembering that would keep
+        // serving "Search error." after whatever caused it (a lock, a reload) has passed.
+        $cacheable = !empty($results) || $warning_message === null;
+    }
+
+    // Format results for JSON
+    $formatted_results = [];
+    $incomplete_records = [];
+
+    foreach ($results as $row) {
+        $species = $row['species'];
+        if (!empty($row['subtype']) && $row['subtype'] != 'NULL') {
+            $species .= ' ' . $row['subtype'];
+        }
+
+        // Check for incomplete annotation records (missing source or accession)
+        if (!$uniquename_search && (empty($row['annotation_source_name']) || empty($row['annotation_accession']))) {
+            $incomplete_records[] = [
+                'organism' => $organism,
+                'feature_uniquename' => $row['feature_uniquename'],
+                'feature_name' => $row['feature_name'] ?? '',
+                'annotation_accession' => $row['annotation_accession'] ?? 'MISSING',
+                'annotation_source' => $row['annotation_source_name'] ?? 'MISSING'
+            ];
+        }
+
+        $formatted_results[] = [
+            'organism' => $organism,
+            'genus' => $row['genus'],
+            'species' => $species,
+            'common_name' => $row['common_name'],
+            'feature_type' => $row['feature_type'],
+            'feature_uniquename' => $row['feature_uniquename'],
+            'feature_name' => $row['feature_name'] ?? '',
+            'feature_description' => htmlspecialchars(decodeAnnotationText($row['feature_description'] ?? ''), ENT_QUOTES, 'UTF-8'),
+            'score' => $row['score'] ?? '',
+            'annotation_source_name' => $row['annotation_source_name'] ?? '',
+            'annotation_accession' => $row['annotation_accession'] ?? '',
+            'annotation_description' => htmlspecialchars(decodeAnnotationText($row['annotation_description'] ?? ''), ENT_QUOTES, 'UTF-8'),
+            'genome_accession' => $row['genome_accession'] ?? '',
+            // Assembly and gene set travel with every result row. Both were already JOINed by
+            // all three search queries (the scope filter needs them) — only the SELECT list left
+            // them out, so carrying them costs nothing. A result is not fully identified without
+            // them: an organism can have several assemblies, and an assembly several gene sets,
+            // so "gene X in Nematostella" is ambiguous on its own.
+            'genome_name' => $row['genome_name'] ?? '',
+            'gene_set'    => $row['gene_set_name'] ?? '',
+            'uniquename_search' => $uniquename_search
+        ];
+    }
+
+    // Log incomplete records for admin review
+    if (!empty($incomplete_records)) {
+        logError('Incomplete annotation records found', $organism, [
+            'search_term' => $p['keywords'],
+            'count' => count($incomplete_records),
+            'records' => $incomplete_records
+        ]);
+    }
+
+    // Check whether results hit the configured per-organism cap
+    $result_count = count($formatted_results);
+    $results_limit = moop_search_results_limit();
+    $is_capped = $result_count >= $results_limit;
+
+    return [[
+        'organism' => $organism,
+        'genus' => $organism_data_result['organism_info']['genus'] ?? '',
+        'species' => $organism_data_result['organism_info']['species'] ?? '',
+        'organism_image_path' => $organism_image_path,
+        'results' => $formatted_results,
+        'count' => $result_count,
+        'search_type' => $uniquename_search ? 'Gene/Transcript ID' : ($quoted_search ? 'Quoted' : 'Keyword'),
+        'warning' => $warning_message,
+        'capped' => $is_capped,
+        // Sent so the results UI and its help can state the real cap rather than a
+        // number baked into the JavaScript, which would go stale the moment an admin
+        // changes it in Site Configuration.
+        'results_limit' => $results_limit,
+        // How broad the term is in this organism, from the term-stats sidecar (an upper
+        // bound; null when the organism has none). Lets a capped result say how much it
+        // left out, which the row count alone cannot.
+        'estimated_matches' => $estimated_matches
+    ], $cacheable];
+}
+
+/**
+ * Merge one organism's rows into a running cross-organism top K, one row per gene.
+ *
+ * Relevance across organisms cannot come from bm25 -- its scores are relative to each
+ * database's own statistics -- but the tiers searchFeaturesAndAnnotations() sorts by ARE
+ * comparable: does the gene's name contain the term, its description, the annotation
+ * text, the stem; does the gene have a name. So the global order is those tiers, with an
+ * ID match above everything, then the row's position within its own organism's ranking
+ * (its bm25 or prior order), then the organism name, for a stable answer.
+ *
+ * @param array $top     the running list, as returned by the previous call ([] to start)
+ * @param array $payload one organism's decoded response
+ * @return array the new top K: [{key, row}], best first
+ */
+function moop_annotation_search_top_merge(array $top, array $payload, array $p, int $k): array
+{
+    $term = mb_strtolower(ftsPrimaryTerm($p['input'], $p['quoted']));
+    $stem = trim(ftsStemLikePattern($p['input'], $p['quoted']), '%');
+    $has  = function ($text, $needle) {
+        return $needle !== '' && mb_stripos(htmlspecialchars_decode((string)$text, ENT_QUOTES), $needle) !== false;
+    };
+
+    // Every row is scored, not just the first per gene: source interleaving
+    // (moop_interleave_by_source()) can put a gene's weaker row ahead of its best one.
+    $best = [];
+    foreach ($payload['results'] ?? [] as $pos => $row) {
+        $gene = $row['organism'] . "\t" . $row['feature_uniquename'];
+        $entry = [
+            'key' => [
+                empty($row['uniquename_search']) ? 1 : 0,
+                $has($row['feature_name'], $term) ? 0 : 1,
+                $has($row['feature_description'], $term) ? 0 : 1,
+                $has($row['annotation_description'], $term) ? 0 : 1,
+                $has($row['annotation_description'], $stem) ? 0 : 1,
+                ($row['feature_name'] ?? '') !== '' ? 0 : 1,
+                $pos,
+                $row['organism'],
+            ],
+            'row' => $row,
+        ];
+        if (!isset($best[$gene]) || $entry['key'] < $best[$gene]['key']) $best[$gene] = $entry;
+    }
+
+    $merged = array_merge($top, array_values($best));
+    usort($merged, function ($a, $b) { return $a['key'] <=> $b['key']; });
+    return array_slice($merged, 0, $k);
+}
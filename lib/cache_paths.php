@@ -175,6 +175,108 @@ function moop_annotation_levels_cache_file(string $organism): string
     return moop_ensure_cache_dir($dir) ? "$dir/annotation_levels.json" : '';
 }
 
+/**
+ * The cross-organism union search index (lib/union_index.php).
+ *
+ * 'union_index_path' when set, otherwise union.sqlite at the cache root. It belongs with the
+ * caches by the rule at the top of this file: scripts/build_union_index.php regenerates it
+ * from the organism databases, and search treats a missing file as "every organism stale"
+ * and falls back to the per-organism path. Slower, never wrong.
+ *
+ * Configurable separately because where it lives matters more than for any JSON cache
+ * here: the point of the file is one small ranking pass instead of 49 scattered ones, and
+ * that only holds if it sits on the fast volume, not beside the organism databases on the
+ * rotational one.
+ */
+function moop_union_index_file(): string
+{
+    $path = ConfigManager::getInstance()->getPath('union_index_path');
+    if ($path !== '') return $path;
+    return moop_cache_root() . '/union.sqlite';
+}
+
+/**
+ * The shared search-result cache (lib/search_result_cache.php).
+ *
+ * 'search_cache_path' when set, otherwise search_cache.sqlite at the cache root. Configurable
+ * separately for the same reason as the union index: a warm answer is only milliseconds if
+ * the file sits on the fast volume, and the cache root may not.
+ */
+function moop_search_cache_file(): string
+{
+    $path = ConfigManager::getInstance()->getPath('search_cache_path');
+    if ($path !== '') return $path;
+    return moop_cache_root() . '/search_cache.sqlite';
+}
+
+/**
+ * Per-organism document-length sidecar for in-process bm25 (lib/fts_docsize.php).
+ *
+ * Same per-organism directory as annotation_sources_cache.json. Regenerable like everything
+ * here -- scripts/build_search_sidecars.php writes it from the organism database -- and a
+ * missing or stale one just means bm25 runs inside SQLite again. Does not create the
+ * directory: this is read on the search path, and only the builder writes.
+ */
+function moop_docsize_sidecar_file(string $db_path): string
+{
+    return moop_cache_root() . '/' . basename(dirname($db_path)) . '/fts_docsize.bin';
+}
+
+/**
+ * Per-organism term-statistics sidecar for match estimates (lib/fts_term_stats.php). Beside
+ * the docsize sidecar, written by the same builder, and read-only on the search path too.
+ */
+function moop_term_stats_sidecar_file(string $db_path): string
+{
+    return moop_cache_root() . '/' . basename(dirname($db_path)) . '/fts_term_stats.sqlite';
+}
+
+/**
+ * The cross-organism skip index (lib/organism_skip_index.php), at the cache root: one file
+ * for all organisms, merged from their term-stats sidecars by scripts/build_search_sidecars.php.
+ */
+function moop_skip_index_file(): string
+{
+    return moop_cache_root() . '/organism_skip.sqlite';
+}
+
+/**
+ * The page-cache residency snapshot the fan-out scheduler orders by (lib/fanout_schedule.php):
+ * scripts/search_residency.py's last answer per organism. Seconds old at most; deleting it
+ * costs one probe.
+ */
+function moop_fanout_residency_file(): string
+{
+    return moop_cache_root() . '/fanout_residency.json';
+}
+
+/**
+ * Which pages of every organism database the page cache held, last time it was warm
+ * (scripts/page_cache_snapshot.py, housekeeping task page_cache_snapshot). Read back after
+ * a reboot or a benchmark empties the cache; deleting it only means the next restore has
+ * nothing to restore until the next snapshot.
+ */
+function moop_page_cache_snapshot_file(): string
+{
+    return moop_cache_root() . '/page_cache_snapshot.bin';
+}
+
+/**
+ * Per-organism search tier (lib/search_tier.php): the organism's FTS index, copied to the
+ * fast volume and ATTACHed beside organism.sqlite at query time.
+ *
+ * Under 'search_tier_path', not the cache root, because the volume is the whole point --
+ * the cache root may sit on the same rotational disk as the databases. Regenerable like
+ * everything here (scripts/build_search_tier.php), and a missing or stale one just means
+ * search reads the index in organism.sqlite. '' when tiering is not configured.
+ */
+function moop_search_tier_file(string $db_path): string
+{
+    $root = rtrim(ConfigManager::getInstance()->getPath('search_tier_path'), '/');
+    if ($root === '') return '';
+    return $root . '/' . basename(dirname($db_path)) . '/search.sqlite';
+}
+
 /**
  * Lock file coordinating the background organism-cache refresh. Lives beside the
  * organism cache it guards. Was: organisms/.organism_cache_lock — moved out with
@@ -517,9 +517,18 @@ function appendScopeFilters(&$sql, &$params, $assembly_accession, $gene_set_name
  * surfaced (and logged) instead of being silently swallowed — a missing FTS index (an
  * organism.sqlite built without build_fts_index.sql) is reported clearly rather
  * than crashing the whole cross-organism search.
+ *
+ * Writes one telemetry record per call (lib/search_telemetry.php). $telemetry says what
+ * the caller knows and this function cannot: 'match' (the FTS expression), 'pool',
+ * 'pool_size', 'matched' (the match estimate), and 'start' (moop_telemetry_start() taken
+ * before the pool was chosen, so the record covers the whole search, not just this query).
+ * 'record' => false leaves the record to the caller, for a query that may be retried: one
+ * search is one record, written once its outcome is known (moop_fts_search_record()).
  */
-function runFtsSearch($dbFile, $sql, $params) {
+function runFtsSearch($dbFile, $sql, $params, array $telemetry = []) {
+    $start       = $telemetry['start'] ?? moop_telemetry_start();
     $max_display = moop_search_results_limit();
+    $error       = false;
     try {
         $dbh  = getDbConnection($dbFile);
         $stmt = $dbh->prepare($sql);
@@ -529,23 +538,52 @@ function runFtsSearch($dbFile, $sql, $params) {
     } catch (PDOException $e) {
         error_log('FTS search failed for ' . $dbFile . ': ' . $e->getMessage());
         $missing_index = stripos($e->getMessage(), 'no such table') !== false;
-        return [
+        $rows  = [];
+        $error = $missing_index ? 'no_index' : 'error';
+    }
+
+    if ($error !== false) {
+        $out = [
             'results' => [],
             'capped'  => false,
-            'warning' => $missing_index
+            'warning' => $error === 'no_index'
                 ? 'Search index not built for this organism yet.'
                 : 'Search error.',
         ];
-    }
-
-    if (count($rows) > $max_display) {
-        return [
+    } elseif (count($rows) > $max_display) {
+        $out = [
             'results' => array_slice($rows, 0, $max_display),
             'capped'  => true,
             'warning' => number_format($max_display) . '+ results found. Use Advanced Filter or add more search terms to refine.',
         ];
+    } else {
+        $out = ['results' => $rows, 'capped' => false, 'warning' => null];
     }
-    return ['results' => $rows, 'capped' => false, 'warning' => null];
+
+    if ($telemetry['record'] ?? true) {
+        moop_fts_search_record($dbFile, $start, $telemetry, $out, $error);
+    }
+    return $out;
+}
+
+/**
+ * The telemetry record for one search, as runFtsSearch() writes it.
+ *
+ * @param array        $out   runFtsSearch()'s result
+ * @param string|false $error false, 'no_index' or 'error'
+ */
+function moop_fts_search_record($dbFile, array $start, array $telemetry, array $out, $error) {
+    moop_telemetry_record('search', $start, [
+        'organism'   => basename(dirname($dbFile)),
+        'term'       => moop_telemetry_term_hash((string)($telemetry['match'] ?? '')),
+        'matched'    => $telemetry['matched'] ?? null,
+        'pool'       => $telemetry['pool'] ?? null,
+        'pool_size'  => $telemetry['pool_size'] ?? null,
+        'tier'       => moop_search_tier_attached($dbFile),
+        'results'    => count($out['results']),
+        'capped'     => $out['capped'],
+        'error'      => $error,
+    ]);
 }
 
 /**
@@ -726,6 +764,7 @@ function moop_annotation_levels($dbFile, $organism = '') {
 function searchFeaturesByNameDescription($search_term, $is_quoted_search, $dbFile, $assembly_accession = '', $gene_set_name = '', $scope_pairs = [], $organism = '') {
     $match = buildFtsMatchExpr($search_term, $is_quoted_search);
     if ($match === '') return ['results' => [], 'capped' => false, 'warning' => null];
+    $start = moop_telemetry_start();
 
     $name_like = '%' . ftsPrimaryTerm($search_term, $is_quoted_search) . '%';
 
@@ -752,6 +791,7 @@ function searchFeaturesByNameDescription($search_term, $is_quoted_search, $dbFil
     // carries description there — so the unfiltered answer is already one row per gene.
     // Retrying unfiltered costs a second query ONLY when the filtered one found nothing.
     $levels = moop_annotation_levels($dbFile, $organism);
+    $fts    = moop_fts_schema($dbFile);   // 'search' when the index is tiered (lib/search_tier.php)
 
     $sql = "SELECT f.feature_uniquename, f.feature_name, f.feature_description,
                    NULL AS annotation_accession, NULL AS annotation_description,
@@ -759,7 +799,7 @@ function searchFeaturesByNameDescription($search_term, $is_quoted_search, $dbFil
                    o.genus, o.species, o.common_name, o.subtype, f.feature_type, f.organism_id,
                    g.genome_accession, g.genome_name, gs.gene_set_name,
                    (f.feature_name LIKE ?) AS name_match
-            FROM feature_search fs
+            FROM $fts.feature_search fs
             JOIN feature   f  ON f.feature_id   = fs.rowid
             JOIN gene_set  gs ON gs.gene_set_id = f.gene_set_id
             JOIN genome    g  ON g.genome_id    = gs.genome_id
@@ -793,12 +833,19 @@ function searchFeaturesByNameDescription($search_term, $is_quoted_search, $dbFil
                         f.feature_uniquename
                LIMIT " . moop_search_query_limit();
 
-    $out = runFtsSearch($dbFile, $sql . $order, $params);
-    if (!empty($out['results'])) return $out;
+    // One search, one telemetry record: the filtered query records only if it is the
+    // answer, and the retry's record covers both queries, from the same start.
+    $telemetry = ['match' => $match, 'pool' => 'name', 'start' => $start];
+    $out = runFtsSearch($dbFile, $sql . $order, $params, $telemetry + ['record' => false]);
+    if (!empty($out['results'])) {
+        moop_fts_search_record($dbFile, $start, $telemetry, $out, false);
+        return $out;
+    }
 
     // Filtered to a level that holds no matching text — see the comment above. Retry with
     // the level filter dropped rather than reporting "no results" for a gene that is there.
-    return runFtsSearch($dbFile, $sql_unfiltered . $order, $params_unfiltered);
+    return runFtsSearch($dbFile, $sql_unfiltered . $order, $params_unfiltered,
+                        ['pool' => 'name_unfiltered'] + $telemetry);
 }
 
 /**
@@ -857,19 +904,81 @@ function moop_fts_type_code($annotation_type) {
  * what makes the re-index a rolling operation rather than a flag day.
  */
 function moop_fts_has_type_column($dbFile) {
+    return stripos(moop_fts_annotation_ddl($dbFile), 'annotation_type_code') !== false;
+}
+
+/**
+ * Does this organism's index carry search_prior (build_fts_index.sql)?
+ *
+ * Same rolling-rebuild rule as moop_fts_has_type_column(): without it the quota pool
+ * takes each type's slice in plain rowid order, exactly as it did before the column.
+ */
+function moop_fts_has_prior_column($dbFile) {
+    return stripos(moop_fts_annotation_ddl($dbFile), 'search_prior') !== false;
+}
+
+/** The CREATE statement of feature_annotation_search, or '' if it cannot be read. */
+function moop_fts_annotation_ddl($dbFile) {
     static $cache = [];
     if (array_key_exists($dbFile, $cache)) return $cache[$dbFile];
     try {
         $dbh  = getDbConnection($dbFile);
-        $stmt = $dbh->query("SELECT sql FROM sqlite_master WHERE name = 'feature_annotation_search'");
-        $ddl  = $stmt ? (string)$stmt->fetchColumn() : '';
-        $cache[$dbFile] = stripos($ddl, 'annotation_type_code') !== false;
+        $fts  = moop_fts_schema($dbFile);
+        $stmt = $dbh->query("SELECT sql FROM $fts.sqlite_master WHERE name = 'feature_annotation_search'");
+        $cache[$dbFile] = $stmt ? (string)$stmt->fetchColumn() : '';
     } catch (PDOException $e) {
-        $cache[$dbFile] = false;
+        $cache[$dbFile] = '';
     }
     return $cache[$dbFile];
 }
 
+/**
+ * Number of search_prior values build_fts_index.sql assigns: 0 (best) .. this - 1.
+ * 2 name states x 3 description-length states.
+ */
+const MOOP_SEARCH_PRIOR_BUCKETS = 6;
+
+/**
+ * The FTS token for one search_prior value. MUST mirror build_fts_index.sql, for the same
+ * reason as moop_fts_type_code(): a mismatch selects nothing and the bucket is skipped.
+ */
+function moop_fts_prior_code($bucket) {
+    return 'aprior' . (int)$bucket . 'z';
+}
+
+/**
+ * bm25() column weights for feature_annotation_search, in column order: name 10,
+ * feature description 5, annotation description 2, accession 3, and 0 for the type code
+ * and the prior. Both zeros are explicit: fts5 weighs an unlisted column 1.0, which let
+ * the prior's tokens score. An index without those columns ignores the extra weights.
+ */
+const MOOP_FTS_BM25_WEIGHTS = '10.0, 5.0, 2.0, 3.0, 0.0, 0.0';
+
+/**
+ * The text columns of feature_annotation_search: everything a user's words may match.
+ * annotation_type_code and search_prior are not among them.
+ */
+const MOOP_FTS_TEXT_COLUMNS = ['feature_name', 'feature_description', 'annotation_description', 'annotation_accession'];
+
+/**
+ * A buildFtsMatchExpr() expression pinned to the text columns, for feature_annotation_search.
+ *
+ * EVERY MATCH against that table must go through this. The type codes ('atype...z') and
+ * the priors ('aprior0z'..'aprior5z') are ordinary tokens to FTS5, and every unquoted
+ * search word is a prefix, so unpinned, "at" matches every row through its type code and
+ * "ap" -- a real gene-symbol prefix -- every row through its prior: the whole table,
+ * cut to 2,500 arbitrary rows. The quota pool always pinned; the bm25, rowid and filtered
+ * paths did not. Pinning also keeps those columns out of bm25(): FTS5 applies a column
+ * filter to the phrase counts behind IDF as well as to the match, and the in-PHP ranker
+ * (moop_bm25_rank()) counts only these columns for the same reason.
+ *
+ * The columns exist in every index build_fts_index.sql has ever written, so this is safe
+ * on databases indexed before the type code and the prior existed.
+ */
+function moop_fts_text_match($match) {
+    return '{' . implode(' ', MOOP_FTS_TEXT_COLUMNS) . '} : (' . $match . ')';
+}
+
 /**
  * Annotation types present in this organism, in the order curated in annotation_config.json.
  *
@@ -902,6 +1011,192 @@ function moop_curated_annotation_types($dbFile) {
     return $cache[$dbFile] = $ordered;
 }
 
+/**
+ * Quota weight per annotation type for the search pool, in curated order.
+ *
+ * Read from annotation_config.json: annotation_types.<Type>.search_quota, a relative
+ * weight. Absent means 1, so an unconfigured site gets the equal split the pool has always
+ * used. A weight of 2 takes twice the share of a weight of 1; 0 means "leftover only" --
+ * the type is still searchable, but only fills capacity the weighted types left unused.
+ * That is the lever for a type like ProtNLM, which the curated order already ranks low
+ * and which bm25 used to let fill 74 of helicase's top 100: turn it down without making it
+ * unfindable. A negative or non-numeric value is a typo, and is read as the default rather
+ * than silently removing the type.
+ *
+ * @return array type => float weight, in moop_curated_annotation_types() order
+ */
+function moop_search_type_weights($dbFile) {
+    static $cfg = null;
+    if ($cfg === null) {
+        global $config;
+        $cfg = loadJsonFile($config->getPath('metadata_path') . '/annotation_config.json', []);
+    }
+
+    $weights = [];
+    foreach (moop_curated_annotation_types($dbFile) as $type) {
+        $q = $cfg['annotation_types'][$type]['search_quota'] ?? 1;
+        $weights[$type] = (is_numeric($q) && $q >= 0) ? (float)$q : 1.0;
+    }
+    return $weights;
+}
+
+/**
+ * Split $capacity pool slots across types in proportion to their weights.
+ *
+ * Largest remainder, so the parts always sum to exactly $capacity -- a ceil() per type
+ * over-fills and a floor() per type leaves slots no arm asks for. Remainder ties go to the
+ * type earlier in the curated order (PHP 8 sorts are stable). A zero weight never receives
+ * a slot. Pure function; tests/smoke_tests.php covers it directly.
+ *
+ * @param  array $weights  type => weight (>= 0), in curated order
+ * @param  int   $capacity slots to hand out
+ * @return array type => int slots, same keys and order as $weights
+ */
+function moop_allocate_type_quotas(array $weights, $capacity) {
+    $alloc = array_fill_keys(array_keys($weights), 0);
+    $total = array_sum($weights);
+    if ($capacity < 1 || $total <= 0) return $alloc;
+
+    $remainder = [];
+    $used = 0;
+    foreach ($weights as $type => $w) {
+        $exact = $capacity * $w / $total;
+        $alloc[$type] = (int) floor($exact);
+        $remainder[$type] = $exact - $alloc[$type];
+        $used += $alloc[$type];
+    }
+    uasort($remainder, function ($a, $b) { return $b <=> $a; });
+    foreach (array_keys($remainder) as $type) {
+        if ($used >= $capacity) break;
+        if ($weights[$type] <= 0) continue;
+        $alloc[$type]++;
+        $used++;
+    }
+    return $alloc;
+}
+
+/**
+ * Choose the search pool by per-type quota, redistributing whatever a type cannot use.
+ *
+ * Replaces bm25() as the pool selector on rebuilt databases. bm25 reads a scattered
+ * docsize entry per MATCHED document: measured on Rhinolophus it was 24.7 MB of helicase's
+ * 40.1 and 51.1 of binding's 73.5. Slices ordered by rowid read none of that, and cost
+ * stops scaling with term frequency -- binding matches 322,361 documents and costs about
+ * what ubiquitin's 75,512 do. 1.6-4.5x less I/O, precision unchanged at 100/100
+ * (notes/bench/quota.py, notes/SEARCH_COST_MODEL_2026-07-31.md).
+ *
+ * ROUNDS. Each round splits the remaining capacity across the types still active, by
+ * weight (moop_allocate_type_quotas()), and asks each for its share in ONE UNION ALL
+ * query, continuing from the last rowid that type returned. A type that comes back short
+ * has no more matches and drops out; its unused share is what the next round hands to the
+ * others. Every round either fills the pool or exhausts at least one type, so there are
+ * at most count($weights) rounds, and usually one or two: a term that matches in only two
+ * of nine types fills its pool in round two instead of coming back with 2/9 of it.
+ *
+ * This replaces the old fixed ceil(pool/types) quota plus a rowid-ordered top-up arm. The
+ * top-up did refill a starved pool, but by rowid ACROSS types, so its rows went to
+ * whichever type happened to sit lowest in the file rather than in proportion to the
+ * curated weights.
+ *
+ * Zero-weight types run as a second tier: they share only what the weighted types could
+ * not fill. Rows whose type carries no code the config knows (a blank annotation_type)
+ * are reached by a last plain-match pass, which only runs when every type is exhausted and
+ * is therefore cheap by construction: the whole match set is then smaller than the pool.
+ *
+ * STATIC PRIOR. On an index carrying search_prior, each type's slice is taken in prior
+ * order -- named genes with a readable description first, bare accessions on unnamed
+ * features last (build_fts_index.sql) -- and by rowid only within one prior value. That is
+ * the part of bm25's job worth keeping: it put useful rows in the pool ahead of noise,
+ * but paid a scattered _docsize read per matched document to do it. The prior is one more
+ * token ANDed inside the index, so it costs a doclist read and nothing else. The sub-arms
+ * of one type run together and are cut to the type's share in prior order, so each type
+ * keeps its quota; the cursor is (prior, rowid), and a type is exhausted only once every
+ * prior value it has left comes back short.
+ *
+ * The type filter is a CODE token (moop_fts_type_code()), and the text filter is pinned to
+ * the text columns (moop_fts_text_match()), so a query term can never match a type code or
+ * a prior.
+ *
+ * @return int[] feature_annotation ids (FTS rowids), at most $pool_size
+ * @throws PDOException on a database error; the caller falls back to the bm25 pool
+ */
+function moop_fts_quota_pool($dbFile, $match, array $weights, $pool_size) {
+    $dbh   = getDbConnection($dbFile);
+    $fts   = moop_fts_schema($dbFile);
+    $taken = [];
+    $types = array_keys($weights);
+    $after = array_fill_keys($types, 0);   // cursor: last rowid taken, within...
+    $prior = array_fill_keys($types, 0);   // ...this search_prior value
+    $done  = [];
+    $last_prior = moop_fts_has_prior_column($dbFile) ? MOOP_SEARCH_PRIOR_BUCKETS - 1 : 0;
+
+    $tiers = [
+        array_filter($weights, function ($w) { return $w > 0; }),
+        array_map(function () { return 1.0; }, array_filter($weights, function ($w) { return $w <= 0; })),
+    ];
+    foreach ($tiers as $tier) {
+        while (count($taken) < $pool_size) {
+            $active = array_diff_key($tier, $done);
+            if (empty($active)) break;
+
+            $alloc  = array_filter(moop_allocate_type_quotas($active, $pool_size - count($taken)));
+            $arms   = [];
+            $params = [];
+            foreach ($alloc as $type => $n) {
+                // LIMIT, the prior and the rowid floor are interpolated, not bound: PDO can
+                // hand a bound value to SQLite as a string, and only the MATCH expression
+                // here comes from user input. All are integers this function computed.
+                $i = array_search($type, $types, true);
+                $n = (int)$n;
+                $sub = [];
+                for ($b = $prior[$type]; $b <= $last_prior; $b++) {
+                    $floor = ($b === $prior[$type]) ? (int)$after[$type] : 0;
+                    $sub[] = "SELECT * FROM (SELECT rowid AS rid, $b AS bk
+                                FROM $fts.feature_annotation_search
+                                WHERE feature_annotation_search MATCH ? AND rowid > $floor
+                                ORDER BY rowid LIMIT $n)";
+                    $params[] = '{annotation_type_code} : ' . moop_fts_type_code($type)
+                              . ($last_prior > 0 ? ' AND {search_prior} : ' . moop_fts_prior_code($b) : '')
+                              . ' AND ' . moop_fts_text_match($match);
+                }
+                $arms[] = "SELECT * FROM (SELECT rid, $i AS arm, bk FROM ("
+                        . implode(' UNION ALL ', $sub) . ") ORDER BY bk, rid LIMIT $n)";
+            }
+
+            $got  = array_fill_keys(array_keys($alloc), 0);
+            $stmt = $dbh->prepare(implode("\n UNION ALL\n", $arms));
+            $stmt->execute($params);
+            while ($row = $stmt->fetch(PDO::FETCH_NUM)) {
+                // The cursor is the greatest (prior, rowid) taken for the type.
+                $type = $types[(int)$row[1]];
+                $rid  = (int)$row[0];
+                $bk   = (int)$row[2];
+                $taken[$rid] = true;
+                if ($bk > $prior[$type] || ($bk === $prior[$type] && $rid > $after[$type])) {
+                    $prior[$type] = $bk;
+                    $after[$type] = $rid;
+                }
+                $got[$type]++;
+            }
+            foreach ($alloc as $type => $n) {
+                if ($got[$type] < $n) $done[$type] = true;
+            }
+        }
+    }
+
+    if (count($taken) < $pool_size) {
+        $stmt = $dbh->prepare("SELECT rowid FROM $fts.feature_annotation_search
+                               WHERE feature_annotation_search MATCH ?
+                               ORDER BY rowid LIMIT " . (int)$pool_size);
+        $stmt->execute([moop_fts_text_match($match)]);
+        while (($rid = $stmt->fetchColumn()) !== false && count($taken) < $pool_size) {
+            $taken[(int)$rid] = true;
+        }
+    }
+
+    return array_keys($taken);
+}
+
 /**
  * Search features and annotations by keyword or quoted phrase (the main search).
  * Used by annotation_search_ajax.php. Backed by the feature_annotation_search FTS
@@ -915,11 +1210,17 @@ function moop_curated_annotation_types($dbFile) {
  * @param string $assembly_accession Optional single-assembly scope
  * @param string $gene_set_name      Optional single-gene-set scope
  * @param array  $scope_pairs        Optional [{assembly, gene_set}] scope (overrides above)
- * @return array ['results' => rows, 'capped' => bool, 'warning' => string|null]
+ * @param array|null $union_pool     Optional ['rowids' => int[], 'gene_set_ids' => int[]]: a
+ *                                   pool already ranked by the cross-organism union index
+ *                                   (lib/union_index.php). Skips this database's own pool.
+ * @return array ['results' => rows, 'capped' => bool, 'warning' => string|null,
+ *                'estimated_matches' => int|null (upper bound on the term's matches across
+ *                the whole organism, before any filter; null without a term-stats sidecar)]
  */
-function searchFeaturesAndAnnotations($search_term, $is_quoted_search, $dbFile, $source_names = [], $assembly_accession = '', $gene_set_name = '', $scope_pairs = []) {
+function searchFeaturesAndAnnotations($search_term, $is_quoted_search, $dbFile, $source_names = [], $assembly_accession = '', $gene_set_name = '', $scope_pairs = [], $union_pool = null) {
     $match = buildFtsMatchExpr($search_term, $is_quoted_search);
     if ($match === '') return ['results' => [], 'capped' => false, 'warning' => null];
+    $start = moop_telemetry_start();
 
     $name_like = '%' . ftsPrimaryTerm($search_term, $is_quoted_search) . '%';
     $date_expr = moop_annotation_date_expr($dbFile);
@@ -943,8 +1244,55 @@ function searchFeaturesAndAnnotations($search_term, $is_quoted_search, $dbFile,
                  || !empty($scope_pairs) || !empty($source_names));
 
     $quota_pool = false;
-
-    if (!$filtered) {
+    $rowid_pool = false;
+    $pool       = 'filtered';   // which pool ran, for the telemetry record
+    $pool_size  = null;
+    $estimate   = moop_fts_estimate_matches($dbFile, $search_term, $is_quoted_search);
+    $fts        = moop_fts_schema($dbFile);   // 'search' when the index is tiered (lib/search_tier.php)
+
+    if (!$filtered && $union_pool !== null) {
+        // UNION POOL -- the ranking already happened, once, in union.sqlite, so this
+        // database does no bm25 pass and reads no _docsize at all. What is left here is the
+        // row fetch for the survivors, which is the part that has to be per-organism.
+        //
+        // The union index holds annotation text only (feature names and descriptions are
+        // per-organism and do not deduplicate), so a row that needs the gene's own fields to
+        // match is not in the handed-over pool: a gene matched by NAME alone, and a split
+        // query -- "Nv123 kinase", Nv123 in feature_name and kinase in the annotation --
+        // which the union index cannot match at all. The second arm recovers both from this
+        // organism's own index: the full pinned match, narrowed to rows where some term hits
+        // feature_name or feature_description (every other match is annotation-only, which
+        // is what the union index ranked), skipping rows already pooled. Finding matches
+        // costs 0.4-0.7 MB whatever the term, and it is ordered by rowid, not bm25, so it
+        // adds none of the cost the union index removes.
+        //
+        // The gene-set filter is the access control, not a scope: union postings are
+        // already limited to accessible ORGANISMS, and this is what keeps a restricted
+        // gene set inside an otherwise accessible organism out. Fails closed -- an empty
+        // list matches nothing.
+        $pool_size = (int) (moop_search_results_limit() * 2);
+        $rid_list  = implode(',', array_map('intval', $union_pool['rowids'] ?: [0]));
+        $gs_list   = implode(',', array_map('intval', $union_pool['gene_set_ids'] ?: [0]));
+        $any_term  = $is_quoted_search ? $match : str_replace(' AND ', ' OR ', $match);
+        $sql = "WITH pool(rid) AS (
+                    SELECT feature_annotation_id FROM feature_annotation
+                    WHERE feature_annotation_id IN ($rid_list)
+                    UNION
+                    SELECT rid FROM (SELECT rowid AS rid
+                                     FROM $fts.feature_annotation_search
+                                     WHERE feature_annotation_search MATCH ?
+                                       AND rowid NOT IN ($rid_list)
+                                     ORDER BY rowid
+                                     LIMIT $pool_size)
+                )
+                SELECT $columns
+                FROM pool
+                " . str_replace('%ROWID%', 'pool.rid', $joins) . "
+                WHERE f.gene_set_id IN ($gs_list)";
+        $params = [moop_fts_text_match($match) . ' AND {feature_name feature_description} : (' . $any_term . ')',
+                   $name_like];
+        $pool   = 'union';
+    } elseif (!$filtered) {
         // FAST PATH — choose the pool inside the FTS index, then fetch only the survivors.
         //
         // The general shape below joins EVERY matched row and sorts the lot, so
@@ -958,56 +1306,58 @@ function searchFeaturesAndAnnotations($search_term, $is_quoted_search, $dbFile,
         // limited to one annotation source could come back near-empty because the pool
         // filled up with rows from other sources. Filtered searches take the general
         // shape, where the filter narrows before ranking.
-        $types = moop_fts_has_type_column($dbFile) ? moop_curated_annotation_types($dbFile) : [];
-
-        if (!empty($types)) {
-            // QUOTA POOL. Take a slice per annotation type, in the curated order, each slice
-            // ordered by rowid -- which is free -- instead of ranking the whole match set
-            // with bm25(), which is not. Measured on Rhinolophus: bm25 was 24.7 MB of
-            // helicase's 40.1 and 51.1 of binding's 73.5, because it reads a scattered
-            // docsize entry per MATCHED document. The quota pool reads none of that, and
-            // cost stops scaling with term frequency: binding matches 322,361 documents and
-            // now costs about what ubiquitin's 75,512 do. 1.6-4.5x less I/O, precision
-            // unchanged at 100/100. See notes/SEARCH_COST_MODEL_2026-07-31.md.
-            //
-            // Pool is 1.5x the cap, not 2x: measured better on BOTH axes than 2x (binding
-            // 23.9 -> 19.7 MB with the same six types on page one). Below 1.5x the type
-            // count starts dropping, which is the thing this exists to protect.
-            $pool_size = max(1, (int) round(moop_search_results_limit() * 1.5));
-            $per_type  = (int) ceil($pool_size / count($types));
-            $text_cols = '{feature_name feature_description annotation_description annotation_accession}';
-
-            $arms = [];
-            $params = [];
-            foreach (array_values($types) as $i => $type) {
-                // LIMIT is interpolated, not bound: PDO can hand a bound value to SQLite as
-                // a string, and only the MATCH expression here comes from user input. Both
-                // $i and $per_type are integers derived from config.
-                $arms[] = "SELECT rid, arm FROM (SELECT rowid AS rid, $i AS arm
-                             FROM feature_annotation_search
-                             WHERE feature_annotation_search MATCH ?
-                             ORDER BY rowid LIMIT $per_type)";
-                $params[] = '{annotation_type_code} : ' . moop_fts_type_code($type)
-                          . ' AND ' . $text_cols . ' : (' . $match . ')';
+        $weights = moop_fts_has_type_column($dbFile) ? moop_search_type_weights($dbFile) : [];
+
+        // PLAN FROM THE MATCH ESTIMATE (lib/fts_term_stats.php), read from a sidecar without
+        // touching this database. The pools below exist because ranking a LARGE match set
+        // is what costs; when the whole match set fits in the quota pool anyway, every pool
+        // holds every matching row, slicing by type buys no diversity, and bm25 over a few
+        // hundred rows is cheap -- so a narrow term ("piwi", 304 rows) keeps bm25 order
+        // even on a rebuilt database. A broad one ("binding", 322,361) goes to the quota
+        // pool as before, or, where there is no type column and no sidecar to rank it in
+        // PHP, to a rowid pool rather than a bm25() pass over the lot. The estimate is an
+        // upper bound, so "fits" is never wrong in the direction that costs -- for the
+        // PINNED match only. The sidecar does not count the type and prior tokens, so every
+        // pool below must match through moop_fts_text_match(); an unpinned "ap" matched the
+        // whole table through its priors while the estimate said a handful, skipped the
+        // quota pool, and ran bm25() over every row. No sidecar -> null -> the pools are
+        // chosen exactly as they were before it existed.
+        $quota_size = max(1, (int) round(moop_search_results_limit() * 1.5));
+        $whole_set  = $estimate !== null && $estimate <= $quota_size;
+
+        // QUOTA POOL. A slice per annotation type, in the curated order, each slice ordered
+        // by rowid -- which is free -- instead of ranking the whole match set with bm25(),
+        // which is not. See moop_fts_quota_pool() for the measurements and the quota rules.
+        //
+        // Pool is 1.5x the cap, not 2x: measured better on BOTH axes than 2x (binding
+        // 23.9 -> 19.7 MB with the same six types on page one). Below 1.5x the type count
+        // starts dropping, which is the thing this exists to protect.
+        $rowids = null;
+        if (!empty($weights) && !$whole_set) {
+            $pool_size = $quota_size;
+            try {
+                $rowids = moop_fts_quota_pool($dbFile, $match, $weights, $pool_size);
+            } catch (PDOException $e) {
+                // Let the bm25 pool below run instead: if the index is genuinely broken it
+                // fails there too, and runFtsSearch() reports it the usual way.
+                error_log('FTS quota pool failed for ' . $dbFile . ': ' . $e->getMessage());
+                $rowids = null;
             }
-            // Top-up arm, deliberately last. Without it a term whose matches all sit in one
-            // type would come back with only pool_size/count(types) rows -- a per-type quota
-            // starves a single-type result. MIN(arm) below keeps the balanced arms ahead of
-            // it, so the top-up only ever fills space the quotas could not.
-            $arms[] = "SELECT rid, arm FROM (SELECT rowid AS rid, 9999 AS arm
-                         FROM feature_annotation_search
-                         WHERE feature_annotation_search MATCH ?
-                         ORDER BY rowid LIMIT $pool_size)";
-            $params[] = $text_cols . ' : (' . $match . ')';
-
-            $sql = "WITH cand(rid, arm) AS (\n" . implode("\n UNION ALL\n", $arms) . "\n),
-                    pool AS (SELECT rid FROM cand GROUP BY rid ORDER BY MIN(arm) LIMIT $pool_size)
+        }
+
+        if ($rowids !== null) {
+            $rid_list = implode(',', array_map('intval', $rowids ?: [0]));
+            $sql = "WITH pool(rid) AS (
+                        SELECT feature_annotation_id FROM feature_annotation
+                        WHERE feature_annotation_id IN ($rid_list)
+                    )
                     SELECT $columns
                     FROM pool
                     " . str_replace('%ROWID%', 'pool.rid', $joins) . "
                     WHERE 1=1";
-            $params[] = $name_like;
+            $params = [$name_like];
             $quota_pool = true;
+            $pool = 'quota';
         } else {
             // Pre-rebuild databases keep the bm25 pool. Pool is TWICE the cap here, not
             // the cap: at 1x the top 100 already diverged for "transpos", because bm25
@@ -1015,26 +1365,73 @@ function searchFeaturesAndAnnotations($search_term, $is_quoted_search, $dbFile,
             // whatever it hands over. (The quota pool above wants 1.5x, not 2x -- it is
             // not ordering by relevance, so it needs breadth rather than depth.)
             $pool_size = (int) (moop_search_results_limit() * 2);
-            $sql = "WITH pool AS (
-                        SELECT rowid AS rid,
-                               bm25(feature_annotation_search, 10.0, 5.0, 2.0, 3.0, 0.0) AS rank
-                        FROM feature_annotation_search
-                        WHERE feature_annotation_search MATCH ?
-                        ORDER BY rank
-                        LIMIT $pool_size
-                    )
-                    SELECT $columns
-                    FROM pool
-                    " . str_replace('%ROWID%', 'pool.rid', $joins) . "
-                    WHERE 1=1";
-            $params = [$match, $name_like];
+
+            // Same pool, ranked in PHP when the organism has a docsize sidecar: identical
+            // scores, but the per-document lengths come from one flat array read in order
+            // instead of the scattered _docsize b-tree (lib/fts_docsize.php). rank is the
+            // position in bm25 order -- only ever compared, so it orders exactly as the
+            // score would.
+            $ranked = null;
+            try {
+                $ranked = moop_bm25_sidecar_pool($dbFile, $search_term, $is_quoted_search,
+                                                 array_map('floatval', explode(',', MOOP_FTS_BM25_WEIGHTS)),
+                                                 $pool_size);
+            } catch (PDOException $e) {
+                error_log('FTS sidecar bm25 failed for ' . $dbFile . ': ' . $e->getMessage());
+                $ranked = null;
+            }
+
+            if ($ranked === null && $estimate !== null && $estimate > $pool_size) {
+                // ROWID POOL: a known-broad term on a database with neither a type column
+                // nor a usable docsize sidecar. bm25() here would read a scattered _docsize
+                // page per matched row; the first rows by rowid cost the match alone. The
+                // tiers below order it, with source interleaving as on the quota pool.
+                $sql = "WITH pool(rid) AS (
+                            SELECT rowid FROM $fts.feature_annotation_search
+                            WHERE feature_annotation_search MATCH ?
+                            ORDER BY rowid
+                            LIMIT $pool_size
+                        )
+                        SELECT $columns
+                        FROM pool
+                        " . str_replace('%ROWID%', 'pool.rid', $joins) . "
+                        WHERE 1=1";
+                $params = [moop_fts_text_match($match), $name_like];
+                $rowid_pool = true;
+                $pool = 'rowid';
+            } elseif ($ranked !== null) {
+                $values = [];
+                foreach ($ranked as $rid => $pos) $values[] = '(' . (int)$rid . ',' . (int)$pos . ')';
+                $sql = "WITH pool(rid, rank) AS (VALUES " . ($values ? implode(',', $values) : '(0,0)') . ")
+                        SELECT $columns
+                        FROM pool
+                        " . str_replace('%ROWID%', 'pool.rid', $joins) . "
+                        WHERE 1=1";
+                $params = [$name_like];
+                $pool = 'bm25_sidecar';
+            } else {
+                $sql = "WITH pool AS (
+                            SELECT rowid AS rid,
+                                   bm25(feature_annotation_search, " . MOOP_FTS_BM25_WEIGHTS . ") AS rank
+                            FROM $fts.feature_annotation_search
+                            WHERE feature_annotation_search MATCH ?
+                            ORDER BY rank
+                            LIMIT $pool_size
+                        )
+                        SELECT $columns
+                        FROM pool
+                        " . str_replace('%ROWID%', 'pool.rid', $joins) . "
+                        WHERE 1=1";
+                $params = [moop_fts_text_match($match), $name_like];
+                $pool = 'bm25';
+            }
         }
     } else {
         $sql = "SELECT $columns
-                FROM feature_annotation_search fas
+                FROM $fts.feature_annotation_search fas
                 " . str_replace('%ROWID%', 'fas.rowid', $joins) . "
                 WHERE feature_annotation_search MATCH ?";
-        $params = [$name_like, $match];
+        $params = [$name_like, moop_fts_text_match($match)];
 
         appendScopeFilters($sql, $params, $assembly_accession, $gene_set_name, $scope_pairs);
 
@@ -1073,9 +1470,13 @@ function searchFeaturesAndAnnotations($search_term, $is_quoted_search, $dbFile,
     // 8th of 10. With no score the tiers below decide alone, which is what they were
     // written to do. Trailing comma included/omitted here so the ORDER BY stays valid
     // either way -- an empty $rank_expr must not leave a dangling comma.
+    //
+    // The union pool has no score here either: union.sqlite ranked it, and its bm25 is not
+    // comparable across databases anyway, so the tiers decide the order exactly as they do
+    // on the quota pool. Nor has the rowid pool, for the quota pool's reason.
     $rank_expr = $filtered
-        ? 'bm25(feature_annotation_search, 10.0, 5.0, 2.0, 3.0, 0.0),'
-        : ($quota_pool ? '' : 'pool.rank,');
+        ? 'bm25(feature_annotation_search, ' . MOOP_FTS_BM25_WEIGHTS . '),'
+        : (($quota_pool || $rowid_pool || $union_pool !== null) ? '' : 'pool.rank,');
 
     // Beneath the literal tier, the same test against the STEM of the typed word, so a
     // plural search still credits the singular records that FTS5 actually matched. See
@@ -1130,14 +1531,18 @@ function searchFeaturesAndAnnotations($search_term, $is_quoted_search, $dbFile,
     $params[] = $name_like;
     if ($stem_like !== '') $params[] = $stem_like;
 
-    $out = runFtsSearch($dbFile, $sql, $params);
+    $out = runFtsSearch($dbFile, $sql, $params, [
+        'match' => $match, 'pool' => $pool, 'pool_size' => $pool_size,
+        'matched' => $estimate, 'start' => $start,
+    ]);
 
-    // Only on the quota path: the bm25 pool does its own (accidental) source spreading,
+    // Only on the quota and rowid paths: the bm25 pool does its own (accidental) source spreading,
     // and the filtered path is already narrowed to what the user asked for, so neither
     // wants this. Applied after the display cap so it reorders only what is shown.
-    if ($quota_pool && !empty($out['results'])) {
+    if (($quota_pool || $rowid_pool) && !empty($out['results'])) {
         $out['results'] = moop_interleave_by_source($out['results'], MOOP_SEARCH_SOURCE_BLOCK);
     }
+    $out['estimated_matches'] = $estimate;
     return $out;
 }
 
@@ -1228,6 +1633,9 @@ function searchFeaturesByUniquenameForSearch($search_term, $dbFile, $organism_na
 // the ID search would fatal the moment a hit needed lifting. Same reasoning, and the same
 // idempotent require_once, as lib/moopmart_functions.php:20.
 require_once __DIR__ . '/parent_functions.php';
+require_once __DIR__ . '/fts_docsize.php';   // moop_bm25_sidecar_pool(), for the bm25 pool
+require_once __DIR__ . '/fts_term_stats.php'; // moop_fts_estimate_matches(), for choosing the pool
+require_once __DIR__ . '/search_telemetry.php'; // moop_telemetry_record(), from runFtsSearch()
 
 /**
  * Collapse ID-search hits onto ONE level per gene, by RESOLVING rather than filtering.
@@ -0,0 +1,148 @@
+<?php
+/**
+ * Fan-out schedule — which organisms of a cross-organism request are warm, and in what
+ * order to run them.
+ *
+ * Cross-organism search and the MOOPmart preview send one request per organism, and used
+ * to send them five at a time in name order. What an organism's request costs is decided
+ * almost entirely by whether its pages are in the page cache: warm, tens of milliseconds
+ * of CPU; cold, seconds of seeks on sdb. And sdb is seek-saturated -- fifteen in flight
+ * instead of five gave 1.12x -- so more concurrency does not help the cold ones, while
+ * name order routinely put a warm organism behind three cold ones and left the largest
+ * cold database to start last and finish long after everything else.
+ *
+ * The residency is known before anything runs: mincore(2) reports it without reading a
+ * page (scripts/search_residency.py). So the plan is
+ *
+ *   warm first    resident organisms answer at once, in the order asked
+ *   cold after,   LARGEST first -- the longest jobs start at t=0 and run while the warm
+ *                 ones are answered, instead of being the tail of the run
+ *
+ * and js/modules/fanout-scheduler.js runs it as two lanes -- warm and cold, each with its
+ * own in-flight limit sized from the latencies it observes -- so the cold lane stays at
+ * the one or two requests the disk can actually serve while the warm lane drains beside it.
+ *
+ * The probe is a subprocess (PHP cannot call mincore), so its answer is kept for
+ * MOOP_FANOUT_RESIDENCY_TTL seconds in one snapshot at the cache root: a burst of searches
+ * probes once. An accelerator, never a dependency: no python3, a probe that times out, or
+ * an unwritable cache all mean "residency unknown", and unknown organisms are scheduled
+ * as cold -- the same requests as before, only ordered.
+ */
+
+require_once __DIR__ . '/cache_paths.php';
+
+/** Fraction of an organism's pages resident for it to count as warm. */
+const MOOP_FANOUT_WARM_FRACTION = 0.9;
+
+/** Seconds a residency answer is used before the organism is probed again. */
+const MOOP_FANOUT_RESIDENCY_TTL = 30;
+
+/** Seconds the probe may take before the request goes ahead without it. */
+const MOOP_FANOUT_PROBE_TIMEOUT = 2;
+
+/**
+ * Page-cache residency of some organism databases, from the snapshot, probing the ones it
+ * has no recent answer for.
+ *
+ * @param array $dbs organism => organism.sqlite path
+ * @return array organism => ['search' => ?float, 'search_bytes' => ?int, 'file' => float,
+ *               'file_bytes' => int, 'checked_at' => int] -- organisms with no answer are left out
+ */
+function moop_fanout_residency(array $dbs): array
+{
+    $file     = moop_fanout_residency_file();
+    $snapshot = json_decode((string)@file_get_contents($file), true);
+    if (!is_array($snapshot)) $snapshot = [];
+
+    $now   = time();
+    $stale = [];
+    foreach ($dbs as $org => $path) {
+        if ($now - (int)($snapshot[$org]['checked_at'] ?? 0) >= MOOP_FANOUT_RESIDENCY_TTL) {
+            $stale[$org] = $path;
+        }
+    }
+
+    if ($stale) {
+        $probed = moop_fanout_probe($stale);
+        foreach ($probed as $org => $entry) {
+            $snapshot[$org] = $entry + ['checked_at' => $now];
+        }
+        if ($probed && moop_ensure_cache_dir(dirname($file))) {
+            $tmp = "$file.tmp." . getmypid();
+            if (@file_put_contents($tmp, json_encode($snapshot)) === false || !@rename($tmp, $file)) {
+                @unlink($tmp);
+            }
+        }
+    }
+
+    return array_intersect_key($snapshot, $dbs);
+}
+
+/**
+ * Run scripts/search_residency.py over some databases. [] when it cannot run or answer in
+ * time.
+ */
+function moop_fanout_probe(array $dbs): array
+{
+    static $python = null;
+    if ($python === null) {
+        $python = trim((string)@shell_exec('command -v python3 2>/dev/null'));
+    }
+    $script = realpath(dirname(__DIR__) . '/scripts/search_residency.py');
+    if ($python === '' || !$script) return [];
+
+    $cmd = 'timeout ' . MOOP_FANOUT_PROBE_TIMEOUT . ' ' . escapeshellarg($python) . ' ' . escapeshellarg($script)
+         . ' --cache-root ' . escapeshellarg(moop_cache_root())
+         . ' ' . implode(' ', array_map('escapeshellarg', array_values($dbs))) . ' 2>/dev/null';
+    $out = [];
+    @exec($cmd, $out, $rc);
+    $report = $rc === 0 ? json_decode(implode("\n", $out), true) : null;
+    if (!is_array($report)) {
+        error_log('MOOP fan-out schedule: residency probe failed (exit ' . $rc . ')');
+        return [];
+    }
+    return array_intersect_key($report, $dbs);
+}
+
+/**
+ * The order to run a fan-out in.
+ *
+ * Warm organisms first, in the order given. Then the cold ones and those with no answer:
+ * largest first when the requests run in parallel, so the longest start earliest and
+ * overlap everything else; smallest first when they run one at a time
+ * (tools/annotation_search_stream.php), where nothing overlaps and shortest-first gets the
+ * most answers to the page soonest.
+ *
+ * @param array  $dbs       organism => organism.sqlite path, in the order asked
+ * @param string $kind      'search' (the FTS pages a search reads first) or 'file' (the
+ *                          whole database, for the MOOPmart preview)
+ * @param array  $residency moop_fanout_residency($dbs)
+ * @return array list of ['organism', 'resident' => ?float, 'bytes' => int, 'warm' => bool]
+ */
+function moop_fanout_plan(array $dbs, string $kind, array $residency, bool $parallel = true): array
+{
+    $warm = $cold = [];
+    foreach ($dbs as $org => $path) {
+        $r = $residency[$org] ?? null;
+        // A database with no search page list yet is judged on the whole file.
+        $resident = $r === null ? null : ($kind === 'search' && $r['search'] !== null ? $r['search'] : $r['file']);
+        $bytes    = $r === null ? (int)@filesize($path)
+                  : (int)($kind === 'search' && $r['search_bytes'] !== null ? $r['search_bytes'] : $r['file_bytes']);
+        $entry = [
+            'organism' => $org,
+            'resident' => $resident === null ? null : (float)$resident,
+            'bytes'    => $bytes,
+            'warm'     => $resident !== null && $resident >= MOOP_FANOUT_WARM_FRACTION,
+        ];
+        if ($entry['warm']) $warm[] = $entry;
+        else                $cold[] = $entry;
+    }
+
+    // Cold cost is the bytes still to be read, not the size.
+    usort($cold, function ($a, $b) use ($parallel) {
+        $ca = $a['bytes'] * (1 - ($a['resident'] ?? 0));
+        $cb = $b['bytes'] * (1 - ($b['resident'] ?? 0));
+        return ($parallel ? $cb <=> $ca : $ca <=> $cb) ?: strcmp($a['organism'], $b['organism']);
+    });
+    return array_merge($warm, $cold);
+}
@@ -31,8 +31,13 @@
  *
  * Indexes are built by the pipeline (scripts/process_one_geneset.sh, beside makeblastdb).
  * Callers must handle their absence — see moop_fasta_index_available().
+ *
+ * Each lookup that reaches the FASTA writes a 'sequence' telemetry record
+ * (lib/search_telemetry.php): ids asked for and found, wall time, bytes read from disk.
  */
 
+require_once __DIR__ . '/search_telemetry.php';
+
 /**
  * Is there a usable index for this FASTA?
  *
@@ -104,6 +109,7 @@ function moop_fasta_fetch(string $fasta, array $ids): array
     $fh = @fopen($fasta, 'rb');
     if ($fh === false) return [];
 
+    $start = moop_telemetry_start();
     $out = [];
     foreach ($ids as $id) {                          // preserve caller order
         if (!isset($idx[$id])) continue;
@@ -125,6 +131,7 @@ function moop_fasta_fetch(string $fasta, array $ids): array
         $out[$id] = $seq;
     }
     fclose($fh);
+    moop_fasta_telemetry($fasta, $start, count($ids), count($out));
     return $out;
 }
 
@@ -188,6 +195,7 @@ function moop_fasta_fetch_with_headers(string $fasta, array $ids): array
     $fh = @fopen($fasta, 'rb');
     if ($fh === false) return [];
 
+    $start = moop_telemetry_start();
     $out = [];
     foreach ($ids as $id) {
         if (!isset($idx[$id])) continue;
@@ -219,9 +227,21 @@ function moop_fasta_fetch_with_headers(string $fasta, array $ids): array
         $out[$id] = ['seq' => $seq, 'header' => ($hdr !== '' ? $hdr : $id)];
     }
     fclose($fh);
+    moop_fasta_telemetry($fasta, $start, count($ids), count($out));
     return $out;
 }
 
+/** The 'sequence' telemetry record for one lookup against one FASTA. */
+function moop_fasta_telemetry(string $fasta, array $start, int $asked, int $found): void
+{
+    moop_telemetry_record('sequence', $start, [
+        'organism' => moop_telemetry_organism_of($fasta),
+        'file'     => basename($fasta),
+        'ids'      => $asked,
+        'results'  => $found,
+    ]);
+}
+
 /**
  * Build the .fai if it is missing or stale, so one bad copy does not mean a full re-sync.
  *
@@ -0,0 +1,406 @@
+<?php
+/**
+ * Exact bm25 outside SQLite, from a flat per-organism document-length sidecar.
+ *
+ * Finding the rows that match a search costs 0.4-0.7 MB whatever the term. Ranking them
+ * with bm25() is what costs: for every matched document it looks up that document's
+ * length in feature_annotation_search_docsize, a b-tree whose pages are scattered across
+ * the file -- 36.7 MB of "helicase"'s cold read on Nematostella, one seek per page on the
+ * rotational volume (notes/SEARCH_COST_MODEL_2026-07-31.md, section 1).
+ *
+ * The sidecar holds the same lengths as a FLAT array indexed by rowid, so the lengths for
+ * a match set -- which FTS hands back in rowid order -- are read front to back in 64 KB
+ * blocks: a few contiguous reads instead of thousands of scattered ones. Everything else
+ * bm25 needs comes from the index itself, through an fts5vocab 'instance' table: the
+ * doclists of the query's own terms, which the match has just read anyway.
+ *
+ * EXACT, NOT APPROXIMATE. The score is SQLite's fts5 bm25 formula term for term (k1 1.2,
+ * b 0.75, per-phrase IDF over the whole table, weighted phrase frequency against the
+ * row's total length across ALL columns), with the same column weights and the same
+ * text-column filter the pool query uses. Checked against bm25() itself on prefix terms,
+ * AND-ed terms and multi-token phrases: agreement to ~1e-16.
+ *
+ * Not mmap(): PHP has none. The blocks go through the page cache like any file read, which
+ * is what mmap would have bought here -- the win is the layout, not the system call.
+ *
+ * An accelerator, never a dependency. No sidecar, a sidecar written from a different
+ * build of the database (its fingerprint no longer matches), or a query it cannot
+ * reproduce exactly -> null, and the caller runs bm25() in SQLite as before.
+ * scripts/build_search_sidecars.php writes them.
+ */
+
+require_once __DIR__ . '/cache_paths.php';
+require_once __DIR__ . '/functions_database.php';   // getDbConnection()
+require_once __DIR__ . '/gene_set_identity.php';    // moop_gene_set_identity_fingerprint()
+
+const MOOP_DOCSIZE_MAGIC  = 'MOOPDSZ1';
+const MOOP_DOCSIZE_HEADER = 64;      // magic(8) rows(8) tokens(8) max_rowid(8) fingerprint(32)
+const MOOP_DOCSIZE_BLOCK  = 65536;
+
+/**
+ * Above this many matching rows the in-process ranker declines and bm25() runs in SQLite.
+ * The score is held per matched row in PHP arrays; "protein" matches 716,560 rows on
+ * Nematostella, which would cost more memory than the scattered reads it saves.
+ */
+const MOOP_DOCSIZE_MAX_MATCHES = 250000;
+
+/**
+ * Write the sidecar for one organism database.
+ *
+ * The fingerprint is taken BEFORE reading, so a database replaced mid-build produces a
+ * sidecar that does not match either file -- and is ignored -- rather than one that
+ * quietly describes a mix of both.
+ *
+ * @return array ['rows' => int, 'tokens' => int, 'max_rowid' => int]
+ * @throws PDOException|RuntimeException
+ */
+function moop_docsize_write(string $db_path, string $out): array
+{
+    $fingerprint = moop_gene_set_identity_fingerprint($db_path);
+    $db = new PDO('sqlite:' . $db_path, null, null, [
+        PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READONLY,
+    ]);
+    $db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+
+    $tmp = $out . '.tmp.' . getmypid();
+    $fh  = fopen($tmp, 'wb');
+    if ($fh === false) throw new RuntimeException("cannot write $tmp");
+    fwrite($fh, str_repeat("\0", MOOP_DOCSIZE_HEADER));   // header last, once the totals are known
+
+    $rows = $tokens = 0;
+    $next = 0;     // next rowid the array expects
+    $buf  = '';
+    $stmt = $db->query("SELECT id, sz FROM feature_annotation_search_docsize ORDER BY id");
+    while ($row = $stmt->fetch(PDO::FETCH_NUM)) {
+        $id = (int)$row[0];
+        if ($id > $next) $buf .= str_repeat("\0\0\0\0", $id - $next);   // gaps: deleted rowids
+        $len = moop_docsize_decode((string)$row[1]);
+        $buf .= pack('V', $len);
+        $next = $id + 1;
+        $rows++;
+        $tokens += $len;
+        if (strlen($buf) >= MOOP_DOCSIZE_BLOCK) { fwrite($fh, $buf); $buf = ''; }
+    }
+    fwrite($fh, $buf);
+
+    fseek($fh, 0);
+    fwrite($fh, pack('a8PPPa32', MOOP_DOCSIZE_MAGIC, $rows, $tokens, max(0, $next - 1), $fingerprint));
+    fclose($fh);
+    if (!rename($tmp, $out)) {
+        @unlink($tmp);
+        throw new RuntimeException("could not move $tmp into place");
+    }
+    return ['rows' => $rows, 'tokens' => $tokens, 'max_rowid' => max(0, $next - 1)];
+}
+
+/**
+ * Total token count of one _docsize record: one SQLite varint per column, summed -- the
+ * same total fts5's bm25 normalises by (xColumnSize with column -1).
+ */
+function moop_docsize_decode(string $blob): int
+{
+    $total = 0;
+    $i = 0;
+    $n = strlen($blob);
+    while ($i < $n) {
+        $v = 0;
+        for ($k = 0; $i < $n; $k++) {
+            $c = ord($blob[$i++]);
+            if ($k === 8) { $v = ($v << 8) | $c; break; }
+            $v = ($v << 7) | ($c & 0x7f);
+            if ($c < 0x80) break;
+        }
+        $total += $v;
+    }
+    return $total;
+}
+
+/**
+ * Open the sidecar for a database, or null when there is none or it is stale.
+ *
+ * @return array|null ['fh' => resource, 'rows' => int, 'tokens' => int, 'max_rowid' => int]
+ */
+function moop_docsize_open(string $db_path): ?array
+{
+    static $open = [];
+    if (!array_key_exists($db_path, $open)) {
+        $open[$db_path] = moop_docsize_open_file(moop_docsize_sidecar_file($db_path), $db_path);
+    }
+    return $open[$db_path];
+}
+
+/** moop_docsize_open() for an explicit sidecar path. */
+function moop_docsize_open_file(string $file, string $db_path): ?array
+{
+    $fh = ($file !== '' && is_file($file)) ? @fopen($file, 'rb') : false;
+    if ($fh === false) return null;
+
+    $head = fread($fh, MOOP_DOCSIZE_HEADER);
+    $h    = strlen((string)$head) === MOOP_DOCSIZE_HEADER
+          ? unpack('a8magic/Prows/Ptokens/Pmax_rowid/a32fingerprint', $head) : false;
+    if (!$h || $h['magic'] !== MOOP_DOCSIZE_MAGIC || $h['rows'] < 1
+        || rtrim($h['fingerprint'], "\0") !== moop_gene_set_identity_fingerprint($db_path)) {
+        // Written from another build of this database: its lengths belong to rowids that
+        // may since have been reassigned. Wrong lengths would rank silently wrong.
+        fclose($fh);
+        return null;
+    }
+    return [
+        'fh'        => $fh,
+        'rows'      => (int)$h['rows'],
+        'tokens'    => (int)$h['tokens'],
+        'max_rowid' => (int)$h['max_rowid'],
+    ];
+}
+
+/**
+ * Lengths for a set of rowids, read block by block in ascending order.
+ *
+ * @param  int[] $rowids ascending
+ * @return array rowid => total token count (0 for a rowid past the end of the array)
+ */
+function moop_docsize_lengths(array $side, array $rowids): array
+{
+    $out   = [];
+    $block = -1;
+    $data  = '';
+    foreach ($rowids as $rid) {
+        if ($rid < 0 || $rid > $side['max_rowid']) { $out[$rid] = 0; continue; }
+        $off = MOOP_DOCSIZE_HEADER + 4 * $rid;
+        $b   = intdiv($off, MOOP_DOCSIZE_BLOCK);
+        if ($b !== $block) {
+            fseek($side['fh'], $b * MOOP_DOCSIZE_BLOCK);
+            $data  = (string)fread($side['fh'], MOOP_DOCSIZE_BLOCK);
+            $block = $b;
+        }
+        $at = $off - $b * MOOP_DOCSIZE_BLOCK;
+        $out[$rid] = strlen($data) >= $at + 4 ? unpack('V', $data, $at)[1] : 0;
+    }
+    return $out;
+}
+
+/**
+ * The tokens of a string exactly as the index's tokenizer produces them, in order.
+ *
+ * Asked of SQLite for the reason moop_porter_stem() gives: the tokens must be the ones the
+ * index stored, and a PHP porter would drift. [] when there is nothing to tokenize or fts5
+ * is unavailable.
+ */
+function moop_fts_tokens(string $text): array
+{
+    static $cache = [];
+    static $pdo   = null;
+    if (array_key_exists($text, $cache)) return $cache[$text];
+
+    try {
+        if ($pdo === null) {
+            $pdo = new PDO('sqlite::memory:', null, null, [PDO::ATTR_ERRMODE => PDO::ERRMODE_EXCEPTION]);
+            $pdo->exec("CREATE VIRTUAL TABLE tok USING fts5(w, tokenize='porter unicode61')");
+            $pdo->exec("CREATE VIRTUAL TABLE tokvocab USING fts5vocab(tok, instance)");
+        }
+        $pdo->exec('DELETE FROM tok');
+        $pdo->prepare('INSERT INTO tok(w) VALUES (?)')->execute([$text]);
+        $tokens = $pdo->query('SELECT term FROM tokvocab ORDER BY "offset"')->fetchAll(PDO::FETCH_COLUMN);
+    } catch (Throwable $e) {
+        $tokens = [];
+    }
+    return $cache[$text] = $tokens;
+}
+
+/**
+ * The phrases of the expression buildFtsMatchExpr() builds for this input, tokenized.
+ * Must mirror it: one prefix phrase per word, or one exact phrase when quoted. 'word' is
+ * the input the phrase was built from.
+ *
+ * @return array|null [['tokens' => string[], 'prefix' => bool, 'word' => string], ...], null
+ *                    if any phrase tokenizes to nothing (the score could not be reproduced)
+ */
+function moop_bm25_phrases($search_term, $is_quoted_search): ?array
+{
+    $words = $is_quoted_search ? [$search_term] : preg_split('/\s+/', trim($search_term));
+    $phrases = [];
+    foreach ($words as $w) {
+        if ($w === '' || !preg_match('/[\p{L}\p{N}]/u', $w)) continue;
+        $tokens = moop_fts_tokens($w);
+        if (empty($tokens)) return null;
+        $phrases[] = ['tokens' => $tokens, 'prefix' => !$is_quoted_search, 'word' => $w];
+    }
+    return empty($phrases) ? null : $phrases;
+}
+
+/**
+ * The fts5vocab term constraint for one token: the token itself, or every term it is a
+ * prefix of.
+ *
+ * @return array [SQL condition on "term", its parameters]
+ */
+function moop_fts_term_range(string $token, bool $prefix): array
+{
+    // U+10FFFF: "term < prefix.this" is every extension of prefix.
+    return $prefix ? ['term >= ? AND term < ?', [$token, $token . "\xF4\x8F\xBF\xBF"]]
+                   : ['term = ?', [$token]];
+}
+
+/**
+ * Weighted frequency of one phrase in each of the matched rows that contain it.
+ *
+ * Streamed, and only the matched rows are kept: a token's instances span every row that
+ * holds it -- "protein" is in 716,560 rows on Nematostella, each instance a PHP array --
+ * and all of that was once fetched whole, for a score that only the matched rows need.
+ * The later tokens' positions are kept for matched rows only, so memory follows the match
+ * set, which the caller has already capped. Only the columns in $col_weight count: the
+ * match is pinned to the text columns (moop_fts_text_match()).
+ *
+ * @param  array $col_weight text column name => bm25 weight
+ * @param  array $matched    rowid => true, the rows the full expression matched
+ * @return array rowid => sum over columns of (weight x occurrences)
+ */
+function moop_bm25_phrase_freq(PDO $dbh, array $phrase, array $col_weight, array $matched): array
+{
+    $n    = count($phrase['tokens']);
+    $scan = function ($j) use ($dbh, $phrase, $n) {
+        [$where, $args] = moop_fts_term_range($phrase['tokens'][$j], $phrase['prefix'] && $j === $n - 1);
+        $stmt = $dbh->prepare("SELECT doc, col, \"offset\" FROM temp.moop_fas_instance WHERE $where");
+        $stmt->execute($args);
+        return $stmt;
+    };
+
+    // Later tokens as a set, so the phrase is "token 0 at p, token j at p + j, same column".
+    $at = [];
+    for ($j = 1; $j < $n; $j++) {
+        $at[$j] = [];
+        $stmt = $scan($j);
+        while ($r = $stmt->fetch(PDO::FETCH_NUM)) {
+            if (isset($matched[$r[0]], $col_weight[$r[1]])) $at[$j][$r[0] . ':' . $r[1] . ':' . $r[2]] = true;
+        }
+    }
+
+    $freq = [];
+    $stmt = $scan(0);
+    while ($r = $stmt->fetch(PDO::FETCH_NUM)) {
+        if (!isset($matched[$r[0]], $col_weight[$r[1]])) continue;
+        for ($j = 1; $j < $n; $j++) {
+            if (!isset($at[$j][$r[0] . ':' . $r[1] . ':' . ($r[2] + $j)])) continue 2;
+        }
+        $doc = (int)$r[0];
+        $freq[$doc] = ($freq[$doc] ?? 0.0) + $col_weight[$r[1]];
+    }
+    return $freq;
+}
+
+/**
+ * Select the bm25 pool in-process: every matching row scored, the best $pool_size kept.
+ *
+ * Same rows, same order as
+ *     ORDER BY bm25(feature_annotation_search, ...$weights) LIMIT $pool_size
+ * with ties broken by rowid.
+ *
+ * @param  float[] $weights bm25 column weights, in column order (missing columns weigh 1.0,
+ *                          as in fts5)
+ * @return array|null rowid => rank position (equal scores share a position), best first;
+ *                    null when the sidecar cannot serve this query
+ * @throws PDOException
+ */
+function moop_bm25_sidecar_pool($dbFile, $search_term, $is_quoted_search, array $weights, $pool_size): ?array
+{
+    $side = moop_docsize_open($dbFile);
+    if ($side === null) return null;
+    return moop_bm25_rank(getDbConnection($dbFile), $side, $search_term, $is_quoted_search,
+                          $weights, $pool_size, moop_fts_schema($dbFile));
+}
+
+/**
+ * moop_bm25_sidecar_pool() against an already-open database and sidecar.
+ *
+ * @param string $fts schema holding feature_annotation_search on $dbh (moop_fts_schema())
+ * @return array|null as moop_bm25_sidecar_pool()
+ * @throws PDOException
+ */
+function moop_bm25_rank(PDO $dbh, array $side, $search_term, $is_quoted_search, array $weights, $pool_size,
+                        string $fts = 'main'): ?array
+{
+    $phrases = moop_bm25_phrases($search_term, $is_quoted_search);
+    if ($phrases === null) return null;
+
+    $dbh->exec("CREATE VIRTUAL TABLE IF NOT EXISTS temp.moop_fas_instance
+                USING fts5vocab($fts, feature_annotation_search, instance)");
+    $dbh->exec("CREATE VIRTUAL TABLE IF NOT EXISTS temp.moop_fas_col
+                USING fts5vocab($fts, feature_annotation_search, col)");
+
+    $col_weight = [];
+    foreach ($dbh->query("PRAGMA $fts.table_info(feature_annotation_search)")->fetchAll(PDO::FETCH_ASSOC) as $col) {
+        if (!in_array($col['name'], MOOP_FTS_TEXT_COLUMNS, true)) continue;
+        $i = (int)$col['cid'];
+        $col_weight[$col['name']] = isset($weights[$i]) ? (float)$weights[$i] : 1.0;
+    }
+
+    // Every token's instances are scanned below, so a token in more rows than the cap
+    // declines here, from the vocabulary, before one instance is read -- however narrow
+    // the AND it sits in. Summed over the text columns, so an upper bound on its rows.
+    $in = implode(',', array_fill(0, count($col_weight), '?'));
+    foreach ($phrases as $p) {
+        $last = count($p['tokens']) - 1;
+        foreach ($p['tokens'] as $j => $tok) {
+            [$where, $args] = moop_fts_term_range($tok, $p['prefix'] && $j === $last);
+            $stmt = $dbh->prepare("SELECT COALESCE(SUM(doc), 0) FROM temp.moop_fas_col
+                                   WHERE $where AND col IN ($in)");
+            $stmt->execute(array_merge($args, array_keys($col_weight)));
+            if ((int)$stmt->fetchColumn() > MOOP_DOCSIZE_MAX_MATCHES) return null;
+        }
+    }
+
+    $stmt = $dbh->prepare("SELECT rowid FROM $fts.feature_annotation_search
+                           WHERE feature_annotation_search MATCH ?");
+    $stmt->execute([moop_fts_text_match(buildFtsMatchExpr($search_term, $is_quoted_search))]);
+    $matched = [];
+    while (($rid = $stmt->fetchColumn()) !== false) {
+        if (count($matched) >= MOOP_DOCSIZE_MAX_MATCHES) return null;
+        $matched[] = (int)$rid;
+    }
+    if (empty($matched)) return [];
+    $matched_set = array_fill_keys($matched, true);
+
+    // fts5's bm25: IDF = ln((N - n + 0.5) / (n + 0.5)), floored at 1e-6, where n is the
+    // rows holding the phrase anywhere in the table -- counted by the index itself, with
+    // the phrase pinned as the search pins it, since the frequencies are kept for the
+    // matched rows only.
+    $N     = $side['rows'];
+    $avgdl = $side['tokens'] / $N;
+    $hit   = $dbh->prepare("SELECT COUNT(*) FROM $fts.feature_annotation_search
+                            WHERE feature_annotation_search MATCH ?");
+    $freqs = $idfs = [];
+    foreach ($phrases as $p) {
+        $f = moop_bm25_phrase_freq($dbh, $p, $col_weight, $matched_set);
+        $hit->execute([moop_fts_text_match(buildFtsMatchExpr($p['word'], $is_quoted_search))]);
+        $hits = (int)$hit->fetchColumn();
+        $idf  = log(($N - $hits + 0.5) / ($hits + 0.5));
+        $idfs[]  = $idf > 0 ? $idf : 1e-6;
+        $freqs[] = $f;
+    }
+
+    $k1 = 1.2;
+    $b  = 0.75;
+    $lengths = moop_docsize_lengths($side, $matched);
+    $scores  = [];
+    foreach ($matched as $rid) {
+        $norm = $k1 * (1 - $b + $b * $lengths[$rid] / $avgdl);
+        $s = 0.0;
+        foreach ($freqs as $i => $f) {
+            $tf = $f[$rid] ?? 0.0;
+            $s += $idfs[$i] * ($tf * ($k1 + 1.0)) / ($tf + $norm);
+        }
+        $scores[$rid] = -$s;   // bm25() returns the negation, so lower is better
+    }
+
+    // Rowid order within equal scores: $matched is ascending and asort() is stable.
+    asort($scores);
+    $pool = [];
+    $pos  = 0;
+    $prev = null;
+    foreach ($scores as $rid => $s) {
+        if (count($pool) >= $pool_size) break;
+        if ($s !== $prev) { $pos = count($pool); $prev = $s; }
+        $pool[$rid] = $pos;
+    }
+    return $pool;
+}
@@ -0,0 +1,206 @@
+<?php
+/**
+ * Per-organism term statistics -- how many rows a search will match, before running it.
+ *
+ * A search's cost is set by the size of its match set, and match sets differ by three
+ * orders of magnitude: on Nematostella "piwi" matches 304 rows and "binding" 322,361. Yet
+ * every unfiltered search took the same path, so "piwi" paid for the quota pool's
+ * per-type, per-prior slicing -- a dozen FTS queries built for match sets far larger
+ * than the pool -- and got rowid order back where bm25 order was affordable.
+ *
+ * The sidecar is a copy of the index's vocabulary (fts5vocab 'row': each term and the
+ * number of rows containing it), with a running total, in its own small SQLite file:
+ *
+ *     term_stats(term PRIMARY KEY, docs, cum)    cum = sum of docs over terms <= term
+ *
+ * so an exact term is one lookup and a PREFIX term -- which is what every unquoted search
+ * word is -- is two: cum at the end of the prefix range minus cum before its start. No
+ * scan of the range, however many terms "a"* covers.
+ *
+ * The estimate is an UPPER BOUND, never a count. A row holding two terms under one prefix
+ * is counted twice, and an AND or a phrase can only match fewer rows than its rarest part,
+ * which is what it is bounded by. Exact for a one-word, one-term search, which is most of
+ * them. Good enough for the two things it is for: choosing a pool (searchFeaturesAndAnnotations)
+ * and telling the user how broad a term is, both without touching the organism database.
+ *
+ * Two more tables ride along for the cross-organism skip index (lib/organism_skip_index.php),
+ * which needs to know what an organism CANNOT match, not only how much it can:
+ * feature_terms, the vocabulary of feature_search (the gene-only search), and id_trigrams,
+ * every three-byte run of a lowercased feature_uniquename (the ID search is a LIKE
+ * substring match, which no token vocabulary can rule out).
+ *
+ * An accelerator, never a dependency. No sidecar, or one from a different build of the
+ * database (fingerprint mismatch) -> null, and search chooses its pool as it did before.
+ * scripts/build_search_sidecars.php writes them.
+ */
+
+require_once __DIR__ . '/cache_paths.php';
+require_once __DIR__ . '/gene_set_identity.php';    // moop_gene_set_identity_fingerprint()
+require_once __DIR__ . '/fts_docsize.php';          // moop_bm25_phrases()
+
+/**
+ * Write the term-statistics sidecar for one organism database.
+ *
+ * Built into a temporary file and renamed into place, like the docsize sidecar, and with
+ * the fingerprint taken before reading for the same reason (moop_docsize_write()).
+ *
+ * The annotation_type_code and search_prior tokens (atype...z, aprior...z) are left out,
+ * which is only sound because every MATCH on feature_annotation_search is pinned to the
+ * text columns (moop_fts_text_match()): no search word can reach them. Counting them would
+ * inflate every "a"* estimate by the whole table; leaving them out of an UNPINNED match
+ * made "ap" look like a handful of rows while the match returned all of them.
+ *
+ * @return array ['terms' => int, 'bytes' => int]
+ * @throws PDOException|RuntimeException
+ */
+function moop_term_stats_write(string $db_path, string $out): array
+{
+    $fingerprint = moop_gene_set_identity_fingerprint($db_path);
+    $src = new PDO('sqlite:' . $db_path, null, null, [
+        PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READONLY,
+    ]);
+    $src->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+    // A temp-schema vocab table works on a read-only connection; it reads the index only.
+    $src->exec("CREATE VIRTUAL TABLE temp.moop_fas_row
+                USING fts5vocab(main, feature_annotation_search, row)");
+
+    $tmp = $out . '.tmp.' . getmypid();
+    @unlink($tmp);
+    $dst = new PDO('sqlite:' . $tmp);
+    $dst->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+    $dst->exec('PRAGMA journal_mode = OFF');
+    $dst->exec('PRAGMA synchronous = OFF');
+    $dst->exec("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)");
+    $dst->exec("CREATE TABLE term_stats (term TEXT PRIMARY KEY, docs INTEGER NOT NULL,
+                                         cum INTEGER NOT NULL) WITHOUT ROWID");
+
+    // fts5vocab returns terms in the index's byte order, which is also BINARY collation's,
+    // so the running total is accumulated in the same order the range lookups walk.
+    $terms = $cum = 0;
+    $dst->beginTransaction();
+    $ins  = $dst->prepare("INSERT INTO term_stats (term, docs, cum) VALUES (?, ?, ?)");
+    $stmt = $src->query("SELECT term, doc FROM temp.moop_fas_row");
+    while ($row = $stmt->fetch(PDO::FETCH_NUM)) {
+        if (preg_match('/^a(type|prior)\w*z$/', $row[0])) continue;
+        $cum += (int)$row[1];
+        $ins->execute([$row[0], (int)$row[1], $cum]);
+        $terms++;
+    }
+
+    $dst->exec("CREATE TABLE feature_terms (term TEXT PRIMARY KEY) WITHOUT ROWID");
+    $src->exec("CREATE VIRTUAL TABLE temp.moop_fs_row USING fts5vocab(main, feature_search, row)");
+    $ins  = $dst->prepare("INSERT INTO feature_terms (term) VALUES (?)");
+    $stmt = $src->query("SELECT term FROM temp.moop_fs_row");
+    while (($term = $stmt->fetchColumn()) !== false) $ins->execute([$term]);
+
+    // LIKE folds ASCII case only, and so does strtolower(); the grams are bytes, as LIKE
+    // compares them.
+    $grams = [];
+    $stmt  = $src->query("SELECT feature_uniquename FROM feature");
+    while (($id = $stmt->fetchColumn()) !== false) {
+        $id = strtolower((string)$id);
+        for ($i = 0, $n = strlen($id) - 2; $i < $n; $i++) $grams[substr($id, $i, 3)] = true;
+    }
+    $dst->exec("CREATE TABLE id_trigrams (gram BLOB PRIMARY KEY) WITHOUT ROWID");
+    $ins = $dst->prepare("INSERT INTO id_trigrams (gram) VALUES (?)");
+    foreach (array_keys($grams) as $g) {
+        $ins->bindValue(1, (string)$g, PDO::PARAM_LOB);
+        $ins->execute();
+    }
+
+    $meta = $dst->prepare("INSERT INTO meta (key, value) VALUES (?, ?)");
+    $meta->execute(['fingerprint', $fingerprint]);
+    $meta->execute(['terms', (string)$terms]);
+    $meta->execute(['id_trigrams', (string)count($grams)]);
+    $dst->commit();
+    $dst = null;
+    $src = null;
+
+    if (!rename($tmp, $out)) {
+        @unlink($tmp);
+        throw new RuntimeException("could not move $tmp into place");
+    }
+    return ['terms' => $terms, 'bytes' => (int)filesize($out)];
+}
+
+/**
+ * The term-statistics sidecar for an organism database, opened read-only, or null when
+ * there is none or it no longer describes that database. Cached for the request.
+ */
+function moop_term_stats_open(string $db_path): ?PDO
+{
+    static $open = [];
+    if (array_key_exists($db_path, $open)) return $open[$db_path];
+    return $open[$db_path] = moop_term_stats_open_file(moop_term_stats_sidecar_file($db_path), $db_path);
+}
+
+/**
+ * moop_term_stats_open() for an explicit sidecar path, uncached.
+ */
+function moop_term_stats_open_file(string $file, string $db_path): ?PDO
+{
+    if (!is_file($file)) return null;
+    try {
+        $pdo = new PDO('sqlite:' . $file, null, null, [
+            PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READONLY,
+        ]);
+        $pdo->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        $fp = $pdo->query("SELECT value FROM meta WHERE key = 'fingerprint'")->fetchColumn();
+    } catch (PDOException $e) {
+        error_log('MOOP term stats: unreadable sidecar ' . $file . ' — ' . $e->getMessage());
+        return null;
+    }
+    return $fp === moop_gene_set_identity_fingerprint($db_path) ? $pdo : null;
+}
+
+/**
+ * Rows containing one index term, or -- as a prefix -- any term that starts with it.
+ * Upper bound for a prefix (see the file header), exact otherwise.
+ */
+function moop_term_stats_docs(PDO $stats, string $token, bool $prefix): int
+{
+    if (!$prefix) {
+        $stmt = $stats->prepare("SELECT docs FROM term_stats WHERE term = ?");
+        $stmt->execute([$token]);
+        return (int)$stmt->fetchColumn();
+    }
+    // Running total just before the range, and at its end. U+10FFFF sorts after every
+    // extension of the prefix, as in moop_fts_term_range().
+    $before = $stats->prepare("SELECT cum FROM term_stats WHERE term < ? ORDER BY term DESC LIMIT 1");
+    $before->execute([$token . "\xF4\x8F\xBF\xBF"]);
+    $end = (int)$before->fetchColumn();
+    $before->execute([$token]);
+    return max(0, $end - (int)$before->fetchColumn());
+}
+
+/**
+ * Upper bound on the rows feature_annotation_search MATCH moop_fts_text_match(buildFtsMatchExpr(...))
+ * returns -- the pinned match, which is the only one search runs.
+ *
+ * Each phrase is bounded by its rarest token (the last one as a prefix, unquoted, exactly
+ * as the match treats it), and the AND of the phrases by the rarest phrase.
+ *
+ * @return int|null null when there is no usable sidecar or the input does not tokenize
+ */
+function moop_fts_estimate_matches(string $dbFile, $search_term, $is_quoted_search): ?int
+{
+    $stats = moop_term_stats_open($dbFile);
+    if ($stats === null) return null;
+    $phrases = moop_bm25_phrases($search_term, $is_quoted_search);
+    if ($phrases === null) return null;
+
+    try {
+        $estimate = null;
+        foreach ($phrases as $p) {
+            $last = count($p['tokens']) - 1;
+            foreach ($p['tokens'] as $j => $tok) {
+                $n = moop_term_stats_docs($stats, $tok, $p['prefix'] && $j === $last);
+                $estimate = $estimate === null ? $n : min($estimate, $n);
+            }
+        }
+    } catch (PDOException $e) {
+        error_log('MOOP term stats: lookup failed for ' . $dbFile . ' — ' . $e->getMessage());
+        return null;
+    }
+    return $estimate;
+}
@@ -4,6 +4,8 @@
  * Database connectivity, query execution, and database integrity validation
  */
 
+require_once __DIR__ . '/search_tier.php';   // moop_search_tier_attach(), for getDbConnection()
+
 /**
  * Path to an organism's SQLite database.
  *
@@ -278,6 +280,10 @@ function getDbConnection($dbFile) {
     // ':memory:' is deliberately NOT cached: it is the coordinator used for cross-organism
     // ATTACH (api/feature_search.php), each use wants a clean database, and reusing one
     // would carry a previous caller's ATTACHed schemas into the next.
+    //
+    // An organism database with a current search tier (lib/search_tier.php) gets it
+    // ATTACHed AS search here, once per connection: its FTS index on the fast volume, for
+    // queries that name the index through moop_fts_schema(). Both files open read-only.
     static $pool = [];
     if ($dbFile !== ':memory:' && isset($pool[$dbFile])) {
         return $pool[$dbFile];
@@ -286,7 +292,7 @@ function getDbConnection($dbFile) {
     $uri_flag = defined('PDO::SQLITE_OPEN_URI') ? PDO::SQLITE_OPEN_URI : 0x40;
     $open_flags = ($dbFile === ':memory:')
         ? (PDO::SQLITE_OPEN_READWRITE | PDO::SQLITE_OPEN_CREATE | $uri_flag)
-        : PDO::SQLITE_OPEN_READONLY;
+        : (PDO::SQLITE_OPEN_READONLY | $uri_flag);
     $dbh = new PDO("sqlite:" . $dbFile, null, null, [PDO::SQLITE_ATTR_OPEN_FLAGS => $open_flags]);
     $dbh->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
     $dbh->sqliteCreateFunction('REGEXP', function($pattern, $text) {
@@ -294,6 +300,7 @@ function getDbConnection($dbFile) {
     }, 2);
 
     if ($dbFile !== ':memory:') {
+        moop_search_tier_attach($dbh, $dbFile);
         $pool[$dbFile] = $dbh;
     }
     return $dbh;
@@ -151,6 +151,18 @@ function housekeeping_task_registry(): array {
             'label' => 'JBrowse2 version',
             'desc'  => 'Compares the bundled JBrowse2 against the latest upstream release. Reads the local version every run, but contacts GitHub at most once a week. Report-only — upgrading is a CLI job.',
         ],
+        [
+            'name'  => 'page_cache_snapshot',
+            'fn'    => 'housekeeping_page_cache_snapshot',
+            'label' => 'Page-cache snapshot and restore',
+            'desc'  => 'Records which pages of every organism database the page cache holds, every page_cache_snapshot_hours. When most of them have gone since — a reboot, a load test, a dropped cache — reads them back in file order, rate-limited to page_cache_restore_mb_s, in the background. A mincore check per database when nothing is due.',
+        ],
+        [
+            'name'  => 'prewarm_search_pages',
+            'fn'    => 'housekeeping_prewarm_search_pages',
+            'label' => 'Prewarm search pages',
+            'desc'  => 'Re-reads the pages a search touches first (FTS segments, document sizes, the top levels of the feature and annotation tables) of the most-searched organisms, up to prewarm_budget_mb per run, in the background. Pages the page cache still holds are skipped, so a warm site costs one residency check per organism.',
+        ],
     ];
 }
 
@@ -1152,3 +1164,146 @@ function housekeeping_check_jbrowse_version() {
     $_SESSION['jbrowse_version'] = $result;
     housekeeping_persist_status('jbrowse_version', $result);
 }
+
+/**
+ * Keep the most-searched organisms' search pages in the page cache.
+ *
+ * Organism pages do not survive a night in the page cache (notes/bench/residency_watch.py),
+ * so the first cross-organism search of a morning found every database cold. This re-reads
+ * the part of each database a search touches first, most-used organism first, within
+ * 'prewarm_budget_mb' per run; scripts/prewarm_search_pages.py does the reading and
+ * explains what it reads and why in that order.
+ *
+ * "Most used" is what the shared search cache (lib/search_result_cache.php) already knows:
+ * the number of cached searches over the past week that read each organism. With no cache
+ * to ask, every organism is a candidate, in name order, and the budget decides.
+ *
+ * Launched detached, like the NCBI sync above -- a prewarm is seconds to minutes of reads,
+ * and housekeeping tasks must stay fast. Python, because the residency check is mincore(2),
+ * which PHP cannot call; without python3 the task does nothing. 0 turns it off.
+ */
+function housekeeping_prewarm_search_pages() {
+    $config        = ConfigManager::getInstance();
+    $budget_mb     = $config->getInt('prewarm_budget_mb', 2048);
+    $organism_data = rtrim($config->getPath('organism_data'), '/');
+    $script_path   = realpath(dirname(__DIR__) . '/scripts/prewarm_search_pages.py');
+    $logs_dir      = $config->getPath('site_path') . '/logs';
+    $lock_file     = "$logs_dir/.prewarm_lock";
+
+    if ($budget_mb <= 0 || !$script_path || $organism_data === '' || !is_dir($organism_data)) return;
+
+    if (housekeeping_lock_alive($lock_file)) return;
+    @unlink($lock_file); // stale lock
+    // A page-cache restore is reading these databases already; two readers only seek.
+    if (housekeeping_lock_alive("$logs_dir/.page_cache_lock")) return;
+
+    $python = trim((string)@shell_exec('command -v python3 2>/dev/null'));
+    if ($python === '') return;
+
+    $dbs = [];
+    foreach (glob("$organism_data/*/organism.sqlite") ?: [] as $db) {
+        $dbs[basename(dirname($db))] = $db;
+    }
+    if (!$dbs) return;
+    ksort($dbs);
+
+    // Usage over the past week from the search cache, when there is one.
+    require_once __DIR__ . '/search_result_cache.php';
+    $uses = moop_search_cache_usage(7);
+    if ($uses) {
+        $used = [];
+        foreach (array_keys($uses) as $org) {
+            if (isset($dbs[$org])) $used[$org] = $dbs[$org];
+        }
+        $dbs = $used;
+    }
+    if (!$dbs) return;
+
+    $cmd = escapeshellarg($python) . ' ' . escapeshellarg($script_path)
+         . ' --budget-mb ' . (int)$budget_mb
+         . ' --cache-root ' . escapeshellarg(moop_cache_root())
+         . ' ' . implode(' ', array_map('escapeshellarg', array_values($dbs)));
+    $shell_cmd = 'echo $$ > ' . escapeshellarg($lock_file)
+               . ' ; ' . $cmd . ' >> ' . escapeshellarg("$logs_dir/prewarm.log") . ' 2>&1'
+               . ' ; rm -f ' . escapeshellarg($lock_file);
+
+    if (!is_dir($logs_dir)) @mkdir($logs_dir, 0755, true);
+    file_put_contents($lock_file, '0');
+    $descriptors = [
+        0 => ['file', '/dev/null', 'r'],
+        1 => ['file', '/dev/null', 'w'],
+        2 => ['file', '/dev/null', 'w'],
+    ];
+    $proc = @proc_open(['/bin/sh', '-c', $shell_cmd], $descriptors, $pipes);
+    if (!is_resource($proc)) {
+        @unlink($lock_file);
+    }
+}
+
+/**
+ * Whether a detached task's PID lock names a live process. A lock still holding the '0'
+ * written before launch counts for a minute -- the shell has not written its PID yet.
+ */
+function housekeeping_lock_alive(string $lock_file): bool {
+    if (!file_exists($lock_file)) return false;
+    $pid = (int)trim((string)@file_get_contents($lock_file));
+    if ($pid === 0) return (time() - (int)@filemtime($lock_file)) < 60;
+    return file_exists("/proc/$pid");
+}
+
+/**
+ * Snapshot the page cache's hold on the organism databases, or restore it.
+ *
+ * The cache fills over hours of searching and empties in moments: a load test took it from
+ * 12.2 GB to 0.3 GB and it had refilled to 6.6 GB two and a half hours later
+ * (notes/bench/loadtest.py). scripts/page_cache_snapshot.py `auto` decides which this run
+ * is -- restore when most of the snapshot's pages are gone, otherwise refresh the snapshot
+ * when it is 'page_cache_snapshot_hours' old -- and a cold cache never overwrites a warm
+ * snapshot. A database reloaded since the snapshot gets its search pages instead.
+ *
+ * Launched detached, like the prewarm below, and skipped while the prewarm runs: both
+ * read the same databases. Python for mincore(2); without python3 nothing happens.
+ * 'page_cache_restore_mb_s' 0 turns it off.
+ */
+function housekeeping_page_cache_snapshot() {
+    $config        = ConfigManager::getInstance();
+    $rate          = $config->getInt('page_cache_restore_mb_s', 40);
+    $hours         = $config->getInt('page_cache_snapshot_hours', 6);
+    $organism_data = rtrim($config->getPath('organism_data'), '/');
+    $script_path   = realpath(dirname(__DIR__) . '/scripts/page_cache_snapshot.py');
+    $logs_dir      = $config->getPath('site_path') . '/logs';
+    $lock_file     = "$logs_dir/.page_cache_lock";
+
+    if ($rate <= 0 || !$script_path || $organism_data === '' || !is_dir($organism_data)) return;
+    if (housekeeping_lock_alive($lock_file) || housekeeping_lock_alive("$logs_dir/.prewarm_lock")) return;
+    @unlink($lock_file); // stale, if anything
+
+    $python = trim((string)@shell_exec('command -v python3 2>/dev/null'));
+    if ($python === '') return;
+
+    $dbs = glob("$organism_data/*/organism.sqlite") ?: [];
+    if (!$dbs) return;
+    sort($dbs);
+
+    $cmd = escapeshellarg($python) . ' ' . escapeshellarg($script_path)
+         . ' auto ' . escapeshellarg(moop_page_cache_snapshot_file())
+         . ' --every-hours ' . max(1, $hours)
+         . ' --rate-mb-s ' . (int)$rate
+         . ' --cache-root ' . escapeshellarg(moop_cache_root())
+         . ' ' . implode(' ', array_map('escapeshellarg', $dbs));
+    $shell_cmd = 'echo $$ > ' . escapeshellarg($lock_file)
+               . ' ; ' . $cmd . ' >> ' . escapeshellarg("$logs_dir/page_cache.log") . ' 2>&1'
+               . ' ; rm -f ' . escapeshellarg($lock_file);
+
+    if (!is_dir($logs_dir)) @mkdir($logs_dir, 0755, true);
+    file_put_contents($lock_file, '0');
+    $descriptors = [
+        0 => ['file', '/dev/null', 'r'],
+        1 => ['file', '/dev/null', 'w'],
+        2 => ['file', '/dev/null', 'w'],
+    ];
+    $proc = @proc_open(['/bin/sh', '-c', $shell_cmd], $descriptors, $pipes);
+    if (!is_resource($proc)) {
+        @unlink($lock_file);
+    }
+}
@@ -0,0 +1,265 @@
+<?php
+/**
+ * Cross-organism skip index -- which organisms CANNOT match a search, known without
+ * opening them.
+ *
+ * A cross-organism search fans out one request per organism, and each one opens that
+ * organism's database and runs the search in it, even when the answer is nothing. For a
+ * rare term that is most of them: "piwi" is in a handful of the 48 organisms, and every
+ * other one pays a cold open and a cold index probe -- seeks on the rotational volume --
+ * to say so.
+ *
+ * One small file, {cache_path}/organism_skip.sqlite, holds for every term of every
+ * organism's FTS indexes the set of organisms that have it, as a bitmap:
+ *
+ *     terms(term PRIMARY KEY, orgs)          feature_annotation_search + feature_search
+ *     id_trigrams(gram PRIMARY KEY, orgs)    three-byte runs of feature_uniquename
+ *     organisms(bit, organism, fingerprint)
+ *
+ * An organism can be skipped only when ALL THREE searches the per-organism endpoint might
+ * run are ruled out: the ID search (feature_uniquename LIKE '%input%' -- needs every
+ * trigram of the input), the annotation search and the gene-only search (need a term
+ * for every token, each last-token-of-a-word as a prefix, exactly as buildFtsMatchExpr()
+ * matches). Each test is a necessary condition, never a sufficient one, so a skipped
+ * organism is certain to have returned nothing; the converse does not hold, and an
+ * organism left in may still come back empty.
+ *
+ * Built by merging the per-organism term-stats sidecars (lib/fts_term_stats.php), so a
+ * rebuild reads a few small files on the cache volume, not the organism databases:
+ * scripts/build_search_sidecars.php rewrites it whenever it rewrites a sidecar.
+ *
+ * An accelerator, never a dependency. An organism that is not in the index, or whose
+ * database has changed since (its fingerprint no longer matches), is never skipped; no
+ * index at all skips nothing.
+ */
+
+require_once __DIR__ . '/cache_paths.php';
+require_once __DIR__ . '/gene_set_identity.php';    // moop_gene_set_identity_fingerprint()
+require_once __DIR__ . '/fts_term_stats.php';       // moop_term_stats_open_file(), moop_bm25_phrases()
+
+/**
+ * A prefix that spans more index terms than this is not worth OR-ing -- a two-letter
+ * prefix covers tens of thousands of terms and nearly every organism -- so it rules
+ * nothing out and the organisms are searched as if there were no index.
+ */
+const MOOP_SKIP_INDEX_MAX_RANGE = 20000;
+
+/**
+ * Rebuild the skip index from the organisms' current term-stats sidecars.
+ *
+ * @param  array $dbs     organism => organism.sqlite path
+ * @param  array $sidecars organism => term-stats sidecar path, where it is not the usual
+ *                         moop_term_stats_sidecar_file() (tests)
+ * @return array ['organisms' => int indexed, 'missing' => string[] with no current sidecar,
+ *                'terms' => int]
+ * @throws PDOException|RuntimeException
+ */
+function moop_skip_index_build(array $dbs, string $out, array $sidecars = []): array
+{
+    ksort($dbs);
+    $tmp = $out . '.tmp.' . getmypid();
+    @unlink($tmp);
+    $dst = new PDO('sqlite:' . $tmp);
+    $dst->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+    $dst->exec('PRAGMA journal_mode = OFF');
+    $dst->exec('PRAGMA synchronous = OFF');
+    $dst->exec("CREATE TABLE organisms (bit INTEGER PRIMARY KEY, organism TEXT UNIQUE NOT NULL,
+                                        fingerprint TEXT NOT NULL)");
+    $dst->exec("CREATE TEMP TABLE postings (term TEXT NOT NULL, bit INTEGER NOT NULL)");
+    $dst->exec("CREATE TEMP TABLE gram_postings (gram BLOB NOT NULL, bit INTEGER NOT NULL)");
+
+    $bit = 0;
+    $missing = [];
+    $org_ins = $dst->prepare("INSERT INTO organisms (bit, organism, fingerprint) VALUES (?, ?, ?)");
+    foreach ($dbs as $organism => $db_path) {
+        // Only a sidecar that still describes its database, and one new enough to carry
+        // the gene-only and ID tables; anything else leaves the organism out -- unskippable.
+        $sidecar = $sidecars[$organism] ?? moop_term_stats_sidecar_file($db_path);
+        $stats   = moop_term_stats_open_file($sidecar, $db_path);
+        if ($stats === null
+            || $stats->query("SELECT COUNT(*) FROM sqlite_master WHERE name = 'id_trigrams'")->fetchColumn() == 0) {
+            $missing[] = $organism;
+            continue;
+        }
+        $fingerprint = $stats->query("SELECT value FROM meta WHERE key = 'fingerprint'")->fetchColumn();
+        $stats = null;
+
+        $dst->exec("ATTACH " . $dst->quote($sidecar) . " AS s");
+        $dst->beginTransaction();
+        $dst->exec("INSERT INTO postings (term, bit)
+                    SELECT term, $bit FROM s.term_stats
+                    UNION SELECT term, $bit FROM s.feature_terms");
+        $dst->exec("INSERT INTO gram_postings (gram, bit) SELECT gram, $bit FROM s.id_trigrams");
+        $org_ins->execute([$bit, $organism, $fingerprint]);
+        $dst->commit();
+        $dst->exec("DETACH s");
+        $bit++;
+    }
+
+    $width = max(1, intdiv($bit + 7, 8));
+    $terms = 0;
+    foreach (['terms' => ['term', 'TEXT', 'postings'], 'id_trigrams' => ['gram', 'BLOB', 'gram_postings']]
+             as $table => [$col, $type, $from]) {
+        $dst->exec("CREATE TABLE $table ($col $type PRIMARY KEY, orgs BLOB NOT NULL) WITHOUT ROWID");
+        $ins = $dst->prepare("INSERT INTO $table ($col, orgs) VALUES (?, ?)");
+        $dst->beginTransaction();
+        $stmt = $dst->query("SELECT $col, group_concat(bit) FROM $from GROUP BY $col ORDER BY $col");
+        while ($row = $stmt->fetch(PDO::FETCH_NUM)) {
+            $map = str_repeat("\0", $width);
+            foreach (explode(',', $row[1]) as $b) {
+                $b = (int)$b;
+                $map[$b >> 3] = chr(ord($map[$b >> 3]) | (1 << ($b & 7)));
+            }
+            $ins->bindValue(1, $row[0], $type === 'BLOB' ? PDO::PARAM_LOB : PDO::PARAM_STR);
+            $ins->bindValue(2, $map, PDO::PARAM_LOB);
+            $ins->execute();
+            if ($table === 'terms') $terms++;
+        }
+        $dst->commit();
+    }
+    $dst = null;
+
+    if (!rename($tmp, $out)) {
+        @unlink($tmp);
+        throw new RuntimeException("could not move $tmp into place");
+    }
+    return ['organisms' => $bit, 'missing' => $missing, 'terms' => $terms];
+}
+
+/**
+ * The skip index, opened read-only, with its organism table; null when there is none.
+ * Cached for the request.
+ *
+ * @return array|null ['pdo' => PDO, 'bits' => organism => ['bit' => int, 'fingerprint' => string],
+ *                     'width' => int bytes per bitmap]
+ */
+function moop_skip_index_open(): ?array
+{
+    static $index = false;
+    if ($index === false) $index = moop_skip_index_open_file(moop_skip_index_file());
+    return $index;
+}
+
+/**
+ * moop_skip_index_open() for an explicit file, uncached.
+ */
+function moop_skip_index_open_file(string $file): ?array
+{
+    $index = null;
+    if (!is_file($file)) return null;
+    try {
+        $pdo = new PDO('sqlite:' . $file, null, null, [
+            PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READONLY,
+        ]);
+        $pdo->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        $bits = [];
+        foreach ($pdo->query("SELECT bit, organism, fingerprint FROM organisms")->fetchAll(PDO::FETCH_ASSOC) as $r) {
+            $bits[$r['organism']] = ['bit' => (int)$r['bit'], 'fingerprint' => $r['fingerprint']];
+        }
+        $index = ['pdo' => $pdo, 'bits' => $bits, 'width' => max(1, intdiv(count($bits) + 7, 8))];
+    } catch (PDOException $e) {
+        error_log('MOOP skip index: unreadable ' . $file . ' — ' . $e->getMessage());
+    }
+    return $index;
+}
+
+/**
+ * Organisms, out of $organisms, that certainly have no result for this search.
+ *
+ * Takes the input as the endpoints do after sanitize_search_input(). Costs one stat per
+ * organism (the fingerprint check) and a few index lookups; opens no organism database.
+ *
+ * @param  array      $dbs   organism => organism.sqlite path, the organisms the caller would search
+ * @param  array|null $index an opened index (moop_skip_index_open_file()); default the site's
+ * @return string[] the skippable ones, in $dbs order
+ */
+function moop_skip_index_skippable($search_input, $is_quoted_search, array $dbs, ?array $index = null): array
+{
+    $index = $index ?? moop_skip_index_open();
+    if ($index === null || empty($dbs)) return [];
+
+    // Only organisms whose database is the one the index was built from.
+    $current = [];
+    foreach ($dbs as $organism => $db_path) {
+        $entry = $index['bits'][$organism] ?? null;
+        if ($entry !== null && $entry['fingerprint'] === moop_gene_set_identity_fingerprint($db_path)) {
+            $current[$organism] = $entry['bit'];
+        }
+    }
+    if (empty($current)) return [];
+
+    try {
+        $can_match = moop_skip_index_text_bitmap($index, $search_input, $is_quoted_search)
+                   | moop_skip_index_id_bitmap($index, $search_input);
+    } catch (PDOException $e) {
+        error_log('MOOP skip index: lookup failed — ' . $e->getMessage());
+        return [];
+    }
+
+    $skip = [];
+    foreach ($current as $organism => $bit) {
+        if (!(ord($can_match[$bit >> 3]) & (1 << ($bit & 7)))) $skip[] = $organism;
+    }
+    return $skip;
+}
+
+/**
+ * Organisms whose FTS vocabulary could satisfy the match: per phrase, the AND of its
+ * tokens' organism sets (the last token as a prefix, unquoted), then the AND over phrases.
+ * All bits set -- "cannot rule anything out" -- when the input does not tokenize or a
+ * prefix is too broad to be worth the lookup.
+ */
+function moop_skip_index_text_bitmap(array $index, $search_input, $is_quoted_search): string
+{
+    $all = str_repeat("\xFF", $index['width']);
+    $phrases = moop_bm25_phrases($search_input, $is_quoted_search);
+    if ($phrases === null) return $all;
+
+    $pdo   = $index['pdo'];
+    $exact = $pdo->prepare("SELECT orgs FROM terms WHERE term = ?");
+    $range = $pdo->prepare("SELECT orgs FROM terms WHERE term >= ? AND term < ? LIMIT " . (MOOP_SKIP_INDEX_MAX_RANGE + 1));
+    $map   = $all;
+    foreach ($phrases as $p) {
+        $last = count($p['tokens']) - 1;
+        foreach ($p['tokens'] as $j => $tok) {
+            if ($p['prefix'] && $j === $last) {
+                $range->execute([$tok, $tok . "\xF4\x8F\xBF\xBF"]);
+                $rows = $range->fetchAll(PDO::FETCH_COLUMN);
+                if (count($rows) > MOOP_SKIP_INDEX_MAX_RANGE) continue;   // too broad to rule out
+                $orgs = str_repeat("\0", $index['width']);
+                foreach ($rows as $r) $orgs |= $r;
+            } else {
+                $exact->execute([$tok]);
+                $orgs = $exact->fetchColumn();
+                if ($orgs === false) $orgs = str_repeat("\0", $index['width']);
+            }
+            $map &= $orgs;
+        }
+    }
+    return $map;
+}
+
+/**
+ * Organisms with an ID containing the input: the AND of its trigrams' organism sets.
+ * All bits set when the input is shorter than a trigram. Trigrams holding a LIKE wildcard
+ * (% or _) match more than their bytes and are not required.
+ */
+function moop_skip_index_id_bitmap(array $index, $search_input): string
+{
+    $all = str_repeat("\xFF", $index['width']);
+    $id  = strtolower((string)$search_input);
+    if (strlen($id) < 3) return $all;
+
+    $stmt = $index['pdo']->prepare("SELECT orgs FROM id_trigrams WHERE gram = ?");
+    $map  = $all;
+    for ($i = 0, $n = strlen($id) - 2; $i < $n; $i++) {
+        $gram = substr($id, $i, 3);
+        if (strpbrk($gram, '%_') !== false) continue;
+        $stmt->bindValue(1, $gram, PDO::PARAM_LOB);
+        $stmt->execute();
+        $orgs = $stmt->fetchColumn();
+        $map &= ($orgs === false ? str_repeat("\0", $index['width']) : $orgs);
+        if (trim($map, "\0") === '') break;   // nothing left to rule out
+    }
+    return $map;
+}
@@ -0,0 +1,103 @@
+<?php
+/**
+ * Workload capture — one NDJSON line per search request, with what it takes to replay it.
+ *
+ * Every benchmark in notes/bench picks its terms by hand (kinase, helicase, transposases),
+ * which is the "one term is not a workload" trap notes/bench/iobench.py warns about.
+ * Telemetry (lib/search_telemetry.php) knows the real mix but hashes the expression, so it
+ * cannot be re-run. This keeps the request itself, for `python3 -m moopbench replay`
+ * (notes/bench/moopbench/replay.py) to re-issue against the databases or the site at the
+ * original timing, so a cache size, a layout or an index is judged on what users search.
+ *
+ * Each record:
+ *
+ *     ts         arrival, seconds with milliseconds
+ *     endpoint   'organism' (tools/annotation_search_ajax.php), 'stream'
+ *                (tools/annotation_search_stream.php), 'union' (api/union_search.php),
+ *                'feature_id' (api/feature_search.php)
+ *     term       what was searched
+ *     organisms  the organisms it was asked of ([] for a feature ID, which searches all)
+ *     params     the request's search parameters, verbatim but for the term
+ *     visitor    a token that is the same for one session's requests on one day and says
+ *                nothing else: HMAC of the session id under a salt that is regenerated
+ *                daily and never logged. The replayer needs it to put a fan-out's
+ *                per-organism requests back together into the search they were.
+ *
+ * ANONYMISED. No address, user name, session id or user agent is written. A term that
+ * looks like an e-mail address is replaced by its hash, and terms are cut at 200
+ * characters. Off unless 'search_capture_max_mb' is above 0; rotated to .1 past it, like
+ * telemetry. Never in the way: a capture that cannot be written is skipped, silently.
+ */
+
+/** Request parameters a replay needs; anything else (tokens, cache busters) is dropped. */
+const MOOP_CAPTURE_PARAMS = ['search_keywords', 'q', 'quoted', 'no_annotations', 'source_names',
+                             'group', 'assembly', 'gene_set', 'scope', 'scopes', 'organism',
+                             'organisms', 'top_k'];
+
+/**
+ * The term as it may be stored: e-mail-like terms hashed, everything cut at 200 chars.
+ */
+function moop_capture_term(string $term): string
+{
+    if (preg_match('/[^\s@]+@[^\s@]+\.[^\s@]+/', $term)) {
+        return 'redacted:' . substr(sha1($term), 0, 12);
+    }
+    return mb_substr($term, 0, 200);
+}
+
+/**
+ * The visitor token for this request's session: stable for a day, '' without a session.
+ * The salt lives beside the capture file and is replaced when the day changes.
+ */
+function moop_capture_visitor(string $dir): string
+{
+    $sid = session_id();
+    if ($sid === '' || $sid === false) return '';
+    $day       = gmdate('Y-m-d');
+    $salt_file = "$dir/.search_capture_salt";
+    $salt      = json_decode((string)@file_get_contents($salt_file), true);
+    if (!is_array($salt) || ($salt['day'] ?? '') !== $day || empty($salt['salt'])) {
+        $salt = ['day' => $day, 'salt' => bin2hex(random_bytes(16))];
+        // Two processes crossing midnight may each write one; a visitor's token then
+        // changes once, which costs the replayer one split search.
+        if (@file_put_contents($salt_file, json_encode($salt), LOCK_EX) !== false) {
+            @chmod($salt_file, 0600);
+        }
+    }
+    return substr(hash_hmac('sha256', $sid, $salt['salt']), 0, 12);
+}
+
+/**
+ * Record one search request.
+ *
+ * @param string $endpoint  'organism', 'stream', 'union' or 'feature_id'
+ * @param array  $get       the request's parameters ($_GET)
+ * @param array  $organisms the organisms it asks about
+ */
+function moop_search_capture(string $endpoint, array $get, array $organisms): void
+{
+    if (!class_exists('ConfigManager')) return;
+    $config = ConfigManager::getInstance();
+    $max_mb = $config->getInt('search_capture_max_mb', 0);
+    $file   = $config->getPath('search_capture_file');
+    if ($max_mb <= 0 || $file === '' || !is_dir(dirname($file))) return;
+
+    $term = moop_capture_term((string)($get['search_keywords'] ?? $get['q'] ?? ''));
+    if ($term === '') return;
+    $params = array_intersect_key($get, array_flip(MOOP_CAPTURE_PARAMS));
+    foreach (['search_keywords', 'q'] as $k) {
+        if (isset($params[$k])) $params[$k] = $term;
+    }
+    $record = [
+        'ts'        => round(microtime(true), 3),
+        'endpoint'  => $endpoint,
+        'term'      => $term,
+        'organisms' => array_values($organisms),
+        'params'    => $params,
+        'visitor'   => moop_capture_visitor(dirname($file)),
+    ];
+
+    clearstatcache(true, $file);
+    if (@filesize($file) > $max_mb * 1048576) @rename($file, "$file.1");
+    @file_put_contents($file, json_encode($record) . "\n", FILE_APPEND | LOCK_EX);
+}
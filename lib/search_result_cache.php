@@ -0,0 +1,290 @@
+<?php
+/**
+ * Shared search-result cache — one SQLite file on the fast volume, LRU within a byte budget,
+ * stale-while-revalidate.
+ *
+ * The same popular terms are searched over and over, and every cold repeat pays the whole
+ * search again: seconds of seeks on the rotational volume for a per-organism annotation
+ * search, an ATTACH of every accessible database for an ID lookup. The answer only changes
+ * when the database behind it does, so the finished JSON response is kept and served back.
+ *
+ * KEY. What the response depends on, normalised: the endpoint, the FTS expression the
+ * search runs (buildFtsMatchExpr(), so "kinase  binding" and "kinase binding" share an
+ * entry), every scope and source filter, the result cap, and MOOP_SEARCH_CACHE_VERSION
+ * (bump it when the response shape or the ranking changes). NOT the user: both endpoints
+ * check access before they get here, and what they return for an organism is the same
+ * for everyone who may see it -- the ID lookup puts the accessible gene sets in its key.
+ *
+ * VALIDITY. Each entry records the fingerprint (mtime:size -- the 'db:' part of
+ * buildPerOrganismFingerprints(), via moop_gene_set_identity_fingerprint(), one stat) of
+ * every organism database it was computed from. A reloaded or rebuilt organism therefore
+ * invalidates exactly the entries that read it, and no others. Entries also go stale after
+ * 'search_cache_ttl' seconds, for whatever the fingerprint cannot see (annotation_config.json
+ * quotas, a code change that forgot to bump the version).
+ *
+ * STALE-WHILE-REVALIDATE. A stale entry younger than MOOP_SEARCH_CACHE_MAX_STALE is served
+ * as it is, and the request recomputes it AFTER the response has gone out
+ * (fastcgi_finish_request()). One request per entry does that -- the first to take the
+ * revalidation lease; the rest keep getting the stale answer meanwhile rather than piling
+ * onto the same cold database. A stale answer is a complete, self-consistent result from
+ * the previous build, never a mix. Without php-fpm there is no way to answer first, so a
+ * stale entry is recomputed inline like a miss.
+ *
+ * BUDGET. 'search_cache_max_mb' of response bodies; past it, the least recently HIT
+ * entries go first. Hits record their time at most once a minute, so a hot entry costs a
+ * write per minute, not one per request. 0 turns the cache off.
+ *
+ * Never a dependency: an unopenable, locked or corrupt cache file is logged and the search
+ * runs uncached.
+ */
+
+require_once __DIR__ . '/cache_paths.php';
+require_once __DIR__ . '/gene_set_identity.php';    // moop_gene_set_identity_fingerprint()
+
+// Bump when the cached response shape or the ranking behind it changes.
+const MOOP_SEARCH_CACHE_VERSION = 2;
+
+const MOOP_SEARCH_CACHE_MAX_STALE      = 604800;   // 7 days past stale, then recompute inline
+const MOOP_SEARCH_CACHE_TOUCH_INTERVAL = 60;       // seconds between LRU timestamp writes
+const MOOP_SEARCH_CACHE_LEASE          = 120;      // one revalidation per entry per lease
+
+/** Byte budget for cached bodies; 0 = cache disabled. */
+function moop_search_cache_budget(): int
+{
+    $mb = ConfigManager::getInstance()->getInt('search_cache_max_mb', 256);
+    return $mb > 0 ? $mb * 1048576 : 0;
+}
+
+/**
+ * The cache database, opened read-write with its schema in place, or null.
+ *
+ * WAL, so a hit never waits behind another request's write. busy_timeout is short on
+ * purpose: a cache that makes a search wait is worse than no cache.
+ */
+function moop_search_cache_db(): ?PDO
+{
+    static $db = false;
+    if ($db !== false) return $db;
+    $db = null;
+
+    if (moop_search_cache_budget() === 0) return null;
+    $file = moop_search_cache_file();
+    if ($file === '' || !moop_ensure_cache_dir(dirname($file))) return null;
+
+    try {
+        $pdo = new PDO('sqlite:' . $file, null, null, [
+            PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READWRITE | PDO::SQLITE_OPEN_CREATE,
+        ]);
+        $pdo->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        $pdo->exec('PRAGMA busy_timeout = 250');
+        $pdo->exec('PRAGMA journal_mode = WAL');
+        $pdo->exec('PRAGMA synchronous = NORMAL');   // losing the last write on power loss is fine for a cache
+        $pdo->exec("CREATE TABLE IF NOT EXISTS search_cache (
+                        cache_key        TEXT PRIMARY KEY,
+                        fingerprints     TEXT NOT NULL,
+                        body             BLOB NOT NULL,
+                        bytes            INTEGER NOT NULL,
+                        created_at       INTEGER NOT NULL,
+                        last_hit         INTEGER NOT NULL,
+                        revalidate_until INTEGER NOT NULL DEFAULT 0
+                    )");
+        $pdo->exec("CREATE INDEX IF NOT EXISTS search_cache_lru ON search_cache(last_hit)");
+        $db = $pdo;
+    } catch (PDOException $e) {
+        error_log('MOOP search cache: cannot open ' . $file . ' — ' . $e->getMessage());
+    }
+    return $db;
+}
+
+/**
+ * Cache key for one request.
+ *
+ * @param string $endpoint short name of the calling endpoint
+ * @param array  $parts    everything else the response depends on; order-insensitive
+ *                         lists (sources, scope pairs) should be sorted by the caller
+ */
+function moop_search_cache_key(string $endpoint, array $parts): string
+{
+    return sha1(json_encode([MOOP_SEARCH_CACHE_VERSION, $endpoint, moop_search_results_limit(), $parts]));
+}
+
+/**
+ * Fingerprints of the databases a response reads, as stored with the entry.
+ *
+ * @param array $dbs organism => organism.sqlite path
+ */
+function moop_search_cache_fingerprints(array $dbs): string
+{
+    $fps = [];
+    foreach ($dbs as $organism => $path) $fps[$organism] = moop_gene_set_identity_fingerprint($path);
+    ksort($fps);
+    return json_encode($fps);
+}
+
+/**
+ * Serve a response body from the cache, computing and storing it when needed.
+ *
+ * Sends an X-MOOP-Search-Cache header (hit, stale, miss, off) so a slow search can be told
+ * apart from an uncached one in the browser's network panel.
+ *
+ * @param  array    $dbs     organism => organism.sqlite path the response reads
+ * @param  callable $compute function(): array{0: array, 1: bool} -- the response payload,
+ *                           and whether it may be cached (false for a failed search: a
+ *                           transient "database is locked" must not be remembered)
+ * @return string JSON body
+ */
+function moop_search_cache_serve(string $key, array $dbs, callable $compute): string
+{
+    $db = moop_search_cache_db();
+    if ($db === null) {
+        if (!headers_sent()) header('X-MOOP-Search-Cache: off');
+        return json_encode($compute()[0]);
+    }
+
+    $fps = moop_search_cache_fingerprints($dbs);
+    $ttl = max(1, ConfigManager::getInstance()->getInt('search_cache_ttl', 86400));
+    $now = time();
+
+    try {
+        $stmt = $db->prepare("SELECT fingerprints, body, created_at, last_hit
+                              FROM search_cache WHERE cache_key = ?");
+        $stmt->execute([$key]);
+        $row = $stmt->fetch(PDO::FETCH_ASSOC) ?: null;
+
+        if ($row !== null) {
+            $age = $now - (int)$row['created_at'];
+            if ($row['fingerprints'] === $fps && $age < $ttl) {
+                if ($now - (int)$row['last_hit'] >= MOOP_SEARCH_CACHE_TOUCH_INTERVAL) {
+                    $db->prepare("UPDATE search_cache SET last_hit = ? WHERE cache_key = ?")
+                       ->execute([$now, $key]);
+                }
+                if (!headers_sent()) header('X-MOOP-Search-Cache: hit');
+                return $row['body'];
+            }
+
+            if ($age < $ttl + MOOP_SEARCH_CACHE_MAX_STALE && function_exists('fastcgi_finish_request')) {
+                // Take the lease, or see that another request already has it. Either way
+                // this request answers from the stale entry.
+                $lease = $db->prepare("UPDATE search_cache SET revalidate_until = ?
+                                       WHERE cache_key = ? AND revalidate_until < ?");
+                $lease->execute([$now + MOOP_SEARCH_CACHE_LEASE, $key, $now]);
+                if ($lease->rowCount() === 1) {
+                    register_shutdown_function(function () use ($key, $fps, $compute) {
+                        fastcgi_finish_request();
+                        [$payload, $cacheable] = $compute();
+                        if ($cacheable) moop_search_cache_put($key, $fps, json_encode($payload));
+                    });
+                }
+                if (!headers_sent()) header('X-MOOP-Search-Cache: stale');
+                return $row['body'];
+            }
+        }
+    } catch (PDOException $e) {
+        error_log('MOOP search cache: lookup failed — ' . $e->getMessage());
+    }
+
+    [$payload, $cacheable] = $compute();
+    $body = json_encode($payload);
+    if ($cacheable) moop_search_cache_put($key, $fps, $body);
+    if (!headers_sent()) header('X-MOOP-Search-Cache: miss');
+    return $body;
+}
+
+/**
+ * Would moop_search_cache_serve() answer this key without running the search -- a fresh
+ * entry, or a stale one it may still serve? A read only: no hit is recorded and no lease
+ * taken. For callers that order work so the instant answers go first
+ * (tools/annotation_search_stream.php).
+ *
+ * @param array $dbs organism => organism.sqlite path the response reads
+ */
+function moop_search_cache_peek(string $key, array $dbs): bool
+{
+    $db = moop_search_cache_db();
+    if ($db === null) return false;
+
+    try {
+        $stmt = $db->prepare("SELECT fingerprints, created_at FROM search_cache WHERE cache_key = ?");
+        $stmt->execute([$key]);
+        $row = $stmt->fetch(PDO::FETCH_ASSOC);
+    } catch (PDOException $e) {
+        return false;
+    }
+    if (!$row) return false;
+
+    $ttl = max(1, ConfigManager::getInstance()->getInt('search_cache_ttl', 86400));
+    $age = time() - (int)$row['created_at'];
+    if ($row['fingerprints'] === moop_search_cache_fingerprints($dbs) && $age < $ttl) return true;
+    return $age < $ttl + MOOP_SEARCH_CACHE_MAX_STALE && function_exists('fastcgi_finish_request');
+}
+
+/**
+ * Store one body, then evict least-recently-hit entries until the cache is back under
+ * budget. Eviction goes to 90% of the budget, not 100%, so a full cache does not pay an
+ * eviction pass on every single store.
+ */
+function moop_search_cache_put(string $key, string $fps, string $body): void
+{
+    $db     = moop_search_cache_db();
+    $budget = moop_search_cache_budget();
+    if ($db === null || $body === '' || strlen($body) > $budget / 4) return;   // one answer may not take the cache
+
+    $now = time();
+    try {
+        $db->prepare("INSERT OR REPLACE INTO search_cache
+                          (cache_key, fingerprints, body, bytes, created_at, last_hit, revalidate_until)
+                      VALUES (?, ?, ?, ?, ?, ?, 0)")
+           ->execute([$key, $fps, $body, strlen($body), $now, $now]);
+
+        $total = (int)$db->query("SELECT COALESCE(SUM(bytes), 0) FROM search_cache")->fetchColumn();
+        if ($total > $budget) {
+            $target = (int)($budget * 0.9);
+            $doomed = [];
+            $lru = $db->query("SELECT cache_key, bytes FROM search_cache ORDER BY last_hit")
+                      ->fetchAll(PDO::FETCH_ASSOC);
+            foreach ($lru as $r) {
+                if ($total <= $target) break;
+                $doomed[] = $r['cache_key'];
+                $total   -= (int)$r['bytes'];
+            }
+            $db->beginTransaction();
+            $del = $db->prepare("DELETE FROM search_cache WHERE cache_key = ?");
+            foreach ($doomed as $k) $del->execute([$k]);
+            $db->commit();
+        }
+    } catch (PDOException $e) {
+        if ($db->inTransaction()) $db->rollBack();
+        error_log('MOOP search cache: store failed — ' . $e->getMessage());
+    }
+}
+
+/**
+ * Searches per organism over the past $days, as far as the cache knows: the number of
+ * entries hit in that window whose answer read the organism. Not a request count -- a
+ * popular term is one entry however often it is asked -- but it ranks organisms by how
+ * much of what people search touches them, which is what the prewarm and the search tier
+ * planner need. Empty when the cache is off or unreadable.
+ *
+ * @return array organism => entries, most first
+ */
+function moop_search_cache_usage(int $days = 7): array
+{
+    $db = moop_search_cache_db();
+    if ($db === null) return [];
+
+    $uses = [];
+    try {
+        $stmt = $db->prepare("SELECT fingerprints FROM search_cache WHERE last_hit >= ?");
+        $stmt->execute([time() - $days * 86400]);
+        foreach ($stmt->fetchAll(PDO::FETCH_COLUMN) as $fps) {
+            foreach (array_keys(json_decode($fps, true) ?: []) as $org) {
+                $uses[$org] = ($uses[$org] ?? 0) + 1;
+            }
+        }
+    } catch (PDOException $e) {
+        error_log('MOOP search cache: usage read failed — ' . $e->getMessage());
+        return [];
+    }
+    arsort($uses);
+    return $uses;
+}
@@ -0,0 +1,92 @@
+<?php
+/**
+ * Per-query telemetry — one NDJSON line per search, sequence fetch and MOOPmart organism
+ * pass, so production says what every benchmark in notes/bench has to reconstruct by hand.
+ *
+ * Those benchmarks measure cold against warm, bytes read and pool choice on one organism
+ * and one term at a time, under conditions they set up. What they cannot say is what the
+ * site actually does: which organisms are slow for real users, how often a search meets a
+ * cold disk, whether the quota pool is the one that runs. Each record carries
+ *
+ *     ts, kind       when, and what ran: 'search', 'sequence', 'moopmart'
+ *     organism
+ *     wall_ms        the whole operation, pool selection included for a search
+ *     read_bytes     bytes this process read from STORAGE meanwhile (/proc/self/io). Page
+ *                    cache hits do not count, so this is the cold/warm signal: a warm
+ *                    search reads ~0, a cold one megabytes.
+ *     rchar          bytes read through read() and pread(), cache hits included -- the
+ *                    I/O the operation asked for, wherever it was served from
+ *
+ * plus what the kind adds (for a search: a hash of the FTS expression, the match estimate,
+ * the pool strategy, the result count). The expression is hashed, not stored: it is what
+ * the user typed, and a log is the wrong place to keep it. Equal expressions hash equally,
+ * so per-term reports still group correctly.
+ *
+ * scripts/analyze_telemetry.py rolls the file up into per-organism and per-term
+ * percentiles. Appended with a lock, rotated to .1 at 'search_telemetry_max_mb'. Never in
+ * the way: a log that cannot be written is skipped, silently, like a cache that cannot be.
+ */
+
+/**
+ * This process's cumulative I/O counters from /proc/self/io. [] where there is no such
+ * file (not Linux) or it cannot be read.
+ */
+function moop_telemetry_io(): array
+{
+    $raw = @file_get_contents('/proc/self/io');
+    if ($raw === false) return [];
+    $io = [];
+    foreach (explode("\n", $raw) as $line) {
+        if (preg_match('/^(\w+):\s*(\d+)/', $line, $m)) $io[$m[1]] = (int)$m[2];
+    }
+    return $io;
+}
+
+/** The counters at the start of an operation, for moop_telemetry_record(). */
+function moop_telemetry_start(): array
+{
+    return ['t' => microtime(true), 'io' => moop_telemetry_io()];
+}
+
+/** Hash of an FTS expression, for grouping by term without storing it. */
+function moop_telemetry_term_hash(string $match): string
+{
+    return substr(sha1($match), 0, 12);
+}
+
+/**
+ * Append one record: kind and the caller's fields, plus wall time and I/O since $start.
+ */
+function moop_telemetry_record(string $kind, array $start, array $fields): void
+{
+    if (!class_exists('ConfigManager')) return;
+    $config = ConfigManager::getInstance();
+    $max_mb = $config->getInt('search_telemetry_max_mb', 64);
+    $file   = $config->getPath('search_telemetry_file');
+    if ($max_mb <= 0 || $file === '' || !is_dir(dirname($file))) return;
+
+    $io_end = moop_telemetry_io();
+    $io     = $start['io'] ?? [];
+    $record = ['ts' => time(), 'kind' => $kind] + $fields + [
+        'wall_ms'    => (int)round((microtime(true) - ($start['t'] ?? microtime(true))) * 1000),
+        'read_bytes' => isset($io_end['read_bytes'], $io['read_bytes']) ? $io_end['read_bytes'] - $io['read_bytes'] : null,
+        'rchar'      => isset($io_end['rchar'], $io['rchar']) ? $io_end['rchar'] - $io['rchar'] : null,
+    ];
+
+    // Rotation is racy between processes only in who does it; a line lands in one file or
+    // the other either way.
+    clearstatcache(true, $file);
+    if (@filesize($file) > $max_mb * 1048576) @rename($file, "$file.1");
+    @file_put_contents($file, json_encode($record) . "\n", FILE_APPEND | LOCK_EX);
+}
+
+/**
+ * The organism a file under the organism data tree belongs to -- its first directory
+ * there. '' for a file outside it.
+ */
+function moop_telemetry_organism_of(string $path): string
+{
+    $root = rtrim(ConfigManager::getInstance()->getPath('organism_data'), '/') . '/';
+    if ($root === '/' || strpos($path, $root) !== 0) return '';
+    return explode('/', substr($path, strlen($root)), 2)[0];
+}
@@ -0,0 +1,230 @@
+<?php
+/**
+ * Search tier — each organism's FTS index copied to the fast volume, ATTACHed at query time.
+ *
+ * Every organism database lives on sdb, the rotational volume: 32 ms per random read. sda,
+ * the fast one, does 0.5 ms. The same database copied to sda ran a cold search 17x faster,
+ * but there is not room on sda for all 85 databases, and most of each one is rows a
+ * search fetches a page of, not the index it walks. The index -- feature_annotation_search
+ * and feature_search, contentless FTS5, so postings and document sizes only -- is where a
+ * cold search spends its seeks, and it is a fraction of the file.
+ *
+ * So, per organism:
+ *
+ *     {search_tier_path}/{organism}/search.sqlite    the two FTS tables, shadow tables
+ *                                                    copied verbatim, plus meta(fingerprint)
+ *
+ * and getDbConnection() ATTACHes it AS search beside organism.sqlite, which stays where it
+ * is and is still main. Queries name the index through moop_fts_schema() --
+ * "FROM {$fts}.feature_annotation_search" -- which is 'search' when the tier is attached
+ * and 'main' otherwise, so one query text serves both. The rows a search returns still
+ * come from sdb; only the walk that finds them moves.
+ *
+ * The copy is exact. FTS5 keeps its whole index in ordinary shadow tables (_data, _idx,
+ * _docsize, _config), so copying them row for row under the same CREATE VIRTUAL TABLE
+ * gives an index that answers every MATCH, bm25() and fts5vocab query the original does,
+ * rowids included -- which is what the joins back into main rely on. The build checks it
+ * with FTS5's own integrity-check before the file is renamed into place.
+ *
+ * Not every organism fits. moop_search_tier_plan() decides which do: the most searched
+ * organisms per byte first, within 'search_tier_max_gb' and the free space on the volume.
+ * scripts/build_search_tier.php runs the plan -- builds what is missing or stale, and
+ * removes what no longer made the cut.
+ *
+ * An accelerator, never a dependency. No tier configured, no file, or one built from a
+ * different version of the database (fingerprint mismatch, e.g. after an FTS rebuild) ->
+ * nothing is attached and search reads the index in organism.sqlite, as before.
+ */
+
+require_once __DIR__ . '/cache_paths.php';
+require_once __DIR__ . '/gene_set_identity.php';    // moop_gene_set_identity_fingerprint()
+
+/** The FTS tables the tier holds. Everything else stays in organism.sqlite. */
+const MOOP_SEARCH_TIER_TABLES = ['feature_annotation_search', 'feature_search'];
+
+/** FTS5 shadow-table suffixes; _content only exists for a table that is not contentless. */
+const MOOP_SEARCH_TIER_SHADOWS = ['data', 'idx', 'docsize', 'config', 'content'];
+
+/**
+ * Write the search tier for one organism database.
+ *
+ * Built into a temporary file and renamed into place, with the fingerprint taken before
+ * reading, like the docsize sidecar (moop_docsize_write()): a database replaced mid-build
+ * then leaves a tier that is already stale, never one that claims to be current.
+ *
+ * @return array ['bytes' => int]
+ * @throws PDOException|RuntimeException
+ */
+function moop_search_tier_build(string $db_path, string $out): array
+{
+    $fingerprint = moop_gene_set_identity_fingerprint($db_path);
+    $uri_flag    = defined('PDO::SQLITE_OPEN_URI') ? PDO::SQLITE_OPEN_URI : 0x40;
+
+    $tmp = $out . '.tmp.' . getmypid();
+    @unlink($tmp);
+    try {
+        $dst = new PDO('sqlite:' . $tmp, null, null, [
+            PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READWRITE | PDO::SQLITE_OPEN_CREATE | $uri_flag,
+        ]);
+        $dst->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        $dst->exec('PRAGMA journal_mode = OFF');
+        $dst->exec('PRAGMA synchronous = OFF');
+        $dst->exec('ATTACH DATABASE ' . $dst->quote('file:' . $db_path . '?mode=ro') . ' AS src');
+
+        $dst->beginTransaction();
+        $find = $dst->prepare("SELECT sql FROM src.sqlite_master WHERE type = 'table' AND name = ?");
+        foreach (MOOP_SEARCH_TIER_TABLES as $table) {
+            $find->execute([$table]);
+            $ddl = $find->fetchColumn();
+            if (!$ddl) throw new RuntimeException("$table is not in $db_path");
+            $dst->exec($ddl);
+
+            foreach (MOOP_SEARCH_TIER_SHADOWS as $suffix) {
+                $shadow = "{$table}_$suffix";
+                $find->execute([$shadow]);
+                if ($find->fetchColumn() === false) continue;
+                // The CREATE above seeded _config and _data with an empty index's rows.
+                $dst->exec("DELETE FROM main.$shadow");
+                $dst->exec("INSERT INTO main.$shadow SELECT * FROM src.$shadow");
+            }
+            $dst->exec("INSERT INTO main.$table($table) VALUES ('integrity-check')");
+        }
+        $dst->exec("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)");
+        $meta = $dst->prepare("INSERT INTO meta (key, value) VALUES (?, ?)");
+        $meta->execute(['fingerprint', $fingerprint]);
+        $meta->execute(['source', $db_path]);
+        $dst->commit();
+        $dst->exec('DETACH DATABASE src');
+        $dst = null;
+    } catch (PDOException | RuntimeException $e) {
+        $dst = null;
+        @unlink($tmp);
+        throw $e;
+    }
+
+    if (!rename($tmp, $out)) {
+        @unlink($tmp);
+        throw new RuntimeException("could not move $tmp into place");
+    }
+    return ['bytes' => (int)filesize($out)];
+}
+
+/**
+ * Attach an organism's search tier to a connection on its database, if it has a current
+ * one. Called by getDbConnection() for every organism database it opens; records the
+ * answer for moop_fts_schema().
+ */
+function moop_search_tier_attach(PDO $dbh, string $db_path): bool
+{
+    // Only organism databases have tiers; the union index and the caches go through
+    // getDbConnection() too.
+    $file     = basename($db_path) === 'organism.sqlite' ? moop_search_tier_file($db_path) : '';
+    $attached = $file !== '' && moop_search_tier_attach_file($dbh, $file, $db_path);
+    moop_search_tier_attached($db_path, $attached);
+    return $attached;
+}
+
+/**
+ * moop_search_tier_attach() for an explicit tier file. Attaches it AS search, read-only,
+ * and detaches it again unless it was built from the database as it is now.
+ */
+function moop_search_tier_attach_file(PDO $dbh, string $file, string $db_path): bool
+{
+    if (!is_file($file)) return false;
+    try {
+        $dbh->exec('ATTACH DATABASE ' . $dbh->quote('file:' . $file . '?mode=ro') . ' AS search');
+        $fp = $dbh->query("SELECT value FROM search.meta WHERE key = 'fingerprint'")->fetchColumn();
+        if ($fp === moop_gene_set_identity_fingerprint($db_path)) return true;
+        $dbh->exec('DETACH DATABASE search');
+    } catch (PDOException $e) {
+        error_log('MOOP search tier: unusable ' . $file . ' — ' . $e->getMessage());
+        try { $dbh->exec('DETACH DATABASE search'); } catch (PDOException $e2) { /* never attached */ }
+    }
+    return false;
+}
+
+/**
+ * Whether getDbConnection() attached a search tier for this database. Set once per
+ * connection by moop_search_tier_attach(); read through moop_fts_schema().
+ */
+function moop_search_tier_attached(string $db_path, ?bool $attached = null): bool
+{
+    static $state = [];
+    if ($attached !== null) $state[$db_path] = $attached;
+    return $state[$db_path] ?? false;
+}
+
+/**
+ * The schema that holds this organism's FTS tables on its getDbConnection() handle:
+ * 'search' when the tier is attached, 'main' otherwise. For "FROM {$fts}.feature_search",
+ * fts5vocab(<schema>, ...), "{$fts}.sqlite_master" and PRAGMA <schema>.table_info.
+ *
+ * Opens the connection if it is not open yet, because that is where the decision is made.
+ * A connection that cannot be opened answers 'main'; the query that follows reports why.
+ */
+function moop_fts_schema(string $db_path): string
+{
+    try {
+        getDbConnection($db_path);
+    } catch (PDOException $e) {
+        return 'main';
+    }
+    return moop_search_tier_attached($db_path) ? 'search' : 'main';
+}
+
+/**
+ * Bytes one organism's FTS index will take as a search tier.
+ *
+ * The sum of what the shadow tables hold, plus a tenth for b-tree page overhead (the copy
+ * is written in key order, so its pages are nearly full). Reads the whole index, which is
+ * why scripts/build_search_tier.php keeps the answer per fingerprint and asks again only
+ * after a rebuild. No dbstat: it is not compiled into every SQLite PHP links against.
+ *
+ * @throws PDOException
+ */
+function moop_search_tier_measure(string $db_path): int
+{
+    $dbh   = getDbConnection($db_path);
+    $bytes = 0;
+    foreach (MOOP_SEARCH_TIER_TABLES as $table) {
+        $bytes += (int)$dbh->query("SELECT SUM(length(block)) + 16 * COUNT(*) FROM main.{$table}_data")->fetchColumn();
+        $bytes += (int)$dbh->query("SELECT SUM(length(term)) + 24 * COUNT(*) FROM main.{$table}_idx")->fetchColumn();
+        $bytes += (int)$dbh->query("SELECT SUM(length(sz)) + 12 * COUNT(*) FROM main.{$table}_docsize")->fetchColumn();
+    }
+    return (int)ceil($bytes * 1.1);
+}
+
+/**
+ * Which organisms get a search tier.
+ *
+ * The space is worth most where it saves the most cold searches per byte, so organisms go
+ * in by searches-per-byte, densest first, while they fit; one too large for what is left
+ * is passed over, not a reason to stop. A never-searched organism counts as one search, so
+ * with no usage data at all the smallest go first -- the most organisms made fast for the
+ * space.
+ *
+ * @param array $sizes    organism => tier bytes (moop_search_tier_measure(), or a built tier's size)
+ * @param int   $capacity bytes available for tiers
+ * @param array $uses     organism => searches (moop_search_cache_usage())
+ * @return array ['tier' => [organism => bytes], 'left' => [organism => bytes], 'bytes' => int]
+ */
+function moop_search_tier_plan(array $sizes, int $capacity, array $uses = []): array
+{
+    $order = array_keys($sizes);
+    usort($order, function ($a, $b) use ($sizes, $uses) {
+        $da = (($uses[$a] ?? 0) + 1) / max(1, $sizes[$a]);
+        $db = (($uses[$b] ?? 0) + 1) / max(1, $sizes[$b]);
+        return $db <=> $da ?: strcmp($a, $b);
+    });
+
+    $plan = ['tier' => [], 'left' => [], 'bytes' => 0];
+    foreach ($order as $org) {
+        if ($plan['bytes'] + $sizes[$org] <= $capacity) {
+            $plan['tier'][$org] = $sizes[$org];
+            $plan['bytes'] += $sizes[$org];
+        } else {
+            $plan['left'][$org] = $sizes[$org];
+        }
+    }
+    return $plan;
+}
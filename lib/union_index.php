@@ -0,0 +1,215 @@
+<?php
+/**
+ * Cross-organism union index — rank ONCE, then fetch per organism.
+ *
+ * A cross-organism annotation search used to run searchFeaturesAndAnnotations() against
+ * every selected organism.sqlite, and each of those ran its own bm25() pass over its own
+ * _docsize table. bm25 is where a cold search's I/O goes, and the multiplier is the
+ * organism count: 49 organisms, "helicase", 2,517 MB read in 156.9 s
+ * (notes/SEARCH_COST_MODEL_2026-07-31.md, section 1).
+ *
+ * The annotation TEXT barely varies between organisms -- 25.7M rows across 79 organisms
+ * hold 1.39M distinct (accession, description) pairs, ~139 MB -- so union.sqlite indexes
+ * each distinct document once and keeps a posting list back to (organism,
+ * feature_annotation_id). A search ranks there once, keeps the top documents, and only the
+ * survivors are fetched from each organism database, through the same tiers and row shape
+ * as the per-organism path (searchFeaturesAndAnnotations' union pool).
+ *
+ * ACCESS CONTROL. Per-organism search enforces privacy by never opening a database the
+ * user cannot see. The union index holds every organism in one file, so here it is a
+ * filter, applied twice and failing closed both times:
+ *
+ *   1. union_posting rows are restricted to the org_ids of ACCESSIBLE organisms inside the
+ *      ranking query, so an inaccessible organism cannot even take a slot in the pool;
+ *   2. the per-organism fetch is restricted to the accessible gene_set_ids, so a
+ *      restricted gene set inside an accessible organism stays out.
+ *
+ * An organism whose accessible gene sets cannot all be identified is not searched through
+ * the union at all -- it is handed back as stale, for the per-organism path.
+ *
+ * STALENESS. union_organism records the organism.sqlite fingerprint (mtime:size, the same
+ * one lib/gene_set_identity.php uses) each organism was indexed from. An organism reloaded
+ * since is reported stale and is NOT served from its old postings: its feature_annotation
+ * ids may have been reassigned, which would silently attach the wrong annotation to a gene.
+ * scripts/build_union_index.php --organism=NAME refreshes one organism in place.
+ *
+ * It is an accelerator, never a dependency: no union.sqlite, or an unreadable one, means
+ * every organism comes back stale and the caller searches exactly as before.
+ */
+
+require_once __DIR__ . '/cache_paths.php';
+require_once __DIR__ . '/functions_database.php';   // getDbConnection()
+require_once __DIR__ . '/gene_set_identity.php';    // moop_gene_set_identity_fingerprint()
+require_once __DIR__ . '/database_queries.php';
+
+/**
+ * Organisms currently indexed, with whether each is still current.
+ *
+ * @return array organism => ['org_id' => int, 'fresh' => bool], or [] when there is no
+ *               usable union index.
+ */
+function moop_union_index_organisms(string $union_file, string $organism_data): array
+{
+    if ($union_file === '' || !is_file($union_file) || !is_readable($union_file)) return [];
+
+    try {
+        $dbh  = getDbConnection($union_file);
+        $rows = $dbh->query("SELECT org_id, organism, fingerprint FROM union_organism")
+                    ->fetchAll(PDO::FETCH_ASSOC);
+    } catch (PDOException $e) {
+        error_log('MOOP union index: unreadable ' . $union_file . ' — ' . $e->getMessage());
+        return [];
+    }
+
+    $out = [];
+    foreach ($rows as $row) {
+        $db = "$organism_data/{$row['organism']}/organism.sqlite";
+        $out[$row['organism']] = [
+            'org_id' => (int)$row['org_id'],
+            'fresh'  => $row['fingerprint'] === moop_gene_set_identity_fingerprint($db),
+        ];
+    }
+    return $out;
+}
+
+/**
+ * Rank the whole site once and return the surviving rows, per organism.
+ *
+ * Ranked on annotation text only -- the column filter keeps the type-code column out of
+ * the match, or a prefix such as "at" would match every "atype...z" token. Weights mirror
+ * the annotation columns of the per-organism bm25 (description 2, accession 3).
+ *
+ * @param  string $match   FTS5 expression from buildFtsMatchExpr()
+ * @param  int[]  $org_ids union org_ids the user may see
+ * @return array  org_id => feature_annotation_id[], best document first
+ */
+function moop_union_rank(string $union_file, string $match, array $org_ids): array
+{
+    if ($match === '' || empty($org_ids)) return [];
+
+    $ids       = implode(',', array_map('intval', $org_ids));
+    $doc_pool  = (int) (moop_search_results_limit() * 2);
+    $per_org   = (int) (moop_search_results_limit() * 2);
+
+    // EXISTS inside the ranked CTE, not only in the outer join: a document held solely by
+    // organisms this user cannot see must not occupy one of the $doc_pool slots, or a
+    // private organism's vocabulary could crowd a public search down to nothing.
+    $sql = "WITH hits AS (
+                SELECT rowid AS doc_id, bm25(union_search, 2.0, 3.0, 0.0) AS rank
+                FROM union_search
+                WHERE union_search MATCH ?
+                  AND EXISTS (SELECT 1 FROM union_posting p
+                              WHERE p.doc_id = union_search.rowid AND p.org_id IN ($ids))
+                ORDER BY rank
+                LIMIT $doc_pool
+            )
+            SELECT p.org_id, p.feature_annotation_id
+            FROM hits h
+            JOIN union_posting p ON p.doc_id = h.doc_id
+            WHERE p.org_id IN ($ids)
+            ORDER BY h.rank, p.org_id, p.feature_annotation_id";
+
+    $dbh  = getDbConnection($union_file);
+    $stmt = $dbh->prepare($sql);
+    $stmt->execute(['{annotation_description annotation_accession} : (' . $match . ')']);
+
+    $out = [];
+    while ($row = $stmt->fetch(PDO::FETCH_NUM)) {
+        $org = (int)$row[0];
+        if (count($out[$org] ?? []) < $per_org) $out[$org][] = (int)$row[1];
+    }
+    return $out;
+}
+
+/**
+ * The union pools for many organisms: one ranking in union.sqlite, split per organism.
+ *
+ * Organisms the user cannot access are dropped before anything is read. Organisms that
+ * the union index cannot serve -- not indexed, reloaded since, or with a gene set whose id
+ * could not be resolved -- are returned in 'stale' for the caller to search per organism.
+ *
+ * @param  string   $search_term      Already sanitized
+ * @param  bool     $is_quoted_search
+ * @param  string[] $organisms        Organism directory names in scope
+ * @return array ['pools' => [organism => searchFeaturesAndAnnotations() $union_pool],
+ *                'stale' => string[]]
+ */
+function moop_union_pools($search_term, $is_quoted_search, array $organisms): array
+{
+    $config        = ConfigManager::getInstance();
+    $organism_data = $config->getPath('organism_data');
+    $wanted        = array_flip($organisms);
+
+    // Accessible gene sets per organism. A source whose gene_set_id did not resolve makes
+    // the whole organism ineligible: the gene-set filter would otherwise quietly drop that
+    // gene set's rows, and the per-organism path knows how to search it.
+    $gene_sets = [];
+    $unresolved = [];
+    foreach (flattenSourcesList(getAccessibleGeneSets()) as $src) {
+        $org = $src['organism'];
+        if (!isset($wanted[$org])) continue;
+        if (empty($src['gene_set_id'])) { $unresolved[$org] = true; continue; }
+        $gene_sets[$org][(int)$src['gene_set_id']] = true;
+    }
+
+    $union_file = moop_union_index_file();
+    $indexed    = moop_union_index_organisms($union_file, $organism_data);
+
+    $serve = [];   // organism => org_id
+    $stale = [];
+    foreach (array_keys($gene_sets + $unresolved) as $org) {
+        if (!isset($unresolved[$org]) && !empty($indexed[$org]['fresh'])) {
+            $serve[$org] = $indexed[$org]['org_id'];
+        } else {
+            $stale[] = $org;
+        }
+    }
+    sort($stale);
+
+    if (empty($serve)) return ['pools' => [], 'stale' => $stale];
+
+    $match = buildFtsMatchExpr($search_term, $is_quoted_search);
+    try {
+        $ranked = moop_union_rank($union_file, $match, array_values($serve));
+    } catch (PDOException $e) {
+        // A damaged or half-written index must not take search down with it.
+        error_log('MOOP union index: rank failed — ' . $e->getMessage());
+        $stale = array_merge($stale, array_keys($serve));
+        sort($stale);
+        return ['pools' => [], 'stale' => $stale];
+    }
+
+    // Every served organism gets a pool, even one with no ranked postings: the union pool's
+    // second arm still finds genes that match through their own name or description.
+    ksort($serve);
+    $pools = [];
+    foreach ($serve as $org => $org_id) {
+        $ids = array_keys($gene_sets[$org]);
+        sort($ids);
+        $pools[$org] = ['rowids' => $ranked[$org_id] ?? [], 'gene_set_ids' => $ids];
+    }
+    return ['pools' => $pools, 'stale' => $stale];
+}
+
+/**
+ * Annotation search across many organisms through the union index, every served organism
+ * fetched in turn (moop_union_pools()).
+ *
+ * @param  string   $search_term      Already sanitized
+ * @param  bool     $is_quoted_search
+ * @param  string[] $organisms        Organism directory names in scope
+ * @return array ['results' => [organism => runFtsSearch() shape], 'stale' => string[]]
+ */
+function moop_union_search($search_term, $is_quoted_search, array $organisms): array
+{
+    $organism_data = ConfigManager::getInstance()->getPath('organism_data');
+    $found   = moop_union_pools($search_term, $is_quoted_search, $organisms);
+    $results = [];
+    foreach ($found['pools'] as $org => $pool) {
+        $results[$org] = searchFeaturesAndAnnotations(
+            $search_term, $is_quoted_search, "$organism_data/$org/organism.sqlite",
+            [], '', '', [], $pool
+        );
+    }
+    return ['results' => $results, 'stale' => $found['stale']];
+}
@@ -12,17 +12,28 @@ is global, so nothing else should be hitting the disk while this runs.
 Cold is the number that matters; warm is reported alongside because a large cold/warm gap
 is what says the cost is I/O and not CPU.
 
+--scheduler picks how the fan-out is run:
+  fixed     the old browser pool: --conc at a time, in the order given
+  adaptive  js/modules/fanout-scheduler.js, mirrored below: the plan from
+            api/fanout_schedule.php (warm first, cold largest first), run as a warm and
+            a cold lane, each sized from its observed latency
+  both      fixed, then adaptive, each from an evicted start -- the A/B in one run
+"half" is when half the organisms had answered: what a user watching the page fill sees,
+which a total alone hides.
+
 usage:
   crossorg_ab.py --term helicase --orgs A,B,C
   crossorg_ab.py --term helicase --orgs-file /tmp/orgs.txt --label after
+  crossorg_ab.py --term helicase --orgs-file /tmp/orgs.txt --scheduler both
 """
 import argparse, json, os, subprocess, sys, time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from quota import hard_evict
 
 BASE = "http://172.16.2.52/moop/tools/annotation_search_ajax.php"
+SCHEDULE = "http://172.16.2.52/moop/api/fanout_schedule.php"
 ORGDIR = "/var/www/html/moop/organisms"
 
 
@@ -45,10 +56,102 @@ def one(org, term):
 
 
 def sweep(orgs, term, conc):
+    """The fixed pool. Returns (seconds, sdb MB, counts in orgs order, seconds to half)."""
     t0, d0 = time.perf_counter(), sdb_mb()
+    done = []
+
+    def timed(o):
+        n = one(o, term)
+        done.append(time.perf_counter() - t0)
+        return n
+
     with ThreadPoolExecutor(max_workers=conc) as ex:
-        counts = list(ex.map(lambda o: one(o, term), orgs))
-    return time.perf_counter() - t0, sdb_mb() - d0, counts
+        counts = list(ex.map(timed, orgs))
+    return time.perf_counter() - t0, sdb_mb() - d0, counts, sorted(done)[(len(done) - 1) // 2]
+
+
+class Limit:
+    """FanoutLimit in js/modules/fanout-scheduler.js -- keep the two in step."""
+    TOLERANCE = 1.5
+
+    def __init__(self, initial, lo, hi, per_byte):
+        self.limit, self.lo, self.hi, self.per_byte = initial, lo, hi, per_byte
+        self.best = float("inf")
+
+    def observe(self, ms, nbytes):
+        cost = ms / (1 + (nbytes or 0) / 1048576) if self.per_byte else ms
+        if cost <= 0:
+            return
+        self.best = min(self.best, cost)
+        gradient = max(0.5, min(1.0, self.best * self.TOLERANCE / cost))
+        target = self.limit * gradient + 1
+        self.limit = max(self.lo, min(self.hi, 0.8 * self.limit + 0.2 * target))
+
+    @property
+    def slots(self):
+        return int(self.limit)
+
+
+def schedule(orgs):
+    """api/fanout_schedule.php's plan, as the browser gets it ([] on failure)."""
+    out = subprocess.run(
+        ["curl", "-s", "--max-time", "10", f"{SCHEDULE}?kind=search&organisms={','.join(orgs)}"],
+        capture_output=True, text=True)
+    try:
+        return json.loads(out.stdout).get("schedule", [])
+    except Exception:
+        return []
+
+
+def adaptive_sweep(orgs, term):
+    """FanoutScheduler in js/modules/fanout-scheduler.js. Same return as sweep(), plus the
+    plan it ran and each lane's final limit."""
+    t0, d0 = time.perf_counter(), sdb_mb()
+    plan = schedule(orgs)
+    planned = {s["organism"] for s in plan}
+    nbytes = {s["organism"]: s.get("bytes", 0) for s in plan}
+    warm = [s["organism"] for s in plan if s.get("warm")]
+    cold = [s["organism"] for s in plan if not s.get("warm")] + [o for o in orgs if o not in planned]
+    split = f"{len(warm)} warm / {len(cold)} cold"
+    lanes = [
+        {"name": "warm", "queue": warm, "in": 0, "limit": Limit(4, 2, 8, False)},
+        {"name": "cold", "queue": cold, "in": 0, "limit": Limit(2, 1, 5, True)},
+    ]
+
+    counts, done, running = {}, [], {}
+    with ThreadPoolExecutor(max_workers=13) as ex:
+        while True:
+            for lane in lanes:
+                while lane["queue"] and lane["in"] < lane["limit"].slots:
+                    o = lane["queue"].pop(0)
+                    lane["in"] += 1
+                    running[ex.submit(one, o, term)] = (lane, o, time.perf_counter())
+            if not running:
+                break
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for f in finished:
+                lane, o, started = running.pop(f)
+                lane["in"] -= 1
+                lane["limit"].observe((time.perf_counter() - started) * 1000, nbytes.get(o, 0))
+                counts[o] = f.result()
+                done.append(time.perf_counter() - t0)
+    return (time.perf_counter() - t0, sdb_mb() - d0, [counts[o] for o in orgs],
+            sorted(done)[(len(done) - 1) // 2],
+            f"{split}, final limits "
+            f"{lanes[0]['limit'].limit:.1f} / {lanes[1]['limit'].limit:.1f}")
+
+
+def evict_all(orgs):
+    # Evict every database in the set and VERIFY. An unverified evict reports a cache hit
+    # as a cold read, which is how a benchmark in this very directory once measured page
+    # cache and called it disk latency.
+    still = []
+    for o in orgs:
+        r, _ = hard_evict(os.path.join(ORGDIR, o, "organism.sqlite"))
+        if r:
+            still.append(f"{o}:{r}")
+    if still:
+        sys.exit("eviction failed for " + ", ".join(still))
 
 
 def main():
@@ -62,6 +165,7 @@ def main():
     # right now", which is a different question from "what does a first visitor get" --
     # and it is the only way to see whether the working set is actually staying resident.
     ap.add_argument("--no-evict", action="store_true")
+    ap.add_argument("--scheduler", choices=["fixed", "adaptive", "both"], default="fixed")
     args = ap.parse_args()
 
     if args.orgs_file:
@@ -70,35 +174,36 @@ def main():
         orgs = [o.strip() for o in (args.orgs or "").split(",") if o.strip()]
     if not orgs:
         sys.exit("no organisms given")
-
-    # Evict every database in the set and VERIFY. An unverified evict reports a cache hit
-    # as a cold read, which is how a benchmark in this very directory once measured page
-    # cache and called it disk latency.
-    still = []
     for o in orgs:
         db = os.path.join(ORGDIR, o, "organism.sqlite")
         if not os.path.exists(db):
             sys.exit(f"missing {db}")
-        if args.no_evict:
-            continue
-        r, _ = hard_evict(db)
-        if r:
-            still.append(f"{o}:{r}")
-    if still:
-        sys.exit("eviction failed for " + ", ".join(still))
-
-    cold_s, cold_mb, counts = sweep(orgs, args.term, args.conc)
-    warm_s, warm_mb, _ = sweep(orgs, args.term, args.conc)
+    # Without eviction the second arm would start with what the first left warm -- an A/B
+    # rigged for whichever runs second. Run the arms separately, with --label.
+    if args.no_evict and args.scheduler == "both":
+        sys.exit("--scheduler both needs eviction; run each arm with --no-evict separately")
 
     tag = f" [{args.label}]" if args.label else ""
-    print(f"\n  {len(orgs)} organisms, term {args.term!r}, concurrency {args.conc}{tag}")
-    print(f"    COLD  {cold_s:7.1f} s   {cold_mb:8.1f} MB")
-    print(f"    WARM  {warm_s:7.1f} s   {warm_mb:8.1f} MB")
-    if warm_s > 0:
-        print(f"    ratio {cold_s / warm_s:7.1f}x")
-    bad = [o for o, c in zip(orgs, counts) if c < 0]
-    print(f"    rows returned: {sum(c for c in counts if c > 0):,}"
-          + (f"   ⚠ {len(bad)} organism(s) returned no parseable JSON: {bad[:3]}" if bad else ""))
+    arms = ["fixed", "adaptive"] if args.scheduler == "both" else [args.scheduler]
+    for arm in arms:
+        if not args.no_evict:
+            evict_all(orgs)
+        run = (lambda: sweep(orgs, args.term, args.conc) + ("",)) if arm == "fixed" \
+            else (lambda: adaptive_sweep(orgs, args.term))
+        cold_s, cold_mb, counts, cold_half, note = run()
+        warm_s, warm_mb, _, warm_half, _ = run()
+
+        how = f"concurrency {args.conc}" if arm == "fixed" else "adaptive"
+        print(f"\n  {len(orgs)} organisms, term {args.term!r}, {how}{tag}")
+        if note:
+            print(f"    plan  {note}")
+        print(f"    COLD  {cold_s:7.1f} s   {cold_mb:8.1f} MB   half at {cold_half:6.1f} s")
+        print(f"    WARM  {warm_s:7.1f} s   {warm_mb:8.1f} MB   half at {warm_half:6.1f} s")
+        if warm_s > 0:
+            print(f"    ratio {cold_s / warm_s:7.1f}x")
+        bad = [o for o, c in zip(orgs, counts) if c < 0]
+        print(f"    rows returned: {sum(c for c in counts if c > 0):,}"
+              + (f"   ⚠ {len(bad)} organism(s) returned no parseable JSON: {bad[:3]}" if bad else ""))
 
 
 if __name__ == "__main__":
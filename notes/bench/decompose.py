@@ -7,6 +7,10 @@ join that fetches the matched rows out of feature/annotation.
 
 Each stage is measured after a verified eviction, so the stages are not warming each
 other. Stages are cumulative: each does everything the previous one did, plus more.
+
+With --trace each stage runs instead through moopbench's tracing VFS on the sdb disk
+model, and the bytes are split exactly, by the object they were read from -- which
+answers the question without subtracting one noisy cold run from another.
 """
 import os, sqlite3, sys, time
 
@@ -50,8 +54,26 @@ STAGES = {
             LIMIT {CAP}""",
 }
 
-term = sys.argv[1] if len(sys.argv) > 1 else "helicase"
+args = [a for a in sys.argv[1:] if a != "--trace"]
+term = args[0] if args else "helicase"
 print(f"\n  {ORGDB.split('/')[-2]}, term {term!r} — cumulative stages, each from cold\n")
+
+if "--trace" in sys.argv:
+    from moopbench.diskmodel import DiskModel
+    from moopbench.trace import Tracer, trace_sql
+    from moopbench.vfs import LatencyVFS
+    tracer = Tracer(LatencyVFS(DiskModel.load("sdb")), ORGDB)
+    for label, sql in STAGES.items():
+        objs = trace_sql(tracer, sql, (term,), label).objects()
+        mb = sum(o["disk_bytes"] for o in objs) / 1048576
+        ms = sum(o["disk_ms"] for o in objs)
+        print(f"  {label:32} {ms / 1000:6.2f} s  {mb:7.1f} MB   (modelled)")
+        for o in objs:
+            if o["disk_bytes"]:
+                print(f"      {o['object'][:38]:38} {o['disk_bytes'] / 1048576:7.1f} MB  "
+                      f"{o['touched']:7,} pages  {o['runs']:6,} runs")
+    sys.exit(0)
+
 prev = 0.0
 for label, sql in STAGES.items():
     evict(ORGDB)
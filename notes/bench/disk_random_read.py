@@ -17,11 +17,17 @@ block every "random" offset resolved to block 0, so it re-read one block 60 time
 made sda look better than it is. If a volume has no large file to test, this creates
 one rather than quietly testing a small one.
 
-usage:  disk_random_read.py [--reads N] [--size-mb N] [PATH ...]
+QUEUE DEPTH. --depth 1,4,16 repeats the measurement with that many reads in flight
+(one thread each; preadv releases the GIL). A seek-bound disk holds its reads/s nearly
+flat as depth grows, so each read waits longer -- 5 -> 15 in flight on sdb bought 1.12x.
+--json FILE writes every latency per depth plus a streaming rate, which
+`python3 -m moopbench fit FILE` turns into the disk model moopbench.vfs emulates.
+
+usage:  disk_random_read.py [--reads N] [--size-mb N] [--depth 1,4,16] [--json FILE] [PATH ...]
 
 With no PATH it tests one file per mounted volume it can find a suitable file on.
 """
-import os, random, statistics, sys, time
+import json, mmap, os, random, statistics, sys, threading, time
 
 BLOCK = 4096
 DEFAULT_READS = 200
@@ -69,8 +75,8 @@ def find_or_make(path_hint, size_mb):
     return made, True
 
 
-def measure(path, reads):
-    """Median/p95 latency of `reads` random 4K reads, cache bypassed."""
+def measure(path, reads, depth=1):
+    """Median/p95 latency of `reads` random 4K reads, cache bypassed, `depth` in flight."""
     size = os.path.getsize(path)
     if size < BLOCK * 64:
         return None, f"too small to sample randomly ({size} bytes)"
@@ -81,29 +87,64 @@ def measure(path, reads):
         return None, f"O_DIRECT unavailable ({exc}) -- number would be untrustworthy"
 
     try:
-        # O_DIRECT requires a page-aligned buffer; an anonymous mmap gives one.
-        import mmap
-        buf = mmap.mmap(-1, BLOCK)
         highest = (size - BLOCK) & ~(BLOCK - 1)
         latencies = []
-        for _ in range(reads):
-            offset = random.randrange(0, highest // BLOCK + 1) * BLOCK
-            t0 = time.perf_counter()
-            os.preadv(fd, [buf], offset)
-            latencies.append((time.perf_counter() - t0) * 1000.0)
+
+        def worker(n):
+            # O_DIRECT requires a page-aligned buffer; an anonymous mmap gives one.
+            buf = mmap.mmap(-1, BLOCK)
+            rng = random.Random()
+            mine = []
+            for _ in range(n):
+                offset = rng.randrange(0, highest // BLOCK + 1) * BLOCK
+                t0 = time.perf_counter()
+                os.preadv(fd, [buf], offset)
+                mine.append((time.perf_counter() - t0) * 1000.0)
+            latencies.extend(mine)
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(reads // depth + (i < reads % depth),))
+                   for i in range(depth)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        raw = list(latencies)
         latencies.sort()
         return {
             "n": len(latencies),
+            "depth": depth,
             "median": statistics.median(latencies),
             "mean": statistics.fmean(latencies),
             "p95": latencies[int(len(latencies) * 0.95) - 1],
             "max": latencies[-1],
+            "reads_per_s": len(latencies) / elapsed,
             "size_mb": size / 1024**2,
+            "latencies_ms": raw,
         }, None
     finally:
         os.close(fd)
 
 
+def streaming_mb_s(path, mb=64, chunk_mb=1):
+    """Sequential O_DIRECT read rate over `mb` from a random aligned start; None if too small."""
+    size = os.path.getsize(path)
+    span = min(mb, size // 1048576 - 1) * 1048576
+    if span < chunk_mb * 1048576 * 4:
+        return None
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECT)
+    try:
+        buf = mmap.mmap(-1, chunk_mb * 1048576)
+        start = random.randrange(0, (size - span) // BLOCK) * BLOCK
+        t0 = time.perf_counter()
+        for off in range(start, start + span, len(buf)):
+            os.preadv(fd, [buf], off)
+        return span / 1048576 / (time.perf_counter() - t0)
+    finally:
+        os.close(fd)
+
+
 def main():
     args = sys.argv[1:]
     reads = DEFAULT_READS
@@ -112,14 +153,21 @@ def main():
         i = args.index("--reads"); reads = int(args[i + 1]); del args[i:i + 2]
     if "--size-mb" in args:
         i = args.index("--size-mb"); size_mb = int(args[i + 1]); del args[i:i + 2]
+    depths = [1]
+    if "--depth" in args:
+        i = args.index("--depth"); depths = [int(d) for d in args[i + 1].split(",")]; del args[i:i + 2]
+    json_out = None
+    if "--json" in args:
+        i = args.index("--json"); json_out = args[i + 1]; del args[i:i + 2]
 
     targets = args or ["/var/www/html/moop/organisms", "/home", "/tmp"]
 
     print(f"\nRandom {BLOCK}-byte reads, {reads} per volume, O_DIRECT (page cache bypassed)")
-    print(f"{'path':<46}{'MB':>7}{'median':>10}{'mean':>9}{'p95':>9}{'max':>9}")
-    print("-" * 90)
+    print(f"{'path':<46}{'MB':>7}{'depth':>6}{'median':>10}{'mean':>9}{'p95':>9}{'max':>9}{'reads/s':>9}")
+    print("-" * 105)
 
     scratch = []
+    report = {}
     try:
         for hint in targets:
             if not os.path.exists(hint):
@@ -128,14 +176,23 @@ def main():
             path, made = find_or_make(hint, size_mb)
             if made:
                 scratch.append(path)
-            stats, err = measure(path, reads)
             label = path if len(path) <= 45 else "..." + path[-42:]
-            if err:
-                print(f"{label:<46}  {err}")
-                continue
-            print(f"{label:<46}{stats['size_mb']:>7.0f}"
-                  f"{stats['median']:>9.3f}m{stats['mean']:>8.3f}m"
-                  f"{stats['p95']:>8.3f}m{stats['max']:>8.3f}m")
+            for depth in depths:
+                stats, err = measure(path, reads, depth)
+                if err:
+                    print(f"{label:<46}  {err}")
+                    break
+                print(f"{label:<46}{stats['size_mb']:>7.0f}{depth:>6}"
+                      f"{stats['median']:>9.3f}m{stats['mean']:>8.3f}m"
+                      f"{stats['p95']:>8.3f}m{stats['max']:>8.3f}m{stats['reads_per_s']:>9.0f}")
+                entry = report.setdefault(hint, {"path": path, "block": BLOCK, "depths": {}})
+                entry["depths"][str(depth)] = {"latencies_ms": stats["latencies_ms"],
+                                               "reads_per_s": stats["reads_per_s"]}
+            if hint in report:
+                rate = streaming_mb_s(path)
+                report[hint]["sequential_mb_s"] = rate
+                if rate:
+                    print(f"{'':<46}{'':>7}{'':>6}  streaming {rate:.0f} MB/s")
     finally:
         for f in scratch:
             try:
@@ -143,6 +200,12 @@ def main():
             except OSError:
                 pass
 
+    if json_out:
+        # One volume per file is what `moopbench fit` takes; several are keyed by path.
+        with open(json_out, "w") as fh:
+            json.dump(next(iter(report.values())) if len(report) == 1 else report, fh)
+        print(f"\nwrote {json_out}")
+
     print("\nRule of thumb: flash is well under 1 ms. A 7200rpm spindle cannot beat")
     print("~8-12 ms. Anything above that is a spindle or contended shared storage.")
 
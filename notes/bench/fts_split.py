@@ -24,66 +24,16 @@ MEASURING HONESTLY -- three traps this avoids:
 Bytes come from /proc/self/io read_bytes, so the figure is this process's real reads
 regardless of which device served them.
 """
-import ctypes, mmap, os, sqlite3, sys, time
+import os, sqlite3, sys, time
 
-ORGDB = "/var/www/html/moop/organisms/Rhinolophus_ferrumequinum/organism.sqlite"
-PROTO = "/var/www/html/moop/notes/bench/split_proto.sqlite"  # same volume as ORGDB, on purpose
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from moopbench import evict, organism_db, read_bytes, resident_pages  # noqa: F401  (re-exported)
+
+ORGDB = organism_db("Rhinolophus_ferrumequinum")
+PROTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "split_proto.sqlite")  # same volume as ORGDB, on purpose
 CAP = 2500
 POOL = CAP * 2
 
-libc = ctypes.CDLL("libc.so.6", use_errno=True)
-
-
-libc.mmap.restype = ctypes.c_void_p
-libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
-                      ctypes.c_int, ctypes.c_int, ctypes.c_long]
-libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
-libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
-PROT_READ, MAP_SHARED = 1, 1
-
-
-def resident_pages(path):
-    """How many of this file's pages are in page cache right now, via mincore().
-
-    Maps through libc rather than Python's mmap module: mincore() needs the raw
-    address, and a read-only Python mmap will not hand one out (ctypes refuses to
-    take the address of a non-writable buffer).
-    """
-    fd = os.open(path, os.O_RDONLY)
-    try:
-        size = os.fstat(fd).st_size
-        if size == 0:
-            return 0, 0
-        addr = libc.mmap(None, size, PROT_READ, MAP_SHARED, fd, 0)
-        if addr in (None, ctypes.c_void_p(-1).value):
-            return -1, 0
-        try:
-            npages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
-            vec = ctypes.create_string_buffer(npages)
-            if libc.mincore(ctypes.c_void_p(addr), ctypes.c_size_t(size), vec) != 0:
-                return -1, npages
-            return sum(b & 1 for b in vec.raw), npages
-        finally:
-            libc.munmap(ctypes.c_void_p(addr), size)
-    finally:
-        os.close(fd)
-
-
-def evict(path):
-    fd = os.open(path, os.O_RDONLY)
-    try:
-        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
-    finally:
-        os.close(fd)
-
-
-def read_bytes():
-    with open("/proc/self/io") as fh:
-        for line in fh:
-            if line.startswith("read_bytes:"):
-                return int(line.split()[1])
-    return 0
-
 
 def build_proto():
     if os.path.exists(PROTO):
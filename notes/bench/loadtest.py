@@ -24,8 +24,13 @@ usage:
 ⚠️  THIS EVICTS THE PAGE CACHE AND THE SITE IS SLOW FOR HOURS AFTERWARDS.
     A previous cross-organism run took cache 12.2 GB -> 0.3 GB, and 2.5 hours later
     it had only recovered to 6.6 GB. Run it out of hours, and tell IT the window.
+    It now snapshots which organism pages are cached before the run and reads them
+    back afterwards (scripts/page_cache_snapshot.py), which takes minutes; --no-restore
+    leaves the cache as the run left it.
 """
-import argparse, json, subprocess, sys, time
+import argparse, json, os, subprocess, sys, time
+
+from moopbench.paths import moop_root, organism_data
 from concurrent.futures import ThreadPoolExecutor
 
 BASE = "http://172.16.2.52/moop/tools/annotation_search_ajax.php"
@@ -83,6 +88,10 @@ def main():
     ap.add_argument("--term", default="transposases")
     ap.add_argument("--force", action="store_true",
                     help="run even if the cache is not at steady state (timings only)")
+    ap.add_argument("--no-restore", action="store_true",
+                    help="do not read the pre-run page cache back afterwards")
+    ap.add_argument("--restore-mb-s", type=float, default=80,
+                    help="restore rate; out of hours the disk can stream faster")
     a = ap.parse_args()
 
     orgs = organisms(None if a.all else (a.group or "Bats"))
@@ -115,6 +124,13 @@ def main():
     print(f"cache at start: {cached:.1f} GB of {avail:.1f} GB available")
     print(f"START  {time.strftime('%Y-%m-%d %H:%M:%S %Z')}\n")
 
+    snap_cmd = [sys.executable, os.path.join(moop_root(), "scripts", "page_cache_snapshot.py")]
+    snapshot = f"/var/tmp/loadtest_page_cache.{os.getpid()}.bin"
+    if not a.no_restore:
+        dbs = [os.path.join(organism_data(), o, "organism.sqlite") for o in organisms()]
+        subprocess.run(snap_cmd + ["snapshot", "--out", snapshot]
+                       + [d for d in dbs if os.path.exists(d)], check=False)
+
     v0, c0, d0, t0 = vmstat(), meminfo_gb("Cached:"), sdb_mb(), time.time()
     times = []
     for p in range(a.passes):
@@ -139,6 +155,13 @@ def main():
           % (refault * 4096 / 1024**3))
     print("  With cache large enough to hold the working set, that number is ~0.")
 
+    # After the counters, so the restore's reads are not in them.
+    if not a.no_restore and os.path.exists(snapshot):
+        print("\n--- putting the page cache back ---")
+        subprocess.run(snap_cmd + ["restore", snapshot, "--rate-mb-s", str(a.restore_mb_s)],
+                       check=False)
+        os.remove(snapshot)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,45 @@
+"""moopbench -- the cold-search benchmark harness as one package.
+
+The scripts beside this package each grew their own copy of the same three things: a
+mincore() residency check, a posix_fadvise() eviction, and a /proc/self/io byte
+counter (cache.py, fts_split.py, quota.py -- three copies, two of them subtly
+different: one fsync'd first, one did not, one retried). Each hard-coded its organism's
+path and printed free-form text, so a result could be read once and never compared.
+
+Here the README's rules are code instead of convention:
+
+  verified eviction   a cold sample is taken only after mincore() reports zero pages
+                      resident (moopbench.cache.verified_evict); a file that will not
+                      leave the cache aborts the run rather than being timed warm
+  cold AND warm       every sample is a cold run and the warm run straight after it
+  same volume         files the arms read must sit on the device the organism data is
+                      on -- /tmp is the fast disk and answers a question nobody asked
+  repeat, alternate   arms are interleaved round by round and reported as medians:
+                      one run of design A read identical bytes in 9.21 s and 0.90 s
+
+and a run is a JSON file that `moopbench compare` can hold against another.
+
+    python3 -m moopbench run suites/cold_search.json       (from notes/bench)
+    python3 -m moopbench compare OLD.json NEW.json
+    python3 -m moopbench evict|stat FILE...
+    python3 -m moopbench trace --organism O --term T     pages read, per object
+    python3 -m moopbench layout SUITE --organism O [--apply]   physical layout by workload
+    python3 -m moopbench ab SUITE --change NAME            A/B to tight intervals, stored
+    python3 -m moopbench load WORKLOAD [--serve]           open-loop load, HTTP, histograms
+    python3 -m moopbench replay CAPTURE [--direct]         captured real searches, re-issued
+    python3 -m moopbench cost --organism O --term T       cold ms and bytes, predicted
+    python3 -m moopbench cost-group --group G --term T     a group search, nothing evicted
+    python3 -m moopbench arms
+
+Arms are pluggable: moopbench.arms holds the built-in query shapes, and a suite may
+name any `module:function` decorated with @moopbench.arm.
+"""
+from .cache import (EvictionError, evict, pct, read_bytes, resident, resident_pages,
+                    verified_evict)
+from .arms import arm, ARMS, load_arm
+from .paths import moop_root, organism_data, organism_db
+
+__all__ = [
+    "EvictionError", "evict", "pct", "read_bytes", "resident", "resident_pages",
+    "verified_evict", "arm", "ARMS", "load_arm", "moop_root", "organism_data", "organism_db",
+]
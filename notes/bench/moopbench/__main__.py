@@ -0,0 +1,643 @@
+"""moopbench command line -- run from notes/bench as `python3 -m moopbench ...`.
+
+    run SUITE.json [--organism O | --db PATH] [--reps N] [--terms a,b] [--out FILE]
+                   [--disk-model sdb|MODEL.json [--sleep]]        emulated disk, no eviction
+    fit MEASURED.json [-o MODEL.json]   disk model from disk_random_read.py --json
+    compare OLD.json NEW.json [--wall-tol 0.25] [--bytes-tol 0.10]     exit 1 on regression
+    corpus DIR [--organisms N] [--scale X] [--seed S]    synthetic organism databases
+    trace (--organism O | --db PATH) --term T [--arm A ... | --sql SQL] [--json FILE]
+                             every page a cold query reads, by object, with a heatmap
+    layout SUITE.json (--organism O ... | --db PATH) [--apply]
+                             rebuild in the order the workload reads, if it is faster
+    ab SUITE.json [--db LABEL=PATH ...] [--change NAME] [--target 0.10] [--max-rounds N]
+                             interleaved cold A/B until the bootstrap intervals are tight,
+                             appended to the results store (results/ab.sqlite)
+    ab-trend [--change NAME] [--metric wall_ms|read_bytes]     a change's runs over time
+    load [WORKLOAD.json] [--rate R] [--duration S] [--term T:W ...] [--group G:W ...]
+         [--organism O:W ...] [--serve] [--json FILE]
+                             open-loop Poisson search arrivals over HTTP, latency histograms
+    replay CAPTURE.ndjson... [--direct] [--speed X | --asap] [--serve | --site URL] [--evict]
+                             re-issue searches captured by lib/search_capture.php
+    replay CAPTURE --export-suite FILE --organism O [--top N]   a suite of real terms
+    cost-fit (--organism O | --db PATH) --terms a,b,c [-o PARAMS.json]
+                             trace calibration terms on the emulated disk, fit the cost model
+    cost (--organism O | --db PATH) --term T [--docs K] [--strategy S] | --trace TRACE.json
+                             predicted cold ms and bytes, from a count or a page trace
+    cost-check (--organism O | --db PATH) --terms a,b [--reps N]
+                             the predictions against verified-cold runs
+    cost-group --group G --term T [--fanout N]   a whole group's cold search, nothing evicted
+    evict FILE...            verified eviction, residency before -> after
+    stat FILE...             residency only
+    arms                     the built-in arms
+"""
+import argparse, json, os, sqlite3, sys
+
+from . import compare as cmp
+from .arms import ARMS
+from .cache import EvictionError, evict, pct, resident, verified_evict
+from .runner import DisciplineError, load_suite, run_suite, write_result
+
+
+def cmd_run(args):
+    suite = load_suite(args.suite, organism=args.organism, db=args.db, reps=args.reps,
+                       label=args.label, disk_model=args.disk_model, sleep=args.sleep or None,
+                       terms=args.terms.split(",") if args.terms else None)
+    print(f"  {suite['label']}: {os.path.basename(os.path.dirname(suite['db']))}, "
+          f"{len(suite['arms'])} arm(s) x {len(suite['terms'])} term(s) x {suite['reps']} round(s)")
+    try:
+        result = run_suite(suite, any_device=args.any_device)
+    except (DisciplineError, EvictionError) as e:
+        print(f"  REFUSED: {e}", file=sys.stderr)
+        return 2
+    except RuntimeError as e:      # the emulated disk without APSW
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    print(f"\n  {'arm':14} {'term':20} {'phase':5} {'median ms':>10} {'min':>8} {'max':>9} "
+          f"{'MB':>8} {'rows':>6}")
+    for s in result["summary"]:
+        print(f"  {s['arm'][:14]:14} {s['term'][:20]:20} {s['phase']:5} {s['wall_ms']:10.1f} "
+              f"{s['wall_ms_min']:8.1f} {s['wall_ms_max']:9.1f} {s['read_bytes'] / 1048576:8.1f} "
+              f"{s['rows']:6.0f}" + ("   results vary between rounds" if s["digest"] == "varies" else ""))
+    print(f"\n  wrote {write_result(result, args.out)}")
+    return 0
+
+
+def cmd_compare(args):
+    try:
+        old, new = cmp.load(args.old), cmp.load(args.new)
+        rows, notes = cmp.compare(old, new, tolerance={"wall_ms": args.wall_tol,
+                                                       "read_bytes": args.bytes_tol})
+    except (OSError, ValueError) as e:
+        print(f"  cannot compare: {e}", file=sys.stderr)
+        return 2
+    if args.json:
+        json.dump({"rows": rows, "notes": notes}, sys.stdout, indent=1)
+        print()
+    else:
+        cmp.report(rows, notes)
+    bad = cmp.regressions(rows)
+    if not args.json:
+        print(f"\n  {len(bad)} regression(s)" if bad else "\n  no regressions")
+    return 1 if bad else 0
+
+
+def cmd_fit(args):
+    from .diskmodel import DiskModel
+    with open(args.measured) as fh:
+        model = DiskModel.fit(json.load(fh), name=args.name)
+    print(f"  {model.name}: sequential {model.seq_mb_s:.0f} MB/s")
+    for d, (m, p) in sorted(model.depths.items()):
+        print(f"    depth {d:3}: median {m:8.2f} ms   p95 {p:8.2f} ms   ~{d / m * 1000:6.0f} reads/s")
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(model.to_json(), fh, indent=1)
+            fh.write("\n")
+        print(f"  wrote {args.out} -- use it as a suite's disk_model")
+    return 0
+
+
+def cmd_corpus(args):
+    from .corpus import generate_corpus
+    print(f"  {args.organisms} synthetic organism(s) at scale {args.scale} into {args.dir}")
+    generate_corpus(args.dir, args.organisms, args.scale, args.seed, args.spread)
+    print(f"\n  wrote {os.path.join(args.dir, 'corpus.json')} -- benchmark it with "
+          f"MOOP_ORGANISM_DATA={args.dir}")
+    return 0
+
+
+def cmd_trace(args):
+    from .arms import load_arm
+    from .diskmodel import DiskModel
+    from .trace import Tracer, report, trace_sql
+    from .vfs import LatencyVFS
+    from . import paths
+    db = os.path.abspath(args.db or paths.organism_db(args.organism))
+    try:
+        model = None if args.disk_model == "none" else DiskModel.load(args.disk_model)
+        vfs = LatencyVFS(model)
+        tracer = Tracer(vfs, db)
+    except RuntimeError as e:       # no APSW
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    ctx = {"db": db, "organism": args.organism, "cap": args.cap, "pool": args.pool, "vfs": vfs}
+    traces = []
+    if args.sql:
+        traces.append(trace_sql(tracer, args.sql, (args.term,) if "?" in args.sql else (),
+                                label=f"sql {args.term!r}"))
+    for name in args.arm or ([] if args.sql else ["pair_bm25"]):
+        fn = load_arm(name, os.getcwd())
+        with tracer.query(f"{fn.arm_name} {args.term!r}") as t:
+            fn(ctx, args.term)
+        traces.append(t)
+        if args.warm:
+            with tracer.query(f"{fn.arm_name} {args.term!r} warm", cold=False) as t:
+                fn(ctx, args.term)
+            traces.append(t)
+    for t in traces:
+        report(t, top=args.top, width=args.width)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"db": db, "disk_model": model.to_json() if model else None,
+                       "traces": [t.to_json(args.width) for t in traces]}, fh, indent=1)
+            fh.write("\n")
+        print(f"\n  wrote {args.json}")
+    return 0
+
+
+def cmd_layout(args):
+    from .layout import LAYOUTS, PAGE_SIZES, LayoutError, optimise
+    from .arms import load_arm
+    targets = [("db", args.db)] if args.db else [("organism", o) for o in args.organism or []]
+    if not targets:
+        print("  layout needs --organism or --db", file=sys.stderr)
+        return 2
+    rc = 0
+    for key, value in targets:
+        suite = load_suite(args.suite, reps=args.rounds, disk_model=args.disk_model,
+                           terms=args.terms.split(",") if args.terms else None, **{key: value})
+        arms = [load_arm(a, suite["suite_dir"]) for a in suite["arms"]]
+        print(f"\n  {os.path.basename(os.path.dirname(suite['db']))}: "
+              f"{len(arms)} arm(s) x {len(suite['terms'])} term(s)")
+        try:
+            report = optimise(suite, arms,
+                              layouts=args.layouts.split(",") if args.layouts else LAYOUTS,
+                              page_sizes=[int(p) for p in args.page_sizes.split(",")]
+                              if args.page_sizes else PAGE_SIZES,
+                              rounds=suite["reps"], workdir=args.workdir, min_gain=args.min_gain,
+                              any_device=args.any_device, apply=args.apply, keep=args.keep)
+        except (DisciplineError, EvictionError, LayoutError) as e:
+            print(f"  REFUSED: {e}", file=sys.stderr)
+            rc = 2
+            continue
+        except RuntimeError as e:      # no APSW: the trace needs it
+            print(f"  {e}", file=sys.stderr)
+            return 2
+        print(f"\n  {'layout':14} {'cold ms':>10} {'MB':>8}  verdict")
+        print(f"  {'current':14} {report['current_cold_ms']:10.1f}")
+        for label, v in sorted(report["candidates"].items(), key=lambda kv: kv[1]["cold_ms"]):
+            print(f"  {label:14} {v['cold_ms']:10.1f} {v['cold_bytes'] / 1048576:8.1f}  {v['verdict']}")
+        if report["applied"]:
+            print(f"  applied {report['accepted']} -- now: php scripts/build_search_sidecars.php "
+                  f"and build_search_tier.php (the sidecars are stale)")
+        report["label"] = "layout-" + os.path.basename(os.path.dirname(suite["db"]))
+        print(f"  wrote {write_result(report, None if len(targets) > 1 else args.out)}")
+    return rc
+
+
+def cmd_ab(args):
+    from . import ab
+    dbs = []
+    for spec in args.db or []:
+        label, sep, path = spec.partition("=")
+        dbs.append((label, path) if sep else (os.path.basename(os.path.dirname(os.path.abspath(spec))), spec))
+    suite = load_suite(args.suite, organism=args.organism, label=args.label,
+                       disk_model=args.disk_model,
+                       terms=args.terms.split(",") if args.terms else None,
+                       arms=args.arm or None, db=dbs[0][1] if dbs else None)
+    try:
+        result = ab.run_ab(suite, dbs, change=args.change, store=None if args.no_store else args.store,
+                           min_rounds=args.min_rounds, max_rounds=args.max_rounds,
+                           target=args.target, any_device=args.any_device, seed=args.seed)
+    except (DisciplineError, EvictionError) as e:
+        print(f"  REFUSED: {e}", file=sys.stderr)
+        return 2
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    ab.report(result)
+    if "run_id" in result:
+        print(f"\n  run {result['run_id']} appended to {args.store}")
+    if args.json:
+        print(f"  wrote {write_result(result, args.json)}")
+    return 0
+
+
+def cmd_ab_trend(args):
+    from . import ab
+    ab.report_trend(ab.trend(args.store, args.change, args.metric))
+    return 0
+
+
+def cmd_load(args):
+    from .load import load_workload, report, run_load, weighted
+    scopes = weighted([f"group:{g}" for g in args.group or []]
+                      + [f"organism:{o}" for o in args.organism or []])
+    try:
+        w = load_workload(args.workload, label=args.label, rate=args.rate, duration=args.duration,
+                          fanout=args.fanout, max_in_flight=args.max_in_flight,
+                          timeout=args.timeout, seed=args.seed, device=args.device,
+                          terms=weighted(args.term), scopes=scopes)
+        result = run_load(w, base=args.base, serve_port=args.port, local=args.serve)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    report(result)
+    print(f"\n  wrote {write_result(result, args.json)}")
+    return 0
+
+
+def cmd_replay(args):
+    from . import replay as rp
+    from .load import serve
+    since = until = None
+    try:
+        since = rp_time(args.since)
+        until = rp_time(args.until)
+        if args.export_suite:
+            if not args.organism:
+                raise ValueError("--export-suite needs --organism")
+            suite = rp.export_suite(args.capture, args.export_suite, args.organism, args.top,
+                                    since, until)
+            print(f"  {args.organism}: {suite['captured']['searches']} captured searches, "
+                  f"{suite['captured']['terms']} distinct terms; top {len(suite['terms'])} "
+                  f"written to {args.export_suite}")
+            return 0
+        proc, site = None, args.site or rp.SITE
+        if args.serve and not args.direct:
+            proc, base = serve(args.port, workers=max(2, args.fanout * 2))
+            site = base.rsplit("/tools/", 1)[0]
+        try:
+            result = rp.replay(args.capture, direct=args.direct, since=since, until=until,
+                               gap=args.gap, limit=args.limit, evict=args.evict, site=site,
+                               speed=args.speed, asap=args.asap, fanout=args.fanout,
+                               threads=args.threads, timeout=args.timeout, device=args.device,
+                               arm=args.arm)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=10)
+    except EvictionError as e:
+        print(f"  REFUSED: {e}", file=sys.stderr)
+        return 2
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    rp.report(result)
+    print(f"\n  wrote {write_result(result, args.json)}")
+    return 0
+
+
+def rp_time(value):
+    """Epoch seconds from an ISO date/time or a number; None stays None."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        import datetime
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def cost_setup(args, params=True):
+    """(db or None, disk model, fitted params or None) for the cost-* commands."""
+    from . import costmodel, paths
+    from .diskmodel import DiskModel
+    db = None
+    if getattr(args, "db", None) or getattr(args, "organism", None):
+        db = os.path.abspath(args.db or paths.organism_db(args.organism))
+    model = DiskModel.load(args.disk_model)
+    if not params:
+        return db, model, None
+    organism = args.organism or (os.path.basename(os.path.dirname(db)) if db else None)
+    path = args.params or (costmodel.default_params(organism) if organism else None)
+    if path is None:
+        raise costmodel.CostModelError("--params, or --organism to find its fit")
+    return db, model, costmodel.load_params(path)
+
+
+def cmd_cost_fit(args):
+    from . import costmodel
+    try:
+        db, model, _ = cost_setup(args, params=False)
+        if db is None:
+            raise ValueError("cost-fit needs --organism or --db")
+        params = costmodel.calibrate(db, args.terms.split(","), model, arms=args.arm or ("pair_bm25",),
+                                     cap=args.cap, pool=args.pool)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    for c, f in params["classes"].items():
+        fit = f"{f['reads']:.0f} reads" if c == "match" else f"s = {f['slope']:.4g}"
+        print(f"  {c:8} {f['bytes'] / 1048576:9.1f} MB   {fit:18} {f['bytes_per_read'] / 1024:6.0f} KB/read "
+              f"  {f['sequential'] * 100:4.0f}% sequential")
+    out = args.out or costmodel.default_params(params["organism"])
+    print(f"  wrote {write_result(params, out)}")
+    return 0
+
+
+def cmd_cost(args):
+    from . import costmodel
+    try:
+        if args.trace:
+            _, model, _ = cost_setup(args, params=False)
+            with open(args.trace) as fh:
+                data = json.load(fh)
+            for t in data.get("traces", [data]):
+                p = costmodel.predict_trace(t, model)
+                print(f"  {t.get('label', args.trace)[:40]:40} {p['reads']:7,} reads {p['seeks']:7,} seeks "
+                      f"{p['bytes'] / 1048576:8.1f} MB {p['ms']:10.1f} ms on {model.name}")
+            return 0
+        db, model, params = cost_setup(args)
+        if db is None or not args.term:
+            raise ValueError("cost needs --term and --organism or --db (or --trace)")
+        p = costmodel.predict_organism(params, db, args.term, model, args.cap,
+                                       cache_root=args.cache_root, strategy=args.strategy,
+                                       docs=args.docs, cold=args.cold)
+    except (OSError, ValueError, RuntimeError, sqlite3.Error) as e:
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    print(f"  {args.term!r}: {p['docs']:,} docs, {p['strategy']} pool, "
+          f"{p['resident_share'] * 100:.1f}% of the database resident")
+    for c, v in p["classes"].items():
+        print(f"    {c:8} {v['reads']:9,.1f} reads {v['bytes'] / 1048576:8.1f} MB"
+              f"   ({v['cold_share'] * 100:.0f}% cold)")
+    print(f"  predicted cold: {p['bytes'] / 1048576:.1f} MB, {p['seeks']:,.0f} seeks, "
+          f"{p['ms']:,.1f} ms on {model.name}")
+    if args.json:
+        print(f"  wrote {write_result(dict(p, term=args.term, label='cost'), args.json)}")
+    return 0
+
+
+def cmd_cost_check(args):
+    from . import costmodel
+    from .runner import emulated_disk
+    try:
+        db, model, params = cost_setup(args)
+        if db is None:
+            raise ValueError("cost-check needs --organism or --db")
+        vfs = emulated_disk({"disk_model": args.disk_model}) if args.emulated else None
+        result = costmodel.validate(params, db, args.terms.split(","), model,
+                                    arms=args.arm or ("pair_bm25",), reps=args.reps,
+                                    cap=args.cap, pool=args.pool, vfs=vfs)
+    except EvictionError as e:
+        print(f"  REFUSED: {e}", file=sys.stderr)
+        return 2
+    except (OSError, ValueError, RuntimeError, sqlite3.Error) as e:
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    costmodel.report_check(result)
+    result["label"] = "cost-check"
+    print(f"\n  wrote {write_result(result, args.json)}")
+    return 0
+
+
+def cmd_cost_group(args):
+    from . import costmodel
+    from .load import group_members
+    try:
+        _, model, params = cost_setup(args)
+        members = group_members(args.groups).get(args.group)
+        if not members:
+            raise ValueError(f"no group {args.group!r}")
+        result = costmodel.estimate_group(params, members, args.term, model, args.cap,
+                                          args.fanout, args.cache_root, args.strategy)
+    except (OSError, ValueError, RuntimeError, sqlite3.Error) as e:
+        print(f"  {e}", file=sys.stderr)
+        return 2
+    costmodel.report_group(result)
+    result["label"] = "cost-group"
+    print(f"\n  wrote {write_result(result, args.json)}")
+    return 0
+
+
+def cmd_evict(args):
+    rc = 0
+    for f in args.files:
+        before = resident(f)
+        try:
+            after = verified_evict(f)
+        except EvictionError as e:
+            print(f"  {e}")
+            rc = 1
+            continue
+        print(f"  {os.path.basename(f):28s} {pct(*before):6.1f}% -> {pct(*after):6.1f}% "
+              f"({after[0]}/{after[1]} pages resident)")
+    return rc
+
+
+def cmd_stat(args):
+    for f in args.files:
+        r = resident(f)
+        print(f"  {os.path.basename(f):28s} {pct(*r):6.1f}% ({r[0]}/{r[1]} pages)")
+    return 0
+
+
+def cmd_arms(args):
+    for name, fn in sorted(ARMS.items()):
+        print(f"  {name:14} {(fn.__doc__ or '').strip().splitlines()[0]}")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="moopbench", description="Cold-search benchmark harness.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("run", help="run a suite and write a JSON result")
+    p.add_argument("suite")
+    p.add_argument("--organism")
+    p.add_argument("--db", help="an organism.sqlite path, instead of the suite's organism")
+    p.add_argument("--reps", type=int)
+    p.add_argument("--terms", help="comma-separated, instead of the suite's terms")
+    p.add_argument("--label")
+    p.add_argument("--out", help="result file (default: results/LABEL-STAMP.json)")
+    p.add_argument("--any-device", action="store_true",
+                   help="record even with files off the organism data volume (compare refuses it)")
+    p.add_argument("--disk-model", help="emulate a volume: a preset (sdb, sda) or a model file")
+    p.add_argument("--sleep", action="store_true",
+                   help="with --disk-model, sleep the modelled latency instead of adding it up")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("fit", help="fit a disk model to disk_random_read.py --json output")
+    p.add_argument("measured")
+    p.add_argument("-o", "--out")
+    p.add_argument("--name")
+    p.set_defaults(func=cmd_fit)
+
+    p = sub.add_parser("compare", help="flag regressions between two runs")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--wall-tol", type=float, default=cmp.TOLERANCE["wall_ms"])
+    p.add_argument("--bytes-tol", type=float, default=cmp.TOLERANCE["read_bytes"])
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_compare)
+
+    p = sub.add_parser("corpus", help="write a synthetic organism.sqlite corpus")
+    p.add_argument("dir")
+    p.add_argument("--organisms", type=int, default=3)
+    p.add_argument("--scale", type=float, default=1.0,
+                   help="1.0 = Rhinolophus_ferrumequinum, ~2.9M annotation pairs per organism")
+    p.add_argument("--spread", type=float, default=0.5,
+                   help="lognormal sigma of organism sizes around --scale (0 = all equal)")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=cmd_corpus)
+
+    p = sub.add_parser("trace", help="trace the pages a cold query reads, per object")
+    p.add_argument("--organism")
+    p.add_argument("--db")
+    p.add_argument("--term", default="helicase")
+    p.add_argument("--arm", action="append", help="an arm to trace (repeatable; default pair_bm25)")
+    p.add_argument("--sql", help="trace this SQL instead; a ? is bound to --term")
+    p.add_argument("--cap", type=int, default=2500)
+    p.add_argument("--pool", type=int, default=5000)
+    p.add_argument("--disk-model", default="sdb", help="the cost per miss: a preset, a model file, or none")
+    p.add_argument("--warm", action="store_true", help="trace each arm again straight after, warm")
+    p.add_argument("--top", type=int, default=14)
+    p.add_argument("--width", type=int, default=64)
+    p.add_argument("--json")
+    p.set_defaults(func=cmd_trace)
+
+    p = sub.add_parser("layout", help="rebuild a database in the order its workload reads it")
+    p.add_argument("suite", help="the workload: a suite's arms x terms")
+    p.add_argument("--organism", action="append", help="repeatable")
+    p.add_argument("--db")
+    p.add_argument("--terms")
+    p.add_argument("--layouts", help="comma-separated, of schema,heat,path (default all)")
+    p.add_argument("--page-sizes", help="comma-separated bytes (default 4096,16384,65536)")
+    p.add_argument("--rounds", type=int, help="cold replays per candidate (default: the suite's reps)")
+    p.add_argument("--min-gain", type=float, default=0.10,
+                   help="accept only a candidate this much faster cold (default 0.10)")
+    p.add_argument("--workdir", help="where candidates are built (default: beside the database)")
+    p.add_argument("--disk-model", help="score on the emulated disk instead of the device")
+    p.add_argument("--apply", action="store_true", help="rename the accepted candidate into place")
+    p.add_argument("--keep", action="store_true", help="keep the candidate files")
+    p.add_argument("--any-device", action="store_true")
+    p.add_argument("--out")
+    p.set_defaults(func=cmd_layout)
+
+    from .ab import MAX_ROUNDS, MIN_ROUNDS, TARGET, default_store
+    p = sub.add_parser("ab", help="interleaved cold A/B until the intervals are tight, into the store")
+    p.add_argument("suite")
+    p.add_argument("--arm", action="append", help="instead of the suite's arms (repeatable)")
+    p.add_argument("--db", action="append", help="LABEL=PATH, a database variant (repeatable)")
+    p.add_argument("--organism")
+    p.add_argument("--terms", help="comma-separated, instead of the suite's terms")
+    p.add_argument("--change", help="what is being decided, for the trend report")
+    p.add_argument("--label")
+    p.add_argument("--target", type=float, default=TARGET,
+                   help="stop when every ratio interval is within this share of its median")
+    p.add_argument("--min-rounds", type=int, default=MIN_ROUNDS)
+    p.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    p.add_argument("--seed", type=int)
+    p.add_argument("--disk-model", help="emulate a volume: a preset (sdb, sda) or a model file")
+    p.add_argument("--any-device", action="store_true")
+    p.add_argument("--store", default=default_store())
+    p.add_argument("--no-store", action="store_true")
+    p.add_argument("--json", help="also write the full result here")
+    p.set_defaults(func=cmd_ab)
+
+    p = sub.add_parser("ab-trend", help="the A/B runs of a change, oldest first")
+    p.add_argument("--change")
+    p.add_argument("--metric", choices=("wall_ms", "read_bytes"), default="wall_ms")
+    p.add_argument("--store", default=default_store())
+    p.set_defaults(func=cmd_ab_trend)
+
+    p = sub.add_parser("load", help="open-loop search load over HTTP, with latency histograms")
+    p.add_argument("workload", nargs="?", help="a workload JSON file (see suites/open_loop.json)")
+    p.add_argument("--rate", type=float, help="searches arriving per second, on average")
+    p.add_argument("--duration", type=float, help="seconds of arrivals")
+    p.add_argument("--term", action="append", help="TERM or TERM:WEIGHT (repeatable)")
+    p.add_argument("--group", action="append", help="GROUP or GROUP:WEIGHT, fanned out (repeatable)")
+    p.add_argument("--organism", action="append", help="ORGANISM or ORGANISM:WEIGHT (repeatable)")
+    p.add_argument("--fanout", type=int, help="organisms in flight per group search (default 4)")
+    p.add_argument("--max-in-flight", type=int, help="searches in flight before arrivals are shed")
+    p.add_argument("--timeout", type=float)
+    p.add_argument("--seed", type=int)
+    p.add_argument("--device", help="block device whose reads are counted (default sdb)")
+    p.add_argument("--label")
+    p.add_argument("--base", help="the search endpoint URL")
+    p.add_argument("--serve", action="store_true", help="run this checkout under php -S and load that")
+    p.add_argument("--port", type=int, help="with --serve (default: a free port)")
+    p.add_argument("--json", help="result file (default: results/LABEL-STAMP.json)")
+    p.set_defaults(func=cmd_load)
+
+    p = sub.add_parser("replay", help="re-issue captured searches (lib/search_capture.php)")
+    p.add_argument("capture", nargs="+", help="search_capture.ndjson (its .1 is read too)")
+    p.add_argument("--direct", action="store_true", help="query the databases in-process, no web server")
+    p.add_argument("--site", help="site URL for HTTP replay (default the production site)")
+    p.add_argument("--serve", action="store_true", help="replay against this checkout under php -S")
+    p.add_argument("--port", type=int)
+    p.add_argument("--speed", type=float, default=1.0, help="2 = twice the captured pace")
+    p.add_argument("--asap", action="store_true", help="every search at once")
+    p.add_argument("--since", help="ISO time or epoch seconds")
+    p.add_argument("--until", help="ISO time or epoch seconds")
+    p.add_argument("--gap", type=float, default=60.0,
+                   help="seconds between one visitor's requests still counted as one search")
+    p.add_argument("--limit", type=int, help="only the first N searches")
+    p.add_argument("--fanout", type=int, default=4, help="organisms in flight per search")
+    p.add_argument("--threads", type=int, default=8, help="--direct: queries in flight in all")
+    p.add_argument("--arm", help="--direct: this arm for every search")
+    p.add_argument("--timeout", type=float, default=900)
+    p.add_argument("--device", default="sdb")
+    p.add_argument("--evict", action="store_true", help="start from a verified-cold cache")
+    p.add_argument("--export-suite", help="write a suite of the most searched terms instead")
+    p.add_argument("--organism", help="with --export-suite")
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--json", help="result file (default: results/replay-STAMP.json)")
+    p.set_defaults(func=cmd_replay)
+
+    def cost_args(p, params=True):
+        p.add_argument("--organism")
+        p.add_argument("--db")
+        p.add_argument("--cap", type=int, default=2500)
+        p.add_argument("--disk-model", default="sdb", help="a preset or a fitted model file")
+        if params:
+            p.add_argument("--params", help="a cost-fit result (default: results/cost-model-ORGANISM.json)")
+            p.add_argument("--cache-root", help="where the sidecars and residency maps are "
+                                                "(default: the organism data)")
+            p.add_argument("--strategy", choices=("quota", "bm25_sidecar", "rowid", "bm25"),
+                           help="instead of the pool production would choose")
+
+    p = sub.add_parser("cost-fit", help="fit the cold-cost model from traced calibration terms")
+    cost_args(p, params=False)
+    p.add_argument("--terms", required=True, help="comma-separated, narrow to broad")
+    p.add_argument("--arm", action="append", help="arms to trace (default pair_bm25)")
+    p.add_argument("--pool", type=int, default=5000)
+    p.add_argument("-o", "--out")
+    p.set_defaults(func=cmd_cost_fit)
+
+    p = sub.add_parser("cost", help="predict a query's cold ms and bytes")
+    cost_args(p)
+    p.add_argument("--term")
+    p.add_argument("--docs", type=int, help="matched documents, instead of counting them")
+    p.add_argument("--cold", action="store_true", help="as if nothing were resident")
+    p.add_argument("--trace", help="predict from a `trace --json` file instead")
+    p.add_argument("--json")
+    p.set_defaults(func=cmd_cost)
+
+    p = sub.add_parser("cost-check", help="the cost model against verified-cold runs")
+    cost_args(p)
+    p.add_argument("--terms", required=True)
+    p.add_argument("--arm", action="append")
+    p.add_argument("--pool", type=int, default=5000)
+    p.add_argument("--reps", type=int, default=3)
+    p.add_argument("--emulated", action="store_true",
+                   help="cold on the emulated disk instead: checks the count model against the trace")
+    p.add_argument("--json")
+    p.set_defaults(func=cmd_cost_check)
+
+    p = sub.add_parser("cost-group", help="predict a group search's cold cost, evicting nothing")
+    cost_args(p)
+    p.add_argument("--group", required=True)
+    p.add_argument("--groups", help="organism_assembly_groups.json (default: the site's)")
+    p.add_argument("--term", required=True)
+    p.add_argument("--fanout", type=int, default=5)
+    p.add_argument("--json")
+    p.set_defaults(func=cmd_cost_group)
+
+    p = sub.add_parser("evict", help="evict files from the page cache, verified")
+    p.add_argument("files", nargs="+")
+    p.set_defaults(func=cmd_evict)
+
+    p = sub.add_parser("stat", help="page-cache residency of files")
+    p.add_argument("files", nargs="+")
+    p.set_defaults(func=cmd_stat)
+
+    p = sub.add_parser("arms", help="list the built-in arms")
+    p.set_defaults(func=cmd_arms)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
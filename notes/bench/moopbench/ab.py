@@ -0,0 +1,361 @@
+"""A/B until the answer is known: interleaved cold runs, bootstrap intervals, a store.
+
+crossorg_ab.py, fts_split.py and quota.py each alternate their arms by hand and report
+one median -- and one run of design A read identical bytes in 9.21 s and 0.90 s, so a
+median of three says little and says it with no error bar. Here:
+
+  variants    the suite's arms, or one arm over several database files (--db LABEL=PATH,
+              e.g. the current file and a layout candidate), or both crossed
+  rounds      every round runs every term on every variant, cold (eviction verified,
+              or the emulated disk emptied) then warm, in a fresh random order per
+              term: alternation alone lines one variant up with anything periodic
+  intervals   per variant, the median cold wall time and bytes read over rounds; per
+              variant against the first (the baseline), the median of the per-round
+              ratios -- paired, so a round where the disk was busy for everyone cancels
+              -- each with a 95% percentile-bootstrap interval
+  stopping    after MIN_ROUNDS, as soon as every ratio interval is within TARGET of its
+              median (both metrics), else at MAX_ROUNDS, reported as inconclusive
+  machine     beside every cold sample: page cache size, free and dirty memory, the
+              volume's requests in flight before it, and its average queue depth and busy
+              share while it ran (/proc/diskstats) -- so a slow sample can be told from a
+              slow machine
+  the store   every run, sample and estimate appended to a SQLite file (results/ab.sqlite
+              by default), tagged with --change; `ab-trend` lists a change's runs in time
+              order, intervals and verdicts, so a decision rests on a series and not one
+              evening
+
+A verdict is "faster" or "slower" only when the whole interval is on one side of 1.
+
+    python3 -m moopbench ab suites/cold_search.json --change fts-detail-none
+    python3 -m moopbench ab SUITE --arm pair_bm25 --db current=A.sqlite --db heat64k=B.sqlite
+    python3 -m moopbench ab-trend [--change fts-detail-none]
+"""
+import datetime, json, os, platform, random, socket, sqlite3, statistics, time
+
+from . import paths
+from .arms import load_arm
+from .cache import verified_evict
+from .runner import check_devices, emulated_disk, git_head, timed
+
+MIN_ROUNDS, MAX_ROUNDS = 5, 30
+TARGET = 0.10               # interval half-width, as a share of the median
+RESAMPLES = 2000
+CONFIDENCE = 0.95
+METRICS = ("wall_ms", "read_bytes")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, started TEXT, label TEXT, change TEXT, git TEXT, host TEXT,
+    kernel TEXT, baseline TEXT, variants TEXT, terms TEXT, emulated TEXT,
+    rounds INTEGER, stopped TEXT);
+CREATE TABLE IF NOT EXISTS samples (
+    run INTEGER REFERENCES runs(id), round INTEGER, term TEXT, variant TEXT, phase TEXT,
+    wall_ms REAL, read_bytes INTEGER, rows INTEGER, digest TEXT,
+    cached_mb REAL, free_mb REAL, dirty_mb REAL, in_flight INTEGER, queue_avg REAL,
+    busy REAL, loadavg REAL);
+CREATE TABLE IF NOT EXISTS estimates (
+    run INTEGER REFERENCES runs(id), variant TEXT, metric TEXT, median REAL, lo REAL,
+    hi REAL, ratio REAL, ratio_lo REAL, ratio_hi REAL, verdict TEXT);
+CREATE INDEX IF NOT EXISTS samples_run ON samples(run);
+CREATE INDEX IF NOT EXISTS estimates_run ON estimates(run);
+"""
+
+
+# -- the machine ------------------------------------------------------------------------
+
+def device_of(path):
+    """The /proc/diskstats name of the block device holding path, or None."""
+    st = os.stat(path)
+    major, minor = os.major(st.st_dev), os.minor(st.st_dev)
+    try:
+        with open("/proc/diskstats") as fh:
+            for line in fh:
+                f = line.split()
+                if int(f[0]) == major and int(f[1]) == minor:
+                    return f[2]
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def diskstats(device):
+    """(requests in flight, ms doing I/O, weighted ms) of a device, cumulative but the first."""
+    if device:
+        with open("/proc/diskstats") as fh:
+            for line in fh:
+                f = line.split()
+                if len(f) > 13 and f[2] == device:
+                    return int(f[11]), int(f[12]), int(f[13])
+    return 0, 0, 0
+
+
+def meminfo_mb():
+    out = {}
+    with open("/proc/meminfo") as fh:
+        for line in fh:
+            k, v = line.split(":", 1)
+            if k in ("Cached", "MemFree", "Dirty"):
+                out[k] = int(v.split()[0]) / 1024
+    return out
+
+
+class Machine:
+    """The state to record beside a sample: take before() and after() around it."""
+
+    def __init__(self, device):
+        self.device = device
+
+    def before(self):
+        m = meminfo_mb()
+        self.t0, (in_flight, self.io0, self.w0) = time.monotonic(), diskstats(self.device)
+        with open("/proc/loadavg") as fh:
+            load = float(fh.read().split()[0])
+        return {"cached_mb": round(m.get("Cached", 0), 1), "free_mb": round(m.get("MemFree", 0), 1),
+                "dirty_mb": round(m.get("Dirty", 0), 1), "in_flight": in_flight, "loadavg": load}
+
+    def after(self):
+        ms = max(1e-3, (time.monotonic() - self.t0) * 1000)
+        _, io, weighted = diskstats(self.device)
+        return {"queue_avg": round((weighted - self.w0) / ms, 3),
+                "busy": round(min(1.0, (io - self.io0) / ms), 3)}
+
+
+# -- the statistics ---------------------------------------------------------------------
+
+def bootstrap(values, rng, stat=statistics.median, resamples=RESAMPLES, confidence=CONFIDENCE):
+    """(stat, lo, hi): the statistic and its percentile-bootstrap interval."""
+    n = len(values)
+    if n < 2:
+        v = stat(values) if values else None
+        return v, v, v
+    draws = sorted(stat(rng.choices(values, k=n)) for _ in range(resamples))
+    tail = (1 - confidence) / 2
+    return (stat(values), draws[int(tail * resamples)],
+            draws[min(resamples - 1, int((1 - tail) * resamples))])
+
+
+def tight(est, target):
+    v, lo, hi = est
+    return v is not None and v > 0 and (hi - lo) / 2 <= target * v
+
+
+def verdict(ratio):
+    v, lo, hi = ratio
+    if v is None:
+        return "no ratio"
+    if hi < 1:
+        return "faster"
+    if lo > 1:
+        return "slower"
+    return "no detectable difference"
+
+
+def estimate(samples, variants, rng):
+    """{variant: {metric: {"median": (v, lo, hi), "ratio": (v, lo, hi) or None}}} over the
+    cold samples, each round's terms summed into one value per variant."""
+    per = {}
+    for s in samples:
+        if s["phase"] == "cold":
+            r = per.setdefault(s["variant"], {}).setdefault(s["round"], {m: 0 for m in METRICS})
+            for m in METRICS:
+                r[m] += s[m]
+    base = variants[0]
+    out = {}
+    for v in variants:
+        rounds = per.get(v, {})
+        out[v] = {}
+        for m in METRICS:
+            values = [rounds[k][m] for k in sorted(rounds)]
+            ratios = [rounds[k][m] / per[base][k][m] for k in sorted(rounds)
+                      if v != base and per[base].get(k, {}).get(m)]
+            out[v][m] = {"median": bootstrap(values, rng),
+                         "ratio": bootstrap(ratios, rng) if ratios else None}
+    return out
+
+
+def settled(est, target):
+    return all(e["ratio"] is None or tight(e["ratio"], target)
+               for per in est.values() for e in per.values())
+
+
+# -- the run ----------------------------------------------------------------------------
+
+def variants_of(suite, dbs):
+    """[(label, arm function, db path)]: arms x databases, labelled by what varies."""
+    arms = [load_arm(a, suite["suite_dir"]) for a in suite["arms"]]
+    dbs = dbs or [(os.path.basename(os.path.dirname(suite["db"])) or "db", suite["db"])]
+    out = []
+    for fn in arms:
+        for label, db in dbs:
+            name = (f"{fn.arm_name}@{label}" if len(arms) > 1 and len(dbs) > 1
+                    else label if len(dbs) > 1 else fn.arm_name)
+            out.append((name, fn, os.path.abspath(db)))
+    if len(out) < 2:
+        raise ValueError("an A/B needs two variants: two arms, or --db twice")
+    return out
+
+
+def run_ab(suite, dbs=None, change=None, store=None, min_rounds=MIN_ROUNDS,
+           max_rounds=MAX_ROUNDS, target=TARGET, any_device=False, seed=None, log=print):
+    variants = variants_of(suite, dbs)
+    names = [v[0] for v in variants]
+    for _, _, db in variants:
+        if not os.path.exists(db):
+            raise FileNotFoundError(db)
+    base_ctx = dict(suite.get("params") or {}, organism=suite.get("organism"),
+                    cap=suite["cap"], pool=suite["pool"])
+    vfs = base_ctx["vfs"] = emulated_disk(suite)
+    ctx = {name: dict(base_ctx, db=db) for name, _, db in variants}
+    if vfs is None:
+        for name, fn, db in variants:
+            check_devices(fn.arm_files(ctx[name]), suite["db"], any_device)
+    machine = Machine(None if vfs else device_of(suite["db"]))
+    rng = random.Random(seed if seed is not None else suite.get("seed", 0))
+
+    samples, est, rounds = [], None, 0
+    log(f"  {len(variants)} variants x {len(suite['terms'])} term(s), {min_rounds}-{max_rounds} "
+        f"rounds, until every ratio is within +/-{target:.0%} (baseline {names[0]})")
+    while rounds < max_rounds:
+        rounds += 1
+        for term in suite["terms"]:
+            order = list(variants)
+            rng.shuffle(order)
+            for name, fn, db in order:
+                c = ctx[name]
+                if vfs is not None:
+                    vfs.cold()
+                else:
+                    for f in fn.arm_files(c):
+                        verified_evict(f)
+                state = machine.before()
+                cold = timed(fn, c, term)
+                state.update(machine.after())
+                warm = timed(fn, c, term)
+                samples.append(dict(variant=name, term=term, round=rounds, phase="cold",
+                                    **cold, **state))
+                samples.append(dict(variant=name, term=term, round=rounds, phase="warm", **warm))
+        if rounds >= min_rounds:
+            est = estimate(samples, names, rng)
+            log(f"  [{rounds}] " + "   ".join(
+                f"{n}: {fmt_ratio(est[n]['wall_ms']['ratio'])}" for n in names[1:]))
+            if settled(est, target):
+                break
+        else:
+            log(f"  [{rounds}] done")
+    est = est or estimate(samples, names, rng)
+    result = {
+        "label": suite["label"], "change": change,
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git": git_head(), "host": socket.gethostname(), "kernel": platform.release(),
+        "baseline": names[0], "variants": {n: db for n, _, db in variants},
+        "arms": {n: fn.arm_name for n, fn, _ in variants},
+        "terms": suite["terms"], "emulated": vfs.model.to_json() if vfs else None,
+        "rounds": rounds, "stopped": "settled" if settled(est, target) else "max rounds",
+        "estimates": est, "samples": samples,
+    }
+    if store:
+        result["run_id"] = save(store, result)
+    return result
+
+
+# -- the store --------------------------------------------------------------------------
+
+def default_store():
+    return os.path.join(os.path.dirname(paths.HERE), "results", "ab.sqlite")
+
+
+def connect(store):
+    os.makedirs(os.path.dirname(os.path.abspath(store)), exist_ok=True)
+    con = sqlite3.connect(store)
+    con.executescript(SCHEMA)
+    return con
+
+
+def save(store, result):
+    con = connect(store)
+    try:
+        with con:
+            run = con.execute(
+                "INSERT INTO runs (started, label, change, git, host, kernel, baseline, variants,"
+                " terms, emulated, rounds, stopped) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                (result["started"], result["label"], result["change"], result["git"],
+                 result["host"], result["kernel"], result["baseline"],
+                 json.dumps(result["variants"]), json.dumps(result["terms"]),
+                 json.dumps(result["emulated"]) if result["emulated"] else None,
+                 result["rounds"], result["stopped"])).lastrowid
+            con.executemany(
+                "INSERT INTO samples VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                [(run, s["round"], s["term"], s["variant"], s["phase"], s["wall_ms"],
+                  s["read_bytes"], s["rows"], s["digest"], s.get("cached_mb"), s.get("free_mb"),
+                  s.get("dirty_mb"), s.get("in_flight"), s.get("queue_avg"), s.get("busy"),
+                  s.get("loadavg")) for s in result["samples"]])
+            con.executemany(
+                "INSERT INTO estimates VALUES (?,?,?,?,?,?,?,?,?,?)",
+                [(run, v, m, *e["median"], *(e["ratio"] or (None, None, None)),
+                  verdict(e["ratio"]) if e["ratio"] else None)
+                 for v, per in result["estimates"].items() for m, e in per.items()])
+        return run
+    finally:
+        con.close()
+
+
+def trend(store, change=None, metric="wall_ms"):
+    """[{run, started, change, git, rounds, stopped, variant, ratio, lo, hi, verdict}], oldest
+    first, for the non-baseline variants."""
+    con = connect(store)
+    try:
+        q = ("SELECT r.id, r.started, r.change, r.git, r.rounds, r.stopped, e.variant, e.ratio,"
+             " e.ratio_lo, e.ratio_hi, e.verdict, e.median FROM runs r JOIN estimates e ON e.run = r.id"
+             " WHERE e.metric = ? AND e.ratio IS NOT NULL")
+        args = [metric]
+        if change is not None:
+            q += " AND r.change = ?"
+            args.append(change)
+        cols = ("run", "started", "change", "git", "rounds", "stopped", "variant", "ratio",
+                "lo", "hi", "verdict", "median")
+        return [dict(zip(cols, row)) for row in con.execute(q + " ORDER BY r.started, r.id", args)]
+    finally:
+        con.close()
+
+
+# -- reporting --------------------------------------------------------------------------
+
+def fmt_ratio(r):
+    return "   -" if not r or r[0] is None else f"{r[0]:.2f}x [{r[1]:.2f}, {r[2]:.2f}]"
+
+
+def report(result, out=print):
+    est = result["estimates"]
+    out(f"\n  {result['rounds']} round(s), {result['stopped']}; cold, terms summed per round, "
+        f"{CONFIDENCE:.0%} bootstrap intervals")
+    out(f"\n  {'variant':24} {'wall s':>24} {'MB read':>24}   vs {result['baseline']}")
+    for v, per in est.items():
+        w, b = per["wall_ms"]["median"], per["read_bytes"]["median"]
+        out(f"  {v[:24]:24} {w[0] / 1000:8.2f} [{w[1] / 1000:6.2f}, {w[2] / 1000:6.2f}] "
+            f"{b[0] / 1048576:8.1f} [{b[1] / 1048576:6.1f}, {b[2] / 1048576:6.1f}]"
+            + ("" if v == result["baseline"] else
+               f"   wall {fmt_ratio(per['wall_ms']['ratio'])} {verdict(per['wall_ms']['ratio'])}; "
+               f"bytes {fmt_ratio(per['read_bytes']['ratio'])}"))
+    cold = [s for s in result["samples"] if s["phase"] == "cold"]
+    busy = sorted((s for s in cold if s.get("queue_avg")), key=lambda s: -s["queue_avg"])[:3]
+    if busy:
+        out("\n  busiest cold samples (volume queue depth while they ran): " + ", ".join(
+            f"{s['variant']}/{s['term']} r{s['round']} {s['queue_avg']:.1f}" for s in busy))
+    # The same arm should return the same page on every database and in every round.
+    digests = {}
+    for s in result["samples"]:
+        digests.setdefault((s["term"], result["arms"][s["variant"]]), set()).add(s["digest"])
+    for (term, arm), ds in digests.items():
+        if len(ds) > 1:
+            out(f"  note: {arm} returned different results for '{term}' across variants or rounds")
+
+
+def report_trend(rows, out=print):
+    if not rows:
+        out("  no runs in the store")
+        return
+    out(f"  {'started':19} {'change':20} {'git':9} {'variant':22} {'rounds':>6} {'ratio':>24}  verdict")
+    for r in rows:
+        out(f"  {r['started']:19} {(r['change'] or '-')[:20]:20} {(r['git'] or '-')[:9]:9} "
+            f"{r['variant'][:22]:22} {r['rounds']:6} {fmt_ratio((r['ratio'], r['lo'], r['hi'])):>24}  "
+            f"{r['verdict']}" + ("" if r["stopped"] == "settled" else " (inconclusive)"))
@@ -0,0 +1,130 @@
+"""Query arms: the things a suite times, one function per query shape.
+
+An arm is `fn(ctx, term) -> rows`, registered with @arm. `ctx` carries the suite's
+settings ('db', 'organism', 'cap', 'pool' and anything else the suite sets under
+"params"); an arm opens its databases with connect(ctx), so an emulated-disk run
+(moopbench.vfs) sees every read it makes. `rows` is the result list, so a run can say not only how long an arm took but
+whether what it returned changed. `files(ctx)` names what must be evicted before a cold
+run -- by default the organism database; an arm that ATTACHes a prototype lists both.
+
+Built in are the shapes lib/database_queries.php chooses between for a pair-index
+search. A suite may name any other arm as "module:function", the module found on
+sys.path or beside the suite file -- a prototype's arm lives with the prototype.
+"""
+import importlib, sqlite3, sys
+
+ARMS = {}
+
+
+def arm(name, files=None):
+    """Register fn as arm `name`; `files(ctx)` lists what a cold run must evict."""
+    def register(fn):
+        fn.arm_name = name
+        fn.arm_files = files or (lambda ctx: [ctx["db"]])
+        ARMS[name] = fn
+        return fn
+    return register
+
+
+def load_arm(spec, search_dir=None):
+    """A registered arm by name, or a decorated "module:function" imported on demand."""
+    if spec in ARMS:
+        return ARMS[spec]
+    if ":" not in spec:
+        raise KeyError(f"unknown arm {spec!r} (built in: {', '.join(sorted(ARMS))})")
+    module, func = spec.split(":", 1)
+    if search_dir and search_dir not in sys.path:
+        sys.path.insert(0, search_dir)
+    fn = getattr(importlib.import_module(module), func)
+    if not hasattr(fn, "arm_files"):
+        arm(spec)(fn)
+    return fn
+
+
+def connect(ctx, db=None):
+    """A read-only connection to ctx's database (or `db`), through the emulated disk when
+    the run has one (ctx['vfs'], moopbench.vfs). Both kinds take execute(sql, {name: v})."""
+    uri = f"file:{db or ctx['db']}?mode=ro"
+    vfs = ctx.get("vfs")
+    if vfs is not None:
+        import apsw
+        return apsw.Connection(uri, flags=apsw.SQLITE_OPEN_READONLY | apsw.SQLITE_OPEN_URI,
+                               vfs=vfs.vfs_name)
+    return sqlite3.connect(uri, uri=True)
+
+
+F = "feature_annotation_search"
+
+# The production tiers (searchFeaturesAndAnnotations), less the stem tier, which needs
+# the PHP stemmer. {rank} is the pool's score where it has one.
+TIERS = """ORDER BY (f.feature_name LIKE :nm) DESC,
+                    (f.feature_description LIKE :nm) DESC,
+                    (a.annotation_description LIKE :nm) DESC,
+                    (COALESCE(f.feature_name,'') <> '') DESC,
+                    {rank}
+                    f.feature_uniquename"""
+
+BODY = """SELECT f.feature_uniquename, a.annotation_accession
+          FROM pool
+          JOIN feature_annotation fa ON fa.feature_annotation_id = pool.rid
+          JOIN feature f ON f.feature_id = fa.feature_id
+          JOIN annotation a ON a.annotation_id = fa.annotation_id
+          JOIN annotation_source ans ON ans.annotation_source_id = a.annotation_source_id
+          {tiers}
+          LIMIT {cap}"""
+
+
+def _pair(ctx, term, pool_cte, rank):
+    sql = pool_cte + BODY.format(tiers=TIERS.format(rank=rank), cap=int(ctx["cap"]))
+    c = connect(ctx)
+    try:
+        return c.execute(sql, {"t": term, "nm": f"%{term.strip(chr(34) + '*')}%"}).fetchall()
+    finally:
+        c.close()
+
+
+@arm("pair_bm25")
+def pair_bm25(ctx, term):
+    """bm25 picks the pool: the fallback on a database with no sidecar and no type column."""
+    return _pair(ctx, term,
+                 f"WITH pool AS (SELECT rowid AS rid, bm25({F},10.0,5.0,2.0,3.0,0.0) AS r "
+                 f"FROM {F} WHERE {F} MATCH :t ORDER BY r LIMIT {int(ctx['pool'])})",
+                 "pool.r,")
+
+
+@arm("pair_rowid")
+def pair_rowid(ctx, term):
+    """The first rows by rowid: the match alone, no scattered _docsize reads."""
+    return _pair(ctx, term,
+                 f"WITH pool AS (SELECT rowid AS rid FROM {F} WHERE {F} MATCH :t "
+                 f"ORDER BY rowid LIMIT {int(ctx['pool'])})",
+                 "")
+
+
+@arm("feature_name")
+def feature_name(ctx, term):
+    """searchFeaturesByNameDescription(): feature_search alone, no annotations."""
+    c = connect(ctx)
+    try:
+        return c.execute(
+            """SELECT f.feature_uniquename FROM feature_search fs
+               JOIN feature f ON f.feature_id = fs.rowid
+               WHERE feature_search MATCH :t
+               ORDER BY (f.feature_name LIKE :nm) DESC,
+                        (COALESCE(f.feature_name,'') <> '') DESC,
+                        bm25(feature_search, 10.0, 5.0), f.feature_uniquename
+               LIMIT """ + str(int(ctx["cap"])),
+            {"t": term, "nm": f"%{term.strip(chr(34) + '*')}%"}).fetchall()
+    finally:
+        c.close()
+
+
+@arm("feature_id")
+def feature_id(ctx, term):
+    """api/feature_search.php: an exact feature_uniquename lookup, one index probe."""
+    c = connect(ctx)
+    try:
+        return c.execute("SELECT feature_uniquename, feature_type FROM feature "
+                         "WHERE feature_uniquename = :t", {"t": term}).fetchall()
+    finally:
+        c.close()
@@ -0,0 +1,100 @@
+"""Page-cache residency, eviction and I/O accounting, with VERIFICATION.
+
+The point of this module is that eviction is *checked*, not assumed. The 2026-07 round's
+cold numbers did not reproduce because dd oflag=nocache is advisory, and
+disk_latency.py once shipped a cache hit measured as disk latency because
+posix_fadvise(DONTNEED) silently skips dirty pages.
+"""
+import ctypes, mmap, os, time
+
+libc = ctypes.CDLL("libc.so.6", use_errno=True)
+libc.mmap.restype = ctypes.c_void_p
+libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
+                      ctypes.c_int, ctypes.c_int, ctypes.c_long]
+libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+PROT_READ, MAP_SHARED = 1, 1
+BIT0 = bytes(b & 1 for b in range(256))     # mincore vector byte -> its residency bit
+
+
+class EvictionError(RuntimeError):
+    """A file is still (partly) resident after eviction -- a cold run would be a lie."""
+
+
+def resident(path):
+    """(resident_pages, total_pages) of one file, via mincore(2). Faults nothing in.
+
+    Maps through libc rather than Python's mmap module: mincore() needs the raw address,
+    and a read-only Python mmap will not hand one out (ctypes refuses to take the address
+    of a non-writable buffer).
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return 0, 0
+        addr = libc.mmap(None, size, PROT_READ, MAP_SHARED, fd, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            raise OSError(ctypes.get_errno(), f"mmap failed: {path}")
+        try:
+            npages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+            vec = ctypes.create_string_buffer(npages)
+            if libc.mincore(ctypes.c_void_p(addr), ctypes.c_size_t(size), vec) != 0:
+                raise OSError(ctypes.get_errno(), f"mincore failed: {path}")
+            # bit 0 is residency; the other bits are reserved. Mask each byte to it and
+            # popcount the vector as one integer: 1.5 ms for 500,000 pages (2 GB), where
+            # a Python loop over the bytes took 22 ms.
+            return int.from_bytes(vec.raw[:npages].translate(BIT0), "big").bit_count(), npages
+        finally:
+            libc.munmap(ctypes.c_void_p(addr), size)
+    finally:
+        os.close(fd)
+
+
+# The name fts_split.py and its importers know it by.
+resident_pages = resident
+
+
+def pct(r, t):
+    return 0.0 if t == 0 else 100.0 * r / t
+
+
+def evict(path):
+    """Drop one file's clean pages. Needs no privileges; not verified -- see below."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def verified_evict(path, tries=5):
+    """Evict, and MAKE SURE: sync(), fadvise, mincore, retry. Returns (resident, total);
+    raises EvictionError when pages are still resident after `tries` attempts.
+
+    DONTNEED skips dirty pages, so a file written moments ago (a freshly built prototype)
+    stays partly resident and the next run reads it from RAM. One call is not enough.
+    """
+    for attempt in range(tries):
+        os.sync()
+        evict(path)
+        r, t = resident(path)
+        if r == 0:
+            return r, t
+        time.sleep(0.3)
+    raise EvictionError(f"{path}: {r}/{t} pages still resident after {tries} evictions")
+
+
+def io_counters():
+    """This process's cumulative /proc/self/io counters ({} where there is none)."""
+    try:
+        with open("/proc/self/io") as fh:
+            return {k: int(v) for k, v in (line.split(":", 1) for line in fh if ":" in line)}
+    except OSError:
+        return {}
+
+
+def read_bytes():
+    """Bytes this process has read from STORAGE -- page-cache hits do not count."""
+    return io_counters().get("read_bytes", 0)
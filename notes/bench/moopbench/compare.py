@@ -0,0 +1,90 @@
+"""Hold one run against another and flag regressions.
+
+Matched on (arm, term, phase), medians against medians. A regression is a median that
+grew by more than the tolerance AND by more than an absolute floor -- cold wall time on
+sdb swings 10x between identical runs of one query, so it gets a wide tolerance, while
+bytes read are nearly deterministic and get a narrow one. A warm run that starts reading
+from storage at all is flagged on the byte floor alone.
+
+A first-100 digest that changed is reported too: the arm is returning a different page,
+which may be the point of the change or may be a bug, but is never noise.
+
+Runs that did not keep the discipline (files off the organism data volume) are refused,
+and a database that changed between the runs is called out: after a reload the two
+numbers describe different data. A run on the emulated disk (moopbench.vfs) compares
+only with runs on the same disk model.
+"""
+import json
+
+TOLERANCE = {"wall_ms": 0.25, "read_bytes": 0.10}
+FLOOR = {"wall_ms": 20.0, "read_bytes": 256 * 1024}
+
+
+class IncomparableError(ValueError):
+    pass
+
+
+def load(path):
+    with open(path) as fh:
+        result = json.load(fh)
+    if result.get("moopbench") != 1:
+        raise IncomparableError(f"{path}: not a moopbench result")
+    if not result.get("discipline", {}).get("same_device", False):
+        raise IncomparableError(f"{path}: recorded with files off the organism data volume")
+    return result
+
+
+def compare(old, new, tolerance=None, floor=None):
+    """(rows, notes): one row per matched (arm, term, phase), and warnings."""
+    tolerance = dict(TOLERANCE, **(tolerance or {}))
+    floor = dict(FLOOR, **(floor or {}))
+    emulated = [r["discipline"].get("emulated") for r in (old, new)]
+    if emulated[0] != emulated[1]:
+        raise IncomparableError("one run is on " + " and the other on ".join(
+            f"the emulated disk {e['name']!r}" if e else "the real device" for e in emulated))
+    notes = []
+    if old["db"] != new["db"]:
+        notes.append(f"database changed between runs ({old['db']} -> {new['db']})")
+    if old["suite"].get("db") != new["suite"].get("db"):
+        notes.append(f"different databases: {old['suite'].get('db')} vs {new['suite'].get('db')}")
+
+    before = {(s["arm"], s["term"], s["phase"]): s for s in old["summary"]}
+    rows = []
+    for s in new["summary"]:
+        key = (s["arm"], s["term"], s["phase"])
+        o = before.pop(key, None)
+        if o is None:
+            notes.append(f"new in this run: {'/'.join(key)}")
+            continue
+        row = {"arm": s["arm"], "term": s["term"], "phase": s["phase"], "flags": []}
+        for metric in ("wall_ms", "read_bytes"):
+            a, b = o[metric], s[metric]
+            row[metric] = (a, b)
+            if b - a > floor[metric] and b > a * (1 + tolerance[metric]):
+                row["flags"].append(f"{metric} regressed")
+        if o["digest"] != s["digest"] or o["rows"] != s["rows"]:
+            row["flags"].append("results changed")
+        rows.append(row)
+    for key in before:
+        notes.append(f"missing from this run: {'/'.join(key)}")
+    return rows, notes
+
+
+def regressions(rows):
+    return [r for r in rows if any(f.endswith("regressed") for f in r["flags"])]
+
+
+def ratio(a, b):
+    return "   -  " if not a else f"{b / a:5.2f}x"
+
+
+def report(rows, notes, out=print):
+    out(f"  {'arm':14} {'term':20} {'phase':5}  {'wall ms old':>11} {'new':>9} {'':6}  "
+        f"{'MB old':>8} {'new':>8} {'':6}  flags")
+    for r in rows:
+        (wa, wb), (ba, bb) = r["wall_ms"], r["read_bytes"]
+        out(f"  {r['arm'][:14]:14} {r['term'][:20]:20} {r['phase']:5}  {wa:11.1f} {wb:9.1f} "
+            f"{ratio(wa, wb):6}  {ba / 1048576:8.1f} {bb / 1048576:8.1f} {ratio(ba, bb):6}  "
+            + ", ".join(r["flags"]))
+    for n in notes:
+        out(f"  NOTE: {n}")
@@ -0,0 +1,233 @@
+"""Synthetic organism.sqlite corpus -- schema-correct databases to benchmark anywhere.
+
+Every measurement in notes/ was taken against the live 33 GB corpus on one host, so
+nothing could be checked anywhere else and nothing could be tried at a size the site
+has not reached yet. This writes organism databases from the real schema
+(config/build_and_load_db/data_loaders/create_schema_sqlite.sql) and indexes them with
+the real build_fts_index.sql, so every query, sidecar and tier script runs against
+them unchanged. What is synthetic is the text, shaped after what the notes measured:
+
+  size         scale 1.0 is Rhinolophus_ferrumequinum, the cost model's organism:
+               2,884,714 (feature, annotation) pairs over 407,002 distinct annotations,
+               ~25,000 genes. Organisms vary around that (lognormal, like the real 85).
+  gene model   gene -> 1-3 mRNA -> one CDS and one protein each; annotations on the
+               mRNA, where the loader floats them (SEARCH_FEATURE_LEVEL_DECISION.md).
+  fan-out      pairs per mRNA are heavy-tailed; ~15% of mRNA carry none.
+  types        the curated annotation types, each with its own share of the pairs, its
+               own reuse (GO terms are shared across thousands of genes; a ProtNLM name
+               belongs to one protein) and its own description length -- ProtNLM's
+               short names are what bm25 favoured, so their brevity is reproduced.
+  terms        filler words Zipf-distributed over a large vocabulary, plus the six
+               terms of the cost model at the share of pair documents they matched there,
+               from piwi (304 documents) to binding (322,361). A benchmark term here
+               hits roughly the match-set size it hits in production.
+  scores       e-values for the homology types, NULL where a type has none (43%).
+
+Deterministic for a given seed. Written to DIR/<organism>/organism.sqlite, with a
+corpus.json manifest of what was asked for and what was written.
+
+    python3 -m moopbench corpus DIR --organisms 5 --scale 1
+    MOOP_ORGANISM_DATA=DIR python3 -m moopbench run suites/cold_search.json --organism Synth_a
+"""
+import itertools, json, math, os, random, sqlite3, time
+
+from . import paths
+
+SCHEMA_DIR = os.path.join("config", "build_and_load_db", "data_loaders")
+
+BASE_PAIRS = 2_884_714
+BASE_GENES = 25_000
+
+# type, sources, share of pairs, distinct annotations per pair, words (min, max), scored
+TYPES = [
+    ("Orthologs",      ["OrthoFinder"],                        0.08, 0.30, (3, 8),   True),
+    ("Homologs",       ["BLAST Swiss-Prot", "BLAST TrEMBL"],   0.06, 0.35, (6, 18),  True),
+    ("RBBH_Homolog",   ["RBBH Human", "RBBH Mouse", "RBBH Fly"], 0.28, 0.20, (6, 16), True),
+    ("Domains",        ["InterPro", "Pfam", "SMART"],          0.16, 0.04, (2, 6),   True),
+    ("GO",             ["GO (InterPro2GO)", "GO (EggNOG)"],    0.25, 0.01, (2, 7),   False),
+    ("Pathways",       ["KEGG", "Reactome"],                   0.05, 0.02, (3, 9),   False),
+    ("Gene Families",  ["PANTHER", "EggNOG"],                  0.09, 0.05, (2, 7),   True),
+    ("AI Annotations", ["ProtNLM"],                            0.03, 0.90, (1, 3),   False),
+]
+
+# Cost-model terms and the share of documents they matched (SEARCH_COST_MODEL, section 1).
+ANCHORS = [("binding", 0.112), ("kinase", 0.076), ("ubiquitin", 0.026),
+           ("helicase", 0.0065), ("pax", 0.0021), ("piwi", 0.0001)]
+
+# A pair document also carries its gene's description, and half the genes have one, so a
+# term placed at rate p in every phrase matches ~1.5p of the pair documents (measured:
+# 17% for binding at 11.2%). Phrases are drawn at the share / 1.5 to land on the share.
+DOC_FACTOR = 1.5
+
+VOCAB = 40_000
+ZIPF_S = 1.07
+SYLLABLES = ["ba", "co", "de", "fi", "ga", "hy", "ki", "lo", "me", "no", "pe", "ra",
+             "si", "tu", "ve", "xo", "ze", "ph", "tr", "cl", "str", "ase", "ine", "ol"]
+
+
+def schema_file(name):
+    return os.path.join(paths.moop_root(), SCHEMA_DIR, name)
+
+
+class Words:
+    """Zipf-distributed filler words plus the anchored cost-model terms."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        seen, words = set(), []
+        for n in itertools.count(1):
+            w = "".join(rng.choice(SYLLABLES) for _ in range(2 + n % 3))
+            if w not in seen and w not in dict(ANCHORS):
+                seen.add(w)
+                words.append(w)
+            if len(words) == VOCAB:
+                break
+        self.vocab = words
+        self.cum = list(itertools.accumulate(1 / (r ** ZIPF_S) for r in range(1, VOCAB + 1)))
+
+    def phrase(self, lo, hi):
+        words = self.rng.choices(self.vocab, cum_weights=self.cum, k=self.rng.randint(lo, hi))
+        for term, share in ANCHORS:
+            if self.rng.random() < share / DOC_FACTOR:
+                words.insert(self.rng.randrange(len(words) + 1), term)
+        return " ".join(words)
+
+
+def zipf_cum(n, s=1.0):
+    return list(itertools.accumulate(1 / (r ** s) for r in range(1, n + 1)))
+
+
+def organism_names(n):
+    """Synth_a, Synth_b, ... -- valid organism directory names, stable per count."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    out = []
+    for i in range(n):
+        tag, j = "", i
+        while True:
+            tag = letters[j % 26] + tag
+            j = j // 26 - 1
+            if j < 0:
+                break
+        out.append(f"Synth_{tag}")
+    return out
+
+
+def generate(db, organism, scale, seed, log=print):
+    """Write one organism database. Returns its counts."""
+    rng = random.Random(f"{seed}:{organism}")
+    words = Words(rng)
+    if os.path.exists(db):
+        os.remove(db)
+    c = sqlite3.connect(db)
+    c.execute("PRAGMA journal_mode=OFF")
+    c.execute("PRAGMA synchronous=OFF")
+    c.execute("PRAGMA foreign_keys=ON")
+    with open(schema_file("create_schema_sqlite.sql")) as fh:
+        c.executescript(fh.read())
+
+    genus, species = organism.split("_", 1)
+    c.execute("INSERT INTO organism(genus, species, common_name, taxon_id) VALUES (?,?,?,?)",
+              (genus, species, f"synthetic {species}", 900000 + rng.randrange(99999)))
+    c.execute("INSERT INTO genome(organism_id, genome_description, genome_name, genome_accession) "
+              "VALUES (1, 'synthetic assembly', ?, ?)", (f"{species}_v1", f"SYN{rng.randrange(10**6):06d}.1"))
+    c.execute("INSERT INTO gene_set(genome_id, gene_set_name, gene_set_description) "
+              "VALUES (1, 'v1', 'synthetic gene models')")
+
+    # Gene models.
+    genes = max(10, int(BASE_GENES * scale))
+    prefix = species[:2].upper()
+    features, mrnas, fid = [], [], 0
+    for g in range(1, genes + 1):
+        fid += 1
+        gene_id = fid
+        name = (f"{rng.choice('ABCDEFGHKMNPRSTWZ')}{rng.choice('ABCDEFGHKLMNPRSTX')}"
+                f"{rng.choice('ABCDEFGHKLMNPRSTX')}{rng.randint(1, 99)}") if rng.random() < 0.6 else None
+        desc = words.phrase(2, 8) if rng.random() < 0.5 else None
+        features.append((gene_id, name, desc, "gene", f"{prefix}g{g:06d}", None))
+        for t in range(1, 1 + min(3, 1 + int(rng.expovariate(2.2)))):
+            fid += 1
+            mrna_id, mrna_name = fid, f"{prefix}t{g:06d}{t:03d}"
+            features.append((mrna_id, name, desc, "mRNA", mrna_name, gene_id))
+            mrnas.append(mrna_id)
+            features.append((fid + 1, None, None, "CDS", f"{mrna_name}:cds", mrna_id))
+            features.append((fid + 2, None, None, "protein", f"{mrna_name}:pep", mrna_id))
+            fid += 2
+    c.executemany("INSERT INTO feature(feature_id, feature_name, feature_description, organism_id, "
+                  "feature_type, feature_uniquename, parent_feature_id, gene_set_id) "
+                  "VALUES (?,?,?,1,?,?,?,1)", features)
+    del features
+
+    # Annotation pools, per type and source.
+    pairs_target = int(BASE_PAIRS * scale)
+    pools = []          # (cum_weights, [annotation_id...], scored) per source
+    share_weights = []
+    ann_id = 0
+    for atype, sources, share, distinct, (lo, hi), scored in TYPES:
+        for s in sources:
+            c.execute("INSERT INTO annotation_source(annotation_source_name, annotation_source_version, "
+                      "annotation_type, annotation_date) VALUES (?, '1', ?, '2026-01-01')", (s, atype))
+            src_id = c.execute("SELECT last_insert_rowid()").fetchone()[0]
+            n = max(1, int(pairs_target * share / len(sources) * distinct))
+            tag = "".join(ch for ch in s.upper() if ch.isalnum())[:6]
+            rows = []
+            for i in range(n):
+                ann_id += 1
+                rows.append((ann_id, src_id, f"{tag}{i:07d}", words.phrase(lo, hi)))
+            c.executemany("INSERT INTO annotation(annotation_id, annotation_source_id, "
+                          "annotation_accession, annotation_description) VALUES (?,?,?,?)", rows)
+            # A type with heavy reuse draws a few annotations often; ProtNLM barely repeats.
+            pools.append((zipf_cum(n, 1.0 if distinct < 0.5 else 0.2), ann_id - n + 1, n, scored))
+            share_weights.append(share / len(sources))
+
+    # Fan-out: pairs per mRNA, heavy-tailed, ~15% unannotated.
+    mean = pairs_target / (len(mrnas) * 0.85)
+    sigma = 1.0
+    mu = math.log(mean) - sigma * sigma / 2
+    src_cum = list(itertools.accumulate(share_weights))
+    pairs = 0
+    batch = []
+    for mrna_id in mrnas:
+        if rng.random() < 0.15:
+            continue
+        k = max(1, int(rng.lognormvariate(mu, sigma)))
+        chosen = set()
+        for p in rng.choices(range(len(pools)), cum_weights=src_cum, k=k):
+            cum, first, n, scored = pools[p]
+            a = first + rng.choices(range(n), cum_weights=cum)[0] if n > 1 else first
+            if a in chosen:
+                continue
+            chosen.add(a)
+            score = 10 ** -rng.uniform(3, 180) if scored else None
+            batch.append((mrna_id, a, score))
+        if len(batch) >= 100_000:
+            c.executemany("INSERT INTO feature_annotation(feature_id, annotation_id, score) VALUES (?,?,?)", batch)
+            pairs += len(batch)
+            batch = []
+    c.executemany("INSERT INTO feature_annotation(feature_id, annotation_id, score) VALUES (?,?,?)", batch)
+    pairs += len(batch)
+    c.commit()
+
+    t0 = time.perf_counter()
+    with open(schema_file("build_fts_index.sql")) as fh:
+        c.executescript(fh.read())
+    c.close()
+    counts = {"genes": genes, "mrna": len(mrnas), "annotations": ann_id, "pairs": pairs,
+              "bytes": os.path.getsize(db)}
+    log(f"  {organism:16} {genes:9,} genes {len(mrnas):9,} mRNA {ann_id:10,} annotations "
+        f"{pairs:11,} pairs  {counts['bytes'] / 1048576:8.0f} MB  (FTS {time.perf_counter() - t0:.0f} s)")
+    return counts
+
+
+def generate_corpus(out, organisms=3, scale=1.0, seed=1, spread=0.5, log=print):
+    """organisms databases under out/, sizes lognormal around scale (spread 0 = all equal)."""
+    rng = random.Random(seed)
+    manifest = {"seed": seed, "scale": scale, "spread": spread, "organisms": {}}
+    for org in organism_names(organisms):
+        s = scale * (rng.lognormvariate(-spread * spread / 2, spread) if spread > 0 else 1.0)
+        os.makedirs(os.path.join(out, org), exist_ok=True)
+        counts = generate(paths.organism_db(org, out), org, s, seed, log)
+        manifest["organisms"][org] = dict(counts, scale=round(s, 4))
+    with open(os.path.join(out, "corpus.json"), "w") as fh:
+        json.dump(manifest, fh, indent=1)
+        fh.write("\n")
+    return manifest
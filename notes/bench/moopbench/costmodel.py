@@ -0,0 +1,427 @@
+"""What a cold search will cost, before anyone makes it cold.
+
+SEARCH_COST_MODEL_2026-07-31.md measured the shape of a cold search: finding the matches
+costs 0.4-0.7 MB whatever the term; bm25() then reads a scattered _docsize entry per
+matching document until it has touched the whole docsize table; the row fetch is bounded
+by the pool. Cost follows the matched-document count, not the database size. This turns
+that into a prediction -- cold milliseconds and bytes -- two ways:
+
+  from a trace   the distinct pages a query reads, in the order it first reads them
+                 (moopbench.trace; `trace --json` keeps them), replayed against a disk
+                 model: a page not yet fetched is one device read of that page and the
+                 readahead window behind it, a seek unless it starts where the last read
+                 ended -- vfs.charge's rule, at the model's EXPECTED seek (the lognormal
+                 mean) rather than a draw, so a fitted model answers for a trace taken
+                 under another
+  from a count   matched documents k and the pool the search would take (quota,
+                 bm25_sidecar, rowid, bm25, as searchFeaturesAndAnnotations chooses),
+                 through one saturating curve per class of object:
+
+                     device reads = W (1 - exp(-s x / W))
+
+                 W the readahead windows the class's pages lie in, x the documents it is read for
+                 (k for _docsize under bm25, the pool for the row fetch), s the reads per
+                 document while few are read. Matched documents cluster -- "piwi"'s 304
+                 cost 1.8 MB of _docsize, not 304 windows -- so s is fitted, not assumed.
+                 The FTS index ("match") is a constant. What is resident is subtracted.
+
+  cost-fit       traces a few terms cold through the emulated disk -- nothing evicted,
+                 nothing slept -- and fits s, bytes per read and the sequential share per
+                 class. The fit is in reads and bytes, which do not depend on the device,
+                 so one organism's fit serves a group; the disk model turns it into time.
+  cost-check     the fit against real verified-cold runs: per term, both predictions and
+                 the measured median, and the error as a factor
+  cost-group     every member of a group, e.g. all 49 bats: k counted from each FTS index
+                 (its doclists, 0.4-0.7 MB a database, read and left warm), class sizes and
+                 residency from scripts/residency_map.py (mincore, faults nothing in), and
+                 the whole search at the fan-out's queue depth. Nothing is evicted, so the
+                 answer is known before a destructive cross-organism eviction is run to
+                 find it out.
+
+    python3 -m moopbench cost-fit --organism Rhinolophus_ferrumequinum --terms piwi,pax,helicase,binding
+    python3 -m moopbench cost --params results/cost-model-Rhinolophus_ferrumequinum.json --organism O --term kinase
+    python3 -m moopbench cost --trace t.json --disk-model sdb-model.json
+    python3 -m moopbench cost-check --params P --organism O --terms piwi,helicase --disk-model sdb-model.json
+    python3 -m moopbench cost-group --params P --group Bats --term helicase
+
+Terms are FTS MATCH expressions, as in suites. The quota pool runs a dozen narrow FTS
+queries where the fit saw one, so its "match" is an underestimate until a quota arm is
+traced. The bm25_sidecar read is modelled, not fitted: the sidecar is read by PHP, which
+the VFS cannot see -- the blocks the match set touches, front to back, one seek.
+"""
+import json, math, os, sqlite3, statistics, sys
+
+from . import paths
+from .arms import load_arm
+from .cache import verified_evict
+from .diskmodel import Z95
+from .runner import timed
+
+SCHEMA = 1
+CLASSES = ("match", "docsize", "rows")
+ARM_STRATEGY = {"pair_bm25": "bm25", "pair_rowid": "rowid"}
+FANOUT = 5                      # the browser's fan-out, as the note measured it
+DOCSIZE_MAX_MATCHES = 250000    # MOOP_DOCSIZE_MAX_MATCHES (lib/fts_docsize.php)
+SIDECAR_HEADER, SIDECAR_BLOCK = 64, 65536
+F = "feature_annotation_search"
+
+
+class CostModelError(RuntimeError):
+    """No fit to predict from, or one that cannot be used."""
+
+
+# -- the database ---------------------------------------------------------------------
+
+def virtual_tables(db):
+    c = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        return {n: sql for n, sql in c.execute(
+            "SELECT name, sql FROM sqlite_schema WHERE sql LIKE 'CREATE VIRTUAL TABLE%'")}
+    finally:
+        c.close()
+
+
+def class_of(name, virtual):
+    """'docsize', 'match' (the rest of an FTS table's shadows) or 'rows' (everything else)."""
+    if name.endswith("_docsize"):
+        return "docsize"
+    return "match" if any(name.startswith(v + "_") for v in virtual) else "rows"
+
+
+def count_matches(db, term):
+    """k: the rows the term matches. Reads the index's doclists, nothing else."""
+    c = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        return c.execute(f"SELECT count(*) FROM {F} WHERE {F} MATCH ?", (term,)).fetchone()[0]
+    finally:
+        c.close()
+
+
+def residency_map():
+    scripts = os.path.join(paths.moop_root(), "scripts")
+    if scripts not in sys.path:
+        sys.path.insert(0, scripts)
+    import residency_map
+    return residency_map
+
+
+def class_sizes(db, cache_root=None, cold=False, readahead_kb=128):
+    """{class: {"bytes", "resident_bytes", "windows"}} from the residency map (one mincore).
+    windows is how many readahead-sized stretches of the file hold the class's pages -- the
+    most device reads it can take to read all of it, which is what the curve saturates at:
+    a _docsize smeared across the file has as many windows as pages. cold=True counts
+    nothing resident, as after an eviction."""
+    rm = residency_map()
+    virtual = virtual_tables(db)
+    m = rm.load_map(db, cache_root)
+    out = {c: {"bytes": 0, "resident_bytes": 0, "windows": 0} for c in CLASSES}
+    for r in rm.residency(db, m):
+        o = out[class_of(r["object"], virtual)]
+        o["bytes"] += r["bytes"]
+        o["resident_bytes"] += 0 if cold else r["resident_bytes"]
+    span = -(-readahead_kb * 1024 // m["page_size"]) + 1
+    owner = m["owner"]
+    for c in CLASSES:
+        ks = [k for k, name in enumerate(m["names"]) if class_of(name, virtual) == c]
+        select = bytes(1 if i in ks else 0 for i in range(256))
+        mask = owner.translate(select)
+        out[c]["windows"] = sum(1 for i in range(0, len(mask), span) if 1 in mask[i:i + span])
+    return out
+
+
+def sidecars(db, cache_root=None):
+    """(docsize sidecar size or None, has a term-stats sidecar) -- lib/cache_paths.php's
+    paths, under the cache root (cache_path, else the organism data)."""
+    d = os.path.join(cache_root or paths.organism_data(), os.path.basename(os.path.dirname(db)))
+    docsize = os.path.join(d, "fts_docsize.bin")
+    return (os.path.getsize(docsize) if os.path.exists(docsize) else None,
+            os.path.exists(os.path.join(d, "fts_term_stats.sqlite")))
+
+
+def choose_strategy(k, has_type, docsize_bytes, term_stats, cap=2500):
+    """The pool searchFeaturesAndAnnotations() would take for an unfiltered search.
+    Without the term-stats sidecar there is no estimate, and production decides blind."""
+    quota_size = max(1, round(cap * 1.5))
+    whole_set = term_stats and k <= quota_size
+    if has_type and not whole_set:
+        return "quota"
+    if docsize_bytes is not None and k < DOCSIZE_MAX_MATCHES:
+        return "bm25_sidecar"
+    if term_stats and k > cap * 2:
+        return "rowid"
+    return "bm25"
+
+
+def pool_rows(strategy, cap=2500):
+    return max(1, round(cap * 1.5)) if strategy == "quota" else cap * 2
+
+
+# -- the disk -------------------------------------------------------------------------
+
+def expected_seek_ms(model, depth=1):
+    """The mean of the model's lognormal seek at a queue depth."""
+    median, p95 = model.latency_params(depth)
+    sigma = max(0.0, math.log(max(p95, median) / median) / Z95)
+    return median * math.exp(sigma * sigma / 2)
+
+
+def replay_pages(order, page_size, page_count, model, depth=1):
+    """Cold cost of reading these pages in this order: {"reads", "seeks", "bytes", "ms"}."""
+    ra_pages = -(-model.readahead_kb * 1024 // page_size)
+    fetched, last_end = set(), None
+    reads = seeks = pages = 0
+    for p in order:
+        if p in fetched:
+            continue
+        end = min(page_count, p + ra_pages) if page_count else p + ra_pages
+        new = [q for q in range(p, end + 1) if q not in fetched]
+        fetched.update(new)
+        reads += 1
+        seeks += p != last_end
+        pages += len(new)
+        last_end = end + 1
+    nbytes = pages * page_size
+    ms = seeks * expected_seek_ms(model, depth) + model.transfer_ms(nbytes)
+    return {"reads": reads, "seeks": seeks, "bytes": nbytes, "ms": round(ms, 1)}
+
+
+def predict_trace(trace, model, depth=1):
+    """From a moopbench.trace.QueryTrace or one of `trace --json`'s traces."""
+    if hasattr(trace, "order"):
+        order, ps, pc = trace.order(), trace.map.page_size, trace.map.page_count
+    else:
+        # Traces written before "order" was kept: the misses, in order, under the readahead
+        # they were taken with.
+        order = trace.get("order") or trace["misses"]
+        ps, pc = trace["page_size"], trace["page_count"]
+    return replay_pages(order, ps, pc, model, depth)
+
+
+# -- the fit --------------------------------------------------------------------------
+
+def curve(W, s, x):
+    return W * (1 - math.exp(-s * x / W)) if W > 0 and x > 0 else 0.0
+
+
+def fit_slope(points):
+    """s minimising the squared log error of curve() over [(W, x, reads)], by a log-spaced
+    scan and one refinement around the best."""
+    points = [(W, x, r) for W, x, r in points if W > 0 and x > 0]
+    if not points:
+        return 0.0
+
+    def err(s):
+        return sum((math.log1p(curve(W, s, x)) - math.log1p(r)) ** 2 for W, x, r in points)
+    grid = [10 ** (e / 20) for e in range(-100, 41)]        # 1e-5 .. 100
+    best = min(grid, key=err)
+    fine = [best * 10 ** (e / 400) for e in range(-20, 21)]
+    return min(fine, key=err)
+
+
+def calibrate(db, terms, model, arms=("pair_bm25",), cap=2500, pool=5000, log=print):
+    """Trace each term cold through the emulated disk and fit the classes."""
+    from .trace import Tracer
+    from .vfs import LatencyVFS
+    vfs = LatencyVFS(model)
+    tracer = Tracer(vfs, db)
+    virtual = virtual_tables(db)
+    ra_bytes = model.readahead_kb * 1024 + tracer.map.page_size
+    sizes = class_sizes(db, cold=True, readahead_kb=model.readahead_kb)
+    ctx = {"db": db, "cap": cap, "pool": pool, "vfs": vfs}
+    points = []
+    for term in terms:
+        k = count_matches(db, term)
+        for name in arms:
+            fn = load_arm(name)
+            strategy = ARM_STRATEGY.get(fn.arm_name, "bm25")
+            with tracer.query(f"{fn.arm_name} {term!r}") as t:
+                fn(ctx, term)
+            per = {c: {"reads": 0, "seq": 0, "bytes": 0} for c in CLASSES}
+            for o in t.objects():
+                p = per[class_of(o["object"], virtual)]
+                p["reads"] += o["misses"]
+                p["seq"] += o["sequential"]
+                p["bytes"] += o["disk_bytes"]
+            x = {"match": 1, "docsize": k if strategy == "bm25" else 0,
+                 "rows": min(k, pool_rows(strategy, cap))}
+            points.append({"term": term, "arm": fn.arm_name, "docs": k, "x": x, "classes": per,
+                           "trace": predict_trace(t, model)})
+            log(f"  {fn.arm_name:12} {term[:20]:20} {k:9,} docs   "
+                + "   ".join(f"{c} {per[c]['reads']:5,} reads {per[c]['bytes'] / 1048576:6.1f} MB"
+                             for c in CLASSES))
+    classes = {}
+    for c in CLASSES:
+        reads = sum(p["classes"][c]["reads"] for p in points)
+        bpr = sum(p["classes"][c]["bytes"] for p in points) / reads if reads else ra_bytes
+        W = sizes[c]["windows"]
+        f = {"bytes_per_read": round(bpr), "bytes": sizes[c]["bytes"], "windows": W,
+             "sequential": round(sum(p["classes"][c]["seq"] for p in points) / reads, 3) if reads else 0.0}
+        if c == "match":
+            f["reads"] = statistics.median(p["classes"][c]["reads"] for p in points) if points else 0
+        else:
+            f["slope"] = fit_slope([(W, p["x"][c], p["classes"][c]["reads"]) for p in points])
+        classes[c] = f
+    return {"moopbench_costmodel": SCHEMA, "db": db, "organism": os.path.basename(os.path.dirname(db)),
+            "db_fingerprint": paths.fingerprint(db), "cap": cap, "pool": pool,
+            "readahead_kb": model.readahead_kb, "fitted_on": model.name,
+            "classes": classes, "points": points}
+
+
+def load_params(path):
+    try:
+        with open(path) as fh:
+            params = json.load(fh)
+    except (OSError, ValueError) as e:
+        raise CostModelError(f"no cost model at {path} ({e}) -- run `moopbench cost-fit` first")
+    if params.get("moopbench_costmodel") != SCHEMA:
+        raise CostModelError(f"{path} is not a cost model this version reads")
+    return params
+
+
+def default_params(organism):
+    return os.path.join(os.path.dirname(paths.HERE), "results", f"cost-model-{organism}.json")
+
+
+# -- the prediction -------------------------------------------------------------------
+
+def predict(params, k, strategy, sizes, model, cap=2500, depth=1, docsize_bytes=None):
+    """{"ms", "bytes", "seeks", "classes"} for k matched documents under a pool strategy,
+    over class sizes (class_sizes(); what they hold resident is not read again)."""
+    x = {"match": 1, "docsize": k if strategy == "bm25" else 0,
+         "rows": min(k, pool_rows(strategy, cap))}
+    out, seeks, nbytes = {}, 0.0, 0.0
+    for c in CLASSES:
+        f, size = params["classes"][c], sizes[c]
+        bpr = f["bytes_per_read"]
+        W = size["windows"]
+        reads = min(W, f["reads"]) if c == "match" else curve(W, f["slope"], x[c])
+        cold = 1 - size["resident_bytes"] / size["bytes"] if size["bytes"] else 0.0
+        reads *= cold
+        out[c] = {"reads": round(reads, 1), "bytes": round(reads * bpr), "cold_share": round(cold, 3)}
+        seeks += reads * (1 - f["sequential"])
+        nbytes += reads * bpr
+    if strategy == "bm25_sidecar" and docsize_bytes:
+        blocks = max(1, -(-(docsize_bytes - SIDECAR_HEADER) // SIDECAR_BLOCK))
+        b = curve(blocks, 1.0, k) * SIDECAR_BLOCK
+        out["sidecar"] = {"reads": 1, "bytes": round(b), "cold_share": 1.0}
+        seeks += 1
+        nbytes += b
+    ms = seeks * expected_seek_ms(model, depth) + model.transfer_ms(nbytes)
+    return {"ms": round(ms, 1), "bytes": round(nbytes), "seeks": round(seeks, 1), "classes": out}
+
+
+def predict_organism(params, db, term, model, cap=2500, depth=1, cache_root=None,
+                     strategy=None, docs=None, cold=False):
+    """predict() for one database, with k, sizes and the strategy found from it."""
+    k = count_matches(db, term) if docs is None else docs
+    sizes = class_sizes(db, cache_root, cold, model.readahead_kb)
+    docsize_bytes, term_stats = sidecars(db, cache_root)
+    if strategy is None:
+        strategy = choose_strategy(k, "annotation_type_code" in (virtual_tables(db).get(F) or ""),
+                                   docsize_bytes, term_stats, cap)
+    p = predict(params, k, strategy, sizes, model, cap, depth, docsize_bytes)
+    return dict(p, docs=k, strategy=strategy,
+                resident_share=round(sum(s["resident_bytes"] for s in sizes.values())
+                                     / max(1, sum(s["bytes"] for s in sizes.values())), 3))
+
+
+def estimate_group(params, organisms, term, model, cap=2500, fanout=FANOUT, cache_root=None,
+                   strategy=None, log=print):
+    """Every organism's prediction at the fan-out's queue depth, and the whole search: the
+    disk serves `fanout` requests at once, so its seeks take the deeper latency but
+    overlap, and transfer is shared."""
+    missing = [o for o in organisms if not os.path.exists(paths.organism_db(o))]
+    present = [o for o in organisms if o not in missing]
+    depth = max(1, min(fanout, len(present)))
+    rows = []
+    for org in present:
+        db = paths.organism_db(org)
+        p = predict_organism(params, db, term, model, cap, depth, cache_root, strategy)
+        rows.append(dict(p, organism=org))
+        log(f"  {org[:32]:32} {p['docs']:9,} docs  {p['strategy']:12} "
+            f"{p['resident_share'] * 100:5.1f}% resident  {p['bytes'] / 1048576:8.1f} MB  "
+            f"{p['ms'] / 1000:7.2f} s")
+    seeks = sum(r["seeks"] for r in rows)
+    nbytes = sum(r["bytes"] for r in rows)
+    wall = seeks * expected_seek_ms(model, depth) / depth + model.transfer_ms(nbytes)
+    return {"term": term, "organisms": len(rows), "missing": missing, "fanout": depth,
+            "disk_model": model.to_json(), "bytes": nbytes, "seeks": round(seeks),
+            "ms": round(wall, 1), "rows": rows}
+
+
+# -- the check ------------------------------------------------------------------------
+
+def error_factor(predicted, measured):
+    """How far off, as a factor >= 1 (2.0 = half or double)."""
+    if predicted <= 0 or measured <= 0:
+        return None
+    return round(max(predicted / measured, measured / predicted), 2)
+
+
+def validate(params, db, terms, model, arms=("pair_bm25",), reps=3, cap=2500, pool=5000,
+             vfs=None, log=print):
+    """Both predictions against cold runs: verified eviction, or with vfs the emulated disk
+    emptied -- which checks the count model against the trace model, not against a device."""
+    ctx = {"db": db, "cap": cap, "pool": pool, "vfs": vfs}
+    sizes = class_sizes(db, cold=True, readahead_kb=model.readahead_kb)
+    tracer = None
+    try:
+        from .trace import Tracer
+        from .vfs import LatencyVFS
+        tracer = Tracer(LatencyVFS(model), db)
+    except RuntimeError:            # no APSW: the count model alone
+        pass
+    out = []
+    for term in terms:
+        k = count_matches(db, term)
+        for name in arms:
+            fn = load_arm(name)
+            strategy = ARM_STRATEGY.get(fn.arm_name, "bm25")
+            pred = predict(params, k, strategy, sizes, model, cap)
+            traced = None
+            if tracer is not None:
+                with tracer.query(term) as t:
+                    fn(dict(ctx, vfs=tracer.vfs), term)
+                traced = predict_trace(t, model)
+            samples = []
+            for _ in range(reps):
+                if vfs is not None:
+                    vfs.cold()
+                else:
+                    for f in fn.arm_files(ctx):
+                        verified_evict(f)
+                samples.append(timed(fn, ctx, term))
+            ms = statistics.median(s["wall_ms"] for s in samples)
+            nbytes = statistics.median(s["read_bytes"] for s in samples)
+            row = {"term": term, "arm": fn.arm_name, "docs": k, "strategy": strategy,
+                   "measured": {"ms": ms, "bytes": nbytes}, "count": pred, "trace": traced,
+                   "error": {"count_ms": error_factor(pred["ms"], ms),
+                             "count_bytes": error_factor(pred["bytes"], nbytes),
+                             "trace_ms": error_factor(traced["ms"], ms) if traced else None,
+                             "trace_bytes": error_factor(traced["bytes"], nbytes) if traced else None}}
+            out.append(row)
+            log(f"  {fn.arm_name:12} {term[:18]:18} {k:9,} docs  measured {ms:9.1f} ms "
+                f"{nbytes / 1048576:7.1f} MB   count {pred['ms']:9.1f} ms {pred['bytes'] / 1048576:7.1f} MB"
+                + (f"   trace {traced['ms']:9.1f} ms {traced['bytes'] / 1048576:7.1f} MB" if traced else ""))
+    summary = {}
+    for key in ("count_ms", "count_bytes", "trace_ms", "trace_bytes"):
+        errs = [r["error"][key] for r in out if r["error"][key]]
+        if errs:
+            summary[key] = {"median": statistics.median(errs), "worst": max(errs)}
+    return {"db": db, "fingerprint": paths.fingerprint(db), "emulated": vfs is not None,
+            "disk_model": model.to_json(), "reps": reps, "rows": out, "summary": summary}
+
+
+def report_check(result, out=print):
+    out(f"\n  against {'the emulated disk' if result['emulated'] else 'verified-cold runs'} "
+        f"({result['reps']} each), error as a factor (1.00 = exact):")
+    for key, s in result["summary"].items():
+        out(f"    {key.replace('_', ' '):12} median x{s['median']:.2f}   worst x{s['worst']:.2f}")
+
+
+def report_group(result, out=print):
+    out(f"\n  {result['organisms']} organism(s), {result['term']!r}, {result['fanout']} in flight "
+        f"on {result['disk_model']['name']}: {result['bytes'] / 1048576:,.0f} MB cold, "
+        f"{result['seeks']:,} seeks, ~{result['ms'] / 1000:,.1f} s")
+    if result["missing"]:
+        out(f"  no database for: {', '.join(result['missing'])}")
@@ -0,0 +1,114 @@
+"""A model of the data volume: what one read costs, by access pattern and queue depth.
+
+Fitted from disk_random_read.py --json measurements (O_DIRECT, so the numbers are the
+device's, never the page cache's), used by moopbench.vfs to charge every read SQLite
+makes as if it had gone to that device.
+
+A read costs
+
+    random      a seek drawn from the volume's latency distribution at the current
+                queue depth -- lognormal, fitted to the measured median and p95
+    sequential  (it starts where the previous read of the same file ended) transfer
+                only, at the measured streaming rate: readahead and the drive's own
+                track buffer make the next block nearly free
+    + transfer  bytes / sequential rate, on either -- including the readahead window the
+                kernel fetches behind a buffered read (128 KB by default, read_ahead_kb).
+                That window is why a cold helicase search reads 40 MB for far fewer pages
+                asked, and why it took ~9 s rather than a seek per 4 KB page: 40 MB in
+                128 KB windows is ~320 seeks, ~10 s at 33 ms.
+
+Queue depth matters on sdb more than anywhere: the measured median is 32-34 ms at depth
+1, /proc/diskstats averages 26.3 ms, and five more requests in flight bought 1.12x. A
+model fitted at several depths interpolates between them and, past the deepest one
+measured, holds throughput flat -- every extra request only waits.
+
+Draws come from a seeded generator, so the same reads in the same order always cost the
+same: a cold query is reproducible to the millisecond.
+"""
+import bisect, json, math, random, statistics
+
+Z95 = 1.6449
+
+
+class DiskModel:
+    def __init__(self, name, depths, seq_mb_s, block=4096, readahead_kb=128, seed=0):
+        """depths: {queue depth: (median_ms, p95_ms)}, at least depth 1."""
+        if 1 not in depths:
+            raise ValueError("a disk model needs depth 1")
+        self.name = name
+        self.depths = {int(d): (float(m), float(p)) for d, (m, p) in depths.items()}
+        self.seq_mb_s = float(seq_mb_s)
+        self.block = block
+        self.readahead_kb = readahead_kb
+        self.readahead_blocks = readahead_kb * 1024 // block
+        self.rng = random.Random(seed)
+        self._keys = sorted(self.depths)
+
+    # -- fitting and storage --------------------------------------------------------
+
+    @classmethod
+    def fit(cls, measured, name=None, seed=0):
+        """From disk_random_read.py --json output."""
+        depths = {}
+        for d, m in measured["depths"].items():
+            lat = sorted(m["latencies_ms"])
+            depths[int(d)] = (statistics.median(lat), lat[max(0, int(len(lat) * 0.95) - 1)])
+        return cls(name or measured.get("path", "fitted"), depths,
+                   measured.get("sequential_mb_s") or 100.0, measured.get("block", 4096),
+                   measured.get("readahead_kb", 128), seed)
+
+    @classmethod
+    def load(cls, spec, seed=0):
+        """A preset name (see PRESETS) or a saved model / measurement JSON file."""
+        if spec in PRESETS:
+            return cls(spec, seed=seed, **PRESETS[spec])
+        with open(spec) as fh:
+            data = json.load(fh)
+        if any(isinstance(v, dict) for v in data.get("depths", {}).values()):
+            return cls.fit(data, seed=seed)     # raw measurements, not a saved model
+        return cls(data["name"], {int(k): tuple(v) for k, v in data["depths"].items()},
+                   data["seq_mb_s"], data.get("block", 4096), data.get("readahead_kb", 128), seed)
+
+    def to_json(self):
+        return {"name": self.name, "depths": {str(k): list(v) for k, v in self.depths.items()},
+                "seq_mb_s": self.seq_mb_s, "block": self.block, "readahead_kb": self.readahead_kb}
+
+    # -- costs ------------------------------------------------------------------------
+
+    def latency_params(self, depth):
+        """(median_ms, p95_ms) at a queue depth."""
+        depth = max(1, depth)
+        keys = self._keys
+        if depth in self.depths:
+            return self.depths[depth]
+        if depth > keys[-1]:
+            # Past the deepest measurement throughput is flat: latency grows with depth.
+            m, p = self.depths[keys[-1]]
+            f = depth / keys[-1]
+            return m * f, p * f
+        i = bisect.bisect(keys, depth)
+        lo, hi = keys[i - 1], keys[i]
+        t = (depth - lo) / (hi - lo)
+        (m0, p0), (m1, p1) = self.depths[lo], self.depths[hi]
+        return m0 + t * (m1 - m0), p0 + t * (p1 - p0)
+
+    def seek_ms(self, depth=1):
+        median, p95 = self.latency_params(depth)
+        sigma = max(0.0, math.log(max(p95, median) / median) / Z95)
+        return self.rng.lognormvariate(math.log(median), sigma)
+
+    def transfer_ms(self, nbytes):
+        return nbytes / (self.seq_mb_s * 1048576) * 1000.0
+
+    def cost_ms(self, nbytes, sequential, depth=1):
+        return (0.0 if sequential else self.seek_ms(depth)) + self.transfer_ms(nbytes)
+
+
+# Measured on the production host (notes/STORAGE_AND_RAM_TESTING.md): sdb 32-34 ms median,
+# 59-64 ms p95 at depth 1; sda 0.5 / 0.8 ms. The deeper points and the streaming rates are
+# ESTIMATES until disk_random_read.py --depth is run there: shaped so that 5 -> 15 in
+# flight gains the measured 1.12x. Fit a real model with `moopbench fit`.
+PRESETS = {
+    "sdb": {"depths": {1: (33.0, 61.0), 5: (66.0, 140.0), 15: (177.0, 380.0)}, "seq_mb_s": 120.0},
+    "sda": {"depths": {1: (0.5, 0.8), 8: (0.9, 1.6), 32: (2.4, 4.5)}, "seq_mb_s": 900.0},
+}
@@ -0,0 +1,369 @@
+"""Rebuild an organism database in the physical order its workload reads it.
+
+The 2026-07-31 FTS rebuild ended in a VACUUM, and a cold COUNT(*) over annotation went
+from 7,051 ms to 400 ms (notes/QUERY_PERFORMANCE.md) with no change to the query: the
+table's pages had become contiguous. VACUUM lays objects out in schema order, which is
+the order the loader happened to create them in -- nobody chose it. This chooses it.
+
+    1. trace    the workload (a suite: arms x terms) runs cold through moopbench.trace;
+                every object it reads is weighed by its modelled disk time and by when in
+                the query it is first read
+    2. build    one copy per candidate layout x page size, objects written in that order,
+                each b-tree contiguous:
+                  schema  what VACUUM gives -- the baseline a plain rebuild would reach
+                  heat    the hottest objects first, at the front of the file
+                  path    objects in the order a query walks them, so a cold query's
+                          reads move forward through the file instead of back and forth
+                In heat and path an FTS table's shadow tables stay together, _idx, _data
+                then _docsize: the segment a term's doclist is read from sits next to
+                the _docsize pages bm25 reads for every match.
+                Page sizes: 4 KB is what the corpus has; 16 and 64 KB trade fewer seeks
+                for reading more bytes per page touched -- on a volume at 33 ms a seek
+                and 120 MB/s, 64 KB of transfer costs 0.5 ms, a sixtieth of the seek.
+    3. score    the current file and every candidate replay the workload, cold and
+                verified evicted (moopbench.runner), round after round with the files
+                alternating so a busy minute on the disk is shared; or all on the
+                emulated disk with --disk-model
+    4. accept   the fastest candidate, only if it returns identical results (digests),
+                has no per-query regression (moopbench.compare) and beats the current
+                file's total cold time by --min-gain. --apply renames it into place.
+
+Copying is exact: tables and their indexes go through SQLite's transfer optimisation
+(the path VACUUM takes), FTS shadow tables row for row, so the index is the index that
+was built, not a rebuild of it. A candidate is checked before it is scored (quick_check,
+every object's row count, FTS5 integrity-check) and never replaces the original
+otherwise.
+
+Candidates are written beside the database (organisms/<org>/.layout/), on the volume
+whose seeks they are meant to save: VACUUM's lesson about /tmp (scripts/
+rebuild_fts_indexes.sh) applies, and a candidate on sda would win on the device alone.
+
+    python3 -m moopbench layout suites/cold_search.json --organism Nematostella_vectensis
+    python3 -m moopbench layout suites/cold_search.json --organism X --apply
+
+A database replaced this way has a new mtime and size, so its search sidecars and tier
+are stale until scripts/build_search_sidecars.php and build_search_tier.php rerun.
+"""
+import os, shutil, sqlite3, statistics
+
+from . import compare as cmp
+from . import paths
+from .runner import DisciplineError, run_suite, summarise
+
+LAYOUTS = ("schema", "heat", "path")
+PAGE_SIZES = (4096, 16384, 65536)
+FTS_ORDER = ("_config", "_idx", "_data", "_docsize", "_content")
+MIN_GAIN = 0.10
+
+
+class LayoutError(RuntimeError):
+    """A candidate that does not hold the same data as the original."""
+
+
+# -- what is in the database ------------------------------------------------------------
+
+def objects(db):
+    """The database's schema, as the items a layout orders.
+
+    An item is a table (with the indexes its constraints create, which SQLite fills
+    alongside it), a named index, or an FTS shadow table. Returns (items, extras): items
+    in schema order as dicts, extras the views and triggers created last."""
+    c = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        rows = c.execute("SELECT type, name, tbl_name, sql FROM sqlite_schema ORDER BY rowid").fetchall()
+    finally:
+        c.close()
+    virtual = {name: sql for kind, name, _, sql in rows
+               if kind == "table" and sql and sql.upper().startswith("CREATE VIRTUAL TABLE")}
+    items, extras = [], []
+    for kind, name, tbl, sql in rows:
+        if name in virtual or name.startswith("sqlite_") or sql is None:
+            continue        # the virtual table itself, internal tables, autoindexes
+        parent = next((v for v in virtual if name.startswith(v + "_")), None)
+        if kind in ("view", "trigger"):
+            extras.append(sql)
+        elif parent:
+            items.append({"name": name, "kind": "shadow", "parent": parent, "sql": virtual[parent]})
+        else:
+            items.append({"name": name, "kind": kind, "table": tbl, "sql": sql})
+    return items, extras
+
+
+def item_of(obj, items, table_of):
+    """The item a traced object is written with: itself, or its table for an autoindex."""
+    names = {i["name"] for i in items}
+    return obj if obj in names else table_of(obj)
+
+
+# -- ordering ---------------------------------------------------------------------------
+
+def weigh(tracer, arms, ctx, terms):
+    """Trace the workload cold; {item: {"disk_ms", "first"}} over everything it read."""
+    items, _ = objects(tracer.path)
+    weight = {}
+    for fn in arms:
+        for term in terms:
+            with tracer.query(f"{fn.arm_name} {term}") as t:
+                fn(ctx, term)
+            seen = []
+            for page, *_ in t.events:
+                name = item_of(tracer.map.object_of(page), items, tracer.map.table_of)
+                if name not in seen:
+                    seen.append(name)
+            for o in t.objects():
+                name = item_of(o["object"], items, tracer.map.table_of)
+                w = weight.setdefault(name, {"disk_ms": 0.0, "first": []})
+                w["disk_ms"] += o["disk_ms"]
+            for rank, name in enumerate(seen):
+                weight[name]["first"].append(rank / max(1, len(seen) - 1))
+    for w in weight.values():
+        w["first"] = statistics.mean(w["first"]) if w["first"] else 1.0
+    return weight
+
+
+def order(items, weight, layout):
+    """The items in the order `layout` writes them."""
+    if layout == "schema":
+        return list(items)
+    key = {"heat": lambda n: -weight[n]["disk_ms"],
+           "path": lambda n: weight[n]["first"]}[layout]
+    # An FTS table's shadows go as one group, placed by its hottest (or earliest) member;
+    # groups nothing in the workload read keep their schema order, after the rest.
+    groups = {}
+    for i in items:
+        groups.setdefault(i.get("parent") or i["name"], []).append(i)
+    hot = [g for g in groups.values() if any(i["name"] in weight for i in g)]
+    cold = [g for g in groups.values() if not any(i["name"] in weight for i in g)]
+    hot.sort(key=lambda g: min(key(i["name"]) for i in g if i["name"] in weight))
+
+    def shadow_rank(i):
+        return next((k for k, s in enumerate(FTS_ORDER) if i["name"].endswith(s)), len(FTS_ORDER))
+    out = []
+    for g in hot + cold:
+        out.extend(sorted(g, key=shadow_rank) if g[0].get("parent") else g)
+    return out
+
+
+# -- building ---------------------------------------------------------------------------
+
+def build(src, dst, ordered, extras, page_size):
+    """Write src's content to dst, objects in `ordered` order, at page_size."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    c = sqlite3.connect(f"file:{dst}", uri=True, isolation_level=None)
+    tables = {i["name"]: i for i in ordered if i["kind"] == "table"}
+    try:
+        c.execute(f"PRAGMA page_size = {int(page_size)}")
+        c.execute("PRAGMA journal_mode = OFF")
+        c.execute("PRAGMA synchronous = OFF")
+        c.execute("ATTACH ? AS old", (f"file:{src}?mode=ro",))
+        c.execute("BEGIN")
+        created = set()
+
+        def fill(i):
+            name = i["name"]
+            if i["kind"] == "shadow":
+                if i["parent"] not in created:
+                    # Creates every shadow table at once (a root page each) and seeds
+                    # _config and _data; they are emptied before their copy below.
+                    c.execute(i["sql"])
+                    created.add(i["parent"])
+                c.execute(f'DELETE FROM main."{name}"')
+                c.execute(f'INSERT INTO main."{name}" SELECT * FROM old."{name}"')
+            elif i["kind"] == "table":
+                # Created empty with only its constraint indexes, so the insert takes the
+                # transfer path: the table's b-tree, then each of those, each contiguous.
+                c.execute(i["sql"])
+                c.execute(f'INSERT INTO main."{name}" SELECT * FROM old."{name}"')
+            else:
+                # A named index built after its table is filled: sorted, contiguous. An
+                # index ordered ahead of its table brings the table forward with it.
+                if i["table"] not in created:
+                    fill(tables[i["table"]])
+                c.execute(i["sql"])
+            created.add(name)
+
+        for i in ordered:
+            if i["name"] not in created:
+                fill(i)
+        if c.execute("SELECT 1 FROM old.sqlite_schema WHERE name = 'sqlite_sequence'").fetchone():
+            c.execute("DELETE FROM main.sqlite_sequence")
+            c.execute("INSERT INTO main.sqlite_sequence SELECT * FROM old.sqlite_sequence")
+        if c.execute("SELECT 1 FROM old.sqlite_schema WHERE name = 'sqlite_stat1'").fetchone():
+            c.execute("CREATE TABLE IF NOT EXISTS main.sqlite_stat1(tbl, idx, stat)")
+            c.execute("INSERT INTO main.sqlite_stat1 SELECT * FROM old.sqlite_stat1")
+        for sql in extras:
+            c.execute(sql)
+        c.execute("COMMIT")
+        c.execute("DETACH old")
+    finally:
+        c.close()
+
+
+def verify(src, dst, items):
+    """Raise LayoutError unless dst holds what src holds."""
+    c = sqlite3.connect(f"file:{dst}", uri=True)    # writable: FTS5's check is an INSERT
+    c.execute("ATTACH ? AS old", (f"file:{src}?mode=ro",))
+    try:
+        chk = c.execute("PRAGMA main.quick_check").fetchone()[0]
+        if chk != "ok":
+            raise LayoutError(f"{dst}: quick_check: {chk}")
+        for i in items:
+            if i["kind"] == "index":
+                continue
+            a = c.execute(f'SELECT COUNT(*) FROM old."{i["name"]}"').fetchone()[0]
+            b = c.execute(f'SELECT COUNT(*) FROM main."{i["name"]}"').fetchone()[0]
+            if a != b:
+                raise LayoutError(f"{dst}: {i['name']} has {b} rows, the original {a}")
+        for v in sorted({i["parent"] for i in items if i["kind"] == "shadow"}):
+            try:
+                c.execute(f'INSERT INTO main."{v}"("{v}") VALUES (\'integrity-check\')')
+            except sqlite3.DatabaseError as e:
+                raise LayoutError(f"{dst}: {v}: {e}")
+    finally:
+        c.close()
+
+
+# -- scoring ----------------------------------------------------------------------------
+
+def score(suite, files, rounds, any_device=False, log=print):
+    """Replay the suite against every file, the files alternating round by round.
+
+    {label: result}, each result a moopbench result of `rounds` samples per arm x term."""
+    results = {}
+    for rep in range(1, rounds + 1):
+        for label, db in files.items():
+            log(f"  round {rep}/{rounds}: {label}")
+            r = run_suite(dict(suite, db=db, reps=1, label=label), any_device=any_device,
+                          log=lambda *_: None)
+            for s in r["samples"]:
+                s["rep"] = rep
+            if label in results:
+                results[label]["samples"] += r["samples"]
+            else:
+                results[label] = r
+    for r in results.values():
+        r["summary"] = summarise(r["samples"])
+        r["discipline"]["reps"] = rounds
+    return results
+
+
+def cold_total(result, metric="wall_ms"):
+    return sum(s[metric] for s in result["summary"] if s["phase"] == "cold")
+
+
+def decide(results, baseline="current", min_gain=MIN_GAIN):
+    """(accepted label or None, {label: verdict}) -- see the module docstring."""
+    base = results[baseline]
+    base_ms = cold_total(base)
+    verdicts, best = {}, None
+    for label, r in results.items():
+        if label == baseline:
+            continue
+        rows, _ = cmp.compare(base, r)
+        changed = [f"{x['arm']}/{x['term']}" for x in rows if "results changed" in x["flags"]]
+        worse = [f"{x['arm']}/{x['term']}/{x['phase']}" for x in cmp.regressions(rows)]
+        gain = 1 - cold_total(r) / base_ms if base_ms else 0.0
+        if changed:
+            v = "rejected: results changed for " + ", ".join(changed)
+        elif worse:
+            v = "rejected: regressed " + ", ".join(worse)
+        elif gain < min_gain:
+            v = f"rejected: {gain:+.0%} cold, under the {min_gain:.0%} required"
+        else:
+            v = f"eligible: {gain:+.0%} cold"
+            if best is None or cold_total(r) < cold_total(results[best]):
+                best = label
+        verdicts[label] = {"verdict": v, "gain": round(gain, 4),
+                           "cold_ms": cold_total(r), "cold_bytes": cold_total(r, "read_bytes")}
+    if best:
+        verdicts[best]["verdict"] = verdicts[best]["verdict"].replace("eligible", "ACCEPTED")
+    return best, verdicts
+
+
+# -- the whole pass ---------------------------------------------------------------------
+
+def workdir_for(db):
+    return os.path.join(os.path.dirname(db), ".layout")
+
+
+def optimise(suite, arms, layouts=LAYOUTS, page_sizes=PAGE_SIZES, rounds=3, workdir=None,
+             min_gain=MIN_GAIN, disk_model="sdb", any_device=False, apply=False, keep=False,
+             log=print):
+    """Trace, build, score and decide for suite["db"]; returns the report."""
+    from .diskmodel import DiskModel
+    from .trace import Tracer
+    from .vfs import LatencyVFS
+
+    db = suite["db"]
+    workdir = workdir or workdir_for(db)
+    os.makedirs(workdir, exist_ok=True)
+    if not paths.same_device(workdir, db) and not any_device:
+        raise DisciplineError(f"{workdir} is not on the volume {db} is on: candidates there "
+                              "would be scored on a different disk -- --any-device to anyway")
+    size = os.path.getsize(db)
+    need = size * len(layouts) * len(page_sizes) * 1.1
+    free = shutil.disk_usage(workdir).free
+    if free < need:
+        raise DisciplineError(f"{workdir}: {free / 2**30:.1f} GB free, the candidates need "
+                              f"{need / 2**30:.1f} GB")
+
+    # 1. trace -- always on the emulated disk: the weights are where reads go, which the
+    # device does not change, and the tracer needs the VFS to see them.
+    vfs = LatencyVFS(DiskModel.load(suite.get("disk_model") or disk_model))
+    tracer = Tracer(vfs, db)
+    ctx = dict(suite.get("params") or {}, db=db, organism=suite.get("organism"),
+               cap=suite["cap"], pool=suite["pool"], vfs=vfs)
+    weight = weigh(tracer, arms, ctx, suite["terms"])
+    items, extras = objects(db)
+    log("  heaviest objects: " + ", ".join(
+        f"{n} {w['disk_ms'] / 1000:.1f}s" for n, w in
+        sorted(weight.items(), key=lambda kv: -kv[1]["disk_ms"])[:5]))
+
+    # 2. build
+    files = {"current": db}
+    orders = {}
+    for layout in layouts:
+        orders[layout] = [i["name"] for i in order(items, weight, layout)]
+        for ps in page_sizes:
+            label = f"{layout}-{ps // 1024}k"
+            dst = os.path.join(workdir, f"{label}.sqlite")
+            log(f"  building {label}")
+            build(db, dst, order(items, weight, layout), extras, ps)
+            verify(db, dst, items)
+            files[label] = dst
+
+    # 3. score, 4. decide
+    try:
+        results = score(suite, files, rounds, any_device=any_device, log=log)
+        accepted, verdicts = decide(results, min_gain=min_gain)
+        report = {"db": db, "fingerprint": paths.fingerprint(db), "workload": {
+                      "arms": suite["arms"], "terms": suite["terms"]},
+                  "disk_model": suite.get("disk_model"), "rounds": rounds,
+                  "weights": weight, "orders": orders,
+                  "current_cold_ms": cold_total(results["current"]),
+                  "candidates": verdicts, "accepted": accepted, "applied": False}
+        if accepted and apply:
+            replace(db, files[accepted])
+            report["applied"] = True
+            files.pop(accepted)
+        return report
+    finally:
+        if not keep:
+            for label, f in files.items():
+                if label != "current" and os.path.exists(f):
+                    os.remove(f)
+            if not os.listdir(workdir):
+                os.rmdir(workdir)
+
+
+def replace(db, candidate):
+    """Rename candidate over db -- atomic within the volume, so a reader gets the whole
+    old file or the whole new one -- with the original's mode and owner."""
+    st = os.stat(db)
+    os.chmod(candidate, st.st_mode & 0o7777)
+    try:
+        os.chown(candidate, st.st_uid, st.st_gid)
+    except PermissionError:
+        pass
+    os.replace(candidate, db)
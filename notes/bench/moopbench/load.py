@@ -0,0 +1,443 @@
+"""Open-loop search load: users arriving independently, not a pool waiting its turn.
+
+loadtest.py and crossorg_ab.py run a fixed pool of curl processes. That is CLOSED-loop:
+a new request starts only when one finishes, so when the site slows the load slows
+with it and the queue a real second visitor would wait in never forms -- the
+measurement hides exactly the case QUERY_PERFORMANCE.md lists as unmeasured, several
+users searching at once. Here searches arrive as a Poisson process at --rate per
+second whatever the site is doing, each one a user typing a term:
+
+  a search     a term (weighted draw) over a scope (weighted draw): one organism, or a
+               group fanned out the way the browser does, --fanout organisms in flight
+               per search, one annotation_search_ajax.php request each
+  latency      per request and per search (until its last organism answered, and until
+               half had -- what a user watching the page fill sees), timed from when the
+               search was DUE, not when it got going: a generator that falls behind
+               would otherwise leave its own delay out (coordinated omission)
+  histograms   HDR-style, log-linear buckets: 128 per power of two, so any value is
+               within 0.8%, and a million requests keep in tens of KB
+  counters     /proc/vmstat refaults, major faults and reclaim sampled every second
+               through the run, and MB read from the data volume -- the same counters
+               loadtest.py reports, as a timeline that lines up with the requests
+
+Nothing is capped except --max-in-flight searches; an arrival past it is SHED and
+counted, not queued, so an overloaded site shows as shed arrivals, not as a slower
+arrival rate.
+
+    python3 -m moopbench load suites/open_loop.json
+    python3 -m moopbench load --rate 0.5 --duration 300 --term helicase:3 --term kinase \\
+            --group Bats:2 --organism Nematostella_vectensis --json out.json
+    python3 -m moopbench load suites/open_loop.json --serve    # php -S on this checkout
+
+--serve runs this checkout under PHP's built-in server on 127.0.0.1 (MOOP_ROOT_PATH and
+MOOP_SITE point it here), so a run needs neither nginx nor the production host; set
+MOOP_ORGANISM_DATA and the groups are read from this checkout's metadata. The built-in
+server handles one request at a time unless PHP_CLI_SERVER_WORKERS is set (it is, to
+--fanout x 2) -- a different server from production, so compare its numbers only with
+each other.
+
+HTTP is a small asyncio HTTP/1.0 GET, so the standard library is all this needs.
+"""
+import asyncio, datetime, json, math, os, platform, random, socket, subprocess, time
+import urllib.parse
+
+from . import paths
+from .runner import git_head
+
+COUNTERS = ("workingset_refault_file", "workingset_restore_file", "pgmajfault",
+            "pgscan_kswapd", "pgsteal_kswapd", "pswpout")
+ENDPOINT = "tools/annotation_search_ajax.php"
+BASE = f"http://172.16.2.52/moop/{ENDPOINT}"
+
+DEFAULTS = {"label": "open_loop", "rate": 0.2, "duration": 600, "fanout": 4,
+            "max_in_flight": 200, "timeout": 900, "seed": 1, "device": "sdb",
+            "terms": {"helicase": 1}, "scopes": {}}
+
+
+# -- histograms -------------------------------------------------------------------------
+
+class Histogram:
+    """Counts of values in microseconds, HDR-style: a value v lands in bucket
+    (e, v >> e) with e chosen to keep SUB_BITS significant bits, so every bucket is
+    within 1 / 2**(SUB_BITS - 1) of its values whatever their magnitude."""
+
+    SUB_BITS = 8
+
+    def __init__(self):
+        self.counts = {}
+        self.n = 0
+        self.total = 0
+        self.lo = None
+        self.hi = 0
+
+    def key(self, us):
+        e = max(0, us.bit_length() - self.SUB_BITS)
+        return (e << self.SUB_BITS) | (us >> e)
+
+    def value(self, key):
+        """The highest value a bucket holds: what its percentiles report."""
+        e, m = key >> self.SUB_BITS, key & ((1 << self.SUB_BITS) - 1)
+        return ((m + 1) << e) - 1
+
+    def record(self, seconds):
+        us = max(1, int(seconds * 1e6))
+        k = self.key(us)
+        self.counts[k] = self.counts.get(k, 0) + 1
+        self.n += 1
+        self.total += us
+        self.lo = us if self.lo is None else min(self.lo, us)
+        self.hi = max(self.hi, us)
+
+    def merge(self, other):
+        for k, c in other.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + c
+        self.n += other.n
+        self.total += other.total
+        if other.lo is not None:
+            self.lo = other.lo if self.lo is None else min(self.lo, other.lo)
+        self.hi = max(self.hi, other.hi)
+        return self
+
+    def percentile(self, q):
+        """Seconds at or below which q (0..1) of the values fall."""
+        if not self.n:
+            return None
+        want, seen = max(1, math.ceil(self.n * q)), 0
+        for k in sorted(self.counts):
+            seen += self.counts[k]
+            if seen >= want:
+                return min(self.value(k), self.hi) / 1e6
+        return self.hi / 1e6
+
+    def summary(self):
+        if not self.n:
+            return {"n": 0}
+        return {"n": self.n, "mean": round(self.total / self.n / 1e6, 4),
+                "min": self.lo / 1e6, "max": self.hi / 1e6,
+                **{f"p{int(q * 100)}": round(self.percentile(q), 4) for q in (0.5, 0.95, 0.99)}}
+
+    def to_json(self):
+        return {"unit": "us", "sub_bits": self.SUB_BITS, "min": self.lo, "max": self.hi,
+                "total": self.total, "counts": {str(k): c for k, c in sorted(self.counts.items())}}
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get("sub_bits", cls.SUB_BITS) != cls.SUB_BITS:
+            raise ValueError("histogram saved with a different bucket resolution")
+        h = cls()
+        h.counts = {int(k): c for k, c in data["counts"].items()}
+        h.n, h.total, h.lo, h.hi = sum(h.counts.values()), data["total"], data["min"], data["max"]
+        return h
+
+
+# -- the workload -----------------------------------------------------------------------
+
+def weighted(specs):
+    """["helicase:3", "kinase"] -> {"helicase": 3.0, "kinase": 1.0}."""
+    out = {}
+    for s in specs or ():
+        name, _, w = s.rpartition(":")
+        if not name or not w.replace(".", "", 1).isdigit():
+            name, w = s, "1"
+        out[name] = out.get(name, 0) + float(w)
+    return out
+
+
+def group_members(groups_file=None):
+    path = groups_file or os.path.join(paths.moop_root(), "metadata", "organism_assembly_groups.json")
+    with open(path) as fh:
+        entries = json.load(fh)
+    out = {}
+    for e in entries:
+        for g in e.get("groups") or []:
+            if e["organism"] not in out.setdefault(g, []):
+                out[g].append(e["organism"])
+    return out
+
+
+def load_workload(path=None, **overrides):
+    """A workload: DEFAULTS, then the JSON file, then non-None overrides. Scopes are
+    "group:NAME" or "organism:NAME" with weights; they resolve to organism lists here."""
+    w = dict(DEFAULTS)
+    if path:
+        with open(path) as fh:
+            w.update(json.load(fh))
+    w.update({k: v for k, v in overrides.items() if v not in (None, {}, [])})
+    if not w["scopes"]:
+        raise ValueError("a workload needs at least one scope (--group or --organism)")
+    groups = None
+    w["resolved"] = {}
+    for scope in w["scopes"]:
+        kind, _, name = scope.partition(":")
+        if kind == "organism":
+            w["resolved"][scope] = [name]
+        elif kind == "group":
+            if groups is None:
+                groups = group_members(w.get("groups_file"))
+            if not groups.get(name):
+                raise ValueError(f"no organisms in group {name!r}")
+            w["resolved"][scope] = groups[name]
+        else:
+            raise ValueError(f"scope {scope!r}: expected group:NAME or organism:NAME")
+    return w
+
+
+def arrivals(rate, duration, seed):
+    """Poisson arrival times in [0, duration): exponential gaps at `rate` per second."""
+    rng, t, out = random.Random(seed), 0.0, []
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            return out
+        out.append(t)
+
+
+# -- HTTP -------------------------------------------------------------------------------
+
+async def get(url, timeout):
+    """(status, body bytes) of one GET. HTTP/1.0, so no chunked bodies and no keep-alive:
+    each request is its own connection, like the browser's fan-out across organisms."""
+    u = urllib.parse.urlsplit(url)
+    port = u.port or (443 if u.scheme == "https" else 80)
+    target = (u.path or "/") + (f"?{u.query}" if u.query else "")
+
+    async def fetch():
+        reader, writer = await asyncio.open_connection(u.hostname, port,
+                                                       ssl=True if u.scheme == "https" else None)
+        try:
+            writer.write(f"GET {target} HTTP/1.0\r\nHost: {u.netloc}\r\n"
+                         f"User-Agent: moopbench-load\r\nAccept: application/json\r\n\r\n".encode())
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        head, _, body = raw.partition(b"\r\n\r\n")
+        try:
+            status = int(head.split(b" ", 2)[1])
+        except (IndexError, ValueError):
+            status = 0
+        return status, body
+
+    return await asyncio.wait_for(fetch(), timeout)
+
+
+def result_count(body):
+    try:
+        return len(json.loads(body).get("results", []))
+    except (ValueError, AttributeError):
+        return -1
+
+
+# -- counters ---------------------------------------------------------------------------
+
+def vmstat():
+    out = {}
+    with open("/proc/vmstat") as fh:
+        for line in fh:
+            k, _, v = line.partition(" ")
+            if k in COUNTERS:
+                out[k] = int(v)
+    return out
+
+
+def device_mb(device):
+    try:
+        with open("/proc/diskstats") as fh:
+            for line in fh:
+                f = line.split()
+                if len(f) > 5 and f[2] == device:
+                    return int(f[5]) * 512 / 1048576
+    except OSError:
+        pass
+    return 0.0
+
+
+async def sample_counters(timeline, device, t0, every=1.0):
+    """Append [seconds, MB read, counters...] every `every` seconds until cancelled."""
+    while True:
+        v = vmstat()
+        timeline.append([round(time.monotonic() - t0, 3), round(device_mb(device), 1)]
+                        + [v.get(k, 0) for k in COUNTERS])
+        await asyncio.sleep(every)
+
+
+# -- the run ----------------------------------------------------------------------------
+
+class Run:
+    def __init__(self, w, base, log=print):
+        self.w, self.base, self.log = w, base, log
+        self.rng = random.Random(w["seed"] + 1)
+        self.requests = []          # one dict per organism request
+        self.searches = []          # one dict per search
+        self.shed = 0
+        self.in_flight = 0
+        self.hist = {"request": Histogram(), "search": Histogram(), "half": Histogram()}
+        self.by_scope = {}
+
+    def draw(self, table):
+        names = list(table)
+        return self.rng.choices(names, weights=[table[n] for n in names])[0]
+
+    async def request(self, org, term, due, search_id):
+        url = f"{self.base}?" + urllib.parse.urlencode({"search_keywords": term, "organism": org})
+        t = time.monotonic()
+        try:
+            status, body = await get(url, self.w["timeout"])
+            rows, error = result_count(body), None if status == 200 else f"HTTP {status}"
+        except asyncio.TimeoutError:
+            status, rows, error = 0, -1, "timeout"
+        except OSError as e:
+            status, rows, error = 0, -1, str(e)
+        done = time.monotonic()
+        r = {"search": search_id, "organism": org, "term": term, "status": status,
+             "rows": rows, "error": error, "started": round(t - self.t0, 3),
+             "seconds": round(done - t, 4)}
+        self.requests.append(r)
+        if error is None:
+            self.hist["request"].record(done - t)
+        return done - due, error
+
+    async def search(self, search_id, due, scope, term):
+        orgs = list(self.w["resolved"][scope])
+        sem = asyncio.Semaphore(self.w["fanout"])
+        finished, errors = [], []
+
+        async def one(org):
+            async with sem:
+                seconds, error = await self.request(org, term, due, search_id)
+                finished.append(seconds)
+                if error:
+                    errors.append(error)
+
+        try:
+            await asyncio.gather(*(one(o) for o in orgs))
+        finally:
+            self.in_flight -= 1
+        finished.sort()
+        total, half = finished[-1], finished[(len(finished) - 1) // 2]
+        self.searches.append({"id": search_id, "scope": scope, "term": term,
+                              "due": round(due - self.t0, 3), "organisms": len(orgs),
+                              "seconds": round(total, 4), "half": round(half, 4),
+                              "errors": len(errors)})
+        if not errors:
+            self.hist["search"].record(total)
+            self.hist["half"].record(half)
+            self.by_scope.setdefault(scope, Histogram()).record(total)
+
+    async def run(self):
+        w = self.w
+        schedule = arrivals(w["rate"], w["duration"], w["seed"])
+        self.log(f"  {len(schedule)} searches due over {w['duration']:.0f}s "
+                 f"({w['rate']}/s), fan-out {w['fanout']}, {len(w['scopes'])} scope(s), "
+                 f"{len(w['terms'])} term(s) -> {self.base}")
+        self.t0 = time.monotonic()
+        self.timeline = []
+        sampler = asyncio.ensure_future(sample_counters(self.timeline, w["device"], self.t0))
+        tasks = []
+        try:
+            for i, at in enumerate(schedule):
+                due = self.t0 + at
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                scope, term = self.draw(w["scopes"]), self.draw(w["terms"])
+                if self.in_flight >= w["max_in_flight"]:
+                    self.shed += 1
+                    continue
+                self.in_flight += 1
+                tasks.append(asyncio.ensure_future(self.search(i, due, scope, term)))
+            await asyncio.gather(*tasks)
+        finally:
+            sampler.cancel()
+            v = vmstat()
+            self.timeline.append([round(time.monotonic() - self.t0, 3),
+                                  round(device_mb(w["device"]), 1)] + [v.get(k, 0) for k in COUNTERS])
+        self.elapsed = time.monotonic() - self.t0
+
+    def result(self):
+        first, last = self.timeline[0], self.timeline[-1]
+        deltas = {k: last[i + 2] - first[i + 2] for i, k in enumerate(COUNTERS)}
+        deltas["device_mb"] = round(last[1] - first[1], 1)
+        return {
+            "moopbench": 1, "kind": "load", "label": self.w["label"],
+            "started": datetime.datetime.now().isoformat(timespec="seconds"),
+            "host": socket.gethostname(), "kernel": platform.release(), "git": git_head(),
+            "base": self.base,
+            "workload": {k: v for k, v in self.w.items() if k != "resolved"},
+            "elapsed": round(self.elapsed, 1), "shed": self.shed,
+            "summary": {name: h.summary() for name, h in self.hist.items()},
+            "by_scope": {s: h.summary() for s, h in self.by_scope.items()},
+            "counters": deltas,
+            "timeline": {"columns": ["seconds", "device_mb"] + list(COUNTERS), "rows": self.timeline},
+            "histograms": {name: h.to_json() for name, h in self.hist.items()},
+            "searches": self.searches, "requests": self.requests,
+        }
+
+
+def report(result, out=print):
+    def row(name, s):
+        if not s.get("n"):
+            out(f"  {name:28} {'-':>6}")
+            return
+        out(f"  {name[:28]:28} {s['n']:6} {s['p50']:9.2f} {s['p95']:9.2f} {s['p99']:9.2f} {s['max']:9.2f}")
+
+    errors = sum(1 for r in result["requests"] if r["error"])
+    out(f"\n  {len(result['searches'])} searches, {len(result['requests'])} requests in "
+        f"{result['elapsed']:.0f}s; {errors} request error(s), {result['shed']} arrival(s) shed")
+    out(f"\n  {'seconds':28} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    row("per organism request", result["summary"]["request"])
+    row("per search, all answered", result["summary"]["search"])
+    row("per search, half answered", result["summary"]["half"])
+    for scope, s in sorted(result["by_scope"].items()):
+        row(f"  {scope}", s)
+    out(f"\n  {'counter':28} {'delta':>14}")
+    for k, v in result["counters"].items():
+        out(f"  {k:28} {v:>14,}")
+    refault = result["counters"].get("workingset_refault_file", 0)
+    out(f"\n  {refault * 4096 / 1024**3:.2f} GB of file pages evicted and read back during the run")
+
+
+# -- the local server -------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(port=None, workers=8, log=print):
+    """(process, base URL) of PHP's built-in server on this checkout, once it answers."""
+    root = paths.moop_root()
+    port = port or free_port()
+    env = dict(os.environ, MOOP_ROOT_PATH=os.path.dirname(root), MOOP_SITE=os.path.basename(root),
+               PHP_CLI_SERVER_WORKERS=str(workers))
+    proc = subprocess.Popen(["php", "-S", f"127.0.0.1:{port}", "-t", os.path.dirname(root)],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"php -S exited with {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            base = f"http://127.0.0.1:{port}/{os.path.basename(root)}/{ENDPOINT}"
+            log(f"  php -S on 127.0.0.1:{port}, {workers} workers, serving {root}")
+            return proc, base
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"php -S did not answer on port {port}")
+
+
+def run_load(w, base=None, serve_port=None, local=False, log=print):
+    proc = None
+    if local:
+        proc, base = serve(serve_port, workers=max(2, w["fanout"] * 2), log=log)
+    try:
+        r = Run(w, base or w.get("base") or BASE, log)
+        asyncio.run(r.run())
+        return r.result()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
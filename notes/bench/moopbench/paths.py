@@ -0,0 +1,34 @@
+"""Where the site and its organism databases are -- resolved, not hard-coded.
+
+The bench scripts used to name /var/www/html/moop/organisms/<organism> outright, so
+they ran on one host and needed editing for every reloaded organism. The site root is
+this checkout (notes/bench/moopbench is three levels below it), which is
+/var/www/html/moop on the production host; MOOP_ROOT or MOOP_ORGANISM_DATA override it,
+e.g. to point at a synthetic corpus.
+"""
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def moop_root():
+    return os.environ.get("MOOP_ROOT") or os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
+
+
+def organism_data():
+    return os.environ.get("MOOP_ORGANISM_DATA") or os.path.join(moop_root(), "organisms")
+
+
+def organism_db(organism, root=None):
+    return os.path.join(root or organism_data(), organism, "organism.sqlite")
+
+
+def same_device(path, reference):
+    """Whether `path` is on the block device `reference` is on (for existing paths)."""
+    return os.stat(path).st_dev == os.stat(reference).st_dev
+
+
+def fingerprint(path):
+    """Size and mtime: enough to tell that a database was reloaded between two runs."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": int(st.st_mtime)}
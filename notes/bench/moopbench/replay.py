@@ -0,0 +1,306 @@
+"""Replay captured searches: the site's real workload, at its real pace, on demand.
+
+lib/search_capture.php (on when 'search_capture_max_mb' > 0) logs one line per search
+request: when, which endpoint, the term, the organisms, the parameters, and an anonymous
+visitor token. This turns the log back into load, so a cache size, a layout or an index
+is judged on what users actually search rather than on kinase and helicase:
+
+  searches    the browser's fan-out arrives as one request per organism; requests of
+              one visitor with the same term and parameters, each within --gap seconds
+              of the last, are put back together into the search they were. A stream,
+              union or feature-ID request is a search on its own.
+  timing      each search starts at its captured offset from the first, divided by
+              --speed (2 = twice as fast), or all at once with --asap; a fan-out runs
+              --fanout organisms at a time, as the browser does, whatever pace the
+              original got -- that pace was the old server's answer, not the user's
+  http        (default) the captured requests, re-issued to the same endpoints with the
+              same parameters -- at --site, or this checkout under php -S with --serve.
+              Unauthenticated: organisms that are not public answer "Access denied",
+              and are counted as errors
+  direct      no web server: each search's organisms are opened and queried in this
+              process with the arm for the request (pair_bm25, feature_name when the user
+              deselected annotations, feature_id for an ID), --threads at a time --
+              a layout or an index change measured with PHP out of the picture
+
+Latencies go into the same histograms as moopbench load, with the same refault and
+reclaim counters sampled through the run. --evict starts from a verified-cold cache.
+
+    python3 -m moopbench replay /var/www/html/moop/logs/search_capture.ndjson
+    python3 -m moopbench replay CAPTURE --direct --speed 4 --evict
+    python3 -m moopbench replay CAPTURE --export-suite suites/captured.json --organism O
+"""
+import asyncio, collections, concurrent.futures, datetime, json, os, platform, re, socket
+import sqlite3, time, urllib.parse
+
+from . import paths
+from .arms import load_arm
+from .cache import verified_evict
+from .load import BASE, COUNTERS, Histogram, device_mb, get, result_count, sample_counters, vmstat
+from .runner import git_head
+
+ENDPOINTS = {"organism": "tools/annotation_search_ajax.php",
+             "stream": "tools/annotation_search_stream.php",
+             "union": "api/union_search.php",
+             "feature_id": "api/feature_search.php"}
+SITE = BASE.rsplit("/tools/", 1)[0]
+
+
+# -- reading ----------------------------------------------------------------------------
+
+def read_capture(files, since=None, until=None):
+    """Captured records, oldest first. A rotated FILE.1 is read before FILE."""
+    records = []
+    for f in files:
+        for path in (f + ".1", f):
+            if not os.path.exists(path):
+                continue
+            with open(path) as fh:
+                for line in fh:
+                    try:
+                        r = json.loads(line)
+                    except ValueError:
+                        continue
+                    if r.get("term") and r.get("endpoint") in ENDPOINTS:
+                        records.append(r)
+    records.sort(key=lambda r: r["ts"])
+    return [r for r in records if (since is None or r["ts"] >= since)
+            and (until is None or r["ts"] < until)]
+
+
+def searches(records, gap=60.0):
+    """[{ts, endpoint, term, organisms, requests}]: per-organism requests of one visitor,
+    term and parameter set folded into one search while each follows within `gap` s."""
+    out, open_ = [], {}
+    for r in records:
+        if r["endpoint"] != "organism":
+            out.append({"ts": r["ts"], "endpoint": r["endpoint"], "term": r["term"],
+                        "organisms": list(r.get("organisms") or []), "requests": [r]})
+            continue
+        params = {k: v for k, v in (r.get("params") or {}).items() if k not in ("organism", "scope")}
+        key = (r.get("visitor"), json.dumps(params, sort_keys=True))
+        s = open_.get(key)
+        if s is None or r["ts"] - s["last"] > gap or not r.get("visitor"):
+            s = open_[key] = {"ts": r["ts"], "endpoint": "organism", "term": r["term"],
+                              "organisms": [], "requests": [], "last": r["ts"]}
+            out.append(s)
+        s["organisms"] += r.get("organisms") or []
+        s["requests"].append(r)
+        s["last"] = r["ts"]
+    for s in out:
+        s.pop("last", None)
+    out.sort(key=lambda s: s["ts"])
+    return out
+
+
+def fts_expression(term, quoted=False):
+    """buildFtsMatchExpr() (lib/database_queries.php): what production MATCHes for what the
+    user typed -- the phrase, or every whitespace-separated token as a prefix, ANDed."""
+    def literal(t):
+        return '"' + t.replace('"', '""') + '"'
+    if quoted:
+        return literal(term) if re.search(r"\w", term) else ""
+    return " AND ".join(literal(t) + "*" for t in term.split() if re.search(r"\w", t))
+
+
+def arm_for(search):
+    params = search["requests"][0].get("params") or {}
+    if search["endpoint"] == "feature_id":
+        return "feature_id"
+    return "feature_name" if params.get("no_annotations") else "pair_bm25"
+
+
+# -- the replay -------------------------------------------------------------------------
+
+class Replay:
+    def __init__(self, plan, site=SITE, direct=False, speed=1.0, asap=False, fanout=4,
+                 threads=8, timeout=900, device="sdb", arm=None, log=print):
+        self.plan, self.site, self.direct = plan, site, direct
+        self.speed, self.asap, self.fanout, self.timeout = speed, asap, fanout, timeout
+        self.device, self.arm, self.log = device, arm, log
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads) if direct else None
+        self.hist = {"request": Histogram(), "search": Histogram()}
+        self.by_endpoint = collections.defaultdict(Histogram)
+        self.results = []
+        self.errors = collections.Counter()
+
+    # One organism, or one non-fan-out request: (seconds, error or None).
+    async def http_one(self, endpoint, params):
+        url = f"{self.site}/{ENDPOINTS[endpoint]}?" + urllib.parse.urlencode(params)
+        t = time.monotonic()
+        try:
+            status, body = await get(url, self.timeout)
+            error = None if status == 200 else f"HTTP {status}"
+            if error is None and endpoint == "organism" and result_count(body) < 0:
+                error = "bad response"
+            if error is None and b'"Access denied"' in body[:200]:
+                error = "access denied"
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except OSError as e:
+            error = type(e).__name__
+        return time.monotonic() - t, error
+
+    def direct_one(self, arm, organism, term, quoted):
+        db = paths.organism_db(organism)
+        if not os.path.exists(db):
+            return 0.0, "no database"
+        fn = load_arm(arm)
+        ctx = {"db": db, "organism": organism, "cap": 2500, "pool": 5000}
+        expr = term if arm == "feature_id" else fts_expression(term, quoted)
+        if not expr:
+            return 0.0, "no searchable term"
+        t = time.perf_counter()
+        try:
+            fn(ctx, expr)
+            error = None
+        except sqlite3.Error as e:
+            error = f"sqlite: {e}"
+        return time.perf_counter() - t, error
+
+    async def run_search(self, i, s, due):
+        sem = asyncio.Semaphore(self.fanout)
+        loop = asyncio.get_running_loop()
+        quoted = (s["requests"][0].get("params") or {}).get("quoted") == "1"
+        arm = self.arm or arm_for(s)
+
+        async def one(unit):
+            async with sem:
+                if self.direct:
+                    seconds, error = await loop.run_in_executor(
+                        self.pool, self.direct_one, arm, unit, s["term"], quoted)
+                else:
+                    seconds, error = await self.http_one(s["endpoint"], unit)
+            if error:
+                self.errors[error] += 1
+            else:
+                self.hist["request"].record(seconds)
+            return error
+
+        if self.direct:
+            units = s["organisms"] or list_organisms()
+        elif s["endpoint"] == "organism":
+            units = [r.get("params") or {} for r in s["requests"]]
+        else:
+            units = [s["requests"][0].get("params") or {}]
+        errors = [e for e in await asyncio.gather(*(one(u) for u in units)) if e]
+        total = time.monotonic() - due
+        self.results.append({"search": i, "endpoint": s["endpoint"], "term": s["term"],
+                             "units": len(units), "due": round(due - self.t0, 3),
+                             "seconds": round(total, 4), "errors": len(errors)})
+        if not errors:
+            self.hist["search"].record(total)
+            self.by_endpoint[s["endpoint"]].record(total)
+
+    async def run(self):
+        first = self.plan[0]["ts"] if self.plan else 0
+        self.t0 = time.monotonic()
+        self.timeline = []
+        sampler = asyncio.ensure_future(sample_counters(self.timeline, self.device, self.t0))
+        tasks = []
+        try:
+            for i, s in enumerate(self.plan):
+                due = self.t0 + (0 if self.asap else (s["ts"] - first) / self.speed)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.ensure_future(self.run_search(i, s, due)))
+            await asyncio.gather(*tasks)
+        finally:
+            sampler.cancel()
+            v = vmstat()
+            self.timeline.append([round(time.monotonic() - self.t0, 3),
+                                  round(device_mb(self.device), 1)] + [v.get(k, 0) for k in COUNTERS])
+            if self.pool:
+                self.pool.shutdown()
+        self.elapsed = time.monotonic() - self.t0
+
+
+def list_organisms():
+    root = paths.organism_data()
+    return sorted(d for d in os.listdir(root) if os.path.exists(paths.organism_db(d, root)))
+
+
+def replay(files, direct=False, since=None, until=None, gap=60.0, limit=None, evict=False,
+           log=print, **kw):
+    records = read_capture(files, since, until)
+    plan = searches(records, gap)[:limit]
+    if not plan:
+        raise ValueError("no captured searches in " + ", ".join(files))
+    span = plan[-1]["ts"] - plan[0]["ts"]
+    log(f"  {len(records)} captured requests -> {len(plan)} searches over {span / 60:.1f} min "
+        f"of capture, {'direct' if direct else 'over HTTP'}")
+    if evict:
+        orgs = sorted({o for s in plan for o in s["organisms"]} or set(list_organisms()))
+        for o in orgs:
+            if os.path.exists(paths.organism_db(o)):
+                verified_evict(paths.organism_db(o))
+        log(f"  evicted {len(orgs)} organism database(s), verified")
+    r = Replay(plan, direct=direct, log=log, **kw)
+    asyncio.run(r.run())
+    first, last = r.timeline[0], r.timeline[-1]
+    counters = {k: last[i + 2] - first[i + 2] for i, k in enumerate(COUNTERS)}
+    counters["device_mb"] = round(last[1] - first[1], 1)
+    return {
+        "moopbench": 1, "kind": "replay", "label": "replay",
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": socket.gethostname(), "kernel": platform.release(), "git": git_head(),
+        "capture": {"files": files, "requests": len(records), "searches": len(plan),
+                    "span_s": round(span, 1), "since": since, "until": until, "gap": gap},
+        "mode": "direct" if direct else "http", "site": None if direct else r.site,
+        "speed": "asap" if r.asap else r.speed, "elapsed": round(r.elapsed, 1),
+        "errors": dict(r.errors),
+        "summary": {n: h.summary() for n, h in r.hist.items()},
+        "by_endpoint": {e: h.summary() for e, h in r.by_endpoint.items()},
+        "counters": counters,
+        "timeline": {"columns": ["seconds", "device_mb"] + list(COUNTERS), "rows": r.timeline},
+        "histograms": {n: h.to_json() for n, h in r.hist.items()},
+        "searches": r.results,
+    }
+
+
+def report(result, out=print):
+    def row(name, s):
+        if s.get("n"):
+            out(f"  {name[:28]:28} {s['n']:6} {s['p50']:9.2f} {s['p95']:9.2f} {s['p99']:9.2f} {s['max']:9.2f}")
+
+    out(f"\n  {len(result['searches'])} searches replayed in {result['elapsed']:.0f}s "
+        f"({result['mode']}, speed {result['speed']})"
+        + (f"; errors: " + ", ".join(f"{k} {v}" for k, v in result["errors"].items())
+           if result["errors"] else ""))
+    out(f"\n  {'seconds':28} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    row("per organism" if result["mode"] == "direct" else "per request", result["summary"]["request"])
+    row("per search", result["summary"]["search"])
+    for e, s in sorted(result["by_endpoint"].items()):
+        row(f"  {e}", s)
+    out(f"\n  {'counter':28} {'delta':>14}")
+    for k, v in result["counters"].items():
+        out(f"  {k:28} {v:>14,}")
+
+
+# -- exporting --------------------------------------------------------------------------
+
+def term_counts(files, organism=None, since=None, until=None):
+    """Counter of captured terms (by search, not by request), optionally for one organism."""
+    c = collections.Counter()
+    for s in searches(read_capture(files, since, until)):
+        if s["endpoint"] == "feature_id" or s["term"].startswith("redacted:"):
+            continue
+        if organism is None or organism in s["organisms"]:
+            c[s["term"].strip().lower()] += 1
+    return c
+
+
+def export_suite(files, out, organism, top=20, since=None, until=None, base=None):
+    """A moopbench suite whose terms are the organism's most searched, most first."""
+    counts = term_counts(files, organism, since, until)
+    if not counts:
+        raise ValueError(f"no captured searches of {organism}")
+    suite = dict(base or {"arms": ["pair_bm25"], "reps": 3, "cap": 2500, "pool": 5000})
+    suite.update(label=f"captured_{organism}", organism=organism,
+                 terms=[fts_expression(t) for t, _ in counts.most_common(top)],
+                 captured={"searches": sum(counts.values()), "terms": len(counts),
+                           "weights": [n for _, n in counts.most_common(top)]})
+    with open(out, "w") as fh:
+        json.dump(suite, fh, indent=1)
+        fh.write("\n")
+    return suite
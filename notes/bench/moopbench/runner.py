@@ -0,0 +1,183 @@
+"""Run a suite: every arm x term, cold then warm, round after round, into one JSON file.
+
+A suite is a JSON file (see suites/):
+
+    {
+      "label":    "cold_search",
+      "organism": "Nematostella_vectensis",     or "db": "/path/to/organism.sqlite"
+      "terms":    ["helicase", "kinase"],
+      "arms":     ["pair_bm25", "pair_rowid"],  built-in names or "module:function"
+      "reps":     3,
+      "cap":      2500,                         the result cap (search_results_limit)
+      "pool":     5000,                         the candidate pool a search ranks
+      "params":   {},                           passed to the arms in ctx
+      "disk_model": "sdb"                       optional: emulate the volume, see below
+    }
+
+With "disk_model" (a preset or a fitted model file, moopbench.diskmodel) the run reads
+through moopbench.vfs instead of the real page cache: "cold" is the simulated cache
+emptied, the device time is the model's, and nothing is evicted, so the run is the same
+on a laptop as on the host. wall_ms is then the CPU time measured plus the modelled disk
+time, read_bytes the bytes the model served from "disk". Such a run compares only with
+other emulated runs of the same model.
+
+Rounds alternate the arms -- A, B, A, B rather than A, A, B, B -- so a disk that is
+busier for a minute slows both arms instead of one.
+"""
+import datetime, json, os, platform, socket, statistics, subprocess, time, zlib
+
+from . import paths
+from .arms import load_arm
+from .cache import read_bytes, verified_evict
+
+SCHEMA = 1
+
+DEFAULTS = {"label": "run", "terms": ["helicase"], "arms": ["pair_bm25"], "reps": 3,
+            "cap": 2500, "pool": 5000, "params": {}}
+
+
+class DisciplineError(RuntimeError):
+    """The run would break a rule in notes/bench/README.md."""
+
+
+def load_suite(path, **overrides):
+    with open(path) as fh:
+        suite = dict(DEFAULTS, **json.load(fh))
+    suite.update({k: v for k, v in overrides.items() if v is not None})
+    suite["suite_dir"] = os.path.dirname(os.path.abspath(path))
+    if not suite.get("db"):
+        if not suite.get("organism"):
+            raise ValueError(f"{path}: a suite needs 'organism' or 'db'")
+        suite["db"] = paths.organism_db(suite["organism"])
+    suite["db"] = os.path.abspath(suite["db"])
+    return suite
+
+
+def digest(rows):
+    """A short checksum of the first 100 rows -- did the page a user sees change?"""
+    return format(zlib.crc32(repr(rows[:100]).encode()), "08x")
+
+
+def timed(fn, ctx, term):
+    vfs = ctx.get("vfs")
+    if vfs is not None:
+        vfs.reset_stats()
+    b0, t0 = read_bytes(), time.perf_counter()
+    rows = fn(ctx, term)
+    wall = (time.perf_counter() - t0) * 1000
+    m = {"wall_ms": round(wall, 1), "read_bytes": read_bytes() - b0,
+         "rows": len(rows), "digest": digest(rows)}
+    if vfs is not None:
+        st = vfs.stats()
+        m.update(cpu_ms=round(wall, 1), disk_ms=round(st["disk_ms"], 1), seeks=st["seeks"],
+                 read_bytes=st["disk_bytes"],
+                 wall_ms=round(wall + (0 if vfs.sleep else st["disk_ms"]), 1))
+    return m
+
+
+def check_devices(files, reference, allow):
+    """Every file an arm reads must be on the organism data's device, unless allowed."""
+    off = [f for f in files if not paths.same_device(f, reference)]
+    if off and not allow:
+        raise DisciplineError(
+            "not on the organism data volume (/tmp is the fast disk; measure where "
+            "production reads): " + ", ".join(off) + " -- --any-device to record anyway")
+    return not off
+
+
+def emulated_disk(suite):
+    """The LatencyVFS for a suite with a disk_model, else None."""
+    if not suite.get("disk_model"):
+        return None
+    from .diskmodel import DiskModel
+    from .vfs import LatencyVFS
+    cache_mb = suite.get("cache_mb")
+    return LatencyVFS(DiskModel.load(suite["disk_model"], seed=suite.get("seed", 0)),
+                      cache_bytes=int(cache_mb * 1048576) if cache_mb else None,
+                      sleep=bool(suite.get("sleep")),
+                      background_depth=int(suite.get("background_depth", 0)))
+
+
+def run_suite(suite, any_device=False, log=print):
+    ctx = dict(suite.get("params") or {}, db=suite["db"], organism=suite.get("organism"),
+               cap=suite["cap"], pool=suite["pool"])
+    arms = [load_arm(a, suite["suite_dir"]) for a in suite["arms"]]
+    if not os.path.exists(suite["db"]):
+        raise FileNotFoundError(suite["db"])
+
+    vfs = ctx["vfs"] = emulated_disk(suite)
+    files = sorted({f for fn in arms for f in fn.arm_files(ctx)})
+    # An emulated run reads no device worth checking: the model is the device.
+    same_device = True if vfs else check_devices(files, suite["db"], any_device)
+
+    samples = []
+    for rep in range(1, suite["reps"] + 1):
+        for term in suite["terms"]:
+            for fn in arms:
+                # Cold: evicted and PROVED evicted (EvictionError otherwise), then timed.
+                if vfs is not None:
+                    vfs.cold()
+                else:
+                    for f in fn.arm_files(ctx):
+                        verified_evict(f)
+                cold = timed(fn, ctx, term)
+                # Warm: straight after, the same query.
+                warm = timed(fn, ctx, term)
+                for phase, m in (("cold", cold), ("warm", warm)):
+                    samples.append(dict(arm=fn.arm_name, term=term, rep=rep, phase=phase, **m))
+                log(f"  [{rep}/{suite['reps']}] {fn.arm_name:14} {term[:20]:20} "
+                    f"cold {cold['wall_ms']:9.1f} ms {cold['read_bytes'] / 1048576:8.1f} MB   "
+                    f"warm {warm['wall_ms']:8.1f} ms   rows {cold['rows']}")
+
+    return {
+        "moopbench": SCHEMA,
+        "label": suite["label"],
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "host": socket.gethostname(),
+        "kernel": platform.release(),
+        "git": git_head(),
+        "suite": {k: v for k, v in suite.items() if k != "suite_dir"},
+        "db": paths.fingerprint(suite["db"]),
+        "discipline": {"eviction_verified": vfs is None, "cold_and_warm": True,
+                       "same_device": same_device, "reps": suite["reps"],
+                       "emulated": vfs.model.to_json() if vfs else None},
+        "samples": samples,
+        "summary": summarise(samples),
+    }
+
+
+def summarise(samples):
+    groups = {}
+    for s in samples:
+        groups.setdefault((s["arm"], s["term"], s["phase"]), []).append(s)
+    out = []
+    for (arm, term, phase), ss in groups.items():
+        wall = [s["wall_ms"] for s in ss]
+        digests = {s["digest"] for s in ss}
+        out.append({
+            "arm": arm, "term": term, "phase": phase, "n": len(ss),
+            "wall_ms": statistics.median(wall), "wall_ms_min": min(wall), "wall_ms_max": max(wall),
+            "read_bytes": statistics.median(s["read_bytes"] for s in ss),
+            "rows": statistics.median(s["rows"] for s in ss),
+            "digest": digests.pop() if len(digests) == 1 else "varies",
+        })
+    return out
+
+
+def git_head():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=paths.HERE,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_result(result, out=None):
+    if out is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(os.path.dirname(paths.HERE), "results", f"{result['label']}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as fh:
+        json.dump(result, fh, indent=1)
+        fh.write("\n")
+    return out
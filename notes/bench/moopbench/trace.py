@@ -0,0 +1,220 @@
+"""Which pages a query reads, and whose they are.
+
+/proc/self/io says how many bytes a search read and nothing about which: decompose.py
+had to infer the split between the FTS index and the row fetch from cumulative stages,
+each one evicted and re-run, with 10x noise between runs on sdb. This records every page
+a query reads through moopbench.vfs and names its owner from the dbstat virtual table,
+so the split is exact and one cold run gives it:
+
+  per object    pages touched (and what share of the object that is), page reads, the
+                device reads its misses of the (simulated) cache caused, the bytes they
+                fetched and their modelled time, overflow pages touched
+  access        sequential vs random: a device read is sequential when it starts where
+                the previous one of the file ended, readahead included -- what the
+                device sees, as the disk model charges it; `runs` counts the contiguous
+                stretches an object's touched pages fall into, so pages / runs is how
+                many pages each seek buys
+  heatmap       per object, where in the file its touched pages lie: one row of the
+                file's pages in buckets, shaded by the share of the object's pages in
+                each bucket that the query read. An object read in a few dense places
+                is a layout that works; one smeared across the file is a seek per page.
+
+    python3 -m moopbench trace --organism Nematostella_vectensis --term helicase
+    python3 -m moopbench trace --db X.sqlite --term kinase --arm pair_bm25 --json t.json
+
+The page map reads dbstat once per database, a full pass over the file (seconds on a
+GB). Pages dbstat does not list are "(freelist)" -- free pages, or the pointer-map and
+lock-byte pages of a database that has them.
+"""
+import collections, contextlib, os
+
+from .vfs import apsw, require_apsw
+
+SHADES = " .:-=+*#%@"
+
+
+class PageMap:
+    """page number -> (object, page type) for one database, from dbstat."""
+
+    def __init__(self, db):
+        require_apsw()
+        self.db = os.path.realpath(db)
+        c = apsw.Connection(f"file:{self.db}?mode=ro",
+                            flags=apsw.SQLITE_OPEN_READONLY | apsw.SQLITE_OPEN_URI)
+        try:
+            self.page_size = c.execute("PRAGMA page_size").fetchone()[0]
+            self.page_count = c.execute("PRAGMA page_count").fetchone()[0]
+            self.owner, self.ptype = {}, {}
+            for name, pageno, pagetype in c.execute("SELECT name, pageno, pagetype FROM dbstat"):
+                self.owner[pageno] = name
+                self.ptype[pageno] = pagetype
+            # An FTS5 table's shadow tables (X_data, X_idx, ...) belong to X; an index to
+            # its table.
+            self.table = {}
+            virtual = set()
+            for name, tbl, sql in c.execute("SELECT name, tbl_name, sql FROM sqlite_schema"):
+                self.table[name] = tbl
+                if sql and sql.upper().startswith("CREATE VIRTUAL TABLE"):
+                    virtual.add(name)
+            for name in self.table:
+                for v in virtual:
+                    if name.startswith(v + "_"):
+                        self.table[name] = v
+            self.table.setdefault("sqlite_schema", "sqlite_schema")
+        finally:
+            c.close()
+        self.size = collections.Counter(self.owner.values())
+
+    def object_of(self, page):
+        return self.owner.get(page, "(freelist)")
+
+    def table_of(self, name):
+        return self.table.get(name, name)
+
+
+class QueryTrace:
+    """The pages one query read, in order: (page, missed, sequential, cost_ms, disk_bytes).
+
+    A miss carries the whole device read it caused -- its seek and its readahead -- on
+    the first page of the read that missed; the pages after it show as hits."""
+
+    def __init__(self, label, pagemap):
+        self.label = label
+        self.map = pagemap
+        self.events = []
+        self.other_reads = 0        # journal, WAL, other ATTACHed files
+
+    def order(self):
+        """The distinct pages read, in the order first read -- what moopbench.costmodel
+        replays against another disk model."""
+        return list(dict.fromkeys(e[0] for e in self.events))
+
+    def objects(self):
+        """Per-object statistics, the heaviest first."""
+        per = {}
+        for page, missed, sequential, cost, nbytes in self.events:
+            name = self.map.object_of(page)
+            o = per.setdefault(name, {"object": name, "table": self.map.table_of(name),
+                                      "pages": self.map.size.get(name, 0), "reads": 0,
+                                      "touched": set(), "misses": 0, "sequential": 0,
+                                      "disk_ms": 0.0, "disk_bytes": 0, "overflow": set()})
+            o["reads"] += 1
+            o["touched"].add(page)
+            if self.map.ptype.get(page) == "overflow":
+                o["overflow"].add(page)
+            if missed:
+                o["misses"] += 1
+                o["sequential"] += sequential
+                o["disk_ms"] += cost
+                o["disk_bytes"] += nbytes
+        out = []
+        for o in per.values():
+            touched = sorted(o["touched"])
+            runs = sum(1 for i, p in enumerate(touched) if i == 0 or p != touched[i - 1] + 1)
+            out.append(dict(o, touched=len(touched), overflow=len(o["overflow"]), runs=runs,
+                            disk_ms=round(o["disk_ms"], 1),
+                            sequential_share=round(o["sequential"] / o["misses"], 3) if o["misses"] else None,
+                            touched_pages=touched))
+        out.sort(key=lambda o: (-o["disk_ms"], -o["misses"], -o["reads"]))
+        return out
+
+    def heatmap(self, width=64, objects=None):
+        """{object: [share of its pages read, per bucket of the file]}, width buckets."""
+        n = max(1, self.map.page_count)
+        total = collections.defaultdict(lambda: [0] * width)
+        for page, name in self.map.owner.items():
+            total[name][min(width - 1, (page - 1) * width // n)] += 1
+        hit = collections.defaultdict(lambda: [0] * width)
+        for page in {e[0] for e in self.events}:
+            hit[self.map.object_of(page)][min(width - 1, (page - 1) * width // n)] += 1
+        names = objects if objects is not None else list(hit)
+        return {name: [h / t if t else (1.0 if h else 0.0) for h, t in zip(hit[name], total[name])]
+                for name in names}
+
+    def to_json(self, width=64):
+        objs = self.objects()
+        return {"label": self.label, "page_size": self.map.page_size,
+                "page_count": self.map.page_count, "other_reads": self.other_reads,
+                "objects": objs, "heatmap": self.heatmap(width, [o["object"] for o in objs]),
+                "misses": [e[0] for e in self.events if e[1]], "order": self.order()}
+
+
+class Tracer:
+    """Watches a LatencyVFS and collects a QueryTrace per `with tracer.query(label)`."""
+
+    def __init__(self, vfs, db, pagemap=None):
+        self.vfs = vfs
+        self.map = pagemap or PageMap(db)
+        self.path = self.map.db
+        self.current = None
+        vfs.add_observer(self.observe)
+
+    @contextlib.contextmanager
+    def query(self, label="query", cold=True):
+        if cold:
+            self.vfs.cold()
+        self.current = QueryTrace(label, self.map)
+        try:
+            yield self.current
+        finally:
+            self.current = None
+
+    def observe(self, read):
+        t = self.current
+        if t is None:
+            return
+        if read.path is None or os.path.realpath(read.path) != self.path:
+            t.other_reads += 1
+            return
+        ps = self.map.page_size
+        first, last = read.offset // ps, (read.offset + read.amount - 1) // ps
+        charged = not read.missed
+        for p in range(first, last + 1):
+            # dbstat numbers pages from 1; file offset 0 is page 1.
+            if charged:
+                t.events.append((p + 1, False, False, 0.0, 0))
+            else:
+                t.events.append((p + 1, True, read.sequential, read.cost_ms, read.disk_bytes))
+                charged = True
+
+
+def shade(v):
+    return SHADES[min(len(SHADES) - 1, int(round(v * (len(SHADES) - 1))))] if v > 0 else " "
+
+
+def report(trace, top=14, width=64, out=print):
+    objs = trace.objects()
+    misses = sum(o["misses"] for o in objs)
+    ms = sum(o["disk_ms"] for o in objs)
+    mb = sum(o["disk_bytes"] for o in objs) / 1048576
+    out(f"\n  {trace.label}: {len(trace.events):,} page reads, {misses:,} device reads "
+        f"({mb:.1f} MB with readahead, {ms:,.0f} ms modelled)"
+        + (f", {trace.other_reads} reads of other files" if trace.other_reads else ""))
+    out(f"\n  {'object':40} {'pages':>8} {'touched':>8} {'%obj':>6} {'reads':>8} {'disk MB':>8} "
+        f"{'disk ms':>9} {'%ms':>5} {'seq%':>5} {'runs':>6} {'ovfl':>5}")
+    for o in objs[:top]:
+        seq = "" if o["sequential_share"] is None else f"{o['sequential_share'] * 100:4.0f}%"
+        out(f"  {o['object'][:40]:40} {o['pages']:8,} {o['touched']:8,} "
+            f"{(o['touched'] / o['pages'] * 100 if o['pages'] else 0):5.1f}% {o['reads']:8,} "
+            f"{o['disk_bytes'] / 1048576:8.1f} {o['disk_ms']:9.1f} "
+            f"{(o['disk_ms'] / ms * 100 if ms else 0):4.0f}% {seq:>5} {o['runs']:6,} {o['overflow']:5,}")
+    if len(objs) > top:
+        out(f"  ... {len(objs) - top} more")
+    heat = trace.heatmap(width, [o["object"] for o in objs[:top]])
+    out(f"\n  where in the file (page 1 .. {trace.map.page_count:,}; shade = share of the "
+        f"object's pages in that stretch read)")
+    for name, row in heat.items():
+        out(f"  {name[:40]:40} |{''.join(shade(v) for v in row)}|")
+
+
+def trace_sql(tracer, sql, params=(), label=None, cold=True):
+    """Run sql through the tracer's VFS and return its QueryTrace."""
+    c = apsw.Connection(f"file:{tracer.path}?mode=ro",
+                        flags=apsw.SQLITE_OPEN_READONLY | apsw.SQLITE_OPEN_URI,
+                        vfs=tracer.vfs.vfs_name)
+    try:
+        with tracer.query(label or sql.split()[0], cold) as t:
+            c.execute(sql, params).fetchall()
+    finally:
+        c.close()
+    return t
@@ -0,0 +1,194 @@
+"""An SQLite VFS that charges every read as if it had gone to the slow data volume.
+
+Benchmarks here have been wrong more than once for the same reason: /tmp is on sda,
+flash at 0.5 ms, and the databases are on sdb at 32 ms. A prototype measured in /tmp wins
+on the device alone, and a cold measurement anywhere needs eviction that must be
+verified, on the one host that has sdb. This takes the device out of the measurement:
+
+  - SQLite reads through this VFS (APSW; the stdlib sqlite3 module has no VFS API) from
+    whatever file it is given, wherever it lives
+  - a simulated page cache, not the kernel's, decides what is cold: empty after cold(),
+    so a cold query needs no eviction, no root and no mincore check, and the real
+    cache may be as warm as it likes
+  - each read that misses it is charged by a DiskModel (moopbench.diskmodel) --
+    seek or streaming, at the queue depth of reads in flight across connections, with
+    the kernel's readahead window fetched (and charged) behind it
+
+By default the charge is counted, not slept: `disk_ms` accumulates the modelled device
+time, deterministically, and a cold run of a 40 MB query takes as long as the CPU work.
+sleep=True injects it for real, for anything that has to feel the latency (a server
+under load, a timeout).
+
+    vfs = LatencyVFS(DiskModel.load("sdb"))
+    con = apsw.Connection(db, flags=apsw.SQLITE_OPEN_READONLY, vfs=vfs.vfs_name)
+    ... ; vfs.stats()  ->  {'reads', 'bytes', 'disk_ms', 'seeks'}
+
+Observers (add_observer) see every read -- moopbench.trace is built on that.
+"""
+import collections, itertools, os, threading, time
+
+try:
+    import apsw
+except ImportError:         # the harness works without it; only the emulated modes need it
+    apsw = None
+
+
+# What an observer (add_observer) is handed for every read: the blocks that missed the
+# simulated cache, the bytes fetched for them (readahead included), and whether the
+# device saw it as a seek or a continuation.
+Read = collections.namedtuple("Read", "path offset amount missed cost_ms disk_bytes sequential")
+
+
+def require_apsw():
+    if apsw is None:
+        raise RuntimeError("the emulated-disk and tracing modes need APSW: pip install apsw")
+
+
+def file_name(name):
+    """The path APSW hands xOpen: a URIFilename, a str, or None for a temp file."""
+    if name is None:
+        return None
+    return name.filename() if hasattr(name, "filename") else name
+
+
+class SimCache:
+    """A page cache of blocks, LRU, in place of the kernel's. capacity None = unbounded."""
+
+    def __init__(self, capacity_bytes=None, block=4096):
+        self.block = block
+        self.capacity = None if capacity_bytes is None else max(1, capacity_bytes // block)
+        self.blocks = collections.OrderedDict()
+
+    def clear(self):
+        self.blocks.clear()
+
+    def missing(self, path, first, last):
+        """Blocks first..last not held; the held ones count as used."""
+        out = []
+        for b in range(first, last + 1):
+            key = (path, b)
+            if key in self.blocks:
+                self.blocks.move_to_end(key)
+            else:
+                out.append(b)
+        return out
+
+    def add(self, path, first, last):
+        """Hold blocks first..last; how many were not held already."""
+        new = 0
+        for b in range(first, last + 1):
+            key = (path, b)
+            new += key not in self.blocks
+            self.blocks[key] = True
+            self.blocks.move_to_end(key)
+        if self.capacity is not None:
+            while len(self.blocks) > self.capacity:
+                self.blocks.popitem(last=False)
+        return new
+
+
+_names = itertools.count()
+
+
+class LatencyVFS(apsw.VFS if apsw else object):
+    def __init__(self, model=None, cache_bytes=None, sleep=False, background_depth=0,
+                 name=None, base=""):
+        require_apsw()
+        # Each instance registers under its own name: a tracer and a run, or one run per
+        # layout candidate, may be alive in one process.
+        name = name or f"moopbench{next(_names)}"
+        self.model = model
+        self.cache = SimCache(cache_bytes, model.block if model else 4096)
+        self.sleep = sleep
+        self.background_depth = background_depth
+        self.observers = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.last_end = {}
+        self.sizes = {}
+        self.reset_stats()
+        self.vfs_name, self.base_vfs = name, base
+        apsw.VFS.__init__(self, name, base)
+
+    def xOpen(self, name, flags):
+        return LatencyFile(self, self.base_vfs, name, flags)
+
+    def add_observer(self, fn):
+        """fn(Read) after every read."""
+        self.observers.append(fn)
+
+    def cold(self):
+        """Forget everything cached: the next query starts cold."""
+        with self.lock:
+            self.cache.clear()
+            self.last_end.clear()
+
+    def reset_stats(self):
+        self.counters = {"reads": 0, "bytes": 0, "disk_bytes": 0, "disk_ms": 0.0, "seeks": 0}
+
+    def stats(self):
+        return dict(self.counters)
+
+    def blocks_in(self, path):
+        size = self.sizes.get(path)
+        if size is None:
+            try:
+                size = self.sizes[path] = os.path.getsize(path)
+            except (OSError, TypeError):
+                size = self.sizes[path] = 0
+        return max(1, -(-size // self.cache.block))
+
+    def charge(self, path, offset, amount):
+        """Cost of one read, and the bookkeeping. Called before the read is served.
+
+        A miss is one device read from the first missing block, through the read, plus
+        the model's readahead window after it -- what the kernel does with a buffered
+        read, and why production read_bytes run well above what SQLite asked for.
+        """
+        block = self.cache.block
+        with self.lock:
+            first, last = offset // block, (offset + amount - 1) // block
+            missed = self.cache.missing(path, first, last)
+            depth = self.in_flight + self.background_depth
+            cost, nbytes, sequential = 0.0, 0, False
+            if missed:
+                ra = self.model.readahead_blocks if self.model else 0
+                end = max(last, min(self.blocks_in(path) - 1, missed[-1] + ra))
+                nbytes = self.cache.add(path, missed[0], end) * block
+                sequential = self.last_end.get(path) == missed[0]
+                if self.model is not None:
+                    cost = self.model.cost_ms(nbytes, sequential, depth)
+                    self.counters["seeks"] += not sequential
+                    self.counters["disk_ms"] += cost
+                self.counters["disk_bytes"] += nbytes
+                self.last_end[path] = end + 1
+            else:
+                self.cache.add(path, first, last)
+            self.counters["reads"] += 1
+            self.counters["bytes"] += amount
+            self.in_flight += 1
+        if self.observers:
+            read = Read(path, offset, amount, missed, cost, nbytes, sequential)
+            for fn in self.observers:
+                fn(read)
+        return cost
+
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+class LatencyFile(apsw.VFSFile if apsw else object):
+    def __init__(self, vfs, base, name, flags):
+        self.vfs = vfs
+        self.path = file_name(name)
+        apsw.VFSFile.__init__(self, base, name, flags)
+
+    def xRead(self, amount, offset):
+        cost = self.vfs.charge(self.path, offset, amount)
+        try:
+            if cost and self.vfs.sleep:
+                time.sleep(cost / 1000.0)
+            return super().xRead(amount, offset)
+        finally:
+            self.vfs.done()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Step 2 of the plan: does a build-time STATIC PRIOR give back what bm25's pool had?
+
+quota.py settled diversity: a per-type quota pool spreads page one across the curated
+types at 2-3.5x less I/O than bm25. What it gave up is WITHIN a type -- each slice is
+the first N rows by rowid, which is insertion order, so an unnamed gene with a bare
+"Uncharacterized protein" can take a slot ahead of a named one with a real description.
+bm25 avoided some of that by accident (its length term), and paid a scattered _docsize
+read per matched document for it.
+
+The prior is that judgement made ONCE, at build time, and indexed as a token so the
+pool can ask for "prior-0 rows of this type" inside the FTS index:
+
+    0-2  the feature has a name         3-5  it does not
+    +0   description 8-120 characters   +1 longer   +2 shorter or empty
+
+(build_fts_index.sql; the curated type order stays a query-time concern, so
+annotation_config.json edits need no rebuild.)
+
+Three pools, identical tiers afterwards:
+    bm25     today's fallback: ORDER BY bm25 LIMIT POOL
+    rowid    quota.py: equal per-type slices, rowid order
+    prior    same slices, taken prior bucket by prior bucket
+
+Reported per term: MB and seconds cold, top-100 agreement with bm25, and ladder.py's
+usefulness score (whole-word hits, substring hits, sources, ProtNLM share) -- the
+prior only earns its column if `prior` beats `rowid` on the score at rowid's cost.
+
+Same rules as everything here: prototype on the slow volume, eviction verified.
+"""
+import os, sys, sqlite3, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fts_split import ORGDB, POOL, read_bytes
+from ladder import score
+from quota import hard_evict
+
+PROTO = "/var/www/html/moop/notes/bench/prior_proto.sqlite"
+CAP = 2500
+BUCKETS = 6
+TEXT = "{feature_name feature_description annotation_description annotation_accession}"
+
+TYPE_CODE = ("'atype' || lower(replace(replace(replace(ans.annotation_type,' ',''),"
+             "'-',''),'_','')) || 'z'")
+PRIOR = ("'aprior' || ((CASE WHEN COALESCE(f.feature_name,'') <> '' THEN 0 ELSE 3 END)"
+         " + (CASE WHEN length(COALESCE(a.annotation_description,'')) < 8 THEN 2"
+         "         WHEN length(a.annotation_description) > 120 THEN 1 ELSE 0 END)) || 'z'")
+
+
+def build():
+    if os.path.exists(PROTO):
+        os.remove(PROTO)
+    c = sqlite3.connect(f"file:{PROTO}", uri=True)
+    c.execute("PRAGMA journal_mode=OFF")
+    c.execute("PRAGMA synchronous=OFF")
+    c.execute(f"ATTACH 'file:{ORGDB}?mode=ro' AS o")
+    c.execute("""CREATE VIRTUAL TABLE feature_annotation_search USING fts5(
+                     feature_name, feature_description, annotation_description,
+                     annotation_accession, annotation_type_code, search_prior,
+                     content='', tokenize='porter unicode61')""")
+    t0 = time.perf_counter()
+    c.execute(f"""INSERT INTO feature_annotation_search(rowid, feature_name, feature_description,
+                      annotation_description, annotation_accession, annotation_type_code,
+                      search_prior)
+                  SELECT fa.feature_annotation_id, f.feature_name, f.feature_description,
+                         a.annotation_description, a.annotation_accession, {TYPE_CODE}, {PRIOR}
+                  FROM o.feature_annotation fa
+                  JOIN o.feature f ON f.feature_id = fa.feature_id
+                  JOIN o.annotation a ON a.annotation_id = fa.annotation_id
+                  JOIN o.annotation_source ans ON ans.annotation_source_id = a.annotation_source_id""")
+    c.execute("INSERT INTO feature_annotation_search(feature_annotation_search) VALUES('optimize')")
+    c.commit(); c.close()
+    print(f"  prototype built in {time.perf_counter()-t0:.0f}s, "
+          f"{os.path.getsize(PROTO)/1048576:.0f} MB\n")
+
+
+def types_present(c):
+    return [r[0] for r in c.execute(f"SELECT DISTINCT {TYPE_CODE} FROM o.annotation_source ans")]
+
+
+def quota_pool(c, match, prior):
+    """Equal shares per type, re-split while some type comes back short -- the shape of
+    moop_fts_quota_pool() with every weight 1. With prior=True each share is taken in
+    (bucket, rowid) order; with prior=False in rowid order alone."""
+    codes = types_present(c)
+    cur = {t: (0, 0) for t in codes}
+    done, taken = set(), {}
+    while len(taken) < POOL:
+        active = [t for t in codes if t not in done]
+        if not active:
+            break
+        room = POOL - len(taken)
+        for i, t in enumerate(active):
+            n = room // len(active) + (1 if i < room % len(active) else 0)
+            if n == 0:
+                continue
+            rows = []
+            for b in (range(cur[t][0], BUCKETS) if prior else [0]):
+                floor = cur[t][1] if b == cur[t][0] else 0
+                q = f"{{annotation_type_code}} : {t} AND {TEXT} : ({match})"
+                if prior:
+                    q = q.replace(" AND ", f" AND {{search_prior}} : aprior{b}z AND ", 1)
+                rows += [(b, r[0]) for r in c.execute(
+                    "SELECT rowid FROM feature_annotation_search WHERE feature_annotation_search "
+                    f"MATCH ? AND rowid > {floor} ORDER BY rowid LIMIT {n}", (q,))]
+                if len(rows) >= n:
+                    break
+            rows = rows[:n]
+            for b, rid in rows:
+                taken[rid] = True
+            if rows:
+                cur[t] = rows[-1]
+            if len(rows) < n:
+                done.add(t)
+    return list(taken)
+
+
+TIERS = ("ORDER BY (f.feature_name LIKE :nm) DESC, "
+         "(a.annotation_description LIKE :nm) DESC, "
+         "(COALESCE(f.feature_name,'') <> '') DESC, {rank} f.feature_uniquename")
+
+
+def run(term, arm):
+    r1, n1 = hard_evict(ORGDB); r2, n2 = hard_evict(PROTO)
+    b0, t0 = read_bytes(), time.perf_counter()
+    c = sqlite3.connect(f"file:{PROTO}?mode=ro", uri=True)
+    c.execute(f"ATTACH 'file:{ORGDB}?mode=ro' AS o")
+    c.execute("CREATE TEMP TABLE pool(rid INTEGER PRIMARY KEY, r REAL)")
+    match = f"{term}*"
+    if arm == "bm25":
+        c.execute(f"""INSERT INTO pool SELECT rowid, bm25(feature_annotation_search,
+                          10.0, 5.0, 2.0, 3.0, 0.0, 0.0) AS r
+                      FROM feature_annotation_search WHERE feature_annotation_search MATCH ?
+                      ORDER BY r LIMIT {POOL}""", (f"{TEXT} : ({match})",))
+        rank = "pool.r,"
+    else:
+        c.executemany("INSERT OR IGNORE INTO pool VALUES (?, 0)",
+                      [(x,) for x in quota_pool(c, match, arm == "prior")])
+        rank = ""
+    rows = c.execute(f"""
+        SELECT f.feature_uniquename, f.feature_name, a.annotation_description,
+               ans.annotation_source_name, a.annotation_accession
+        FROM pool
+        JOIN o.feature_annotation fa ON fa.feature_annotation_id = pool.rid
+        JOIN o.feature f ON f.feature_id = fa.feature_id
+        JOIN o.annotation a ON a.annotation_id = fa.annotation_id
+        JOIN o.annotation_source ans ON ans.annotation_source_id = a.annotation_source_id
+        {TIERS.format(rank=rank)} LIMIT {CAP}""", {"nm": f"%{term}%"}).fetchall()
+    c.close()
+    el, mb = time.perf_counter() - t0, (read_bytes() - b0) / 1048576
+    assert r1 == 0 and r2 == 0, f"eviction failed: {r1}/{n1}, {r2}/{n2}"
+    return rows, mb, el
+
+
+if __name__ == "__main__":
+    if not os.path.exists(PROTO) or "--build" in sys.argv:
+        build()
+    terms = [a for a in sys.argv[1:] if not a.startswith("-")] or \
+            ["piwi", "pax", "helicase", "ubiquitin", "kinase", "binding"]
+    print(f"  top 100: agreement with bm25 / whole-word / substring / sources / ProtNLM\n")
+    print(f"  {'term':11} {'arm':6} {'MB':>7} {'s':>6} {'agree':>6}  "
+          f"{'whole':>6} {'subst':>6} {'srcs':>5} {'ProtNLM':>8}")
+    for t in terms:
+        base = None
+        for arm in ("bm25", "rowid", "prior"):
+            rows, mb, el = run(t, arm)
+            keys = [(r[0], r[4]) for r in rows[:100]]
+            if base is None:
+                base = set(keys)
+            w, sb, n, p = score(rows, t)
+            print(f"  {t:11} {arm:6} {mb:7.1f} {el:6.2f} {len(base & set(keys)):5d}%  "
+                  f"{w:6d} {sb:6d} {n:5d} {p:8d}")
+        print()
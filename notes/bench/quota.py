@@ -26,11 +26,12 @@ would flatter the prototype). Eviction verified by mincore() every run.
 import json, os, sys, sqlite3, time
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from fts_split import ORGDB, evict, read_bytes, resident_pages
+from fts_split import ORGDB, read_bytes
+from moopbench import EvictionError, moop_root, resident, verified_evict
 
-PROTO = "/var/www/html/moop/notes/bench/quota_proto.sqlite"
+PROTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quota_proto.sqlite")
 CAP, POOL = 2500, 5000
-CFG = "/var/www/html/moop/metadata/annotation_config.json"
+CFG = os.path.join(moop_root(), "metadata", "annotation_config.json")
 
 CURATED = [k for k, _ in sorted(
     json.load(open(CFG))["annotation_types"].items(),
@@ -114,18 +115,12 @@ TIERS = ("ORDER BY (f.feature_name LIKE :nm) DESC, "
 
 
 def hard_evict(path, tries=5):
-    """Evict, and MAKE SURE. posix_fadvise(DONTNEED) silently skips DIRTY pages, so a
-    file written moments ago stays partly resident and the next run reads it from RAM.
-    That is exactly the failure disk_latency.py shipped -- a cache hit measured as disk.
-    sync() first, then verify with mincore and retry rather than trust one call."""
-    for _ in range(tries):
-        os.sync()
-        evict(path)
-        resident, total = resident_pages(path)
-        if resident == 0:
-            return resident, total
-        time.sleep(0.3)
-    return resident, total
+    """moopbench.verified_evict(), reporting instead of raising: crossorg_ab.py and prior.py
+    decide for themselves what a file that stays resident means."""
+    try:
+        return verified_evict(path, tries)
+    except EvictionError:
+        return resident(path)
 
 
 def run(term, per_pass=250):
@@ -14,15 +14,28 @@ A large jump between samples means SOMETHING swept the disk, even if we cannot s
 whose process it was -- which matters because the Rapid7 agent's /proc/<pid>/io is
 root-owned and unreadable from here.
 
+Whole-file percentages cannot say WHAT stayed: a database 40% resident is fast to
+search if the 40% is its FTS index and slow if it is the annotation table an export
+swept through. residency_objects.log splits each sample by table (indexes and FTS
+shadow tables folded into theirs) via scripts/residency_map.py, per organism and per
+group -- "Bats: feature_annotation_search 95%, annotation 10%" -- which is what sizes
+a prewarm budget.
+
 usage:  residency_watch.py [interval_seconds] [hours]
 """
-import os, sys, time
+import json, os, sys, time
 
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "..", "scripts"))
 from cache import resident, pct
+from moopbench.paths import moop_root
+import residency_map
 
 ORGANISMS = "/var/www/html/moop/organisms"
-LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "residency.log")
+GROUPS = os.path.join(moop_root(), "metadata", "organism_assembly_groups.json")
+LOG = os.path.join(HERE, "residency.log")
+OBJECT_LOG = os.path.join(HERE, "residency_objects.log")
 
 # A representative spread rather than all 75 -- keeps each sample cheap while still
 # showing whether reclaim is happening. If these hold, the rest almost certainly do.
@@ -54,6 +67,46 @@ def sdb_sectors_read():
     return 0
 
 
+def groups_of(names):
+    """{group: [organism]} for the watched organisms, from the site's groups file."""
+    try:
+        with open(GROUPS) as fh:
+            entries = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    out = {}
+    for e in entries:
+        if e.get("organism") in names:
+            for g in e.get("groups") or []:
+                out.setdefault(g, [])
+                if e["organism"] not in out[g]:
+                    out[g].append(e["organism"])
+    return out
+
+
+def shares(rows):
+    return "  ".join(f"{r['table']}={pct(r['resident_bytes'], r['bytes']):.0f}%"
+                     for r in sorted(rows, key=lambda r: -r["bytes"]) if r["bytes"] >= 1048576)
+
+
+def sample_objects(fh, stamp, dbs, maps, groups):
+    """One line per organism and per group: resident share of each table of >= 1 MB."""
+    tables = {}
+    for name, path in dbs:
+        try:
+            fp = residency_map.fingerprint(path)
+            if name not in maps or maps[name]["fingerprint"] != fp:
+                maps[name] = residency_map.load_map(path)
+            tables[name] = residency_map.fold(residency_map.residency(path, maps[name]), "table")
+        except Exception:
+            continue
+        fh.write(f"{stamp}\t{name}\t{shares(tables[name])}\n")
+    for group, members in sorted(groups.items()):
+        rows = [r for m in members for r in tables.get(m, [])]
+        if rows:
+            fh.write(f"{stamp}\tgroup:{group}\t{shares(residency_map.fold(rows, 'table'))}\n")
+
+
 def main():
     interval = int(sys.argv[1]) if len(sys.argv) > 1 else 900      # 15 min
     hours = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
@@ -62,8 +115,11 @@ def main():
     dbs = [(n, os.path.join(ORGANISMS, n, "organism.sqlite")) for n in WATCH]
     dbs = [(n, p) for n, p in dbs if os.path.isfile(p)]
 
+    groups = groups_of({n for n, _ in dbs})
+    maps = {}
+
     new = not os.path.exists(LOG)
-    with open(LOG, "a") as fh:
+    with open(LOG, "a") as fh, open(OBJECT_LOG, "a") as ofh:
         if new:
             fh.write("# timestamp\tcached_GB\tavail_GB\tsdb_MB_read_since_last\t"
                      + "\t".join(n[:18] for n, _ in dbs) + "\n")
@@ -80,10 +136,13 @@ def main():
                     pcts.append(f"{pct(r, t):.1f}")
                 except Exception:
                     pcts.append("err")
-            fh.write(f"{time.strftime('%Y-%m-%d %H:%M')}\t{mi.get('Cached',0):.1f}\t"
+            stamp = time.strftime('%Y-%m-%d %H:%M')
+            fh.write(f"{stamp}\t{mi.get('Cached',0):.1f}\t"
                      f"{mi.get('MemAvailable',0):.1f}\t{read_mb:.0f}\t"
                      + "\t".join(pcts) + "\n")
             fh.flush()
+            sample_objects(ofh, stamp, dbs, maps, groups)
+            ofh.flush()
             time.sleep(interval)
 
 
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Roll the per-query telemetry log up into percentiles per organism, term or pool.
+
+lib/search_telemetry.php appends one NDJSON line per search, sequence fetch and MOOPmart
+organism pass ('search_telemetry_file' in config/site_config.php, rotated to .1). This
+reads both files and prints, per group:
+
+    n             records
+    wall p50/p90/p99     milliseconds
+    read p50/p90/p99     bytes read from storage -- ~0 is a warm run
+    cold          share of records that read more than --cold-mb from storage
+    pools         (searches) how often each pool strategy ran
+
+so "which organisms are slow for real users, and is it the disk" is one command instead
+of a benchmark. Terms are the hashes the log stores, not the expressions.
+
+usage:  analyze_telemetry.py [--file LOG] [--kind search] [--by organism|term|pool|kind]
+                             [--since HOURS] [--cold-mb 1] [--top N] [--json]
+"""
+import argparse, collections, json, os, sys, time
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "logs", "search_telemetry.ndjson")
+
+GROUP_FIELD = {"organism": "organism", "term": "term", "pool": "pool", "kind": "kind"}
+
+
+def records(path, since=None, kind=None):
+    """Every record in the log and its rotation, oldest file first; bad lines skipped."""
+    for p in (path + ".1", path):
+        try:
+            fh = open(p)
+        except OSError:
+            continue
+        with fh:
+            for line in fh:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue      # a line cut short by a full disk or a rotation race
+                if not isinstance(r, dict):
+                    continue
+                if since is not None and r.get("ts", 0) < since:
+                    continue
+                if kind and r.get("kind") != kind:
+                    continue
+                yield r
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list; None when empty."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+def summarise(rows, cold_bytes):
+    wall = sorted(r["wall_ms"] for r in rows if isinstance(r.get("wall_ms"), (int, float)))
+    read = sorted(r["read_bytes"] for r in rows if isinstance(r.get("read_bytes"), (int, float)))
+    pools = collections.Counter(r["pool"] for r in rows if r.get("pool"))
+    return {
+        "n": len(rows),
+        "wall_ms": {q: percentile(wall, q) for q in (50, 90, 99)},
+        "read_bytes": {q: percentile(read, q) for q in (50, 90, 99)},
+        # Records with no read_bytes (not Linux) are left out of the share, not counted warm.
+        "cold": round(sum(1 for b in read if b > cold_bytes) / len(read), 3) if read else None,
+        "pools": dict(pools.most_common()),
+    }
+
+
+def fmt_bytes(b):
+    if b is None:
+        return "-"
+    for unit in ("B", "K", "M", "G"):
+        if b < 1024 or unit == "G":
+            return f"{b:.0f}{unit}" if unit == "B" else f"{b:.1f}{unit}"
+        b /= 1024
+
+
+def fmt_ms(v):
+    return "-" if v is None else str(int(v))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--file", default=DEFAULT_LOG, help="telemetry log (default: %(default)s)")
+    ap.add_argument("--kind", choices=("search", "sequence", "moopmart"),
+                    help="only this kind of record")
+    ap.add_argument("--by", choices=sorted(GROUP_FIELD), default="organism")
+    ap.add_argument("--since", type=float, metavar="HOURS", help="only the last HOURS hours")
+    ap.add_argument("--cold-mb", type=float, default=1.0,
+                    help="storage reads above this count as a cold run (default: %(default)s)")
+    ap.add_argument("--top", type=int, default=30, help="groups shown, slowest p90 first")
+    ap.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = ap.parse_args()
+
+    since = time.time() - args.since * 3600 if args.since else None
+    groups = collections.defaultdict(list)
+    for r in records(args.file, since, args.kind):
+        groups[str(r.get(GROUP_FIELD[args.by]) or "-")].append(r)
+    if not groups:
+        print(f"no records in {args.file}", file=sys.stderr)
+        return 1
+
+    cold_bytes = args.cold_mb * 1048576
+    summary = {g: summarise(rows, cold_bytes) for g, rows in groups.items()}
+    order = sorted(summary, key=lambda g: (-(summary[g]["wall_ms"][90] or 0), g))[:args.top]
+
+    if args.json:
+        json.dump({g: summary[g] for g in order}, sys.stdout, indent=1)
+        print()
+        return 0
+
+    total = sum(s["n"] for s in summary.values())
+    print(f"{total} records, {len(summary)} {args.by} groups"
+          + (f", showing the {len(order)} slowest at p90" if len(order) < len(summary) else ""))
+    print(f"{args.by:<28} {'n':>6}  {'wall p50':>8} {'p90':>7} {'p99':>7}  "
+          f"{'read p50':>8} {'p90':>7} {'p99':>7}  {'cold':>5}  pools")
+    for g in order:
+        s = summary[g]
+        w, b = s["wall_ms"], s["read_bytes"]
+        cold = "-" if s["cold"] is None else f"{s['cold'] * 100:.0f}%"
+        pools = " ".join(f"{p}:{n}" for p, n in s["pools"].items())
+        print(f"{g[:28]:<28} {s['n']:>6}  {fmt_ms(w[50]):>8} {fmt_ms(w[90]):>7} {fmt_ms(w[99]):>7}  "
+              f"{fmt_bytes(b[50]):>8} {fmt_bytes(b[90]):>7} {fmt_bytes(b[99]):>7}  {cold:>5}  {pools}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
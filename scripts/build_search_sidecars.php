@@ -0,0 +1,132 @@
+<?php
+/**
+ * Write the per-organism search sidecars, both copied out of the organism's FTS index:
+ *
+ *   {cache_path}/{organism}/fts_docsize.bin       the total token count of every
+ *       feature_annotation_search row, indexed by rowid, plus the row and token totals
+ *       bm25 normalises by -- for in-process bm25 (lib/fts_docsize.php)
+ *   {cache_path}/{organism}/fts_term_stats.sqlite  every index term and how many rows
+ *       hold it -- for match estimates before a search runs (lib/fts_term_stats.php)
+ *
+ * Each is only as current as the index it was read from, so each records the fingerprint
+ * of the database it came from, and search ignores it once that database changes.
+ *
+ * Then, whenever any term-stats sidecar was written (or the file is missing), it merges
+ * them all into {cache_path}/organism_skip.sqlite, the cross-organism skip index
+ * (lib/organism_skip_index.php). That reads only the sidecars, not the databases.
+ *
+ * Default run writes only what is missing or stale; re-running after a partial run or a
+ * rebuild resumes. Each file is written beside the live one and renamed into place.
+ *
+ * Usage:
+ *   php scripts/build_search_sidecars.php                       # missing or stale only
+ *   php scripts/build_search_sidecars.php --organism=Myotis_myotis [--organism=...]
+ *   php scripts/build_search_sidecars.php --force               # rewrite every one
+ */
+
+if (php_sapi_name() !== 'cli') {
+    die("This script must be run from the command line.\n");
+}
+
+$BASE = dirname(__DIR__);
+require_once $BASE . '/includes/config_init.php';
+require_once $BASE . '/lib/fts_docsize.php';
+require_once $BASE . '/lib/fts_term_stats.php';
+require_once $BASE . '/lib/organism_skip_index.php';
+
+$force = in_array('--force', $argv, true);
+$only  = [];
+foreach ($argv as $arg) {
+    if (strpos($arg, '--organism=') === 0) {
+        $only[] = substr($arg, 11);
+    }
+}
+
+$organism_data = rtrim(ConfigManager::getInstance()->getPath('organism_data'), '/');
+$dbs = glob("$organism_data/*/organism.sqlite") ?: [];
+sort($dbs);
+
+$done = $skipped = $failed = 0;
+$terms_written = 0;
+$bytes = 0;
+$started = microtime(true);
+echo "Scanning " . count($dbs) . " organisms\n\n";
+
+$n = 0;
+foreach ($dbs as $path) {
+    $n++;
+    $org = basename(dirname($path));
+    if (!empty($only) && !in_array($org, $only, true)) continue;
+
+    $need_docsize = $force || moop_docsize_open($path) === null;
+    $need_terms   = $force || moop_term_stats_open($path) === null;
+    if (!$need_docsize && !$need_terms) {
+        $skipped++;
+        continue;
+    }
+
+    printf("[%2d/%2d] %-48s ", $n, count($dbs), substr($org, 0, 48));
+    flush();
+    $t       = microtime(true);
+    $docsize = moop_docsize_sidecar_file($path);
+    $terms   = moop_term_stats_sidecar_file($path);
+
+    if (!moop_ensure_cache_dir(dirname($docsize))) {
+        echo "FAILED  cannot create " . dirname($docsize) . "\n";
+        $failed++;
+        continue;
+    }
+    try {
+        $rows = $vocab = null;
+        if ($need_docsize) {
+            $rows = moop_docsize_write($path, $docsize)['rows'];
+            $bytes += filesize($docsize);
+        }
+        if ($need_terms) {
+            $stats = moop_term_stats_write($path, $terms);
+            $vocab = $stats['terms'];
+            $terms_written++;
+            $bytes += $stats['bytes'];
+        }
+    } catch (PDOException | RuntimeException $e) {
+        // A database without feature_annotation_search (no FTS index yet) lands here too.
+        // Search ranks it in SQLite, with no estimate, as it would with no sidecars at all.
+        echo "FAILED  " . $e->getMessage() . "\n";
+        $failed++;
+        continue;
+    }
+
+    printf("%12s rows  %10s terms  %5.1fs\n",
+           $rows === null ? 'current' : number_format($rows),
+           $vocab === null ? 'current' : number_format($vocab),
+           microtime(true) - $t);
+    $done++;
+}
+
+// The skip index spans every organism, so it is rebuilt whole -- from all of them, not
+// only the --organism ones, which would drop the rest from it.
+$skip_file = moop_skip_index_file();
+if ($terms_written > 0 || !is_file($skip_file)) {
+    $all = [];
+    foreach ($dbs as $path) $all[basename(dirname($path))] = $path;
+    $t = microtime(true);
+    try {
+        if (!moop_ensure_cache_dir(dirname($skip_file))) {
+            throw new RuntimeException('cannot create ' . dirname($skip_file));
+        }
+        $idx = moop_skip_index_build($all, $skip_file);
+        printf("\nskip index: %d organisms, %s terms, %.1fs%s\n", $idx['organisms'],
+               number_format($idx['terms']), microtime(true) - $t,
+               empty($idx['missing']) ? '' : '   (never skipped, no current sidecar: '
+                                             . implode(', ', $idx['missing']) . ')');
+    } catch (PDOException | RuntimeException $e) {
+        echo "\nskip index: FAILED  " . $e->getMessage() . "\n";
+        $failed++;
+    }
+}
+
+printf("\n%s\nwritten: %d   current: %d   failed: %d   %.1f MB written   total %.1f min\n",
+    str_repeat('-', 60), $done, $skipped, $failed, $bytes / 1048576,
+    (microtime(true) - $started) / 60);
+
+exit($failed > 0 ? 1 : 0);
@@ -0,0 +1,171 @@
+<?php
+/**
+ * Plan and build the search tier: each chosen organism's FTS index copied to the fast
+ * volume as {search_tier_path}/{organism}/search.sqlite (lib/search_tier.php).
+ *
+ * 1. SIZE. What each organism's index will take there. Measured by reading the index
+ *    (moop_search_tier_measure()), so the answers are kept in {search_tier_path}/plan.json
+ *    per database fingerprint and only re-measured after a rebuild; a current tier's own
+ *    file size is used where there is one.
+ * 2. PLAN. moop_search_tier_plan(): most searched organisms per byte first (usage from the
+ *    shared search cache, past week), within the smaller of 'search_tier_max_gb' and 90%
+ *    of what the volume could hold -- its free space plus the tiers already on it.
+ * 3. EVICT the tiers that did not make the plan, or whose organism is gone, first, so
+ *    their space is free for the builds.
+ * 4. BUILD every planned tier that is missing or stale. Each is written beside the live
+ *    one and renamed into place; a search holding the old file keeps reading it.
+ *
+ * Resumable: re-running after a failure builds only what is still missing. Run it after
+ * scripts/rebuild_fts_indexes.sh, and whenever usage has shifted -- a stale tier is only
+ * ignored, never wrong, so nothing breaks in between.
+ *
+ * Usage:
+ *   php scripts/build_search_tier.php            # plan, evict, build what is missing or stale
+ *   php scripts/build_search_tier.php --plan     # print the plan, change nothing
+ *   php scripts/build_search_tier.php --force    # rebuild every planned tier
+ */
+
+if (php_sapi_name() !== 'cli') {
+    die("This script must be run from the command line.\n");
+}
+
+$BASE = dirname(__DIR__);
+require_once $BASE . '/includes/config_init.php';
+require_once $BASE . '/lib/search_tier.php';
+require_once $BASE . '/lib/search_result_cache.php';
+
+$plan_only = in_array('--plan', $argv, true);
+$force     = in_array('--force', $argv, true);
+
+$config    = ConfigManager::getInstance();
+$tier_root = rtrim($config->getPath('search_tier_path'), '/');
+if ($tier_root === '') {
+    echo "search_tier_path is not set in site_config.php -- tiering is off, nothing to do.\n";
+    exit(0);
+}
+if (!moop_ensure_cache_dir($tier_root)) {
+    echo "cannot create $tier_root\n";
+    exit(1);
+}
+
+$organism_data = rtrim($config->getPath('organism_data'), '/');
+$dbs = [];
+foreach (glob("$organism_data/*/organism.sqlite") ?: [] as $path) {
+    $dbs[basename(dirname($path))] = $path;
+}
+ksort($dbs);
+
+$plan_file = "$tier_root/plan.json";
+$previous  = json_decode((string)@file_get_contents($plan_file), true)['organisms'] ?? [];
+
+// ---- 1. sizes -------------------------------------------------------------------------
+$started = microtime(true);
+$sizes = $fps = $current = [];
+$failed = 0;
+echo "Sizing " . count($dbs) . " organisms\n";
+foreach ($dbs as $org => $path) {
+    $fps[$org] = moop_gene_set_identity_fingerprint($path);
+    $file = moop_search_tier_file($path);
+
+    $dbh = null;
+    try {
+        // URI filenames on, so the tier can be attached read-only, as getDbConnection() does.
+        $dbh = new PDO('sqlite:' . $path, null, null, [
+            PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READONLY
+                                         | (defined('PDO::SQLITE_OPEN_URI') ? PDO::SQLITE_OPEN_URI : 0x40),
+        ]);
+        $dbh->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        $current[$org] = moop_search_tier_attach_file($dbh, $file, $path);
+    } catch (PDOException $e) {
+        $current[$org] = false;
+    }
+    $dbh = null;
+
+    if ($current[$org]) {
+        $sizes[$org] = (int)filesize($file);
+    } elseif (($previous[$org]['fingerprint'] ?? '') === $fps[$org]) {
+        $sizes[$org] = (int)$previous[$org]['bytes'];
+    } else {
+        try {
+            $sizes[$org] = moop_search_tier_measure($path);
+        } catch (PDOException $e) {
+            // No FTS index yet: nothing to tier. It stays off the plan until it has one.
+            printf("  %-48s not sized: %s\n", substr($org, 0, 48), $e->getMessage());
+            $failed++;
+        }
+    }
+}
+
+// ---- 2. plan --------------------------------------------------------------------------
+$on_volume = 0;
+foreach ($dbs as $org => $path) {
+    $file = moop_search_tier_file($path);
+    if (is_file($file)) $on_volume += (int)filesize($file);
+}
+$free     = (int)@disk_free_space($tier_root);
+$max      = max(0, $config->getInt('search_tier_max_gb', 100)) * 1073741824;
+$capacity = (int)min($max, ($free + $on_volume) * 0.9);
+$uses     = moop_search_cache_usage(7);
+$plan     = moop_search_tier_plan($sizes, $capacity, $uses);
+
+printf("\nCapacity %.1f GB (max %.1f GB, %.1f GB free + %.1f GB in tiers); planned %.1f GB\n\n",
+       $capacity / 1073741824, $max / 1073741824, $free / 1073741824,
+       $on_volume / 1073741824, $plan['bytes'] / 1073741824);
+foreach ($plan['tier'] + $plan['left'] as $org => $bytes) {
+    printf("  %-5s %-48s %9.1f MB  %5d searches  %s\n",
+           isset($plan['tier'][$org]) ? 'TIER' : '-', substr($org, 0, 48), $bytes / 1048576,
+           $uses[$org] ?? 0, $current[$org] ? 'current' : '');
+}
+
+$record = [];
+foreach ($sizes as $org => $bytes) {
+    $record[$org] = ['fingerprint' => $fps[$org], 'bytes' => $bytes, 'tiered' => isset($plan['tier'][$org])];
+}
+$tmp = "$plan_file.tmp." . getmypid();
+if (@file_put_contents($tmp, json_encode(['planned_at' => date('c'), 'capacity' => $capacity,
+                                           'organisms' => $record], JSON_PRETTY_PRINT)) === false
+    || !@rename($tmp, $plan_file)) {
+    @unlink($tmp);
+    echo "\n(plan not saved to $plan_file -- sizes will be measured again next run)\n";
+}
+
+if ($plan_only) exit(0);
+
+// ---- 3. evict -------------------------------------------------------------------------
+$evicted = 0;
+foreach (glob("$tier_root/*/search.sqlite") ?: [] as $file) {
+    $org = basename(dirname($file));
+    if (isset($plan['tier'][$org])) continue;
+    if (@unlink($file)) $evicted++;
+}
+
+// ---- 4. build -------------------------------------------------------------------------
+$built = 0;
+$bytes = 0;
+echo "\n";
+foreach (array_keys($plan['tier']) as $org) {
+    if ($current[$org] && !$force) continue;
+    $path = $dbs[$org];
+    $file = moop_search_tier_file($path);
+    printf("build %-48s ", substr($org, 0, 48));
+    flush();
+    $t = microtime(true);
+    try {
+        if (!moop_ensure_cache_dir(dirname($file))) {
+            throw new RuntimeException('cannot create ' . dirname($file));
+        }
+        $out = moop_search_tier_build($path, $file);
+        $bytes += $out['bytes'];
+        $built++;
+        printf("%9.1f MB  %5.1fs\n", $out['bytes'] / 1048576, microtime(true) - $t);
+    } catch (PDOException | RuntimeException $e) {
+        echo "FAILED  " . $e->getMessage() . "\n";
+        $failed++;
+    }
+}
+
+printf("\n%s\nbuilt: %d   evicted: %d   failed: %d   %.1f MB written   total %.1f min\n",
+    str_repeat('-', 60), $built, $evicted, $failed, $bytes / 1048576,
+    (microtime(true) - $started) / 60);
+
+exit($failed > 0 ? 1 : 0);
@@ -0,0 +1,182 @@
+<?php
+/**
+ * Build or refresh the cross-organism union search index (lib/union_index.php).
+ *
+ * Default run is INCREMENTAL: every organism whose organism.sqlite fingerprint differs
+ * from the one recorded in union.sqlite is reloaded, organisms whose database has gone
+ * are pruned, and everything else is left alone. After one organism is reloaded by the
+ * pipeline, re-running this touches that organism only -- until then search serves it
+ * through the per-organism path, because its stored fingerprint no longer matches.
+ *
+ * Each organism is one transaction (refresh_union_organism.sql), so an interrupted run
+ * leaves every organism either fully old or fully new, and re-running resumes.
+ *
+ * --rebuild builds a brand-new file beside the live one and renames it into place, so
+ * search keeps reading the old index for the whole build (rename(2) is atomic within a
+ * filesystem). An incremental refresh writes in place instead: union.sqlite is
+ * journal_mode=delete, so while ONE organism's transaction runs, ranking against the
+ * index fails with "database is locked" and lib/union_index.php falls back to
+ * per-organism search for that request. Slower for a few seconds, never wrong.
+ *
+ * Usage:
+ *   php scripts/build_union_index.php                       # refresh what changed
+ *   php scripts/build_union_index.php --organism=Myotis_myotis [--organism=...]
+ *   php scripts/build_union_index.php --rebuild             # from scratch, atomic swap
+ */
+
+if (php_sapi_name() !== 'cli') {
+    die("This script must be run from the command line.\n");
+}
+
+$BASE = dirname(__DIR__);
+require_once $BASE . '/includes/config_init.php';
+require_once $BASE . '/lib/gene_set_identity.php';   // moop_gene_set_identity_fingerprint()
+
+$rebuild = in_array('--rebuild', $argv, true);
+$only    = [];
+foreach ($argv as $arg) {
+    if (strpos($arg, '--organism=') === 0) {
+        $only[] = substr($arg, 11);
+    }
+}
+
+if ($rebuild && !empty($only)) {
+    // A rebuilt file holds only what this run loaded; swapping in a one-organism index
+    // would drop every other organism from union search.
+    fwrite(STDERR, "--rebuild and --organism cannot be combined\n");
+    exit(2);
+}
+
+$SQL_DIR       = $BASE . '/config/build_and_load_db/data_loaders';
+$organism_data = rtrim(ConfigManager::getInstance()->getPath('organism_data'), '/');
+$target        = moop_union_index_file();
+$work          = $rebuild ? $target . '.build.' . getmypid() : $target;
+
+if (!is_dir(dirname($target)) && !@mkdir(dirname($target), 0775, true)) {
+    fwrite(STDERR, "cannot create " . dirname($target) . "\n");
+    exit(1);
+}
+
+// Writable, and with URI filenames enabled so each organism can be ATTACHed as
+// 'file:...?mode=ro' -- the organism tree may be read-only, and must never be written.
+$uri_flag = defined('PDO::SQLITE_OPEN_URI') ? PDO::SQLITE_OPEN_URI : 0x40;
+$db = new PDO('sqlite:' . $work, null, null, [
+    PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READWRITE | PDO::SQLITE_OPEN_CREATE | $uri_flag,
+]);
+$db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+$db->exec('PRAGMA busy_timeout = 30000');
+$db->exec(file_get_contents("$SQL_DIR/build_union_index.sql"));
+$refresh_sql = file_get_contents("$SQL_DIR/refresh_union_organism.sql");
+
+$recorded = [];
+foreach ($db->query("SELECT organism, fingerprint FROM union_organism") as $row) {
+    $recorded[$row['organism']] = $row['fingerprint'];
+}
+
+$dbs = glob("$organism_data/*/organism.sqlite") ?: [];
+sort($dbs);
+$present = [];
+foreach ($dbs as $path) {
+    $present[basename(dirname($path))] = $path;
+}
+
+$done = $skipped = $failed = $pruned = 0;
+$started = microtime(true);
+
+// Organisms whose database is gone: drop their postings, and any document only they held.
+// Same orphan rule as refresh_union_organism.sql, without an organism to load.
+foreach (array_diff_key($recorded, $present) as $org => $_) {
+    if (!empty($only) && !in_array($org, $only, true)) continue;
+    $db->beginTransaction();
+    $st = $db->prepare("SELECT org_id FROM union_organism WHERE organism = ?");
+    $st->execute([$org]);
+    $org_id = (int)$st->fetchColumn();
+    $db->exec("DROP TABLE IF EXISTS temp.union_orphans");
+    $db->exec("CREATE TEMP TABLE union_orphans AS
+               SELECT DISTINCT doc_id FROM union_posting WHERE org_id = $org_id");
+    $db->exec("DELETE FROM union_posting WHERE org_id = $org_id");
+    $db->exec("DELETE FROM temp.union_orphans
+               WHERE doc_id IN (SELECT doc_id FROM union_posting)");
+    $db->exec("INSERT INTO union_search(union_search, rowid, annotation_description,
+                                        annotation_accession, annotation_type_code)
+               SELECT 'delete', d.doc_id, d.annotation_description, d.annotation_accession,
+                      d.annotation_type_code
+               FROM union_doc d JOIN temp.union_orphans o ON o.doc_id = d.doc_id");
+    $db->exec("DELETE FROM union_doc WHERE doc_id IN (SELECT doc_id FROM temp.union_orphans)");
+    $db->exec("DELETE FROM union_organism WHERE org_id = $org_id");
+    $db->commit();
+    $db->exec("DROP TABLE IF EXISTS temp.union_orphans");
+    printf("PRUNE %s (database gone)\n", $org);
+    $pruned++;
+}
+
+echo "Scanning " . count($present) . " organisms -> $target\n\n";
+
+$n = 0;
+foreach ($present as $org => $path) {
+    $n++;
+    if (!empty($only) && !in_array($org, $only, true)) continue;
+
+    $fp = moop_gene_set_identity_fingerprint($path);
+    if (($recorded[$org] ?? null) === $fp) {
+        $skipped++;
+        continue;
+    }
+
+    printf("[%2d/%2d] %-48s ", $n, count($present), substr($org, 0, 48));
+    flush();
+    $t = microtime(true);
+
+    try {
+        $db->exec('ATTACH DATABASE ' . $db->quote('file:' . $path . '?mode=ro') . ' AS org');
+        $db->exec("DROP TABLE IF EXISTS temp.union_target");
+        $db->exec("CREATE TEMP TABLE union_target (organism TEXT, fingerprint TEXT)");
+        $db->prepare("INSERT INTO temp.union_target VALUES (?, ?)")->execute([$org, $fp]);
+        $db->exec($refresh_sql);
+        $rows = $db->query("SELECT COUNT(*) FROM org.feature_annotation")->fetchColumn();
+        $db->exec('DETACH DATABASE org');
+    } catch (PDOException $e) {
+        // sqlite3_exec stops at the failing statement with the script's transaction still
+        // open; roll it back so the organism keeps its previous postings and fingerprint,
+        // and search goes on treating it as stale.
+        try { $db->exec("ROLLBACK"); } catch (PDOException $ignored) {}
+        try { $db->exec('DETACH DATABASE org'); } catch (PDOException $ignored) {}
+        echo "FAILED  " . $e->getMessage() . "\n";
+        $failed++;
+        continue;
+    }
+
+    printf("%12s rows  %5.1fs\n", number_format((int)$rows), microtime(true) - $t);
+    $done++;
+}
+
+// Merge the FTS segments the refreshes wrote: a freshly loaded index is many small
+// b-trees, and the first queries against it read all of them.
+if ($done > 0 || $pruned > 0) {
+    $db->exec("INSERT INTO union_search(union_search) VALUES('optimize')");
+}
+
+$docs  = (int)$db->query("SELECT COUNT(*) FROM union_doc")->fetchColumn();
+$posts = (int)$db->query("SELECT COUNT(*) FROM union_posting")->fetchColumn();
+$db = null;
+
+if ($rebuild) {
+    if ($failed > 0) {
+        // Never swap in an index with holes. The organisms that failed would be absent --
+        // searched per organism, so not wrong -- but a rebuild that quietly slows part of
+        // the site is not one an admin should find out about from a timing graph.
+        @unlink($work);
+        fwrite(STDERR, "rebuild had failures; live index left untouched\n");
+    } elseif (!rename($work, $target)) {
+        fwrite(STDERR, "could not move $work into place\n");
+        $failed++;
+    }
+}
+
+printf("\n%s\nrefreshed: %d   unchanged: %d   pruned: %d   failed: %d\n"
+     . "%s distinct documents, %s postings, %.1f MB   total %.1f min\n",
+    str_repeat('-', 60), $done, $skipped, $pruned, $failed,
+    number_format($docs), number_format($posts),
+    is_file($target) ? filesize($target) / 1048576 : 0, (microtime(true) - $started) / 60);
+
+exit($failed > 0 ? 1 : 0);
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Record which pages of every organism database the page cache holds, and put them back.
+
+The page cache is the site's real search index: a warm organism answers in
+milliseconds, a cold one in seconds of seeks on sdb. It takes HOURS of use to fill and
+moments to lose -- notes/bench/loadtest.py took it from 12.2 GB to 0.3 GB, and 2.5 hours
+of ordinary traffic later it held 6.6 GB; a reboot or a reload empties it outright. Users
+refill it one 33 ms refault at a time, in whatever order they happen to search.
+
+    snapshot   mincore(2) over every database -- no page is faulted in -- into one
+               compact file: per database its fingerprint and the resident ranges, as
+               varint deltas, zlib-compressed. 12 GB resident is a few hundred KB.
+    restore    the ranges read back, skipping what is resident again, per database in
+               PHYSICAL OFFSET order with short gaps read through (prewarm_search_pages'
+               GAP_PAGES), so sdb streams at ~100 MB/s instead of seeking at 0.12 MB/s.
+               Rate-limited (--rate-mb-s) so live searches still get the disk, and it
+               stops once MemFree falls under --reserve-mb, so it never evicts what is
+               cached now to restore what was cached then. A database whose
+               fingerprint changed since the snapshot (reloaded, re-laid-out) has other
+               content at those offsets; it gets its search pages instead -- the page
+               list scripts/prewarm_search_pages.py keeps -- when --cache-root is given.
+    auto       what the housekeeping task runs: restore when the databases have lost
+               most of what the snapshot holds (a reboot, a benchmark, a drop_caches),
+               otherwise refresh the snapshot once it is --every-hours old. A snapshot
+               of a cold cache never overwrites a warm one, so a benchmark run between
+               two snapshots does not erase the working set it is about to be restored
+               from.
+
+Databases are restored largest working set first, so a --budget-mb that runs out
+leaves the small ones cold.
+
+usage:
+  page_cache_snapshot.py snapshot --out FILE DB...
+  page_cache_snapshot.py restore FILE [--rate-mb-s 40] [--budget-mb N] [--reserve-mb 1024]
+                                      [--cache-root DIR] [--dry-run]
+  page_cache_snapshot.py auto FILE [--every-hours 6] [restore options] DB...
+"""
+import argparse, base64, json, os, sys, time, zlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from prewarm_search_pages import (CHUNK, GAP_PAGES, fingerprint, missing_ranges, page_map,
+                                  resident_vector)
+
+MAGIC = b"MOOPPCS1\n"
+RESTORE_BELOW = 0.5      # auto restores when less than this share of the snapshot is resident
+MAX_AGE_DAYS = 7         # an older snapshot is no longer the working set
+GAP_BYTES = GAP_PAGES * 4096
+
+
+# -- the file ---------------------------------------------------------------------------
+
+def varints(values):
+    out = bytearray()
+    for v in values:
+        while v >= 0x80:
+            out.append((v & 0x7F) | 0x80)
+            v >>= 7
+        out.append(v)
+    return bytes(out)
+
+
+def unvarints(blob):
+    out, v, shift = [], 0, 0
+    for b in blob:
+        v |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            out.append(v)
+            v, shift = 0, 0
+    return out
+
+
+def resident_ranges(db):
+    """(os_page, [(first page, pages), ...]) resident now, from one mincore."""
+    vec, os_page = resident_vector(db)
+    ranges, start = [], None
+    for i, b in enumerate(vec):
+        if b & 1:
+            if start is None:
+                start = i
+        elif start is not None:
+            ranges.append((start, i - start))
+            start = None
+    if start is not None:
+        ranges.append((start, len(vec) - start))
+    return os_page, ranges
+
+
+def encode(ranges):
+    """Ranges as alternating (gap since the last one ended, length), varint-packed."""
+    flat, end = [], 0
+    for first, n in ranges:
+        flat += [first - end, n]
+        end = first + n
+    return base64.b64encode(varints(flat)).decode()
+
+
+def decode(text):
+    flat, out, end = unvarints(base64.b64decode(text)), [], 0
+    for gap, n in zip(flat[0::2], flat[1::2]):
+        out.append((end + gap, n))
+        end += gap + n
+    return out
+
+
+def take(dbs):
+    files = []
+    for db in dbs:
+        try:
+            os_page, ranges = resident_ranges(db)
+            fp = fingerprint(db)
+        except OSError as e:
+            print(f"  {db}: skipped: {e}", file=sys.stderr)
+            continue
+        files.append({"path": os.path.abspath(db), "fingerprint": fp, "os_page": os_page,
+                      "resident_bytes": sum(n for _, n in ranges) * os_page,
+                      "ranges": encode(ranges)})
+    files.sort(key=lambda f: -f["resident_bytes"])
+    return {"version": 1, "taken": int(time.time()), "files": files,
+            "resident_bytes": sum(f["resident_bytes"] for f in files)}
+
+
+def write(path, snap):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, "wb") as fh:
+        fh.write(MAGIC + zlib.compress(json.dumps(snap, separators=(",", ":")).encode(), 9))
+    os.replace(tmp, path)
+
+
+def read(path):
+    with open(path, "rb") as fh:
+        blob = fh.read()
+    if not blob.startswith(MAGIC):
+        raise ValueError(f"{path}: not a page-cache snapshot")
+    return json.loads(zlib.decompress(blob[len(MAGIC):]))
+
+
+def resident_now(snap):
+    """Bytes of the snapshot's resident pages that are resident now."""
+    total = 0
+    for f in snap["files"]:
+        try:
+            if fingerprint(f["path"]) != f["fingerprint"]:
+                continue
+            vec, os_page = resident_vector(f["path"])
+        except OSError:
+            continue
+        for first, n in decode(f["ranges"]):
+            total += sum(b & 1 for b in vec[first:first + n]) * os_page
+    return total
+
+
+# -- restore ----------------------------------------------------------------------------
+
+def mem_free():
+    """MemFree, not MemAvailable: the cache counts as available, and reading past free
+    memory is exactly what evicts it."""
+    with open("/proc/meminfo") as fh:
+        for line in fh:
+            if line.startswith("MemFree:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def to_read(f):
+    """Byte ranges [offset, length] of f's snapshot ranges not resident now, in offset
+    order, gaps up to GAP_BYTES read through."""
+    vec, os_page = resident_vector(f["path"])
+    out = []
+    for first, n in decode(f["ranges"]):
+        i, end = first, min(first + n, len(vec))
+        while i < end:
+            if vec[i] & 1:
+                i += 1
+                continue
+            j = i
+            while j < end and not vec[j] & 1:
+                j += 1
+            off, length = i * os_page, (j - i) * os_page
+            if out and off - (out[-1][0] + out[-1][1]) <= GAP_BYTES:
+                out[-1][1] = off + length - out[-1][0]
+            else:
+                out.append([off, length])
+            i = j
+    return out
+
+
+class Throttle:
+    """Holds reading to rate bytes/s, and stops it when free memory runs short."""
+
+    def __init__(self, rate, budget, reserve):
+        self.rate, self.budget, self.reserve = rate, budget, reserve
+        self.read, self.t0 = 0, time.monotonic()
+        self.stopped = None
+        self.next_check = 0
+
+    def room(self):
+        if self.budget and self.read >= self.budget:
+            self.stopped = "budget spent"
+        elif self.read >= self.next_check:
+            self.next_check = self.read + 64 * 1048576
+            if mem_free() < self.reserve:
+                self.stopped = "MemFree under the reserve"
+        return self.stopped is None
+
+    def spent(self, n):
+        self.read += n
+        if self.rate:
+            ahead = self.read / self.rate - (time.monotonic() - self.t0)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def read_ranges(path, ranges, throttle):
+    fd = os.open(path, os.O_RDONLY)
+    got_total = 0
+    try:
+        for off, n in ranges:
+            while n > 0:
+                if not throttle.room():
+                    return got_total
+                got = len(os.pread(fd, min(CHUNK, n), off))
+                if got == 0:
+                    break
+                throttle.spent(got)
+                got_total += got
+                off += got
+                n -= got
+    finally:
+        os.close(fd)
+    return got_total
+
+
+def restore(snap, rate_mb_s=40, budget_mb=0, reserve_mb=1024, cache_root=None, dry_run=False):
+    throttle = Throttle(rate_mb_s * 1048576, budget_mb * 1048576, reserve_mb * 1048576)
+    t0 = time.time()
+    print(f"{time.strftime('%Y-%m-%d %H:%M')}  restore, snapshot of "
+          f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(snap['taken']))}, "
+          f"{snap['resident_bytes'] / 2**30:.1f} GB over {len(snap['files'])} databases, "
+          f"at most {rate_mb_s} MB/s")
+    for f in snap["files"]:
+        org = os.path.basename(os.path.dirname(f["path"]))
+        if throttle.stopped:
+            print(f"  {throttle.stopped}; {org} and the rest left as they are")
+            break
+        try:
+            if fingerprint(f["path"]) == f["fingerprint"]:
+                todo, what = to_read(f), "snapshot"
+            elif cache_root:
+                # Other content at the old offsets: restore what a search needs instead.
+                page_size, pages, _ = page_map(f["path"], cache_root)
+                todo, what = missing_ranges(f["path"], page_size, pages), "search pages (changed since)"
+            else:
+                print(f"  {org:40} changed since the snapshot, skipped")
+                continue
+        except OSError as e:
+            print(f"  {org:40} skipped: {e}")
+            continue
+        want = sum(n for _, n in todo)
+        if want == 0:
+            print(f"  {org:40} resident")
+            continue
+        got = 0 if dry_run else read_ranges(f["path"], todo, throttle)
+        print(f"  {org:40} {want / 1048576:8.1f} MB cold in {len(todo):6,} ranges, "
+              f"{got / 1048576:8.1f} MB read  [{what}]")
+    el = time.time() - t0
+    print(f"  done: {throttle.read / 1048576:.1f} MB in {el:.0f}s"
+          + (f" ({throttle.read / 1048576 / el:.0f} MB/s)" if el > 1 else ""))
+
+
+# -- command line -----------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    def restore_options(p):
+        p.add_argument("--rate-mb-s", type=float, default=40)
+        p.add_argument("--budget-mb", type=int, default=0, help="0 = no limit")
+        p.add_argument("--reserve-mb", type=int, default=1024,
+                       help="stop once MemFree falls below this")
+        p.add_argument("--cache-root", help="for search pages of databases changed since")
+        p.add_argument("--dry-run", action="store_true")
+
+    p = sub.add_parser("snapshot")
+    p.add_argument("--out", required=True)
+    p.add_argument("dbs", nargs="+")
+    p = sub.add_parser("restore")
+    p.add_argument("snapshot")
+    restore_options(p)
+    p = sub.add_parser("auto")
+    p.add_argument("snapshot")
+    p.add_argument("--every-hours", type=float, default=6)
+    restore_options(p)
+    p.add_argument("dbs", nargs="+")
+    a = ap.parse_args()
+
+    if a.cmd == "snapshot":
+        snap = take(a.dbs)
+        write(a.out, snap)
+        print(f"  {snap['resident_bytes'] / 2**30:.2f} GB resident over {len(snap['files'])} "
+              f"databases -> {a.out} ({os.path.getsize(a.out) / 1024:.0f} KB)")
+        return 0
+
+    if a.cmd == "restore":
+        restore(read(a.snapshot), a.rate_mb_s, a.budget_mb, a.reserve_mb, a.cache_root, a.dry_run)
+        return 0
+
+    # auto
+    try:
+        snap = read(a.snapshot)
+    except (OSError, ValueError):
+        snap = None
+    now = time.time()
+    if snap and now - snap["taken"] < MAX_AGE_DAYS * 86400 and snap["resident_bytes"]:
+        held = resident_now(snap)
+        if held < RESTORE_BELOW * snap["resident_bytes"]:
+            print(f"{time.strftime('%Y-%m-%d %H:%M')}  {held / 2**30:.1f} of "
+                  f"{snap['resident_bytes'] / 2**30:.1f} GB still resident -- restoring")
+            restore(snap, a.rate_mb_s, a.budget_mb, a.reserve_mb, a.cache_root, a.dry_run)
+            return 0
+        if now - snap["taken"] < a.every_hours * 3600:
+            return 0
+    fresh = take(a.dbs)
+    if snap and fresh["resident_bytes"] < RESTORE_BELOW * snap["resident_bytes"] \
+            and now - snap["taken"] < MAX_AGE_DAYS * 86400:
+        return 0            # never replace a warm snapshot with a cold one
+    if not a.dry_run:
+        write(a.snapshot, fresh)
+    print(f"{time.strftime('%Y-%m-%d %H:%M')}  snapshot: {fresh['resident_bytes'] / 2**30:.2f} GB "
+          f"resident over {len(fresh['files'])} databases")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Re-read the pages a search touches first, within a byte budget, before anyone searches.
+
+notes/bench/residency_watch.py showed organism database pages do not survive a night in
+the page cache, so the first cross-organism search of the morning meets a cold disk in
+every organism it touches -- tens of seconds of seeks. The pages that search needs first
+are a small, known part of each file:
+
+    FTS segments   feature_annotation_search_* and feature_search_* (data, idx, docsize)
+    b-tree tops    the INTERIOR pages of feature, annotation and feature_annotation --
+                   every row fetch descends through them, and they are a fraction of a
+                   percent of those tables
+
+Per organism, in the order given (most used first):
+
+  1. The page list, cached as {cache_root}/{organism}/prewarm_pages.json and rebuilt only
+     when the database changes. FTS pages come from dbstat; the b-tree tops from walking
+     interior pages only -- leaves are never read, because SQLite b-trees are balanced and
+     the depth is known after one descent.
+  2. mincore(2) on those pages. Resident pages are skipped; an organism already fully
+     resident costs nothing but the check, which does not fault anything in.
+  3. The rest read with pread in PHYSICAL OFFSET order, short gaps merged, so a rotational
+     disk streams forward instead of seeking per page.
+
+Stops when --budget-mb has been read (the first page-list build after a rebuild counts
+too: the dbstat walk reads those pages, which warms them as a side effect). Launched
+detached by the prewarm_search_pages housekeeping task (lib/housekeeping.php), which
+passes the organisms in usage order; runnable by hand the same way.
+
+usage:  prewarm_search_pages.py --budget-mb N --cache-root DIR [--dry-run] DB...
+"""
+import argparse, ctypes, json, mmap, os, sqlite3, struct, sys, time
+
+FTS_TABLES = [
+    "feature_annotation_search_data", "feature_annotation_search_idx",
+    "feature_annotation_search_docsize",
+    "feature_search_data", "feature_search_idx", "feature_search_docsize",
+]
+BTREE_TABLES = ["feature", "annotation", "feature_annotation"]
+
+GAP_PAGES = 8          # read through gaps this short rather than seek over them
+CHUNK = 1 << 20        # pread size
+
+libc = ctypes.CDLL("libc.so.6", use_errno=True)
+
+
+def fingerprint(path):
+    st = os.stat(path)
+    return f"{int(st.st_mtime)}:{st.st_size}"
+
+
+def interior_pages(fh, page_size, root):
+    """Interior pages of the b-tree rooted at `root`, without reading its leaves."""
+    def read(pno):
+        fh.seek((pno - 1) * page_size)
+        page = fh.read(page_size)
+        return page, (100 if pno == 1 else 0)
+
+    def children(page, hdr):
+        n = struct.unpack_from(">H", page, hdr + 3)[0]
+        out = []
+        for i in range(n):
+            cell = struct.unpack_from(">H", page, hdr + 12 + 2 * i)[0]
+            out.append(struct.unpack_from(">I", page, cell)[0])
+        out.append(struct.unpack_from(">I", page, hdr + 8)[0])
+        return out
+
+    # Depth: follow the leftmost child down to a leaf (the one leaf this reads).
+    depth, pno = 0, root
+    while True:
+        page, hdr = read(pno)
+        if page[hdr] not in (2, 5):
+            break
+        depth += 1
+        pno = children(page, hdr)[0]
+
+    pages, level = [], [root] if depth else []
+    for d in range(depth):
+        pages += level
+        if d == depth - 1:
+            break          # the next level down is leaves
+        nxt = []
+        for pno in level:
+            page, hdr = read(pno)
+            nxt += children(page, hdr)
+        level = nxt
+    return pages
+
+
+def build_map(db):
+    con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        page_size = con.execute("PRAGMA page_size").fetchone()[0]
+        marks = ",".join("?" * len(FTS_TABLES))
+        pages = [r[0] for r in con.execute(
+            f"SELECT pageno FROM dbstat WHERE name IN ({marks})", FTS_TABLES)]
+        roots = con.execute(
+            f"SELECT rootpage FROM sqlite_master WHERE type = 'table' AND name IN "
+            f"({','.join('?' * len(BTREE_TABLES))})", BTREE_TABLES).fetchall()
+    finally:
+        con.close()
+    with open(db, "rb") as fh:
+        for (root,) in roots:
+            pages += interior_pages(fh, page_size, root)
+    return page_size, sorted(set(pages))
+
+
+def page_map(db, cache_root):
+    """(page_size, sorted page numbers, bytes read to build it)."""
+    org = os.path.basename(os.path.dirname(db))
+    path = os.path.join(cache_root, org, "prewarm_pages.json")
+    fp = fingerprint(db)
+    try:
+        with open(path) as fh:
+            m = json.load(fh)
+        if m.get("fingerprint") == fp:
+            return m["page_size"], m["pages"], 0
+    except (OSError, ValueError):
+        pass
+    page_size, pages = build_map(db)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}"
+        with open(tmp, "w") as fh:
+            json.dump({"fingerprint": fp, "page_size": page_size, "pages": pages}, fh)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"  (page list not cached: {e})", file=sys.stderr)
+    return page_size, pages, len(pages) * page_size
+
+
+def resident_vector(path):
+    """mincore(2) over the whole file: one byte per OS page, bit 0 = resident. Does not
+    fault anything in."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return b"", os.sysconf("SC_PAGESIZE")
+        m = mmap.mmap(fd, size, flags=mmap.MAP_PRIVATE, prot=mmap.PROT_READ | mmap.PROT_WRITE)
+        try:
+            os_page = os.sysconf("SC_PAGESIZE")
+            vec = (ctypes.c_ubyte * ((size + os_page - 1) // os_page))()
+            addr = ctypes.addressof((ctypes.c_char * size).from_buffer(m))
+            if libc.mincore(ctypes.c_void_p(addr), ctypes.c_size_t(size), vec) != 0:
+                raise OSError(ctypes.get_errno(), "mincore failed")
+            return bytes(vec), os_page
+        finally:
+            m.close()
+    finally:
+        os.close(fd)
+
+
+def missing_ranges(db, page_size, pages):
+    """Byte ranges (offset, length) of the pages not fully resident, physical order,
+    gaps of up to GAP_PAGES merged."""
+    vec, os_page = resident_vector(db)
+    per = max(1, page_size // os_page)
+    out = []
+    for pno in pages:
+        first = (pno - 1) * page_size // os_page
+        if all(i < len(vec) and vec[i] & 1 for i in range(first, first + per)):
+            continue
+        off = (pno - 1) * page_size
+        if out and off - (out[-1][0] + out[-1][1]) <= GAP_PAGES * page_size:
+            out[-1][1] = off + page_size - out[-1][0]
+        else:
+            out.append([off, page_size])
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--budget-mb", type=int, required=True)
+    ap.add_argument("--cache-root", required=True)
+    ap.add_argument("--dry-run", action="store_true", help="report what would be read")
+    ap.add_argument("dbs", nargs="+")
+    args = ap.parse_args()
+
+    budget = args.budget_mb * 1048576
+    spent = 0
+    t0 = time.time()
+    print(f"{time.strftime('%Y-%m-%d %H:%M')}  prewarm, budget {args.budget_mb} MB, "
+          f"{len(args.dbs)} organisms")
+    for db in args.dbs:
+        org = os.path.basename(os.path.dirname(db))
+        if spent >= budget:
+            print(f"  budget spent; {org} and the rest left cold")
+            break
+        try:
+            page_size, pages, built = page_map(db, args.cache_root)
+            spent += built
+            todo = missing_ranges(db, page_size, pages)
+        except (OSError, sqlite3.Error) as e:
+            print(f"  {org:40} skipped: {e}")
+            continue
+        want = sum(n for _, n in todo)
+        hot = len(pages) * page_size
+        if want == 0:
+            print(f"  {org:40} resident ({hot / 1048576:.1f} MB hot)")
+            continue
+        read = 0
+        if not args.dry_run:
+            fd = os.open(db, os.O_RDONLY)
+            try:
+                for off, n in todo:
+                    while n > 0 and spent + read < budget:
+                        got = len(os.pread(fd, min(CHUNK, n), off))
+                        if got == 0:
+                            break
+                        read += got; off += got; n -= got
+                    if spent + read >= budget:
+                        break
+            finally:
+                os.close(fd)
+        spent += read
+        print(f"  {org:40} {want / 1048576:7.1f} of {hot / 1048576:7.1f} MB cold, "
+              f"{read / 1048576:7.1f} MB read" + (f", list built ({built / 1048576:.1f} MB)" if built else ""))
+    print(f"  done: {spent / 1048576:.1f} MB in {time.time() - t0:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
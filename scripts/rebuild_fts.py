@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""Rebuild every organism's FTS index, paced to the data volume, resumable after a kill.
+
+rebuild_fts_indexes.sh runs build_fts_index.sql and VACUUM four at a time through xargs:
+four jobs copying, indexing and vacuuming on sdb at once, each seeking across the others'
+files, 20-40 minutes for 85 databases while every search meets a cache the copies just
+churned. sdb is seek-bound -- five requests in flight to fifteen bought 1.12x
+(notes/SEARCH_COST_MODEL_2026-07-31.md) -- so more jobs on it only queue. Here the limit
+is set by the disk, not the CPU count:
+
+  disk slots    at most --disk-slots steps on the data volume at once (default 1): a
+                copy in or out, or a whole build when it runs there. Each one streams
+                instead of four seeking.
+  --stage DIR   build on the fast volume instead: the database is copied to DIR (one
+                sequential read of sdb), indexed, VACUUMed and checked there at flash
+                speed -- --jobs at a time, CPU-bound -- then copied back beside the
+                original (one sequential write) and renamed over it. rename(2) within a
+                filesystem is atomic, so a search sees the old file or the new one.
+                Space is reserved before a build starts (2.2x the database: the copy and
+                VACUUM's second copy); a database too big for DIR is built on the data
+                volume as without --stage.
+  order         largest first, so the longest build is not the one the run ends waiting
+                for, and the disk streams one database while the next builds
+  the cache     copies read and write in 8 MB chunks and drop what they pass through from
+                the page cache (posix_fadvise, after fdatasync for writes): the hot pages
+                of organisms nobody is rebuilding stay where they are
+  the journal   one NDJSON line per step (logs/fts_rebuild/journal.ndjson): started,
+                built, verified, done or failed, with fingerprints and timings. A re-run
+                skips databases done at their current fingerprint and picks a staged or
+                copied build up where it stopped -- after the index was built, a kill
+                costs the copy back, not the rebuild. --fresh starts a new journal.
+
+Everything rebuild_fts_indexes.sh promises still holds: copies by default (a rebuild in
+place holds an exclusive lock that blocks readers for its whole length; --in-place when
+nobody is searching), SQLite's temp files on the volume being built on and never /tmp,
+and no database replaced by one that has not passed quick_check, carries search_prior and
+has exactly one FTS row per feature_annotation row -- nor by one built from a file that
+changed while it was built. A database already carrying search_prior is skipped unless
+--force, or unless its last journal state is failed: an in-place build that failed its
+check has search_prior too, and is exactly the database that must not be skipped.
+
+Per database: seconds per step, size before and after; a summary at the end.
+
+usage:  rebuild_fts.py [--disk-slots N] [--stage DIR [--jobs N]] [--in-place] [--force]
+                       [--fresh] [--dry-run] [--organism-dir DIR] [organism ...]
+"""
+import argparse, json, os, shutil, sqlite3, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SQL = os.path.join(ROOT, "config", "build_and_load_db", "data_loaders", "build_fts_index.sql")
+LOGDIR = os.path.join(ROOT, "logs", "fts_rebuild")
+CHUNK = 8 << 20
+STAGE_FACTOR = 2.2          # the copy, and VACUUM's second copy of it
+
+
+def fingerprint(path):
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def ddl(db):
+    c = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        row = c.execute("SELECT sql FROM sqlite_master WHERE name = 'feature_annotation_search'").fetchone()
+        return row[0] if row else ""
+    finally:
+        c.close()
+
+
+def verify(db):
+    """(ok, detail, fts rows) -- rebuild_fts_indexes.sh's checks."""
+    c = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        check = c.execute("PRAGMA quick_check").fetchone()[0]
+        n_fts = c.execute("SELECT COUNT(*) FROM feature_annotation_search_docsize").fetchone()[0]
+        n_fa = c.execute("SELECT COUNT(*) FROM feature_annotation").fetchone()[0]
+    except sqlite3.Error as e:
+        return False, str(e), None
+    finally:
+        c.close()
+    ok = check == "ok" and "search_prior" in ddl(db) and n_fts == n_fa
+    return ok, f"check={check} fts={n_fts} fa={n_fa}", n_fts
+
+
+def drop_cache(fd, sync=False):
+    if sync:
+        os.fdatasync(fd)
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def copy_file(src, dst):
+    """Copy in chunks, leaving neither file in the page cache."""
+    fi = os.open(src, os.O_RDONLY)
+    try:
+        fo = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            while True:
+                buf = os.read(fi, CHUNK)
+                if not buf:
+                    break
+                os.write(fo, buf)
+                drop_cache(fi)
+                drop_cache(fo, sync=True)
+            os.fsync(fo)
+        finally:
+            os.close(fo)
+    finally:
+        os.close(fi)
+
+
+def fsync_dir(path):
+    fd = os.open(os.path.dirname(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """Append-only NDJSON of steps; the last line per organism is its state."""
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fresh and os.path.exists(path):
+            os.replace(path, path + ".1")
+        self.state = {}
+        try:
+            with open(path) as fh:
+                for line in fh:
+                    try:
+                        r = json.loads(line)
+                    except ValueError:      # a line cut short by the kill
+                        continue
+                    self.state[r["organism"]] = r
+        except OSError:
+            pass
+
+    def write(self, organism, state, **fields):
+        r = dict(fields, organism=organism, state=state, ts=round(time.time(), 1))
+        with self.lock:
+            with open(self.path, "a") as fh:
+                fh.write(json.dumps(r) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+            self.state[organism] = r
+        return r
+
+
+class Space:
+    """Bytes reserved on the staging volume, waited for when it is full."""
+
+    def __init__(self, path):
+        self.total = shutil.disk_usage(path).free
+        self.reserved = 0
+        self.cond = threading.Condition()
+
+    def fits(self, n):
+        return n <= self.total
+
+    def take(self, n):
+        with self.cond:
+            self.cond.wait_for(lambda: self.reserved + n <= self.total)
+            self.reserved += n
+
+    def give(self, n):
+        with self.cond:
+            self.reserved -= n
+            self.cond.notify_all()
+
+
+class Rebuild:
+    def __init__(self, args):
+        self.args = args
+        self.disk = threading.BoundedSemaphore(args.disk_slots)
+        self.journal = Journal(args.journal, args.fresh)
+        self.space = Space(args.stage) if args.stage else None
+        self.out = threading.Lock()
+        self.sqlite = args.sqlite3
+
+    def say(self, line):
+        with self.out:
+            print(line, flush=True)
+
+    def run_sql(self, db, log, script=None, sql=None, tmpdir=None):
+        env = dict(os.environ, SQLITE_TMPDIR=tmpdir or os.path.dirname(db))
+        with open(log, "a") as lf:
+            if script:
+                with open(script) as fh:
+                    r = subprocess.run([self.sqlite, db], stdin=fh, stdout=lf, stderr=lf, env=env)
+            else:
+                r = subprocess.run([self.sqlite, db, sql], stdout=lf, stderr=lf, env=env)
+        return r.returncode == 0
+
+    def build(self, work, log, tmpdir, times):
+        """build_fts_index.sql, then VACUUM -- a failed VACUUM leaves a correct, larger file."""
+        t = time.monotonic()
+        if not self.run_sql(work, log, script=SQL, tmpdir=tmpdir):
+            raise RuntimeError(f"rebuild, see {log}")
+        times["build"] = round(time.monotonic() - t, 1)
+        t = time.monotonic()
+        vacuumed = self.run_sql(work, log, sql="VACUUM;", tmpdir=tmpdir)
+        times["vacuum"] = round(time.monotonic() - t, 1)
+        return vacuumed
+
+    def one(self, org):
+        a = self.args
+        db = os.path.join(a.organism_dir, org, "organism.sqlite")
+        if not os.path.exists(db):
+            return self.say(f"SKIP  {org} (no database)")
+        source = fingerprint(db)
+        before = os.path.getsize(db)
+        last = self.journal.state.get(org)
+        if last and last["state"] == "done" and last.get("fingerprint") == source:
+            return self.say(f"DONE  {org} (journal)")
+        # Built or verified, from this very file, and the build still there: carry on from
+        # the check. Anything earlier starts again -- the index build is one transaction.
+        resume = (last if last and last.get("reached") and last.get("source") == source
+                  and os.path.exists(last.get("work", "")) else None)
+        # The DDL says nothing about a build that failed its check: in place, the index
+        # already carries search_prior. The journal's last word on the database decides.
+        failed = bool(last) and last["state"] == "failed"
+        if resume is None and not a.force and not failed and "search_prior" in ddl(db):
+            return self.say(f"DONE  {org} (already rebuilt)")
+        if a.dry_run:
+            return self.say(f"WOULD {org} ({before / 1048576:,.0f} MB"
+                            + (f", resuming after '{resume['reached']}')" if resume
+                               else ", retrying a failed build)" if failed else ")"))
+        if last and resume is None:
+            for f in (last.get("work"), last.get("back")):
+                if f and f != db and os.path.exists(f):
+                    os.unlink(f)
+
+        log = os.path.join(LOGDIR, f"{org}.log")
+        need = int(before * STAGE_FACTOR)
+        if resume:
+            p = {k: resume[k] for k in ("work", "mode", "staged", "vacuumed", "reached")}
+            p["times"] = dict(resume.get("times", {}))
+        else:
+            staged = bool(self.space) and self.space.fits(need) and not a.in_place
+            p = {"work": db if a.in_place else os.path.join(a.stage, f"{org}.sqlite") if staged
+                 else f"{db}.rebuild",
+                 "mode": "in place" if a.in_place else "staged" if staged else "copy",
+                 "staged": staged, "vacuumed": None, "reached": None, "times": {}}
+        work, times = p["work"], p["times"]
+        t0 = time.monotonic()
+        reserved = 0
+        try:
+            if p["staged"] and self.space:
+                self.space.take(need)
+                reserved = need
+            if not p["reached"]:
+                self.journal.write(org, "started", source=source, **p)
+                if p["staged"]:
+                    with self.disk:
+                        t = time.monotonic()
+                        copy_file(db, work)
+                        times["copy_in"] = round(time.monotonic() - t, 1)
+                    p["vacuumed"] = self.build(work, log, a.stage, times)
+                else:
+                    # Copy and build both run on the data volume: one disk slot for all of it.
+                    with self.disk:
+                        if not a.in_place:
+                            t = time.monotonic()
+                            copy_file(db, work)
+                            times["copy_in"] = round(time.monotonic() - t, 1)
+                        p["vacuumed"] = self.build(work, log, a.tmpdir, times)
+                p["reached"] = "built"
+                self.journal.write(org, "built", source=source, **p)
+
+            t = time.monotonic()
+            ok, detail, rows = verify(work)
+            times["verify"] = round(time.monotonic() - t, 1)
+            if not ok:
+                p["reached"] = None
+                if a.in_place:
+                    raise RuntimeError(f"verify: {detail} -- database LEFT AS IS, re-run to retry")
+                raise RuntimeError(f"verify: {detail} -- original untouched")
+            p["reached"] = "verified"
+            self.journal.write(org, "verified", source=source, **p)
+
+            if not a.in_place:
+                if fingerprint(db) != source:
+                    raise RuntimeError("the database changed while it was rebuilt -- original untouched")
+                back = work
+                if p["staged"]:
+                    back = p["back"] = f"{db}.rebuild"
+                    with self.disk:
+                        t = time.monotonic()
+                        copy_file(work, back)
+                        times["copy_out"] = round(time.monotonic() - t, 1)
+                st = os.stat(db)
+                shutil.copymode(db, back)
+                try:
+                    os.chown(back, st.st_uid, st.st_gid)
+                except PermissionError:
+                    pass
+                os.replace(back, db)
+                fsync_dir(db)
+                if p["staged"]:
+                    os.unlink(work)
+        except (OSError, RuntimeError, sqlite3.Error) as e:
+            # Past the build a failure keeps the work file: the re-run resumes from it.
+            if not p["reached"]:
+                for f in (work, p.get("back")):
+                    if f and f != db and os.path.exists(f):
+                        os.unlink(f)
+            self.journal.write(org, "failed", source=source, error=str(e), **p)
+            return self.say(f"FAIL  {org} ({e})")
+        finally:
+            if reserved:
+                self.space.give(reserved)
+
+        after = os.path.getsize(db)
+        times["total"] = round(time.monotonic() - t0, 1)
+        r = self.journal.write(org, "done", source=source, fingerprint=fingerprint(db),
+                               mode=p["mode"], rows=rows, bytes_before=before, bytes_after=after,
+                               times=times, vacuumed=p["vacuumed"], resumed=bool(resume))
+        self.say(f"OK    {org:38} {times['total']:7.1f}s  {rows:,} rows  "
+                 f"{before / 1048576:,.0f} -> {after / 1048576:,.0f} MB "
+                 f"({(after - before) / 1048576:+,.0f})  {p['mode']}"
+                 + (f", resumed after '{resume['reached']}'" if resume else "")
+                 + ("" if p["vacuumed"] else f", vacuum skipped: {log}")
+                 + "   " + " ".join(f"{k} {v}s" for k, v in times.items() if k != "total"))
+        return r
+
+def summary(journal, orgs, started):
+    done = [journal.state[o] for o in orgs
+            if o in journal.state and journal.state[o]["state"] == "done" and journal.state[o]["ts"] >= started]
+    failed = [o for o in orgs if journal.state.get(o, {}).get("state") == "failed"]
+    if done:
+        before = sum(r["bytes_before"] for r in done)
+        after = sum(r["bytes_after"] for r in done)
+        steps = {}
+        for r in done:
+            for k, v in r["times"].items():
+                steps[k] = steps.get(k, 0) + v
+        print(f"  rebuilt {len(done)}: {before / 1048576:,.0f} -> {after / 1048576:,.0f} MB "
+              f"({(after - before) / 1048576:+,.0f}); seconds summed over databases: "
+              + " ".join(f"{k} {v:,.0f}" for k, v in steps.items()))
+    if failed:
+        print(f"  failed {len(failed)}: {' '.join(failed)} -- re-run to retry")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("organisms", nargs="*", help="default: every organism")
+    ap.add_argument("--organism-dir", default=os.path.join(ROOT, "organisms"))
+    ap.add_argument("--disk-slots", type=int, default=1,
+                    help="steps on the data volume at once (default 1: sdb is seek-bound)")
+    ap.add_argument("--stage", help="build on this (fast) volume and copy back")
+    ap.add_argument("--jobs", type=int, help="builds at once (default: the disk slots, or "
+                                             "with --stage, up to 4 CPUs)")
+    ap.add_argument("--in-place", action="store_true", help="no copy: ONLY when nobody is searching")
+    ap.add_argument("--force", action="store_true", help="rebuild databases that carry search_prior")
+    ap.add_argument("--fresh", action="store_true", help="start a new journal")
+    ap.add_argument("--journal", default=os.path.join(LOGDIR, "journal.ndjson"))
+    ap.add_argument("--sqlite3", default="sqlite3", help="the sqlite3 shell to build with")
+    ap.add_argument("--dry-run", action="store_true", help="list what would be done")
+    args = ap.parse_args()
+    if args.stage and args.in_place:
+        ap.error("--stage builds a copy; it cannot be --in-place")
+    if not os.path.exists(SQL):
+        sys.exit(f"missing {SQL}")
+    os.makedirs(LOGDIR, exist_ok=True)
+
+    # SQLite's temp files must NOT land in /tmp (see rebuild_fts_indexes.sh): VACUUM writes
+    # a second copy of the database there, and /tmp on the host is 4 GB.
+    args.tmpdir = os.environ.get("SQLITE_TMPDIR") or os.path.join(args.organism_dir, ".fts_tmp")
+    os.makedirs(args.tmpdir, exist_ok=True)
+    if args.stage:
+        os.makedirs(args.stage, exist_ok=True)
+    jobs = args.jobs or (min(4, os.cpu_count() or 1) if args.stage else args.disk_slots)
+
+    orgs = args.organisms or sorted(
+        d for d in os.listdir(args.organism_dir)
+        if os.path.isfile(os.path.join(args.organism_dir, d, "organism.sqlite")))
+    # Largest first: the longest build starts first instead of last.
+    orgs.sort(key=lambda o: -os.path.getsize(os.path.join(args.organism_dir, o, "organism.sqlite"))
+              if os.path.exists(os.path.join(args.organism_dir, o, "organism.sqlite")) else 0)
+
+    rb = Rebuild(args)
+    print(f"  {len(orgs)} organisms, {jobs} build(s) at once, {args.disk_slots} on the data volume"
+          + (f", staged in {args.stage}" if args.stage else "") + f"; journal {args.journal}")
+    started = time.time()
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        for _ in pool.map(rb.one, orgs):
+            pass
+    except KeyboardInterrupt:
+        # The sqlite3 shells got the signal too and roll back; the journal has the rest.
+        pool.shutdown(wait=False, cancel_futures=True)
+        print("  interrupted -- re-run to continue where each database stopped")
+        sys.exit(130)
+    pool.shutdown()
+    print(f"  finished in {(time.time() - started) / 60:.0f}m {(time.time() - started) % 60:.0f}s")
+    if not args.dry_run:
+        summary(rb.journal, orgs, started)
+        # The rebuilt databases no longer match their sidecars, search tier or union index
+        # entry: search is correct without them, only slower, until they are rewritten.
+        print("  now: php scripts/build_search_sidecars.php   (rewrites the sidecars these made stale)")
+        print("       php scripts/build_search_tier.php       (if search_tier_path is set)")
+        print("       php scripts/build_union_index.php --organism=NAME   (each rebuilt organism)")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,11 +14,17 @@
 # interrupt rolls back to the previous good index rather than leaving none.
 #
 # NEVER replaces a good database with an unverified one. Before the rename a copy must
-# pass quick_check, must actually carry annotation_type_code, and must have exactly one
-# FTS row per feature_annotation row. Any failure leaves the original untouched.
+# pass quick_check, must actually carry search_prior (the newest column, so it implies
+# annotation_type_code), and must have exactly one FTS row per feature_annotation row.
+# Any failure leaves the original untouched.
 #
-# Resumable: an organism that already carries the column is skipped, so re-running after
-# a failure picks up where it stopped.
+# Resumable: an organism that already carries search_prior is skipped, so re-running after
+# a failure picks up where it stopped -- and databases rebuilt before the column existed
+# are picked up by the next run.
+#
+# scripts/rebuild_fts.py does the same paced to the data volume (one stream on sdb at a
+# time instead of four jobs seeking), with a resume journal, per-database timings and
+# size deltas, and --stage to build on the fast volume and copy back.
 #
 # usage:
 #   scripts/rebuild_fts_indexes.sh              # all organisms, 4 at a time, via copies
@@ -69,7 +75,7 @@ one() {
   # failure or an interrupted run, which matters when the whole pass takes hours.
   if sqlite3 "file:$db?mode=ro" \
        "SELECT sql FROM sqlite_master WHERE name='feature_annotation_search';" 2>/dev/null \
-       | grep -q annotation_type_code; then
+       | grep -q search_prior; then
     echo "DONE  $org (already rebuilt)"; return 0
   fi
 
@@ -101,7 +107,7 @@ one() {
   n_fts=$(sqlite3 "file:$tmp?mode=ro" "SELECT COUNT(*) FROM feature_annotation_search_docsize;" 2>>"$log")
   n_fa=$(sqlite3 "file:$tmp?mode=ro"  "SELECT COUNT(*) FROM feature_annotation;" 2>>"$log")
 
-  if [[ $chk != ok ]] || ! grep -q annotation_type_code <<<"$cols" \
+  if [[ $chk != ok ]] || ! grep -q search_prior <<<"$cols" \
      || [[ -z $n_fts || -z $n_fa || $n_fts -ne $n_fa ]]; then
     # NEVER rm here when in place: $tmp IS the live database, and deleting it would
     # destroy the organism while printing "original untouched". Only the copy path has
@@ -133,3 +139,13 @@ echo "  ${#orgs[@]} organisms, $JOBS at a time, logs in $LOGDIR"
 start=$SECONDS
 printf '%s\n' "${orgs[@]}" | xargs -P "$JOBS" -I{} bash -c 'one "$@"' _ {}
 echo "  finished in $(( (SECONDS - start) / 60 ))m $(( (SECONDS - start) % 60 ))s"
+# A rebuilt database no longer matches its search sidecars (lib/fts_docsize.php,
+# lib/fts_term_stats.php), so search ranks it inside SQLite and picks its pool without a
+# match estimate until they are rewritten. Correct, just slower.
+echo "  now: php scripts/build_search_sidecars.php   (rewrites the sidecars these made stale)"
+# Likewise a search tier (lib/search_tier.php): ignored once its database changes, so search
+# reads the index from the slow volume until the tier is rebuilt.
+echo "       php scripts/build_search_tier.php       (if search_tier_path is set)"
+# And union.sqlite (lib/union_index.php) reports the organism stale once its fingerprint
+# changes, so cross-organism search stops ranking it once until its entry is refreshed.
+echo "       php scripts/build_union_index.php --organism=NAME   (each rebuilt organism)"
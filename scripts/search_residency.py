@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""How much of each organism database the page cache holds right now, for ordering a fan-out.
+
+A cross-organism search or MOOPmart preview runs one request per organism. On a warm
+organism a request is milliseconds of CPU; on a cold one it is seconds of seeks on sdb,
+which is seek-saturated -- raising the fan-out from 5 to 15 in flight gave 1.12x, because
+the extra requests only queue on the same disk. Which organism is which is known before
+anything runs: mincore(2) reports it without faulting a page in. lib/fanout_schedule.php
+asks this script and orders the fan-out from the answer.
+
+Per database, from ONE mincore over the file:
+
+    search        fraction resident of the pages a search touches first -- the page list
+                  scripts/prewarm_search_pages.py keeps in {cache_root}/{organism}/
+                  prewarm_pages.json. Sampled (at most SAMPLE pages), since a fraction is
+                  all an ordering needs. null when there is no current list: building one
+                  reads the whole index, which is not a question's job.
+    search_bytes  bytes in that page list -- what a cold search would have to read. null
+                  likewise.
+    file          fraction of the whole file resident (MOOPmart reads all over the file).
+    file_bytes    the file's size.
+
+Prints one JSON object, organism => those fields. Organisms that cannot be read are left
+out; the caller treats a missing answer as "unknown", never as an error.
+
+usage:  search_residency.py --cache-root DIR DB...
+"""
+import argparse, json, os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from prewarm_search_pages import fingerprint, resident_vector
+
+SAMPLE = 4096          # page-list entries checked per database
+
+
+def cached_page_list(db, cache_root):
+    """(page_size, pages) from the prewarm page list, or None when it is missing or stale."""
+    org = os.path.basename(os.path.dirname(db))
+    try:
+        with open(os.path.join(cache_root, org, "prewarm_pages.json")) as fh:
+            m = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if m.get("fingerprint") != fingerprint(db):
+        return None
+    return m["page_size"], m["pages"]
+
+
+def residency(db, cache_root):
+    vec, os_page = resident_vector(db)
+    out = {
+        # bit 0 is residency; the other bits are reserved and zero on Linux.
+        "file": round((len(vec) - vec.count(0)) / len(vec), 4) if vec else 1.0,
+        "file_bytes": os.path.getsize(db),
+        "search": None,
+        "search_bytes": None,
+    }
+    listed = cached_page_list(db, cache_root)
+    if listed is None:
+        return out
+    page_size, pages = listed
+    per = max(1, page_size // os_page)
+    sample = pages[::max(1, len(pages) // SAMPLE)]
+    hit = 0
+    for pno in sample:
+        first = (pno - 1) * page_size // os_page
+        if all(i < len(vec) and vec[i] & 1 for i in range(first, first + per)):
+            hit += 1
+    out["search"] = round(hit / len(sample), 4) if sample else 1.0
+    out["search_bytes"] = len(pages) * page_size
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--cache-root", required=True)
+    ap.add_argument("dbs", nargs="+")
+    args = ap.parse_args()
+
+    report = {}
+    for db in args.dbs:
+        try:
+            report[os.path.basename(os.path.dirname(db))] = residency(db, args.cache_root)
+        except (OSError, ValueError) as e:
+            print(f"{db}: {e}", file=sys.stderr)
+    json.dump(report, sys.stdout)
+    print()
+
+
+if __name__ == "__main__":
+    main()
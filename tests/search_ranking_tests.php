@@ -48,7 +48,8 @@ function ok($cond, $label) {
  * Build a throwaway organism database.
  *
  * $with_type_code selects which search path the query planner will take:
- *   true  -> feature_annotation_search carries annotation_type_code, so the quota pool runs
+ *   true  -> feature_annotation_search carries annotation_type_code and search_prior, so the
+ *            quota pool runs, taking each type's slice in prior order
  *   false -> it does not, so the code must fall back to the bm25 pool
  * Both must produce the same ordering; that is the point of running every case twice.
  */
@@ -79,6 +80,7 @@ function build_fixture(array $genes, $with_type_code) {
     $db->exec("INSERT INTO annotation_source VALUES (2,'TestDomains','Domains','2026-01-01')");
 
     $fid = $aid = $faid = 0;
+    $db->beginTransaction();
     foreach ($genes as $g) {
         $fid++;
         $ins = $db->prepare("INSERT INTO feature VALUES (?,?,?,?,'mRNA',1,1)");
@@ -92,20 +94,24 @@ function build_fixture(array $genes, $with_type_code) {
                ->execute([$faid, $fid, $aid]);
         }
     }
+    $db->commit();
 
     $cols = $with_type_code
-        ? "feature_name, feature_description, annotation_description, annotation_accession, annotation_type_code"
+        ? "feature_name, feature_description, annotation_description, annotation_accession, annotation_type_code, search_prior"
         : "feature_name, feature_description, annotation_description, annotation_accession";
     $db->exec("CREATE VIRTUAL TABLE feature_annotation_search USING fts5($cols,
                    content='', tokenize='porter unicode61')");
     $sel = $with_type_code
         ? "fa.feature_annotation_id, f.feature_name, f.feature_description, a.annotation_description,
            a.annotation_accession,
-           'atype' || lower(replace(replace(replace(ans.annotation_type,' ',''),'-',''),'_','')) || 'z'"
+           'atype' || lower(replace(replace(replace(ans.annotation_type,' ',''),'-',''),'_','')) || 'z',
+           'aprior' || ((CASE WHEN COALESCE(f.feature_name,'') <> '' THEN 0 ELSE 3 END)
+                      + (CASE WHEN length(COALESCE(a.annotation_description,'')) < 8 THEN 2
+                              WHEN length(a.annotation_description) > 120 THEN 1 ELSE 0 END)) || 'z'"
         : "fa.feature_annotation_id, f.feature_name, f.feature_description, a.annotation_description,
            a.annotation_accession";
     $into = $with_type_code
-        ? "rowid, feature_name, feature_description, annotation_description, annotation_accession, annotation_type_code"
+        ? "rowid, feature_name, feature_description, annotation_description, annotation_accession, annotation_type_code, search_prior"
         : "rowid, feature_name, feature_description, annotation_description, annotation_accession";
     $db->exec("INSERT INTO feature_annotation_search($into)
                SELECT $sel FROM feature_annotation fa
@@ -199,6 +205,417 @@ $stem = [
 ];
 ranks_above('transpos', $stem, 'S_LITERAL', 'S_STEM', 'a literal "transpos" match outranks a stem-only TRANSPORT match');
 
+// ---------------------------------------------------------------------------------------
+group('union index — ranks once, and never returns what the user cannot see');
+
+require_once "$BASE/lib/union_index.php";
+
+/** Build a union.sqlite over the given organism fixtures, exactly as the builder does. */
+function build_union(array $orgs) {
+    global $BASE;
+    $sql_dir = "$BASE/config/build_and_load_db/data_loaders";
+    $path = tempnam(sys_get_temp_dir(), 'moop_union_') . '.sqlite';
+    $db = new PDO('sqlite:' . $path);
+    $db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+    $db->exec(file_get_contents("$sql_dir/build_union_index.sql"));
+    foreach ($orgs as $name => $org_path) {
+        $db->exec('ATTACH DATABASE ' . $db->quote($org_path) . ' AS org');
+        $db->exec("DROP TABLE IF EXISTS temp.union_target");
+        $db->exec("CREATE TEMP TABLE union_target (organism TEXT, fingerprint TEXT)");
+        $db->prepare("INSERT INTO temp.union_target VALUES (?, 'test')")->execute([$name]);
+        $db->exec(file_get_contents("$sql_dir/refresh_union_organism.sql"));
+        $db->exec('DETACH DATABASE org');
+    }
+    $ids = $db->query("SELECT organism, org_id FROM union_organism")->fetchAll(PDO::FETCH_KEY_PAIR);
+    $db = null;
+    return [$path, $ids];
+}
+
+$private = [
+    ['uniquename' => 'P_SECRET', 'name' => 'SNX99', 'description' => 'sorting nexin 99',
+     'annotations' => ['sorting nexin 99']],
+];
+$public_path  = build_fixture($nexin, true);
+$private_path = build_fixture($private, true);
+[$union_path, $org_ids] = build_union(['Public_org' => $public_path, 'Private_org' => $private_path]);
+
+$ranked = moop_union_rank($union_path, buildFtsMatchExpr('nexin', false), [$org_ids['Public_org']]);
+ok(isset($ranked[$org_ids['Public_org']]) && !isset($ranked[$org_ids['Private_org']]),
+    'ranking returns postings for accessible organisms only');
+
+$pool = ['rowids' => $ranked[$org_ids['Public_org']] ?? [], 'gene_set_ids' => [1]];
+$res  = searchFeaturesAndAnnotations('nexin', false, $public_path, [], '', '', [], $pool);
+$order = array_values(array_unique(array_column($res['results'], 'feature_uniquename')));
+ok(($order[0] ?? '') === 'AAA_043_000010',
+    'union pool keeps the tier order: SNX17 first  (got: ' . implode(' , ', $order) . ')');
+
+$res = searchFeaturesAndAnnotations('nexin', false, $public_path, [], '', '', [],
+    ['rowids' => $pool['rowids'], 'gene_set_ids' => []]);
+ok(empty($res['results']), 'an empty accessible gene-set list returns nothing (fails closed)');
+
+// CYTIP is named in no annotation that says "cytohesin"; only its own description does.
+// The union index holds annotation text only, so this must come through the name arm.
+$res = searchFeaturesAndAnnotations('cytohesin', false, $public_path, [], '', '', [],
+    ['rowids' => [], 'gene_set_ids' => [1]]);
+ok(in_array('AAA_013_000004', array_column($res['results'], 'feature_uniquename'), true),
+    'a gene matched only by its own description is still found on the union path');
+
+// A split query: NV123 is the gene's name, kinase is in its annotation. No union document
+// holds both, so the union index ranks nothing for it, and the gene must come through the
+// organism's own index.
+$split_path = build_fixture([
+    ['uniquename' => 'K_SPLIT', 'name' => 'NV123', 'description' => 'hypothetical protein',
+     'annotations' => ['protein kinase domain']],
+    ['uniquename' => 'K_OTHER', 'name' => 'NV124', 'description' => 'hypothetical protein',
+     'annotations' => ['zinc finger domain']],
+], true);
+[$split_union, $split_ids] = build_union(['Split_org' => $split_path]);
+$ranked = moop_union_rank($split_union, buildFtsMatchExpr('NV123 kinase', false), [$split_ids['Split_org']]);
+$res = searchFeaturesAndAnnotations('NV123 kinase', false, $split_path, [], '', '', [],
+    ['rowids' => $ranked[$split_ids['Split_org']] ?? [], 'gene_set_ids' => [1]]);
+ok(empty($ranked) && array_values(array_unique(array_column($res['results'], 'feature_uniquename'))) === ['K_SPLIT'],
+    'a query split between the gene\'s name and its annotation is found on the union path');
+
+unlink($public_path); unlink($private_path); unlink($union_path);
+unlink($split_path); unlink($split_union);
+
+// The pool is one organism's share of a ranking across EVERY organism served with it, cut
+// at one global limit. Alone, Lone_org's weak widget match is in the pool; next to an
+// organism with more, stronger widget documents than the limit, it is pushed out. The
+// result cache sees only Lone_org's database, so the pool itself must be in the key.
+require_once "$BASE/lib/annotation_search.php";
+$lone_path = build_fixture([
+    ['uniquename' => 'W_LONE', 'name' => '', 'description' => '',
+     'annotations' => ['widget protein of unknown function with a long and wordy description']],
+], true);
+$crowd = [];
+foreach (range(1, moop_search_results_limit() * 2 + 1) as $i) {
+    $crowd[] = ['uniquename' => "W_$i", 'name' => '', 'description' => '', 'annotations' => ["widget widget w$i"]];
+}
+$crowd_path = build_fixture($crowd, true);
+[$w_union, $w_ids] = build_union(['Lone_org' => $lone_path, 'Crowd_org' => $crowd_path]);
+$w_match = buildFtsMatchExpr('widget', false);
+$alone   = moop_union_rank($w_union, $w_match, [$w_ids['Lone_org']])[$w_ids['Lone_org']] ?? [];
+$crowded = moop_union_rank($w_union, $w_match, [$w_ids['Lone_org'], $w_ids['Crowd_org']])[$w_ids['Lone_org']] ?? [];
+$w_p = ['input' => 'widget', 'quoted' => false, 'gene_only' => false, 'sources' => [],
+        'assembly' => '', 'gene_set' => '', 'scope' => []];
+$key = function ($rowids) use ($w_p) {
+    return moop_annotation_search_cache_key($w_p + ['union_pool' => ['rowids' => $rowids, 'gene_set_ids' => [1]]],
+                                            'Lone_org');
+};
+ok($alone !== $crowded, 'the same organism gets a different union pool beside a different set of organisms');
+ok($key($alone) !== $key($crowded) && $key($alone) === $key($alone),
+   'so its cached answer is keyed on the pool, not only on its gene sets');
+
+unlink($lone_path); unlink($crowd_path); unlink($w_union);
+
+// ---------------------------------------------------------------------------------------
+group('docsize sidecar — bm25 ranked in PHP picks the same pool as bm25() in SQLite');
+
+require_once "$BASE/lib/fts_docsize.php";
+
+// Lengths and term frequencies vary on purpose: document-length normalisation and IDF are
+// the parts of the formula a near-miss reimplementation gets wrong.
+$bm25_genes = [];
+foreach (range(1, 40) as $i) {
+    $bm25_genes[] = [
+        'uniquename'  => sprintf('B_%03d', $i),
+        'name'        => $i % 3 ? "NEX$i" : '',
+        'description' => str_repeat('sorting nexin ', $i % 4) . str_repeat('filler word ', $i % 7),
+        'annotations' => ["sorting nexin $i" . str_repeat(' domain', $i % 5), "kinase $i helper"],
+    ];
+}
+$bm25_path = build_fixture($bm25_genes, false);
+$side_path = tempnam(sys_get_temp_dir(), 'moop_dsz_');
+moop_docsize_write($bm25_path, $side_path);
+$side = moop_docsize_open_file($side_path, $bm25_path);
+ok($side !== null, 'a freshly written sidecar opens and matches its database');
+
+$bm25_weights = array_map('floatval', explode(',', MOOP_FTS_BM25_WEIGHTS));
+$dbh = getDbConnection($bm25_path);
+foreach ([['nexin', false], ['sorting nex', false], ['sorting nexin', true]] as [$term, $quoted]) {
+    $stmt = $dbh->prepare("SELECT rowid, bm25(feature_annotation_search, " . MOOP_FTS_BM25_WEIGHTS . ")
+                           FROM feature_annotation_search WHERE feature_annotation_search MATCH ?");
+    $stmt->execute([moop_fts_text_match(buildFtsMatchExpr($term, $quoted))]);
+    $sqlite = $stmt->fetchAll(PDO::FETCH_KEY_PAIR);
+    $mine   = $side ? moop_bm25_rank($dbh, $side, $term, $quoted, $bm25_weights, 1000) : null;
+
+    $monotone = is_array($mine) && count($mine) === count($sqlite) && count($sqlite) > 0;
+    $prev = -INF;
+    foreach (array_keys($mine ?? []) as $rid) {
+        if (!isset($sqlite[$rid]) || $sqlite[$rid] < $prev - 1e-9) { $monotone = false; break; }
+        $prev = $sqlite[$rid];
+    }
+    ok($monotone, "\"$term\"" . ($quoted ? ' (quoted)' : '')
+        . ': same rows, in non-decreasing bm25() order (' . count($sqlite) . ' rows)');
+}
+
+touch($bm25_path, time() + 60);   // any change to the database makes its sidecar stale
+clearstatcache();
+ok(moop_docsize_open_file($side_path, $bm25_path) === null, 'a sidecar is ignored once its database changes');
+
+unlink($bm25_path); unlink($side_path);
+
+// ---------------------------------------------------------------------------------------
+group('type and prior tokens — never matched by a search word, on any path');
+
+// Every unquoted word is a prefix, and the type codes (atype...z) and priors (aprior0z..)
+// are tokens in the same index: unpinned, "ap" matched every row through its prior and
+// "at" every row through its type code. Only two genes here hold real ap* text.
+$ap_genes = [
+    ['uniquename' => 'P_APT',  'name' => 'APT1', 'description' => 'adenine phosphoribosyltransferase',
+     'annotations' => ['purine salvage enzyme', 'phosphoribosyltransferase domain']],
+    ['uniquename' => 'P_APOP', 'name' => '',     'description' => 'apoptosis regulator',
+     'annotations' => ['cell death regulator']],
+];
+foreach (range(1, 6) as $i) {
+    $ap_genes[] = ['uniquename' => "P_OTHER$i", 'name' => $i % 2 ? "ZNF$i" : '',
+                   'description' => 'zinc finger protein', 'annotations' => ['zinc finger domain', 'nucleic acid binding']];
+}
+$real_ap = ['P_APT', 'P_APOP'];
+$genes_of = function ($res) {
+    $seen = [];
+    foreach ($res['results'] as $row) $seen[$row['feature_uniquename']] = true;
+    $ids = array_keys($seen);
+    sort($ids);
+    return $ids;
+};
+$ap_path = build_fixture($ap_genes, true);
+ok($genes_of(searchFeaturesAndAnnotations('ap', false, $ap_path)) === $real_ap,
+   '"ap" on the quota pool: only the genes with real ap* text');
+ok($genes_of(searchFeaturesAndAnnotations('ap', false, $ap_path, [], '', 'testGeneSet')) === $real_ap,
+   '"ap" filtered by gene set: only the genes with real ap* text');
+ok($genes_of(searchFeaturesAndAnnotations('at', false, $ap_path, [], '', 'testGeneSet')) === [],
+   '"at" filtered by gene set: no row matches through its type code');
+
+$ap_side_file = tempnam(sys_get_temp_dir(), 'moop_dsz_');
+moop_docsize_write($ap_path, $ap_side_file);
+$ap_side = moop_docsize_open_file($ap_side_file, $ap_path);
+$dbh  = getDbConnection($ap_path);
+$mine = $ap_side ? moop_bm25_rank($dbh, $ap_side, 'ap', false, $bm25_weights, 1000) : null;
+$stmt = $dbh->prepare("SELECT rowid FROM feature_annotation_search WHERE feature_annotation_search MATCH ?");
+$stmt->execute([moop_fts_text_match(buildFtsMatchExpr('ap', false))]);
+$sqlite = $stmt->fetchAll(PDO::FETCH_COLUMN);
+$want = $dbh->query("SELECT fa.feature_annotation_id FROM feature_annotation fa JOIN feature f USING (feature_id)
+                     WHERE f.feature_uniquename IN ('P_APT', 'P_APOP') ORDER BY 1")->fetchAll(PDO::FETCH_COLUMN);
+$got = is_array($mine) ? array_keys($mine) : [];
+sort($got);
+ok(array_map('intval', $sqlite) === array_map('intval', $want) && $got === array_map('intval', $want),
+   '"ap" on the bm25 pool: only the ' . count($want) . ' rows with real ap* text, in SQL and in PHP');
+
+$dbh = null;
+unlink($ap_path); unlink($ap_side_file);
+
+// ---------------------------------------------------------------------------------------
+group('term stats sidecar — match estimates are upper bounds, exact for one term');
+
+require_once "$BASE/lib/fts_term_stats.php";
+
+$ts_path  = build_fixture($bm25_genes, true);
+$ts_file  = tempnam(sys_get_temp_dir(), 'moop_tst_');
+moop_term_stats_write($ts_path, $ts_file);
+$ts_stats = moop_term_stats_open_file($ts_file, $ts_path);
+ok($ts_stats !== null, 'a freshly written term-stats sidecar opens and matches its database');
+
+$dbh = getDbConnection($ts_path);
+foreach ([['nexin', false], ['nex', false], ['sorting nexin', true], ['kinase helper', false]] as [$term, $quoted]) {
+    $stmt = $dbh->prepare("SELECT COUNT(*) FROM feature_annotation_search WHERE feature_annotation_search MATCH ?");
+    $stmt->execute([moop_fts_text_match(buildFtsMatchExpr($term, $quoted))]);
+    $actual = (int)$stmt->fetchColumn();
+
+    $est = null;
+    foreach (moop_bm25_phrases($term, $quoted) ?? [] as $p) {
+        $last = count($p['tokens']) - 1;
+        foreach ($p['tokens'] as $j => $tok) {
+            $n   = moop_term_stats_docs($ts_stats, $tok, $p['prefix'] && $j === $last);
+            $est = $est === null ? $n : min($est, $n);
+        }
+    }
+    ok($est !== null && $est >= $actual && $actual > 0,
+       "\"$term\"" . ($quoted ? ' (quoted)' : '') . ": estimate $est >= actual $actual");
+}
+ok(moop_term_stats_docs($ts_stats, 'kinas', true) === 40, 'one prefix covering one term is exact (40 rows)');
+ok(moop_term_stats_docs($ts_stats, 'atypeorthologsz', false) === 0, 'the quota pool\'s type tokens are not counted');
+
+touch($ts_path, time() + 60);
+clearstatcache();
+ok(moop_term_stats_open_file($ts_file, $ts_path) === null, 'a term-stats sidecar is ignored once its database changes');
+
+$ts_stats = null;
+unlink($ts_path); unlink($ts_file);
+
+// ---------------------------------------------------------------------------------------
+group('whole-set plan — "ap" fits the quota because it really does, not through its priors');
+
+// The estimate leaves the type and prior tokens out, so it bounds the PINNED match only.
+// When the pools matched unpinned, "ap" was estimated at its real rows, skipped the quota
+// pool as a whole-set term, and then matched every row through aprior0z: the sidecar
+// ranker declined past its cap and bm25() ran in SQLite over the entire table. Run here
+// end to end, with both sidecars where the search looks for them and the pool read back
+// from the telemetry record.
+$cm   = ConfigManager::getInstance();
+$prop = new ReflectionProperty('ConfigManager', 'config');
+$prop->setAccessible(true);
+$saved_config = $prop->getValue($cm);
+$plan_cache   = sys_get_temp_dir() . '/moop_plan_' . getmypid();
+$plan_path    = build_fixture($ap_genes, true);
+@mkdir($plan_cache . '/' . basename(dirname($plan_path)), 0775, true);
+$prop->setValue($cm, array_merge($saved_config, [
+    'cache_path'              => $plan_cache,
+    'search_telemetry_file'   => "$plan_cache/telemetry.ndjson",
+    'search_telemetry_max_mb' => 64,
+]));
+moop_term_stats_write($plan_path, moop_term_stats_sidecar_file($plan_path));
+moop_docsize_write($plan_path, moop_docsize_sidecar_file($plan_path));
+
+$res = searchFeaturesAndAnnotations('ap', false, $plan_path);
+$log = @file("$plan_cache/telemetry.ndjson", FILE_IGNORE_NEW_LINES) ?: [];
+$rec = $log ? json_decode(end($log), true) : [];
+ok(($res['estimated_matches'] ?? null) === count($want),
+   '"ap" is estimated at its ' . count($want) . ' real rows, an honest bound on the pinned match');
+ok(($rec['pool'] ?? null) === 'bm25_sidecar',
+   '"ap" is ranked from the sidecar, not by bm25() in SQLite (pool: ' . ($rec['pool'] ?? 'none') . ')');
+ok($genes_of($res) === $real_ap, '"ap" still returns only the genes with real ap* text');
+
+$prop->setValue($cm, $saved_config);
+array_map('unlink', glob("$plan_cache/*/*") ?: []);
+array_map('unlink', glob("$plan_cache/*.*") ?: []);
+@rmdir($plan_cache . '/' . basename(dirname($plan_path)));
+@rmdir($plan_cache);
+unlink($plan_path);
+
+// ---------------------------------------------------------------------------------------
+group('skip index — organisms that cannot match are skipped, no others');
+
+require_once "$BASE/lib/organism_skip_index.php";
+
+$skip_dbs = [
+    'Has_piwi' => build_fixture([
+        ['uniquename' => 'HP_001', 'name' => 'PIWIL1', 'description' => 'piwi like 1',
+         'annotations' => ['Piwi domain', 'argonaute family']],
+    ], true),
+    'No_piwi' => build_fixture([
+        ['uniquename' => 'NPX0042', 'name' => 'SNX17', 'description' => 'sorting nexin 17',
+         'annotations' => ['PX domain', 'kinase helper']],
+    ], false),
+];
+$skip_sidecars = [];
+foreach ($skip_dbs as $org => $path) {
+    $skip_sidecars[$org] = tempnam(sys_get_temp_dir(), 'moop_skt_');
+    moop_term_stats_write($path, $skip_sidecars[$org]);
+}
+$skip_file = tempnam(sys_get_temp_dir(), 'moop_skip_');
+$built = moop_skip_index_build($skip_dbs, $skip_file, $skip_sidecars);
+ok($built['organisms'] === 2 && empty($built['missing']), 'both organisms indexed');
+$skip_index = moop_skip_index_open_file($skip_file);
+
+$skips = function ($q, $quoted = false) use ($skip_dbs, $skip_index) {
+    return moop_skip_index_skippable($q, $quoted, $skip_dbs, $skip_index);
+};
+ok($skips('piwi') === ['No_piwi'], '"piwi": only the organism without it is skipped');
+ok($skips('piwis') === ['No_piwi'], '"piwis": stemmed as the index stems it');
+ok($skips('domain') === [], '"domain": in both, nothing skipped');
+ok($skips('nexin') === ['Has_piwi'], '"nexin" (gene description only): found through feature_search terms');
+ok($skips('piwi domain', true) === ['No_piwi'], '"piwi domain" (quoted): phrase tokens must all be present');
+ok($skips('PX004') === ['Has_piwi'], '"PX004": an ID substring (any case) keeps the organism whose IDs contain it');
+ok($skips('zzzz') === ['Has_piwi', 'No_piwi'], '"zzzz": matches nowhere, every organism skipped');
+
+touch($skip_dbs['No_piwi'], time() + 60);
+clearstatcache();
+ok($skips('piwi') === [], 'an organism whose database changed since the build is never skipped');
+
+$skip_index = null;
+foreach ($skip_dbs as $org => $path) { unlink($path); unlink($skip_sidecars[$org]); }
+unlink($skip_file);
+
+// ---------------------------------------------------------------------------------------
+group('search tier — the copied index answers exactly as the original');
+
+require_once "$BASE/lib/search_tier.php";
+
+$tier_path = build_fixture($bm25_genes, true);
+$tier_file = tempnam(sys_get_temp_dir(), 'moop_tier_');
+moop_search_tier_build($tier_path, $tier_file);
+
+$plain  = getDbConnection($tier_path);
+$tiered = new PDO('sqlite:' . $tier_path, null, null, [
+    PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READONLY
+                                 | (defined('PDO::SQLITE_OPEN_URI') ? PDO::SQLITE_OPEN_URI : 0x40),
+]);
+$tiered->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+ok(moop_search_tier_attach_file($tiered, $tier_file, $tier_path), 'a freshly built tier attaches to its database');
+
+$joins = [
+    'feature_annotation_search' => 'JOIN feature_annotation fa ON fa.feature_annotation_id = feature_annotation_search.rowid
+                                    JOIN feature f ON f.feature_id = fa.feature_id',
+    'feature_search'            => 'JOIN feature f ON f.feature_id = feature_search.rowid',
+];
+foreach (['feature_annotation_search' => 'nexin', 'feature_search' => 'sorting'] as $table => $term) {
+    $q = "SELECT f.feature_uniquename, bm25($table) AS r FROM %s.$table {$joins[$table]}
+          WHERE $table MATCH ? ORDER BY r, f.feature_uniquename";
+    $a = $plain->prepare(sprintf($q, 'main'));
+    $a->execute([buildFtsMatchExpr($term, false)]);
+    $b = $tiered->prepare(sprintf($q, 'search'));
+    $b->execute([buildFtsMatchExpr($term, false)]);
+    $want = $a->fetchAll(PDO::FETCH_NUM);
+    ok(count($want) > 0 && $want == $b->fetchAll(PDO::FETCH_NUM),
+       "$table \"$term\": same rows, same bm25, through the join back into main (" . count($want) . ' rows)');
+}
+
+$dsz  = tempnam(sys_get_temp_dir(), 'moop_dsz_');
+moop_docsize_write($tier_path, $dsz);
+$side = moop_docsize_open_file($dsz, $tier_path);
+$weights = array_map('floatval', explode(',', MOOP_FTS_BM25_WEIGHTS));
+ok($side !== null && moop_bm25_rank($plain, $side, 'sorting nex', false, $weights, 1000)
+                 === moop_bm25_rank($tiered, $side, 'sorting nex', false, $weights, 1000, 'search'),
+   'in-PHP bm25 reads the tier\'s vocabulary and ranks identically');
+
+$plain = $tiered = null;
+touch($tier_path, time() + 60);
+clearstatcache();
+$tiered = new PDO('sqlite:' . $tier_path, null, null, [
+    PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READONLY
+                                 | (defined('PDO::SQLITE_OPEN_URI') ? PDO::SQLITE_OPEN_URI : 0x40),
+]);
+$tiered->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+ok(!moop_search_tier_attach_file($tiered, $tier_file, $tier_path)
+   && $tiered->query("PRAGMA database_list")->fetchAll(PDO::FETCH_COLUMN, 1) === ['main'],
+   'a tier is not attached once its database changes');
+
+$plan = moop_search_tier_plan(['Big' => 900, 'Busy' => 500, 'Small' => 100, 'Idle' => 350], 1000,
+                              ['Busy' => 40, 'Big' => 5]);
+ok(array_keys($plan['tier']) === ['Busy', 'Small', 'Idle'] && $plan['bytes'] === 950,
+   'planner: searches per byte first, and one that does not fit is passed over, not a stop');
+
+$tiered = null;
+unlink($tier_path); unlink($tier_file); unlink($dsz);
+
+// ---------------------------------------------------------------------------------------
+group('streamed top K — one row per gene, comparable tiers across organisms');
+
+require_once "$BASE/lib/annotation_search.php";
+
+$row = function ($org, $id, $name, $fdesc, $adesc) {
+    return ['organism' => $org, 'feature_uniquename' => $id, 'feature_name' => $name,
+            'feature_description' => $fdesc, 'annotation_description' => $adesc,
+            'uniquename_search' => false];
+};
+$p = ['input' => 'nexin', 'quoted' => false];
+$top = moop_annotation_search_top_merge([], ['results' => [
+    $row('Orgb', 'CYTIP', 'CYTIP', 'cytohesin 1 interacting protein', 'sorting nexin-like'),
+    $row('Orgb', 'SNX2', '', 'sorting nexin 2', 'sorting nexin 2'),
+]], $p, 3);
+// Interleaving can put a gene's weaker row first; its best row is the one that counts.
+$top = moop_annotation_search_top_merge($top, ['results' => [
+    $row('Orga', 'G7', '', 'unknown', 'nexin domain'),
+    $row('Orga', 'SNX17', 'SNX17', 'kinase', 'something'),
+    $row('Orga', 'SNX17', 'SNX17', 'sorting nexin 17', 'sorting nexin 17'),
+]], $p, 3);
+$ids = array_map(function ($e) { return $e['row']['feature_uniquename']; }, $top);
+ok($ids === ['SNX17', 'SNX2', 'CYTIP'],
+   'a description match in one organism outranks an annotation-only match in another, and K is kept');
+ok(count(array_unique($ids)) === count($ids), 'each gene appears once');
+
 // ---------------------------------------------------------------------------------------
 echo "\n" . str_repeat('-', 60) . "\n";
 echo "Search ranking tests: $PASS passed, $FAIL failed\n";
@@ -4,7 +4,9 @@
  *
  *   access control      — has_access() level hierarchy + per-resource checks
  *   search-query build   — buildFtsMatchExpr() / ftsPrimaryTerm() / appendScopeFilters()
+ *   search pool          — moop_allocate_type_quotas()
  *   cache invalidation   — buildPerOrganismFingerprints() / buildConfigFingerprint()
+ *   search result cache  — moop_search_cache_key() / moop_search_cache_fingerprints()
  *
  * These are intentionally plain PHP (no PHPUnit) to match this repo's near-zero-dep
  * philosophy. They use only hermetic inputs (mocked $_SESSION, temp files) so they
@@ -126,6 +128,18 @@ appendScopeFilters($sql, $params, '', '', [
 ok(substr_count($sql, ' OR ') === 1 && $params === ['A', 'g1', 'B', 'g2'],
                                                                 'scope_pairs OR the clauses and bind each pair');
 
+// ----------------------------------------------------------------------------
+group('search pool — per-type quota allocation');
+
+ok(moop_allocate_type_quotas(['A' => 1, 'B' => 1, 'C' => 1], 10) === ['A' => 4, 'B' => 3, 'C' => 3],
+                                                                'equal weights split exactly; the remainder goes to the curated-first type');
+ok(moop_allocate_type_quotas(['A' => 2, 'B' => 1, 'C' => 0], 7) === ['A' => 5, 'B' => 2, 'C' => 0],
+                                                                'weights are proportional and a zero weight gets nothing');
+ok(array_sum(moop_allocate_type_quotas(['A' => 1, 'B' => 3, 'C' => 7], 3750)) === 3750,
+                                                                'the parts always sum to the whole pool');
+ok(moop_allocate_type_quotas(['A' => 0, 'B' => 0], 5) === ['A' => 0, 'B' => 0],
+                                                                'all-zero weights allocate nothing (no division by zero)');
+
 // ----------------------------------------------------------------------------
 group('cache invalidation — change fingerprints (hermetic temp files)');
 
@@ -162,6 +176,85 @@ ok(buildConfigFingerprint(null, $groups) === $cfp2, 'config fingerprint is deter
 // cleanup
 @unlink($db); @unlink($groups); @rmdir("$tmp/OrgA"); @rmdir($tmp);
 
+// ----------------------------------------------------------------------------
+group('search result cache — keys and per-organism invalidation (hermetic temp files)');
+
+require_once "$BASE/lib/search_result_cache.php";
+
+$k1 = moop_search_cache_key('annotation_search', ['organism' => 'OrgA', 'match' => buildFtsMatchExpr('kinase  binding', false)]);
+$k2 = moop_search_cache_key('annotation_search', ['organism' => 'OrgA', 'match' => buildFtsMatchExpr('kinase binding', false)]);
+$k3 = moop_search_cache_key('annotation_search', ['organism' => 'OrgB', 'match' => buildFtsMatchExpr('kinase binding', false)]);
+$k4 = moop_search_cache_key('feature_search',    ['organism' => 'OrgA', 'match' => buildFtsMatchExpr('kinase binding', false)]);
+ok($k1 === $k2,                                 'inputs with the same FTS expression share a key');
+ok($k2 !== $k3 && $k2 !== $k4,                  'organism and endpoint are part of the key');
+
+$tmp = sys_get_temp_dir() . '/moop_srcache_' . getmypid();
+@mkdir($tmp, 0777, true);
+file_put_contents("$tmp/a.sqlite", 'aaaa');
+file_put_contents("$tmp/b.sqlite", 'bbbb');
+$dbs  = ['OrgB' => "$tmp/b.sqlite", 'OrgA' => "$tmp/a.sqlite"];
+$fps1 = moop_search_cache_fingerprints($dbs);
+ok($fps1 === moop_search_cache_fingerprints(array_reverse($dbs, true)),
+                                                'stored fingerprints do not depend on organism order');
+file_put_contents("$tmp/b.sqlite", 'bbbbbbbb');   // "reload" OrgB only
+clearstatcache();
+$fps2 = json_decode(moop_search_cache_fingerprints($dbs), true);
+$old  = json_decode($fps1, true);
+ok($fps2['OrgB'] !== $old['OrgB'] && $fps2['OrgA'] === $old['OrgA'],
+                                                'a reloaded organism changes only its own fingerprint');
+@unlink("$tmp/a.sqlite"); @unlink("$tmp/b.sqlite"); @rmdir($tmp);
+
+// ----------------------------------------------------------------------------
+group('fan-out schedule — warm first, then cold by bytes still to read');
+
+require_once "$BASE/lib/fanout_schedule.php";
+
+$dbs = ['Warm' => '/nonexistent/Warm.sqlite', 'Small' => '/nonexistent/Small.sqlite',
+        'Big' => '/nonexistent/Big.sqlite', 'Half' => '/nonexistent/Half.sqlite',
+        'Unknown' => '/nonexistent/Unknown.sqlite'];
+$res = [
+    'Warm'  => ['search' => 0.95, 'search_bytes' => 9000, 'file' => 0.1, 'file_bytes' => 90000],
+    'Small' => ['search' => 0.0,  'search_bytes' => 100,  'file' => 0.0, 'file_bytes' => 1000],
+    'Big'   => ['search' => 0.0,  'search_bytes' => 5000, 'file' => 0.0, 'file_bytes' => 50000],
+    'Half'  => ['search' => 0.5,  'search_bytes' => 8000, 'file' => 0.5, 'file_bytes' => 80000],
+];
+$order = array_column(moop_fanout_plan($dbs, 'search', $res), 'organism');
+ok($order === ['Warm', 'Big', 'Half', 'Small', 'Unknown'],
+                                                'parallel: warm, then the most bytes left to read first, unknown as cold');
+$order = array_column(moop_fanout_plan($dbs, 'search', $res, false), 'organism');
+ok($order === ['Warm', 'Unknown', 'Small', 'Half', 'Big'],
+                                                'sequential: warm, then the cheapest cold first');
+$warm = array_column(moop_fanout_plan($dbs, 'file', $res), 'warm', 'organism');
+ok($warm['Warm'] === false && !in_array(true, $warm, true),
+                                                "'file' judges the whole database, where Warm is cold");
+
+// ----------------------------------------------------------------------------
+group('search telemetry — terms hashed, I/O counters parsed');
+
+require_once "$BASE/lib/search_telemetry.php";
+
+$h = moop_telemetry_term_hash('"sorting nexin"');
+ok(strlen($h) === 12 && $h === moop_telemetry_term_hash('"sorting nexin"') && strpos($h, 'nexin') === false,
+                                                'an FTS expression hashes stably and is not stored');
+$io = moop_telemetry_io();
+ok(!is_file('/proc/self/io') || !is_readable('/proc/self/io') || isset($io['read_bytes'], $io['rchar']),
+                                                '/proc/self/io yields read_bytes and rchar where it exists');
+
+// ----------------------------------------------------------------------------
+group('search capture — terms kept for replay, identities not');
+
+require_once "$BASE/lib/search_capture.php";
+
+ok(moop_capture_term('sorting nexin') === 'sorting nexin',
+                                                'an ordinary term is kept verbatim, for replay');
+$t = moop_capture_term('someone@example.org kinase');
+ok(strpos($t, 'redacted:') === 0 && strpos($t, 'example') === false,
+                                                'an e-mail-like term is replaced by its hash');
+ok(mb_strlen(moop_capture_term(str_repeat('a', 500))) === 200,
+                                                'a term is cut at 200 characters');
+ok(!in_array('PHPSESSID', MOOP_CAPTURE_PARAMS, true) && in_array('scope', MOOP_CAPTURE_PARAMS, true),
+                                                'the kept parameters are search parameters only');
+
 // ----------------------------------------------------------------------------
 group('function registries — each watches its own language, not the other');
 
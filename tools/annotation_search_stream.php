@@ -0,0 +1,187 @@
+<?php
+/**
+ * Streaming cross-organism annotation search: the whole fan-out in one request, answered
+ * as NDJSON, one line per organism the moment that organism is done.
+ *
+ * The browser's fan-out (js/modules/annotation-search.js) sends one request per organism,
+ * a few at a time. Each pays its own PHP bootstrap and session lock, and the page can only
+ * show an organism when its own request comes back, so a search across 85 organisms spends
+ * as long waiting on request overhead and the concurrency limit as on the searches.
+ * Here the organisms run one after another in a single process, and every answer is
+ * written and flushed as soon as it exists, so the first rows reach the page after the
+ * first organism, not after the slowest of the first batch.
+ *
+ * ORDER. Answers that cost nothing go first: organisms the skip index rules out (no
+ * database opened), then those the shared result cache can serve. Then the rest as
+ * lib/fanout_schedule.php plans a sequential run: organisms the page cache holds, then the
+ * cold ones smallest first. The page fills with everything already known before the first
+ * cold search starts, and with the cheap cold answers before the expensive ones.
+ *
+ * UNION INDEX. The organisms left to search after those are ranked ONCE, together, in
+ * union.sqlite (lib/union_index.php), and each is then fetched from its share of that
+ * ranking instead of running its own bm25 pass. Only an unfiltered annotation search can
+ * go this way -- a source, assembly or gene-set filter must narrow before ranking -- and an
+ * organism the union index cannot serve (not indexed, reloaded since, no union.sqlite at
+ * all) is searched on its own exactly as before.
+ *
+ * TOP K. Besides each organism's own ranked rows, a running cross-organism top K is sent
+ * whenever it changes (moop_annotation_search_top_merge()), so the best matches anywhere
+ * are visible while the slow organisms are still being searched.
+ *
+ * Each organism is searched exactly as by tools/annotation_search_ajax.php -- the same
+ * access check, validation, skip index and result cache (lib/annotation_search.php), its
+ * union pool aside -- and its line carries that endpoint's JSON body unchanged.
+ *
+ * GET parameters: those of annotation_search_ajax.php, plus
+ *   organisms - comma-separated organism directory names (required; replaces organism)
+ *   scopes    - JSON {organism: [{assembly, gene_set}]}, each organism's scope (replaces scope)
+ *   top_k     - size of the running top list (default 25, at most 200)
+ *
+ * Response (application/x-ndjson), one JSON object per line:
+ *   {"type":"start","organisms":N,"top_k":K}
+ *   {"type":"organism","organism":"...","data":{...per-organism response, errors included...}}
+ *   {"type":"top","k":K,"results":[row, ...]}        whenever the top K changes
+ *   {"type":"done","organisms":N,"elapsed_ms":T}
+ */
+
+// Start output buffering to catch any errors
+ob_start();
+
+include_once __DIR__ . '/tool_init.php';
+require_once __DIR__ . '/../lib/annotation_search.php';
+require_once __DIR__ . '/../lib/fanout_schedule.php';
+require_once __DIR__ . '/../lib/search_capture.php';
+require_once __DIR__ . '/../lib/union_index.php';
+include_once __DIR__ . '/../lib/extract_search_helpers.php';   // flattenSourcesList()
+
+// Clear any output that might have occurred
+ob_end_clean();
+
+// Nothing below writes to the session. Holding its lock for the length of the stream would
+// stall every other request this user makes meanwhile, the per-organism fallback included.
+if (session_status() === PHP_SESSION_ACTIVE) session_write_close();
+
+$started = microtime(true);
+
+header('Content-Type: application/x-ndjson');
+header('Cache-Control: no-cache');
+// Stop nginx from buffering the response -- the point is that each line arrives when written
+// (same as api/moopmart_export.php).
+header('X-Accel-Buffering: no');
+@ini_set('zlib.output_compression', '0');
+while (ob_get_level() > 0) ob_end_flush();
+
+$emit = function (string $line) {
+    echo $line, "\n";
+    flush();
+};
+
+$p         = moop_annotation_search_params($_GET);
+$organisms = array_values(array_unique(array_filter(array_map('trim', explode(',', (string)($_GET['organisms'] ?? ''))))));
+$scopes    = json_decode((string)($_GET['scopes'] ?? ''), true);
+$top_k     = max(1, min(200, (int)($_GET['top_k'] ?? 25)));
+
+moop_search_capture('stream', $_GET, $organisms);
+
+$emit(json_encode(['type' => 'start', 'organisms' => count($organisms), 'top_k' => $top_k]));
+
+// Per-organism parameters. A name that is not an organism directory name is still answered,
+// with an error, so the client can count it done.
+$params = [];
+$invalid = [];
+$organism_data = rtrim($config->getPath('organism_data'), '/');
+foreach ($organisms as $organism) {
+    if (!preg_match('/^[A-Za-z0-9_.-]+$/', $organism)) {
+        $invalid[] = $organism;
+        continue;
+    }
+    $params[$organism] = $p;
+    if (is_array($scopes) && isset($scopes[$organism])) {
+        $params[$organism]['scope'] = moop_annotation_search_scope($scopes[$organism]);
+    }
+}
+
+// Order the work. This only decides WHEN each organism is answered; whether it may be, and
+// what it gets, is still moop_annotation_search_organism()'s call, access check first.
+$skippable = [];
+$cached    = [];
+$rest      = [];
+if (moop_search_input_is_usable($p['input'], $p['quoted'])) {
+    $dbs = [];
+    foreach ($params as $organism => $_) {
+        $dbs[$organism] = "$organism_data/$organism/organism.sqlite";
+    }
+    $skip = array_flip(moop_skip_index_skippable($p['input'], $p['quoted'], $dbs));
+    foreach ($params as $organism => $op) {
+        if (isset($skip[$organism])) {
+            $skippable[] = $organism;
+        } elseif (moop_search_cache_peek(moop_annotation_search_cache_key($op, $organism),
+                                         [$organism => $dbs[$organism]])) {
+            $cached[] = $organism;
+        } else {
+            $rest[] = $organism;
+        }
+    }
+} else {
+    $rest = array_keys($params);
+}
+
+foreach ($invalid as $organism) {
+    $emit(json_encode(['type' => 'organism', 'organism' => $organism,
+                       'data' => ['error' => 'Invalid organism', 'results' => []]]));
+}
+
+$top = [];
+$top_genes = [];
+$planned = count($rest) < 2;     // one organism has no order to plan
+$queue = array_merge($skippable, $cached, $planned ? $rest : []);
+while ($queue || !$planned) {
+    if (!$queue) {
+        // Planned only now, once the instant answers are out: the residency probe can take
+        // a moment, and nothing it decides affects them.
+        $planned = true;
+
+        // The union index takes the unfiltered ones; whatever it hands back as stale keeps
+        // the per-organism path. The pool goes into the organism's parameters, so its answer
+        // is cached under its own key (moop_annotation_search_cache_key()). Only reached with
+        // two or more organisms to search, which is where ranking once pays.
+        $unfiltered = [];
+        if (moop_search_input_is_usable($p['input'], $p['quoted'])
+            && !$p['gene_only'] && empty($p['sources']) && $p['assembly'] === '' && $p['gene_set'] === '') {
+            foreach ($rest as $organism) {
+                if (empty($params[$organism]['scope'])) $unfiltered[] = $organism;
+            }
+        }
+        if ($unfiltered) {
+            foreach (moop_union_pools($p['input'], $p['quoted'], $unfiltered)['pools'] as $organism => $pool) {
+                $params[$organism]['union_pool'] = $pool;
+            }
+        }
+
+        $rest_dbs = [];
+        foreach ($rest as $organism) $rest_dbs[$organism] = "$organism_data/$organism/organism.sqlite";
+        $queue = array_column(moop_fanout_plan($rest_dbs, 'search', moop_fanout_residency($rest_dbs), false), 'organism');
+        continue;
+    }
+    $organism = array_shift($queue);
+    if (connection_aborted()) exit;
+    // Each organism gets the time one per-organism request would have had.
+    @set_time_limit(120);
+
+    $body = moop_annotation_search_organism($params[$organism], $organism);
+    // The body is already JSON; spliced in rather than decoded and encoded again.
+    $emit('{"type":"organism","organism":' . json_encode($organism) . ',"data":' . $body . '}');
+
+    $payload = json_decode($body, true);
+    if (empty($payload['results'])) continue;
+    $top = moop_annotation_search_top_merge($top, $payload, $params[$organism], $top_k);
+    $genes = array_map(function ($e) { return $e['row']['organism'] . "\t" . $e['row']['feature_uniquename']; }, $top);
+    if ($genes !== $top_genes) {
+        $top_genes = $genes;
+        $emit(json_encode(['type' => 'top', 'k' => $top_k,
+                           'results' => array_column($top, 'row')]));
+    }
+}
+
+$emit(json_encode(['type' => 'done', 'organisms' => count($organisms),
+                   'elapsed_ms' => (int)round((microtime(true) - $started) * 1000)]));